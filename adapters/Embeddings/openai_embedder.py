@@ -1,31 +1,155 @@
+"""
+openai_embedder.py – Adaptador para Generación de Embeddings vía API de OpenAI
+
+Características:
+- Validación de la API Key mediante variables de entorno.
+- División de las entradas en lotes acotados por número de textos y de tokens (límites por petición
+  de la API), contando tokens con tiktoken si está instalado o con una estimación conservadora.
+- Envío concurrente de los lotes mediante un pool de hilos acotado.
+- Reintentos con backoff exponencial por lote ante errores transitorios (RateLimitError, Timeout, etc.):
+  un fallo puntual no obliga a repetir toda la ingesta.
+- Los resultados se recolocan en el orden original de los textos, directamente en una matriz
+  float32 contigua (sin listas de floats intermedias).
+- Caché por texto direccionada por contenido (utils/embedding_cache.py): solo se envían a la API
+  los textos que no estén ya calculados, y cada texto repetido en el lote una sola vez.
+- API key por llamada (api_key=...), sin modificar el estado global openai.api_key.
+- Versión asíncrona (aembed) sobre el cliente compartido de utils/openai_client.py: lotes concurrentes
+  como corrutinas, pool de conexiones keep-alive y backoff no bloqueante.
+"""
+
+import asyncio
 import os
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+import numpy as np
 import openai
-from utils.cache_manager import get_cache, set_cache
+from utils.embedding_cache import acached_embed, cached_embed
+from utils.openai_client import TRANSIENT_ERRORS, AsyncOpenAIClient, get_async_client
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 
 logger = logging.getLogger("RAGLogger")
 
+DEFAULT_MAX_BATCH_SIZE = 2048        # máximo de entradas por petición admitido por la API
+DEFAULT_MAX_BATCH_TOKENS = 100_000   # tokens por petición, con margen frente al límite de la API
+DEFAULT_MAX_WORKERS = 4
+CHARS_PER_TOKEN = 3                  # estimación conservadora cuando tiktoken no está disponible
+
 def create():
     """
     Función de registro que permite identificar este adaptador de embeddings.
-    
+
     Returns:
         str: "openai_embedder_creado"
     """
     return "openai_embedder_creado"
 
-def embed(texts, model="text-embedding-ada-002", cache_ttl=3600):
+def _token_counter(model: str):
+    """
+    Retorna una función que cuenta los tokens de un texto para el modelo indicado.
+    """
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text))
+    return lambda text: len(text) // CHARS_PER_TOKEN + 1
+
+def token_bounded_batches(
+    texts: Sequence[str],
+    model: str = "text-embedding-ada-002",
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS
+) -> List[List[int]]:
+    """
+    Agrupa los índices de los textos en lotes que no superan max_batch_size textos ni max_batch_tokens tokens.
+    Un texto que por sí solo supera max_batch_tokens forma su propio lote (la API lo truncará o rechazará).
+
+    Returns:
+        list[list[int]]: Índices de los textos de cada lote, en orden.
+    """
+    count_tokens = _token_counter(model)
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if current and (len(current) >= max_batch_size or current_tokens + tokens > max_batch_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def _batch_embeddings(response, batch: List[str]) -> List[List[float]]:
+    """
+    Extrae los embeddings de una respuesta de la API, en el orden del lote.
+    """
+    # Se espera que la respuesta tenga la forma: {"data": [{"embedding": [...], "index": i}, ...]}
+    data = response["data"]
+    if data and "index" in data[0]:
+        data = sorted(data, key=lambda item: item["index"])
+    embeddings = [item["embedding"] for item in data]
+    if len(embeddings) != len(batch):
+        raise RuntimeError(f"Respuesta inesperada: {len(embeddings)} embeddings para {len(batch)} textos.")
+    return embeddings
+
+def _embed_batch(batch: List[str], model: str, retries: int, backoff_factor: float, api_key: str) -> List[List[float]]:
+    """
+    Envía un lote a la API con reintentos y backoff exponencial ante errores transitorios.
+    """
+    attempt = 0
+    delay = 1  # segundos iniciales
+    while True:
+        try:
+            response = openai.Embedding.create(input=batch, model=model, api_key=api_key)
+            return _batch_embeddings(response, batch)
+        except TRANSIENT_ERRORS as transient_error:
+            if attempt >= retries:
+                raise
+            logger.warning(f"Error transitorio al generar embeddings: {transient_error}. Reintentando en {delay} segundos...")
+            time.sleep(delay)
+            attempt += 1
+            delay *= backoff_factor
+
+def embed(
+    texts,
+    model="text-embedding-ada-002",
+    cache_ttl=3600,
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    retries: int = 3,
+    backoff_factor: float = 2.0,
+    near_duplicates: bool = False
+):
     """
     Genera embeddings para una lista de textos utilizando la API de OpenAI.
-    
+
     Args:
         texts (list[str]): Lista de textos a convertir en vectores.
         model (str): Modelo de embeddings a utilizar. Por defecto, "text-embedding-ada-002".
         cache_ttl (int): Tiempo en segundos para mantener el resultado en caché.
-        
+        max_batch_size (int): Máximo de textos por petición.
+        max_batch_tokens (int): Máximo de tokens por petición.
+        max_workers (int): Peticiones concurrentes como máximo.
+        retries (int): Reintentos por lote ante errores transitorios.
+        backoff_factor (float): Factor de crecimiento del retraso entre reintentos.
+        near_duplicates (bool): Si True, los textos que solo difieren en mayúsculas o puntuación se
+            envían una sola vez.
+
     Returns:
-        list: Lista de vectores de embeddings.
-        
+        np.ndarray: Matriz (len(texts), dim) float32 de solo lectura, en el mismo orden que texts.
+
     Raises:
         RuntimeError: Si OPENAI_API_KEY no está configurada o si ocurre algún error en la llamada a la API.
     """
@@ -34,22 +158,122 @@ def embed(texts, model="text-embedding-ada-002", cache_ttl=3600):
     if not openai_api_key:
         logger.error("OPENAI_API_KEY no está configurada.")
         raise RuntimeError("OPENAI_API_KEY no está configurada.")
-    openai.api_key = openai_api_key
 
-    # Crear una clave única para la caché basada en los textos y el modelo
-    cache_key = f"openai_embedder:{hash(tuple(texts))}:{model}"
-    cached = get_cache(cache_key)
-    if cached is not None:
-        logger.info("Embeddings recuperados de caché.")
-        return cached
+    def embed_missing(missing: List[str]) -> np.ndarray:
+        return _embed_texts(
+            missing, model, max_batch_size, max_batch_tokens, max_workers, retries, backoff_factor, openai_api_key
+        )
+
+    try:
+        # Caché por texto: solo se envían a la API los textos que no estén ya calculados
+        embeddings = cached_embed(
+            list(texts), f"openai:{model}", embed_missing, ttl=cache_ttl, near_duplicates=near_duplicates
+        )
+        logger.info("Embeddings generados y almacenados en caché.")
+        return embeddings
+    except Exception as e:
+        logger.error(f"Error en OpenAI embedder: {e}")
+        raise RuntimeError(f"Error generando embeddings: {e}")
+
+def _embed_texts(
+    texts: List[str],
+    model: str,
+    max_batch_size: int,
+    max_batch_tokens: int,
+    max_workers: int,
+    retries: int,
+    backoff_factor: float,
+    api_key: str
+) -> np.ndarray:
+    """
+    Calcula los embeddings de texts en lotes concurrentes y los retorna en el orden original.
+    """
+    batches = token_bounded_batches(texts, model, max_batch_size, max_batch_tokens)
+    logger.info(f"Llamando a la API de OpenAI para generar embeddings ({len(texts)} textos en {len(batches)} lotes).")
+    if len(batches) <= 1 or max_workers <= 1:
+        results = [_embed_batch([texts[i] for i in b], model, retries, backoff_factor, api_key) for b in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches)), thread_name_prefix="openai-embed") as pool:
+            futures = [
+                pool.submit(_embed_batch, [texts[i] for i in b], model, retries, backoff_factor, api_key)
+                for b in batches
+            ]
+            try:
+                results = [future.result() for future in futures]
+            except Exception:
+                # No enviar los lotes pendientes si uno falla definitivamente
+                for future in futures:
+                    future.cancel()
+                raise
+    return _assemble(texts, batches, results)
+
+def _assemble(texts: List[str], batches: List[List[int]], results: List[List[List[float]]]) -> np.ndarray:
+    """
+    Recoloca los embeddings de cada lote en el orden original, en una matriz float32 contigua.
+    """
+    embeddings = None
+    for batch, batch_embeddings in zip(batches, results):
+        block = np.asarray(batch_embeddings, dtype=np.float32)
+        if embeddings is None:
+            embeddings = np.empty((len(texts), block.shape[1]), dtype=np.float32)
+        embeddings[batch] = block
+    return embeddings
+
+async def aembed(
+    texts,
+    model="text-embedding-ada-002",
+    cache_ttl=3600,
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+    retries: int = 3,
+    backoff_factor: float = 2.0,
+    near_duplicates: bool = False,
+    client: Optional[AsyncOpenAIClient] = None
+):
+    """
+    Versión asíncrona de embed(): los lotes se envían concurrentemente como corrutinas sobre el cliente
+    compartido (utils/openai_client.py), sin pool de hilos. La concurrencia la limita el semáforo del
+    endpoint "embeddings" y los reintentos esperan con asyncio.sleep.
+
+    Args:
+        texts, model, cache_ttl, max_batch_size, max_batch_tokens, retries, backoff_factor,
+        near_duplicates: Igual que en embed().
+        client (AsyncOpenAIClient, opcional): Cliente a usar; por defecto, el compartido.
+
+    Returns:
+        np.ndarray: Matriz (len(texts), dim) float32 de solo lectura, en el mismo orden que texts.
+
+    Raises:
+        RuntimeError: Si OPENAI_API_KEY no está configurada o si ocurre algún error en la llamada a la API.
+    """
+    if not os.getenv("OPENAI_API_KEY"):
+        logger.error("OPENAI_API_KEY no está configurada.")
+        raise RuntimeError("OPENAI_API_KEY no está configurada.")
+    client = client or get_async_client()
+
+    async def embed_batch(batch: List[str]) -> List[List[float]]:
+        response = await client.embedding(
+            retries=retries, backoff_factor=backoff_factor, input=batch, model=model
+        )
+        return _batch_embeddings(response, batch)
+
+    async def embed_missing(missing: List[str]) -> np.ndarray:
+        batches = token_bounded_batches(missing, model, max_batch_size, max_batch_tokens)
+        logger.info(f"Llamando a la API de OpenAI para generar embeddings ({len(missing)} textos en {len(batches)} lotes, asíncrono).")
+        tasks = [asyncio.ensure_future(embed_batch([missing[i] for i in b])) for b in batches]
+        try:
+            results = await asyncio.gather(*tasks)
+        except Exception:
+            # No enviar los lotes pendientes si uno falla definitivamente
+            for task in tasks:
+                task.cancel()
+            raise
+        return _assemble(missing, batches, results)
 
     try:
-        logger.info("Llamando a la API de OpenAI para generar embeddings.")
-        response = openai.Embedding.create(input=texts, model=model)
-        # Se espera que la respuesta tenga la forma: {"data": [{"embedding": [...]}, ...]}
-        embeddings = [item["embedding"] for item in response["data"]]
-        # Almacenar en caché
-        set_cache(cache_key, embeddings, ttl=cache_ttl)
+        embeddings = await acached_embed(
+            list(texts), f"openai:{model}", embed_missing, ttl=cache_ttl, near_duplicates=near_duplicates
+        )
         logger.info("Embeddings generados y almacenados en caché.")
         return embeddings
     except Exception as e:
@@ -3,9 +3,29 @@ sentence_transformer_embedder.py – Adaptador para Generación de Embeddings co
 
 Enfoque ultra-extendido "state-of-the-art" listo para producción:
   - Carga de modelo configurable (por variable de entorno o parámetro).
-  - Soporte de batch processing y división de textos largos en chunks.
-  - Caching de resultados para ahorrar cómputo (utils/cache_manager).
-  - Concurrencia controlada con threading.Lock.
+  - Soporte de batch processing y división de textos largos en chunks: todos los chunks de todos los
+    textos se codifican en una sola llamada a encode() y se agregan por texto con np.add.reduceat
+    (media simple o ponderada por longitud).
+  - Batching dinámico por longitud: las entradas se ordenan por longitud en tokens y los lotes se
+    dimensionan por un presupuesto de tokens con padding (filas x longitud máxima) en lugar de por
+    número de elementos; el orden original se restaura al final.
+  - Caché por texto direccionada por contenido (utils/embedding_cache): solo se codifican los textos
+    nuevos, y cada texto repetido en el lote una sola vez (near_duplicates=True agrupa también los
+    casi duplicados).
+  - Salida como matriz float32 contigua, sin conversión a listas de floats de Python.
+  - Backend alternativo ONNX Runtime (backend="onnx" u "onnx-int8"; en el pipeline, embedding_backend de
+    core/config.py; por defecto, SENTENCE_TRANSFORMER_BACKEND):
+    el modelo se exporta una vez a ONNX (con cuantización dinámica int8 opcional), se valida su
+    paridad con PyTorch y se sirve desde una sesión de CPU cacheada. Requiere onnxruntime y onnx.
+  - Pool opcional de procesos (utils/embedding_pool): con num_workers >= 1 (o SENTENCE_TRANSFORMER_WORKERS),
+    N procesos cargan el modelo una vez, con threads_per_worker hilos cada uno, y devuelven los vectores
+    por memoria compartida; el rendimiento de las ingestas masivas escala con los núcleos.
+  - Registro de modelos (utils/model_registry) por (modelo, backend): cada llamada usa el modelo que
+    pide, cargado bajo demanda, y los menos usados se expulsan (LRU) si se supera el presupuesto
+    SENTENCE_TRANSFORMER_MEMORY_BUDGET_MB. Un proceso puede servir varios modelos a la vez. Los pools
+    de procesos se registran en el mismo registro (cuentan una copia del modelo por worker) y se
+    detienen al ser expulsados.
+  - Cargas concurrentes serializadas por clave en el registro; cada pool atiende un encode() a la vez.
   - Manejo de errores y logging detallado.
   - Verificación de disponibilidad del servicio local "sentence_transformer" mediante service_detector.
   
@@ -16,13 +36,23 @@ Requisitos:
 """
 
 import os
+import atexit
+import functools
+import inspect
+import json
 import logging
-import threading
-from typing import List, Optional, Union
+import re
+import shutil
+import tempfile
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
 
 from core.service_detector import check_service_availability
 from utils.logger import logger
-from utils.cache_manager import get_cache, set_cache
+from utils.embedding_cache import cached_embed
+from utils.embedding_pool import DEFAULT_THREADS_PER_WORKER, EmbeddingWorkerPool
+from utils.model_registry import ModelRegistry
 
 try:
     from sentence_transformers import SentenceTransformer
@@ -30,14 +60,32 @@ except ImportError:
     logger.error("La librería 'sentence-transformers' no está instalada. Usa 'pip install sentence-transformers'")
     raise RuntimeError("Falta la dependencia 'sentence-transformers' para usar sentence_transformer_embedder.")
 
-# Lock global para la carga concurrente del modelo
-_model_lock = threading.Lock()
-_global_model = None
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
 
 # Parámetros por defecto
-DEFAULT_BATCH_SIZE = 16
+DEFAULT_BATCH_SIZE = 16            # elementos por lote sin presupuesto de tokens (max_batch_tokens=None)
+DEFAULT_MAX_BATCH_TOKENS = 16384   # tokens con padding por lote (filas x longitud máxima del lote)
+DEFAULT_MAX_BATCH_ITEMS = 256      # tope de elementos por lote con presupuesto de tokens
+CHARS_PER_TOKEN = 4                # estimación si el modelo no expone un tokenizador
 DEFAULT_CHUNK_SIZE = 2048  # Cantidad de caracteres por chunk si se habilita la división
 
+# Backends de inferencia
+BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_ONNX_DIR = "onnx_models"
+ONNX_CONFIG_FILE = "onnx_config.json"
+ONNX_OPSET = 17
+PARITY_TEXTS = [
+    "El sistema RAG recupera documentos relevantes para cada consulta.",
+    "Los embeddings cuantizados reducen la memoria y la latencia en CPU.",
+    "def suma(a, b):\n    return a + b",
+    "A short English sentence to check the exported model.",
+]
+PARITY_MIN_COSINE = {"onnx": 0.999, "onnx-int8": 0.98}
+
+
 
 def create() -> str:
     """
@@ -51,7 +99,7 @@ def create() -> str:
 
 def _load_model(model_name: str) -> SentenceTransformer:
     """
-    Carga (o reutiliza) el modelo global de SentenceTransformer.
+    Carga (o reutiliza desde el registro de modelos) un modelo de SentenceTransformer.
 
     Args:
         model_name (str): Nombre o ruta del modelo local de HuggingFace.
@@ -59,47 +107,463 @@ def _load_model(model_name: str) -> SentenceTransformer:
     Returns:
         SentenceTransformer: Instancia del modelo lista para generar embeddings.
     """
-    global _global_model
+    return _model_registry.get((model_name, "torch"))
+
+
+# ======================
+# BACKEND ONNX RUNTIME
+# ======================
+def mean_pool(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """
+    Media de los embeddings de los tokens reales (attention_mask=1) de cada secuencia.
+    """
+    mask = attention_mask.astype(np.float32)[:, :, None]
+    return (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+
+def _onnx_export_dir(model_name: str) -> str:
+    base = os.getenv("SENTENCE_TRANSFORMER_ONNX_DIR", DEFAULT_ONNX_DIR)
+    return os.path.join(base, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+
+
+class OnnxEncoder:
+    """
+    Codificador sobre una sesión de ONNX Runtime (CPU) con la misma interfaz encode() que
+    SentenceTransformer: tokenización, inferencia del transformer exportado, pooling y normalización.
+    """
+
+    def __init__(self, export_dir: str, quantized: bool = False):
+        if ort is None:
+            raise RuntimeError("El backend ONNX requiere 'onnxruntime'. Usa 'pip install onnxruntime'.")
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(export_dir, ONNX_CONFIG_FILE), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        self.max_seq_length = int(self.config["max_seq_length"])
+        self.pooling = self.config["pooling"]
+        self.normalize = bool(self.config["normalize"])
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Respeta el límite de hilos de los workers de utils/embedding_pool
+        options.intra_op_num_threads = int(os.getenv("OMP_NUM_THREADS", "0"))
+        model_file = "model_int8.onnx" if quantized else "model.onnx"
+        model_path = os.path.join(export_dir, model_file)
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        # Tamaño aproximado en memoria, para el presupuesto del registro de modelos
+        self.nbytes = os.path.getsize(model_path)
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def encode(self, texts: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE, **kwargs) -> np.ndarray:
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                list(texts[start:start + batch_size]), padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+            if self.pooling == "cls":
+                pooled = token_embeddings[:, 0]
+            else:
+                pooled = mean_pool(token_embeddings, encoded["attention_mask"])
+            if self.normalize:
+                pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            outputs.append(pooled.astype(np.float32))
+        if not outputs:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(outputs)
+
+
+def _parity_min_cosine(reference: np.ndarray, candidate: np.ndarray) -> float:
+    ref = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    cand = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return float(np.min(np.sum(ref * cand, axis=1)))
+
+
+def _pooling_mode(pooling_module) -> str:
+    """
+    Modo de pooling del módulo Pooling de sentence-transformers ("mean" o "cls"), según la versión instalada.
+    """
+    if pooling_module is None:
+        return "mean"
+    mode = getattr(pooling_module, "pooling_mode", None)
+    if mode is None and hasattr(pooling_module, "get_pooling_mode_str"):
+        mode = pooling_module.get_pooling_mode_str()
+    mode = mode or "mean"
+    if mode not in ("mean", "cls"):
+        raise RuntimeError(f"Modo de pooling '{mode}' no soportado por el backend ONNX.")
+    return mode
+
+
+def export_onnx(model_name: str, export_dir: Optional[str] = None) -> str:
+    """
+    Exporta el transformer de un modelo SentenceTransformer a ONNX (fp32 y, con onnxruntime, int8
+    dinámico), junto con el tokenizador y la configuración de pooling. Cada variante se valida
+    frente al modelo PyTorch: la similitud coseno mínima sobre PARITY_TEXTS debe superar
+    PARITY_MIN_COSINE. El directorio se publica de forma atómica solo si la validación pasa.
+
+    Returns:
+        str: Directorio de exportación.
+
+    Raises:
+        RuntimeError: Si faltan dependencias o la paridad no alcanza el umbral.
+    """
+    if ort is None:
+        raise RuntimeError("El backend ONNX requiere 'onnxruntime'. Usa 'pip install onnxruntime onnx'.")
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    export_dir = export_dir or _onnx_export_dir(model_name)
+    if os.path.exists(os.path.join(export_dir, ONNX_CONFIG_FILE)):
+        return export_dir
+
+    logger.info(f"Exportando '{model_name}' a ONNX en {export_dir}.")
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0]
+    module_names = [type(module).__name__ for module in st_model]
+    pooling = _pooling_mode(next((m for m in st_model if type(m).__name__ == "Pooling"), None))
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids")
+                   if n in transformer.tokenizer.model_input_names]
+
+    class _Wrapper(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    parent = os.path.dirname(os.path.abspath(export_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".onnx-export-", dir=parent)
+    try:
+        sample = transformer.tokenizer(PARITY_TEXTS[:2], padding=True, return_tensors="pt")
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+        # Las versiones recientes de torch exportan con dynamo por defecto; las anteriores (p. ej. 2.0)
+        # no tienen el parámetro y siempre usan el exportador por trazado
+        export_kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+        with torch.no_grad():
+            torch.onnx.export(
+                _Wrapper(transformer.auto_model.eval()),
+                tuple(sample[name] for name in input_names),
+                os.path.join(tmp_dir, "model.onnx"),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=ONNX_OPSET,
+                **export_kwargs
+            )
+        quantize_dynamic(
+            os.path.join(tmp_dir, "model.onnx"), os.path.join(tmp_dir, "model_int8.onnx"), weight_type=QuantType.QInt8
+        )
+        transformer.tokenizer.save_pretrained(tmp_dir)
+        config = {
+            "model_name": model_name,
+            "pooling": pooling,
+            "normalize": "Normalize" in module_names,
+            "max_seq_length": int(st_model.max_seq_length or transformer.tokenizer.model_max_length),
+            "parity": {},
+        }
+        with open(os.path.join(tmp_dir, ONNX_CONFIG_FILE), "w", encoding="utf-8") as f:
+            json.dump(config, f)
+
+        reference = np.asarray(st_model.encode(PARITY_TEXTS), dtype=np.float32)
+        for backend, quantized in (("onnx", False), ("onnx-int8", True)):
+            min_cosine = _parity_min_cosine(reference, OnnxEncoder(tmp_dir, quantized).encode(PARITY_TEXTS))
+            logger.info(f"Paridad {backend} de '{model_name}': coseno mínimo {min_cosine:.5f}.")
+            if min_cosine < PARITY_MIN_COSINE[backend]:
+                raise RuntimeError(
+                    f"La exportación {backend} de '{model_name}' no supera la paridad "
+                    f"(coseno mínimo {min_cosine:.5f} < {PARITY_MIN_COSINE[backend]})."
+                )
+            config["parity"][backend] = min_cosine
+        with open(os.path.join(tmp_dir, ONNX_CONFIG_FILE), "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2)
+        try:
+            os.replace(tmp_dir, export_dir)
+        except OSError:
+            # Otro proceso publicó la exportación antes
+            if not os.path.exists(os.path.join(export_dir, ONNX_CONFIG_FILE)):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return export_dir
+
+
+def _load_onnx_encoder(model_name: str, backend: str) -> OnnxEncoder:
+    """
+    Retorna la sesión ONNX del modelo desde el registro, exportándolo la primera vez.
+    """
+    return _model_registry.get((model_name, backend))
+
+
+def _create_backend_model(key: Tuple):
+    """
+    Loader del registro de modelos: crea el codificador de (model_name, backend), o el pool de
+    procesos de (model_name, backend, num_workers, threads_per_worker).
+    """
+    model_name, backend, *workers = key
+    if workers:
+        return _create_worker_pool(model_name, backend, *workers)
+    if backend == "torch":
+        try:
+            logger.info(f"Cargando modelo SentenceTransformer: {model_name}")
+            model = SentenceTransformer(model_name)
+            logger.info("Modelo SentenceTransformer cargado con éxito.")
+            return model
+        except Exception as e:
+            logger.error(f"Error al cargar el modelo de SentenceTransformer '{model_name}': {e}")
+            raise RuntimeError(f"Fallo al cargar modelo local: {e}")
+    try:
+        export_dir = export_onnx(model_name)
+        encoder = OnnxEncoder(export_dir, quantized=backend == "onnx-int8")
+        logger.info(f"Sesión ONNX Runtime lista para '{model_name}' ({backend}).")
+        return encoder
+    except Exception as e:
+        logger.error(f"Error al cargar el backend {backend} de '{model_name}': {e}")
+        raise RuntimeError(f"Fallo al cargar el backend {backend}: {e}")
+
+
+def _memory_budget_bytes() -> Optional[int]:
+    budget_mb = os.getenv("SENTENCE_TRANSFORMER_MEMORY_BUDGET_MB")
+    return int(float(budget_mb) * 2**20) if budget_mb else None
+
+
+def _release_model(key: Tuple, model) -> None:
+    """
+    Callback de expulsión del registro: detiene los procesos de un pool expulsado (los modelos en
+    proceso se liberan al soltar la referencia).
+    """
+    if isinstance(model, EmbeddingWorkerPool):
+        model.close()
+
+
+# Modelos y pools de procesos, con expulsión LRU bajo el presupuesto de memoria
+_model_registry = ModelRegistry(_create_backend_model, max_bytes=_memory_budget_bytes(), on_evict=_release_model)
+
+
+def _load_backend_model(model_name: str, backend: str = "torch"):
+    """
+    Carga el codificador del backend indicado ("torch", "onnx" u "onnx-int8").
+    """
+    if backend == "torch":
+        return _load_model(model_name)
+    return _load_onnx_encoder(model_name, backend)
 
-    if _global_model is not None:
-        # Modelo ya cargado
-        return _global_model
 
-    with _model_lock:
-        # Verificar de nuevo si otro hilo lo cargó mientras esperábamos
-        if _global_model is None:
-            try:
-                logger.info(f"Cargando modelo SentenceTransformer: {model_name}")
-                _global_model = SentenceTransformer(model_name)
-                logger.info("Modelo SentenceTransformer cargado con éxito.")
-            except Exception as e:
-                logger.error(f"Error al cargar el modelo de SentenceTransformer '{model_name}': {e}")
-                raise RuntimeError(f"Fallo al cargar modelo local: {e}")
-    return _global_model
+def split_into_chunks(texts: Sequence[str], chunk_size: int) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Divide cada texto en chunks de como máximo chunk_size caracteres y aplana el resultado.
+
+    Returns:
+        tuple: (chunks, offsets, lengths) – offsets[i] es la posición del primer chunk del texto i
+               y lengths la longitud en caracteres de cada chunk. Un texto vacío aporta un chunk vacío.
+    """
+    chunks: List[str] = []
+    offsets = np.empty(len(texts), dtype=np.int64)
+    for i, text in enumerate(texts):
+        offsets[i] = len(chunks)
+        chunks.extend([text[j : j + chunk_size] for j in range(0, len(text), chunk_size)] or [text])
+    lengths = np.fromiter((len(chunk) for chunk in chunks), dtype=np.float32, count=len(chunks))
+    return chunks, offsets, lengths
+
+
+def pool_chunk_embeddings(
+    chunk_embeddings,
+    offsets: np.ndarray,
+    lengths: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Agrega los embeddings de los chunks de cada texto (segmentos que empiezan en offsets).
+
+    Args:
+        chunk_embeddings: Matriz (n_chunks, dim) con los embeddings de todos los chunks.
+        offsets (np.ndarray): Inicio de los chunks de cada texto, en orden creciente.
+        lengths (np.ndarray, opcional): Longitud de cada chunk; si se indica, la media se pondera
+            por longitud (un chunk final corto pesa menos).
+
+    Returns:
+        np.ndarray: Matriz (n_textos, dim) float32.
+    """
+    embeddings = np.asarray(chunk_embeddings, dtype=np.float32)
+    if lengths is None:
+        sums = np.add.reduceat(embeddings, offsets, axis=0)
+        weights = np.diff(np.append(offsets, embeddings.shape[0])).astype(np.float32)
+    else:
+        weights_per_chunk = np.maximum(np.asarray(lengths, dtype=np.float32), 1.0)
+        sums = np.add.reduceat(embeddings * weights_per_chunk[:, None], offsets, axis=0)
+        weights = np.add.reduceat(weights_per_chunk, offsets)
+    return np.ascontiguousarray(sums / weights[:, None], dtype=np.float32)
+
+
+def token_lengths(model, texts: Sequence[str]) -> np.ndarray:
+    """
+    Longitud en tokens de cada texto según el tokenizador del modelo (truncada a max_seq_length).
+    Si el modelo no expone un tokenizador utilizable, se estima a partir del número de caracteres.
+    """
+    max_len = getattr(model, "max_seq_length", None)
+    max_len = max_len if isinstance(max_len, int) and max_len > 0 else None
+    lengths = None
+    tokenizer = getattr(model, "tokenizer", None)
+    if callable(tokenizer):
+        try:
+            kwargs = {"truncation": True, "max_length": max_len} if max_len else {}
+            input_ids = tokenizer(list(texts), **kwargs)["input_ids"]
+            if isinstance(input_ids, list) and len(input_ids) == len(texts):
+                lengths = np.fromiter((len(ids) for ids in input_ids), dtype=np.int64, count=len(texts))
+        except Exception as e:
+            logger.warning(f"No se pudo tokenizar para el batching por longitud: {e}")
+    if lengths is None:
+        lengths = np.fromiter((len(t) // CHARS_PER_TOKEN + 1 for t in texts), dtype=np.int64, count=len(texts))
+    if max_len:
+        lengths = np.minimum(lengths, max_len)
+    return np.maximum(lengths, 1)
+
+
+def length_bucketed_batches(lengths: np.ndarray, max_batch_tokens: int, max_batch_items: int) -> List[np.ndarray]:
+    """
+    Agrupa los índices ordenados por longitud decreciente en lotes cuyo coste con padding
+    (número de filas x longitud del más largo) no supera max_batch_tokens.
+
+    Returns:
+        list[np.ndarray]: Índices originales de cada lote.
+    """
+    order = np.argsort(-np.asarray(lengths), kind="stable")
+    batches: List[np.ndarray] = []
+    start = 0
+    while start < len(order):
+        longest = int(lengths[order[start]])
+        size = max(1, min(max_batch_items, max_batch_tokens // longest, len(order) - start))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+def encode_batched(
+    model,
+    texts: Sequence[str],
+    batch_size: Optional[int] = None,
+    max_batch_tokens: Optional[int] = DEFAULT_MAX_BATCH_TOKENS
+) -> np.ndarray:
+    """
+    Codifica texts con lotes por presupuesto de tokens y retorna una matriz float32 en el orden original.
+    Con max_batch_tokens=None se usan lotes fijos de batch_size elementos en el orden de entrada.
+    """
+    if max_batch_tokens is None:
+        return np.asarray(model.encode(list(texts), batch_size=batch_size or DEFAULT_BATCH_SIZE), dtype=np.float32)
+    lengths = token_lengths(model, texts)
+    output = None
+    for batch in length_bucketed_batches(lengths, max_batch_tokens, batch_size or DEFAULT_MAX_BATCH_ITEMS):
+        embeddings = np.asarray(model.encode([texts[i] for i in batch], batch_size=len(batch)), dtype=np.float32)
+        if output is None:
+            output = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+        output[batch] = embeddings
+    return output if output is not None else np.empty((0, 0), dtype=np.float32)
+
+
+def _create_worker_pool(model_name: str, backend: str, num_workers: int, threads_per_worker: int) -> EmbeddingWorkerPool:
+    if backend != "torch":
+        # Exportar una sola vez en este proceso, antes de que los workers abran sus sesiones
+        export_onnx(model_name)
+    return EmbeddingWorkerPool(
+        functools.partial(_load_backend_model, model_name, backend),
+        encode_batched,
+        num_workers=num_workers,
+        threads_per_worker=threads_per_worker
+    )
+
+
+def get_worker_pool(
+    model_name: str,
+    num_workers: int,
+    threads_per_worker: int = DEFAULT_THREADS_PER_WORKER,
+    backend: str = "torch"
+) -> EmbeddingWorkerPool:
+    """
+    Retorna (creándolo la primera vez) el pool de procesos que sirve model_name con el backend indicado.
+    El pool vive en el registro de modelos: su memoria (una copia del modelo por worker) cuenta para
+    el presupuesto y se detiene cuando el registro lo expulsa.
+    """
+    key = (model_name, backend, num_workers, threads_per_worker)
+    pool = _model_registry.get(key)
+    if pool.closed:
+        # Un worker caído cierra el pool: se descarta y se crea otro
+        _model_registry.evict(key)
+        pool = _model_registry.get(key)
+    return pool
+
+
+def _pool_encode(key: Tuple, texts: List[str], **kwargs) -> np.ndarray:
+    """
+    Codifica con el pool de key = (model_name, num_workers, threads_per_worker, backend). Si el pool
+    se detuvo entre la búsqueda y el uso (expulsado por el registro o por un worker caído), se
+    reintenta una vez con un pool nuevo.
+    """
+    pool = get_worker_pool(*key)
+    try:
+        return pool.encode(texts, **kwargs)
+    except RuntimeError:
+        if not pool.closed:
+            raise
+        return get_worker_pool(*key).encode(texts, **kwargs)
+
+
+def shutdown_worker_pools() -> None:
+    """
+    Detiene todos los pools de procesos creados por este adaptador.
+    """
+    for key in _model_registry.keys():
+        if len(key) > 2:
+            _model_registry.evict(key)
+
+
+atexit.register(shutdown_worker_pools)
 
 
 def embed(
     texts: List[str],
     model_name: Optional[str] = None,
-    batch_size: int = DEFAULT_BATCH_SIZE,
+    batch_size: Optional[int] = None,
     enable_chunking: bool = False,
-    chunk_size: int = DEFAULT_CHUNK_SIZE
-) -> List[List[float]]:
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    length_weighted: bool = False,
+    max_batch_tokens: Optional[int] = DEFAULT_MAX_BATCH_TOKENS,
+    num_workers: Optional[int] = None,
+    threads_per_worker: Optional[int] = None,
+    backend: Optional[str] = None,
+    near_duplicates: bool = False
+) -> np.ndarray:
     """
     Genera embeddings para una lista de textos utilizando un modelo local de Sentence Transformers.
     
     Args:
         texts (list[str]): Lista de textos.
         model_name (str, opcional): Nombre o ruta del modelo. Si no se especifica, se toma de la ENV SENTENCE_TRANSFORMER_MODEL.
-        batch_size (int): Tamaño de batch para procesar en cada pasada.
+        batch_size (int, opcional): Máximo de elementos por lote (por defecto DEFAULT_MAX_BATCH_ITEMS con
+            presupuesto de tokens, o DEFAULT_BATCH_SIZE sin él).
         enable_chunking (bool): Si es True, cada texto se divide en chunks de longitud `chunk_size` y se promedian.
         chunk_size (int): Longitud máxima de cada chunk si enable_chunking=True.
+        length_weighted (bool): Con chunking, pondera la media de los chunks por su longitud.
+        max_batch_tokens (int, opcional): Presupuesto de tokens con padding por lote; las entradas se
+            agrupan por longitud. None vuelve a lotes fijos en el orden de entrada.
+        num_workers (int, opcional): Procesos del pool de embeddings (0 = en el proceso actual). Por
+            defecto, la ENV SENTENCE_TRANSFORMER_WORKERS o 0.
+        threads_per_worker (int, opcional): Hilos de cómputo por worker. Por defecto, la ENV
+            SENTENCE_TRANSFORMER_THREADS_PER_WORKER o DEFAULT_THREADS_PER_WORKER.
+        backend (str, opcional): "torch", "onnx" u "onnx-int8" (ONNX Runtime en CPU, con cuantización
+            dinámica int8 en el último caso). RAGPipeline pasa el embedding_backend de la configuración.
+            Por defecto, la ENV SENTENCE_TRANSFORMER_BACKEND o "torch".
+        near_duplicates (bool): Si True, los textos que solo difieren en mayúsculas o puntuación se
+            codifican una vez (los duplicados exactos siempre se codifican una sola vez).
 
     Returns:
-        list[list[float]]: Lista de embeddings (cada uno es un vector list[float]).
+        np.ndarray: Matriz (len(texts), dim) float32 contigua (de solo lectura; sus filas pueden
+        compartir memoria con la caché). Si se necesitan listas, conviértase con .tolist() en el borde.
 
     Raises:
         RuntimeError: Si el modelo no está disponible o si check_service_availability("sentence_transformer") da False.
+        ValueError: Si el backend no es válido.
     """
     # Verificar disponibilidad del "servicio" local
     if not check_service_availability("sentence_transformer"):
@@ -108,47 +572,41 @@ def embed(
     if not model_name:
         model_name = os.getenv("SENTENCE_TRANSFORMER_MODEL", "all-MiniLM-L6-v2")
 
-    # Crear una clave de caché única, basada en los textos, chunking y el modelo
-    cache_key = f"sent_trans_embed:{model_name}:{enable_chunking}:{hash(tuple(texts))}"
-    cached = get_cache(cache_key)
-    if cached is not None:
-        logger.info("Embeddings recuperados de caché (SentenceTransformer).")
-        return cached
+    backend = backend or os.getenv("SENTENCE_TRANSFORMER_BACKEND", "torch")
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend '{backend}' no soportado; opciones: {BACKENDS}")
+    if num_workers is None:
+        num_workers = int(os.getenv("SENTENCE_TRANSFORMER_WORKERS", "0"))
+    if threads_per_worker is None:
+        threads_per_worker = int(os.getenv("SENTENCE_TRANSFORMER_THREADS_PER_WORKER", str(DEFAULT_THREADS_PER_WORKER)))
 
-    # Carga (o reuso) del modelo local
-    model = _load_model(model_name)
+    if num_workers > 0:
+        # Los workers cargan el modelo; el proceso actual solo reparte tareas
+        encode = functools.partial(
+            _pool_encode, (model_name, num_workers, threads_per_worker, backend),
+            batch_size=batch_size, max_batch_tokens=max_batch_tokens
+        )
+    else:
+        # Carga (o reuso) del modelo local o de la sesión ONNX cacheada
+        model = _load_backend_model(model_name, backend)
+        encode = functools.partial(encode_batched, model, batch_size=batch_size, max_batch_tokens=max_batch_tokens)
 
-    # Opcional: dividir cada texto en chunks y generar embedding final promediado
-    def chunk_text(text: str) -> List[str]:
-        return [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+    def encode_missing(missing: List[str]) -> np.ndarray:
+        if enable_chunking:
+            # Todos los chunks de todos los textos en una sola pasada y agregación por segmentos
+            chunks, offsets, lengths = split_into_chunks(missing, chunk_size)
+            return pool_chunk_embeddings(encode(chunks), offsets, lengths if length_weighted else None)
+        return encode(missing)
 
-    final_embeddings = []
     try:
-        if enable_chunking:
-            # Caso: cada texto -> varios chunks -> se promedian
-            # Recolectamos un array temporal de embeddings
-            for text in texts:
-                if len(text) <= chunk_size:
-                    # Directo, sin partición
-                    emb = model.encode([text], batch_size=batch_size)[0]
-                    final_embeddings.append(emb.tolist())
-                else:
-                    subtexts = chunk_text(text)
-                    sub_embs = model.encode(subtexts, batch_size=batch_size)
-                    # Hacemos un promedio de cada vector para obtener uno solo
-                    # (Podrías usar la lógica que prefieras: sum, average, weighted, etc.)
-                    sum_emb = sum(sub_embs)
-                    merged = (sum_emb / len(sub_embs)).tolist()
-                    final_embeddings.append(merged)
-        else:
-            # Caso normal: encode en lotes
-            # Sentence Transformers internamente maneja batching si se le pasa "batch_size"
-            embeddings = model.encode(texts, batch_size=batch_size)
-            # "embeddings" es una lista (ndarray) de vectores
-            final_embeddings = [emb.tolist() for emb in embeddings]
-
-        # Guardar en caché
-        set_cache(cache_key, final_embeddings)
+        # Caché por texto: la clave incluye el modelo, el backend (los vectores ONNX/int8 difieren
+        # ligeramente) y los parámetros de chunking que cambian el vector
+        chunking_id = f"chunk{chunk_size}{'w' if length_weighted else ''}" if enable_chunking else "nochunk"
+        model_id = model_name if backend == "torch" else f"{model_name}@{backend}"
+        final_embeddings = cached_embed(
+            list(texts), f"sentence_transformer:{model_id}:{chunking_id}", encode_missing,
+            near_duplicates=near_duplicates
+        )
         logger.info("Embeddings generados exitosamente con SentenceTransformer (caché actualizado).")
         return final_embeddings
 
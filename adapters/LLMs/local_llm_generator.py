@@ -1,7 +1,17 @@
+import contextlib
+import copy
 import os
 import logging
-from transformers import pipeline, Pipeline
-from typing import Optional
+import threading
+import transformers
+from packaging.version import Version
+from transformers import pipeline, Pipeline, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+from typing import Any, Generator, List, Optional
+
+import torch
+
+from utils.dynamic_batcher import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_DELAY, DynamicBatcher
+from utils.prefix_cache import DEFAULT_MAX_ENTRIES, DEFAULT_MAX_TOKENS, PrefixCache
 
 # Se reutiliza el logger central definido en utils/logger.py
 logger = logging.getLogger("RAGLogger")
@@ -9,6 +19,30 @@ logger = logging.getLogger("RAGLogger")
 # Variable global para cachear el modelo local cargado
 _local_model: Optional[Pipeline] = None
 
+# Planificador de lotes: agrupa las peticiones concurrentes de generate() (ver _get_batcher)
+_batcher: Optional[DynamicBatcher] = None
+_batcher_lock = threading.Lock()
+
+# Uso exclusivo del modelo compartido: los lotes del planificador y las generaciones en streaming
+# (que corren en su propio hilo) nunca lo ejecutan a la vez ni ven el tokenizer en modo lote
+_model_lock = threading.Lock()
+
+# Caché de past key/values por prefijo de prompt (ver _generate_with_prefix_cache)
+_prefix_cache: Optional[PrefixCache] = None
+_prefix_cache_lock = threading.Lock()
+
+MAX_LENGTH = 50  # longitud máxima de la generación (ajustable según necesidades)
+DEFAULT_PREFIX_MIN_TOKENS = 16  # prefijos más cortos no compensan guardar su estado
+# Puntos de corte de los prefijos cacheables: RAGPipeline._build_prompt termina el andamiaje
+# ("Contexto:") y cada documento del contexto con un salto de línea
+PREFIX_BOUNDARY = "\n"
+# La continuación desde un prefijo cacheado necesita past_key_values como objeto Cache (DynamicCache,
+# con get_seq_length() y crop()) y que generate() recorte la entrada por cache_position. Con versiones
+# anteriores (p. ej. 4.30, con tuplas de tensores y solo el último token como entrada si hay caché)
+# se saltaría la parte no cacheada del prompt: la caché de prefijos queda desactivada.
+PREFIX_CACHE_MIN_TRANSFORMERS = "4.45.0"
+PREFIX_CACHE_SUPPORTED = Version(transformers.__version__) >= Version(PREFIX_CACHE_MIN_TRANSFORMERS)
+
 def load_local_model() -> Pipeline:
     """
     Carga el modelo local utilizando la variable de entorno 'LOCAL_LLM_MODEL_PATH'.
@@ -39,9 +73,150 @@ def load_local_model() -> Pipeline:
         logger.error(f"Error cargando el modelo local desde {model_path}: {e}")
         raise RuntimeError(f"Error cargando el modelo local: {e}")
 
+@contextlib.contextmanager
+def _batch_padding(model: Pipeline):
+    """
+    Prepara el tokenizer para un lote: los modelos causales suelen no tener token de padding (se usa el
+    de fin de secuencia) y deben rellenarse por la izquierda para que todos continúen tras su prompt.
+    Al salir se restaura la configuración original del tokenizer compartido.
+    """
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        yield
+        return
+    pad_token, padding_side = tokenizer.pad_token, tokenizer.padding_side
+    if pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+    try:
+        yield
+    finally:
+        if pad_token is None:
+            tokenizer.pad_token = None
+        tokenizer.padding_side = padding_side
+
+def _generate_batch(prompts: List[str]) -> List[Any]:
+    """
+    Ejecuta un lote de prompts en una sola llamada al pipeline (con padding) y retorna la salida de
+    cada prompt en el mismo orden. Un lote de un único prompt se ejecuta igual que sin planificador.
+    """
+    model = load_local_model()
+    with _model_lock:
+        if len(prompts) == 1:
+            # Con padding las posiciones de cada fila se desplazan y no se puede reutilizar un prefijo
+            # cacheado: la caché de prefijos solo se aplica a los lotes de un único prompt
+            prefix_cache = _get_prefix_cache()
+            if prefix_cache is not None and getattr(model, "model", None) is not None and getattr(model, "tokenizer", None) is not None:
+                return [_generate_with_prefix_cache(model, prompts[0], prefix_cache)]
+            return [model(prompts[0], max_length=MAX_LENGTH, do_sample=True)]
+        logger.info(f"Generando un lote de {len(prompts)} prompts.")
+        with _batch_padding(model):
+            return model(prompts, max_length=MAX_LENGTH, do_sample=True, batch_size=len(prompts))
+
+def _get_prefix_cache() -> Optional[PrefixCache]:
+    """
+    Retorna la caché de prefijos compartida, con LOCAL_LLM_PREFIX_CACHE_SIZE entradas (0 la desactiva)
+    y LOCAL_LLM_PREFIX_CACHE_TOKENS tokens cacheados como máximo. None si la versión de transformers
+    no admite continuar desde un prefijo cacheado (ver PREFIX_CACHE_MIN_TRANSFORMERS).
+    """
+    global _prefix_cache
+    with _prefix_cache_lock:
+        if _prefix_cache is None:
+            max_entries = int(os.getenv("LOCAL_LLM_PREFIX_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+            if max_entries < 1 or not PREFIX_CACHE_SUPPORTED:
+                return None
+            max_tokens = int(os.getenv("LOCAL_LLM_PREFIX_CACHE_TOKENS", DEFAULT_MAX_TOKENS))
+            _prefix_cache = PrefixCache(max_entries, max_tokens=max_tokens)
+        return _prefix_cache
+
+def _prefix_lengths(tokenizer, prompt: str, token_ids: List[int]) -> List[int]:
+    """
+    Longitudes en tokens de los prefijos del prompt que terminan en PREFIX_BOUNDARY. En los prompts
+    del pipeline son el andamiaje y el contexto tras cada documento, de modo que dos consultas que
+    recuperan los mismos primeros documentos comparten prefijo aunque difiera el resto del contexto.
+    Solo se usan los prefijos que se tokenizan igual por separado que dentro del prompt completo, y
+    que dejan al menos un token sin cachear.
+    """
+    min_tokens = int(os.getenv("LOCAL_LLM_PREFIX_MIN_TOKENS", DEFAULT_PREFIX_MIN_TOKENS))
+    lengths = []
+    end = prompt.find(PREFIX_BOUNDARY)
+    while end != -1:
+        prefix_ids = tokenizer(prompt[:end + 1])["input_ids"]
+        length = len(prefix_ids)
+        if min_tokens <= length < len(token_ids) and token_ids[:length] == prefix_ids:
+            lengths.append(length)
+        end = prompt.find(PREFIX_BOUNDARY, end + 1)
+    return sorted(set(lengths))
+
+def _generate_with_prefix_cache(model: Pipeline, prompt: str, prefix_cache: PrefixCache) -> List[dict]:
+    """
+    Genera como el pipeline, pero continuando desde los past key/values cacheados del prefijo más
+    largo del prompt. En un fallo se calcula el estado del prefijo más largo (el mismo prefill que
+    haría generate) y se registra bajo cada uno de sus prefijos, de modo que otro prompt con el
+    mismo andamiaje y los mismos primeros documentos también lo aprovecha.
+
+    Returns:
+        list[dict]: [{"generated_text": prompt + continuación}], el formato del pipeline.
+    """
+    tokenizer, lm = model.tokenizer, model.model
+    token_ids = tokenizer(prompt)["input_ids"]
+    input_ids = torch.tensor([token_ids], device=lm.device)
+    # Al menos el último token del prompt debe procesarse para obtener los logits del siguiente
+    length, past = prefix_cache.lookup(token_ids, max_length=len(token_ids) - 1)
+    if past is None:
+        lengths = _prefix_lengths(tokenizer, prompt, token_ids)
+        if lengths:
+            length = lengths[-1]
+            with torch.no_grad():
+                past = lm(input_ids[:, :length], use_cache=True).past_key_values
+            if not (hasattr(past, "get_seq_length") and hasattr(past, "crop")):
+                # Formato heredado (tupla de tuplas): no se puede recortar ni continuar desde él
+                logger.warning("El modelo no expone una caché recortable; se genera sin caché de prefijos.")
+                return model(prompt, max_length=MAX_LENGTH, do_sample=True)
+            for prefix_length in lengths:
+                prefix_cache.put(token_ids[:prefix_length], past, tokens=length)
+    kwargs = {}
+    if past is not None:
+        logger.info(f"Reutilizando el estado cacheado de {length} de {len(token_ids)} tokens del prompt.")
+        # generate() extiende la caché: se trabaja sobre una copia recortada al prefijo
+        past = copy.deepcopy(past)
+        if past.get_seq_length() > length:
+            past.crop(length - past.get_seq_length())  # longitud negativa: tokens a descartar del final
+        kwargs["past_key_values"] = past
+    output = lm.generate(
+        input_ids=input_ids,
+        attention_mask=torch.ones_like(input_ids),
+        max_length=MAX_LENGTH,
+        do_sample=True,
+        pad_token_id=tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id,
+        **kwargs
+    )
+    continuation = tokenizer.decode(output[0, len(token_ids):], skip_special_tokens=True)
+    return [{"generated_text": prompt + continuation}]
+
+def _get_batcher() -> DynamicBatcher:
+    """
+    Retorna el planificador de lotes compartido. El tamaño de lote y la espera máxima para completarlo
+    se configuran con LOCAL_LLM_MAX_BATCH_SIZE y LOCAL_LLM_BATCH_DELAY_MS.
+    """
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = DynamicBatcher(
+                _generate_batch,
+                max_batch_size=int(os.getenv("LOCAL_LLM_MAX_BATCH_SIZE", DEFAULT_MAX_BATCH_SIZE)),
+                max_delay=float(os.getenv("LOCAL_LLM_BATCH_DELAY_MS", DEFAULT_MAX_DELAY * 1000)) / 1000,
+                name="local-llm-batcher"
+            )
+        return _batcher
+
 def generate(prompt: str) -> str:
     """
     Genera una respuesta a partir del prompt utilizando el modelo local.
+
+    Las llamadas concurrentes no se serializan ni comparten el modelo a la vez: el planificador de
+    lotes (utils/dynamic_batcher.py) las agrupa en lotes con padding, los ejecuta en un único hilo y
+    entrega a cada llamador su propia respuesta.
     
     Args:
         prompt (str): El prompt de entrada.
@@ -53,10 +228,8 @@ def generate(prompt: str) -> str:
         RuntimeError: Si ocurre algún error durante la generación.
     """
     try:
-        model = load_local_model()
         logger.info(f"Generando respuesta para el prompt: {prompt}")
-        # Se define un max_length de 50 tokens (ajustable según necesidades)
-        result = model(prompt, max_length=50, do_sample=True)
+        result = _get_batcher()(prompt)
         if isinstance(result, list) and result:
             text = result[0].get("generated_text", "")
             logger.info("Respuesta generada exitosamente.")
@@ -67,3 +240,84 @@ def generate(prompt: str) -> str:
     except Exception as e:
         logger.error(f"Error en la generación local: {e}")
         raise RuntimeError(f"Error en la generación local: {e}")
+
+
+class _CancelCriteria(StoppingCriteria):
+    """
+    Criterio de parada que corta la generación en cuanto se activa alguno de los eventos.
+    """
+
+    def __init__(self, *events: Optional[threading.Event]):
+        self.events = [event for event in events if event is not None]
+
+    def __call__(self, input_ids, scores=None, **kwargs):
+        stop = any(event.is_set() for event in self.events)
+        return torch.full((input_ids.shape[0],), stop, dtype=torch.bool, device=input_ids.device)
+
+
+def generate_stream(
+    prompt: str,
+    max_new_tokens: int = 50,
+    cancel_event: Optional[threading.Event] = None
+) -> Generator[str, None, None]:
+    """
+    Genera la respuesta de forma incremental: el pipeline corre en un hilo de fondo y un
+    TextIteratorStreamer entrega los fragmentos de texto a medida que se decodifican. El hilo toma el
+    lock del modelo compartido, así que espera a que termine el lote en curso del planificador (y los
+    lotes siguientes esperan a que termine o se cancele el streaming).
+
+    La generación se detiene (en el siguiente token) si se activa cancel_event, p. ej. cuando el cliente
+    se desconecta, o si el consumidor deja de iterar (close() / GeneratorExit).
+
+    Args:
+        prompt (str): El prompt de entrada.
+        max_new_tokens (int): Número máximo de tokens nuevos.
+        cancel_event (threading.Event, opcional): Evento de cancelación externo.
+
+    Yields:
+        str: Fragmentos de la respuesta (sin el prompt).
+
+    Raises:
+        RuntimeError: Si ocurre algún error durante la generación.
+    """
+    try:
+        model = load_local_model()
+        streamer = TextIteratorStreamer(model.tokenizer, skip_prompt=True, skip_special_tokens=True)
+    except Exception as e:
+        logger.error(f"Error en la generación local: {e}")
+        raise RuntimeError(f"Error en la generación local: {e}")
+
+    stop_event = threading.Event()
+    errors = []
+
+    def _run():
+        try:
+            with _model_lock:
+                model(
+                    prompt,
+                    max_new_tokens=max_new_tokens,
+                    do_sample=True,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([_CancelCriteria(stop_event, cancel_event)])
+                )
+        except Exception as e:
+            errors.append(e)
+            # Desbloquea al consumidor si la generación falla antes de terminar
+            streamer.end()
+
+    logger.info(f"Generando respuesta en streaming para el prompt: {prompt}")
+    worker = threading.Thread(target=_run, name="local-llm-stream", daemon=True)
+    worker.start()
+    try:
+        for text in streamer:
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info("Generación local cancelada por el cliente.")
+                break
+            if text:
+                yield text
+    finally:
+        # Si el consumidor abandona (break, close() o desconexión), el criterio corta la generación
+        stop_event.set()
+    if errors:
+        logger.error(f"Error en la generación local: {errors[0]}")
+        raise RuntimeError(f"Error en la generación local: {errors[0]}")
@@ -11,14 +11,23 @@ Características:
 - Implementación de reintentos con backoff exponencial en caso de errores transitorios.
 - Manejo robusto de excepciones específicas (RateLimitError, APIError, etc.) de la librería openai.
 - Registro detallado de cada paso para facilitar la trazabilidad y el monitoreo.
+- API key por llamada (api_key=...), sin modificar el estado global openai.api_key.
+- Versión asíncrona (agenerate) sobre el cliente compartido de utils/openai_client.py: pool de
+  conexiones keep-alive, límite de peticiones en vuelo y backoff no bloqueante.
+- Generación en streaming (generate_stream) con los deltas de `stream=True` y cancelación cuando el
+  cliente se desconecta.
 """
 
 import os
 import time
 import logging
+import threading
+from typing import Generator, Optional
 import openai
 from openai.error import RateLimitError, APIError, Timeout, ServiceUnavailableError
 
+from utils.openai_client import AsyncOpenAIClient, get_async_client
+
 logger = logging.getLogger("RAGLogger")
 logger.setLevel(logging.DEBUG)
 
@@ -54,10 +63,9 @@ def generate(
         logger.error("OPENAI_API_KEY no está configurada.")
         raise RuntimeError("OPENAI_API_KEY no está configurada.")
 
-    openai.api_key = openai_api_key
-
     # Configuración de la solicitud
     request_payload = {
+        "api_key": openai_api_key,  # por llamada, sin tocar el estado global openai.api_key
         "model": model,
         "messages": [{"role": "user", "content": prompt}],
         "temperature": temperature,
@@ -94,3 +102,150 @@ def generate(
 
     logger.error("Se agotaron los reintentos para generar la respuesta.")
     raise RuntimeError("No se pudo generar la respuesta después de múltiples intentos.")
+
+
+async def agenerate(
+    prompt: str,
+    model: str = "gpt-3.5-turbo",
+    temperature: float = 0.7,
+    max_tokens: int = 150,
+    retries: int = 3,
+    backoff_factor: float = 2.0,
+    client: Optional[AsyncOpenAIClient] = None,
+    **kwargs
+) -> str:
+    """
+    Versión asíncrona de generate(): la llamada espera sin bloquear el event loop, comparte el pool de
+    conexiones y respeta el límite de peticiones en vuelo del endpoint "chat" (ver utils/openai_client.py).
+
+    Args:
+        prompt, model, temperature, max_tokens, retries, backoff_factor, kwargs: Igual que en generate().
+        client (AsyncOpenAIClient, opcional): Cliente a usar; por defecto, el compartido.
+
+    Returns:
+        str: La respuesta generada.
+
+    Raises:
+        RuntimeError: Si la API Key no está configurada o si ocurren errores críticos en la generación.
+    """
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        logger.error("OPENAI_API_KEY no está configurada.")
+        raise RuntimeError("OPENAI_API_KEY no está configurada.")
+
+    client = client or get_async_client()
+    try:
+        logger.info("Enviando prompt a OpenAI (asíncrono)")
+        response = await client.chat_completion(
+            retries=retries,
+            backoff_factor=backoff_factor,
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **kwargs
+        )
+    except (RateLimitError, Timeout, ServiceUnavailableError) as transient_error:
+        logger.error("Se agotaron los reintentos para generar la respuesta.")
+        raise RuntimeError("No se pudo generar la respuesta después de múltiples intentos.") from transient_error
+    except APIError as api_error:
+        logger.error(f"APIError: {api_error}")
+        raise RuntimeError(f"Error en la API de OpenAI: {api_error}") from api_error
+    except Exception as e:
+        logger.error(f"Error inesperado al generar respuesta: {e}")
+        raise RuntimeError(f"Error inesperado al generar respuesta: {e}") from e
+    if response and response.choices and len(response.choices) > 0:
+        generated_text = response.choices[0].message.get("content", "").strip()
+        logger.info("Respuesta generada exitosamente.")
+        return generated_text
+    logger.error("Respuesta inesperada: estructura de respuesta no válida.")
+    raise RuntimeError("Respuesta inesperada de OpenAI.")
+
+def generate_stream(
+    prompt: str,
+    model: str = "gpt-3.5-turbo",
+    temperature: float = 0.7,
+    max_tokens: int = 150,
+    retries: int = 3,
+    backoff_factor: float = 2.0,
+    cancel_event: Optional[threading.Event] = None,
+    **kwargs
+) -> Generator[str, None, None]:
+    """
+    Genera la respuesta de forma incremental con `stream=True`, produciendo cada delta de contenido
+    en cuanto llega.
+
+    Los errores transitorios se reintentan con backoff solo antes del primer fragmento; una vez emitido
+    texto, reintentar duplicaría la respuesta y el error se propaga. Si se activa cancel_event (p. ej.
+    el cliente se desconecta) o el consumidor deja de iterar, se cierra la respuesta HTTP para que
+    OpenAI deje de generar tokens que nadie va a leer.
+
+    Args:
+        prompt (str): El prompt de entrada.
+        model, temperature, max_tokens, retries, backoff_factor: Igual que en generate().
+        cancel_event (threading.Event, opcional): Evento de cancelación externo.
+        kwargs: Parámetros adicionales que se pasan a la API de OpenAI.
+
+    Yields:
+        str: Fragmentos de la respuesta.
+
+    Raises:
+        RuntimeError: Si la API Key no está configurada o si ocurren errores críticos en la generación.
+    """
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        logger.error("OPENAI_API_KEY no está configurada.")
+        raise RuntimeError("OPENAI_API_KEY no está configurada.")
+
+    request_payload = {
+        "api_key": openai_api_key,  # por llamada, sin tocar el estado global openai.api_key
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        **kwargs,
+        "stream": True
+    }
+
+    attempt = 0
+    delay = 1  # segundos iniciales
+    emitted = False
+    while attempt <= retries:
+        response = None
+        try:
+            logger.info(f"Enviando prompt a OpenAI en streaming (intento {attempt + 1}/{retries + 1})")
+            response = openai.ChatCompletion.create(**request_payload)
+            for chunk in response:
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.info("Generación en streaming cancelada por el cliente.")
+                    return
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.get("content")
+                if content:
+                    emitted = True
+                    yield content
+            logger.info("Respuesta en streaming completada.")
+            return
+        except (RateLimitError, Timeout, ServiceUnavailableError) as transient_error:
+            if emitted:
+                logger.error(f"Error transitorio a mitad del streaming: {transient_error}")
+                raise RuntimeError(f"Streaming interrumpido por OpenAI: {transient_error}") from transient_error
+            logger.warning(f"Error transitorio al generar respuesta: {transient_error}. Reintentando en {delay} segundos...")
+            time.sleep(delay)
+            attempt += 1
+            delay *= backoff_factor
+        except APIError as api_error:
+            logger.error(f"APIError: {api_error}")
+            raise RuntimeError(f"Error en la API de OpenAI: {api_error}") from api_error
+        except Exception as e:
+            logger.error(f"Error inesperado al generar respuesta: {e}")
+            raise RuntimeError(f"Error inesperado al generar respuesta: {e}") from e
+        finally:
+            # Cierra la conexión en cancelaciones, errores y cuando el consumidor abandona (GeneratorExit)
+            close = getattr(response, "close", None)
+            if callable(close):
+                close()
+
+    logger.error("Se agotaron los reintentos para generar la respuesta.")
+    raise RuntimeError("No se pudo generar la respuesta después de múltiples intentos.")
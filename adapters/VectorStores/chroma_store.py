@@ -7,6 +7,10 @@ Implementación “ultra-extendida” con características de:
   - Configuración flexible (persistencia vs modo en memoria).
   - Manejo de excepciones avanzado y logging detallado.
   - Integración con los metadatos y la estructura del pipeline RAG.
+  - Reindexación blue/green (reindex()): se construye una colección sombra en segundo plano mientras
+    las consultas se sirven desde la colección activa, y se intercambian de forma atómica al terminar.
+  - Cada colección registra en sus metadatos el embedder y la dimensión de sus vectores; abrirla con
+    otro embedder u otra dimensión se rechaza.
 
 Requisitos:
   1. pip install chromadb
@@ -19,8 +23,14 @@ import os
 import threading
 from typing import List, Dict, Any, Optional
 
+import numpy as np
+
 from core.service_detector import check_service_availability
 from utils.logger import logger
+from utils.metadata_index import to_chroma_where
+from scalability.reindexer import DEFAULT_REINDEX_BATCH_SIZE, ReindexJob, ReindexState
+
+COLLECTION_DESCRIPTION = "Colección RAG principal con embeddings y documentos."
 
 try:
     import chromadb
@@ -37,7 +47,8 @@ class ChromaStore:
         collection_name: str = "rag_collection",
         embed_dim: int = 768,
         persist_directory: Optional[str] = None,
-        client_settings: Optional[Settings] = None
+        client_settings: Optional[Settings] = None,
+        embedder: Optional[str] = None
     ):
         """
         Inicializa un adaptador ChromaDB. Puede trabajar en modo memoria o persistente.
@@ -48,8 +59,12 @@ class ChromaStore:
             persist_directory (str, opcional): Carpeta donde ChromaDB persistirá la colección.
                                                Si es None, se usará un modo en memoria efímero.
             client_settings (Settings, opcional): Configuración avanzada para el cliente de Chroma.
+            embedder (str, opcional): Embedder con el que se vectoriza la colección. Si la colección ya
+                                      tiene uno registrado, se usa ese; si es None, RAGPipeline registra
+                                      el suyo en la primera ingesta.
         Raises:
-            RuntimeError: Si el servicio 'chroma_store' no está disponible según service_detector.
+            RuntimeError: Si el servicio 'chroma_store' no está disponible según service_detector, o si
+                          la colección existente se indexó con otro embedder u otra dimensión.
         """
         if not check_service_availability("chroma_store"):
             msg = "Servicio 'chroma_store' no disponible. Revisa service_detector."
@@ -58,7 +73,11 @@ class ChromaStore:
 
         self.collection_name = collection_name
         self.embed_dim = embed_dim
+        self._embedder = None
+        # Reducción de dimensionalidad de los vectores indexados (la registra RAGPipeline)
+        self.reducer = None
         self.lock = threading.Lock()
+        self._reindex_job = ReindexJob(f"chroma_store:{collection_name}")
 
         if not client_settings:
             # Definir configuración por defecto
@@ -74,22 +93,56 @@ class ChromaStore:
             logger.info(f"Iniciando ChromaStore con collection='{collection_name}', "
                         f"persist_dir='{persist_directory or 'mem'}', dim={embed_dim}")
             self.chroma_client = Client(settings=client_settings)
-            self.collection = self.chroma_client.get_or_create_collection(
-                name=collection_name,
-                metadata={"description": "Colección RAG principal con embeddings y documentos."}
-            )
+            self.collection = self._open_collection(collection_name, embedder)
             logger.info("ChromaStore inicializado correctamente.")
         except Exception as e:
             logger.error(f"Error al inicializar ChromaStore: {e}")
             raise RuntimeError(f"Error al inicializar ChromaStore: {e}") from e
 
+    def _open_collection(self, name: str, embedder: Optional[str]):
+        """
+        Abre (o crea) la colección conservando el embedder y la dimensión registrados en sus metadatos.
+        """
+        try:
+            existing = dict(self.chroma_client.get_collection(name=name).metadata or {})
+        except Exception:
+            existing = {}  # La colección aún no existe
+        recorded = existing.get("embedder")
+        if recorded and embedder and recorded != embedder:
+            raise RuntimeError(f"La colección '{name}' se indexó con el embedder '{recorded}', no con '{embedder}'.")
+        if "embed_dim" in existing and int(existing["embed_dim"]) != self.embed_dim:
+            raise RuntimeError(
+                f"La colección '{name}' tiene dimensión {existing['embed_dim']}, no {self.embed_dim}."
+            )
+        self._embedder = recorded or embedder
+        metadata = {"description": COLLECTION_DESCRIPTION, **existing, "embed_dim": self.embed_dim}
+        if self._embedder:
+            metadata["embedder"] = self._embedder
+        # get_or_create_collection sobrescribe los metadatos: se pasan los existentes completos
+        return self.chroma_client.get_or_create_collection(name=name, metadata=metadata)
+
+    @property
+    def embedder(self) -> Optional[str]:
+        """
+        Embedder registrado para la colección (None si aún no tiene vectores asociados a ninguno).
+        """
+        return self._embedder
+
+    @embedder.setter
+    def embedder(self, value: str) -> None:
+        with self.lock:
+            metadata = dict(self.collection.metadata or {})
+            metadata.update({"embedder": value, "embed_dim": self.embed_dim})
+            self.collection.modify(metadata=metadata)
+            self._embedder = value
+
     def add(self, document: Dict[str, Any], vector: List[float]):
         """
         Agrega (o actualiza) un documento y su vector al índice ChromaDB.
 
         Args:
             document (dict): Diccionario con al menos las claves "id", "texto", "metadata".
-            vector (list[float]): Vector de embeddings para este documento.
+            vector (list[float] | np.ndarray): Vector de embeddings para este documento.
 
         Raises:
             ValueError: Si el vector no coincide con la dimensión esperada.
@@ -113,7 +166,8 @@ class ChromaStore:
             try:
                 self.collection.add(
                     ids=[doc_id],
-                    embeddings=[vector],
+                    # El cliente de Chroma espera listas: la conversión se hace solo en este borde
+                    embeddings=[np.asarray(vector, dtype="float32").tolist()],
                     metadatas=[metadata],
                     documents=[texto]
                 )
@@ -137,13 +191,21 @@ class ChromaStore:
                 logger.error(f"Error al eliminar documento '{doc_id}': {e}")
                 raise RuntimeError(f"Error al eliminar documento '{doc_id}': {e}") from e
 
-    def search(self, query_vector: List[float], k: int = 5) -> List[Dict[str, Any]]:
+    def search(
+        self,
+        query_vector: List[float],
+        k: int = 5,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Realiza una búsqueda de los k documentos más cercanos a un vector de consulta.
 
         Args:
             query_vector (list[float]): Vector de embeddings para la consulta.
             k (int): Número de resultados a retornar.
+            filter (dict, opcional): Filtro de metadatos con la misma sintaxis que FaissStore
+                                     (ver utils/metadata_index.py). Se traduce a la cláusula
+                                     nativa `where` de ChromaDB.
 
         Returns:
             list[dict]: Lista de documentos, donde cada elemento incluye 'id', 'texto', 'metadata'
@@ -153,6 +215,59 @@ class ChromaStore:
             ValueError: Si la dimensión del vector de consulta no coincide con la esperada.
             RuntimeError: Si ocurre algún problema en la búsqueda.
         """
+        return self._query(query_vector, k, filter)[0]
+
+    def search_with_vectors(
+        self,
+        query_vector: List[float],
+        k: int = 5,
+        filter: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Igual que search(), pero solicita a ChromaDB también los embeddings de los resultados
+        (p. ej. para diversificar con MMR, ver utils/mmr.py).
+
+        Returns:
+            tuple[list[dict], np.ndarray]: (documentos, matriz (n, embed_dim) alineada con ellos).
+        """
+        docs, vectors, _ = self._query(query_vector, k, filter, with_vectors=True)
+        return docs, vectors
+
+    def range_search(
+        self,
+        query_vector: List[float],
+        threshold: Optional[float] = None,
+        k_max: Optional[int] = None,
+        filter: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Búsqueda por umbral: consulta los k_max vecinos con sus distancias y descarta los que superan
+        `threshold` (distancia de la colección; L2 al cuadrado por defecto en ChromaDB).
+
+        Returns:
+            tuple[list[dict], np.ndarray]: (documentos, distancias) alineados.
+
+        Raises:
+            ValueError: Si no hay ni umbral ni k_max, o la dimensión es incorrecta.
+        """
+        if threshold is None and k_max is None:
+            raise ValueError("range_search requiere un umbral (threshold) o un número máximo de resultados (k_max).")
+        n_results = k_max if k_max is not None else max(1, self.collection.count())
+        docs, _, distances = self._query(query_vector, n_results, filter, with_distances=True)
+        if threshold is not None:
+            keep = distances <= threshold
+            docs = [doc for doc, ok in zip(docs, keep) if ok]
+            distances = distances[keep]
+        return docs, distances
+
+    def _query(
+        self,
+        query_vector: List[float],
+        k: int,
+        filter: Optional[Dict[str, Any]],
+        with_vectors: bool = False,
+        with_distances: bool = False
+    ):
         if len(query_vector) != self.embed_dim:
             msg = f"Dimensión inválida para vector de consulta. Esperada={self.embed_dim}, actual={len(query_vector)}"
             logger.error(msg)
@@ -160,10 +275,21 @@ class ChromaStore:
 
         with self.lock:
             try:
-                results = self.collection.query(
-                    query_embeddings=[query_vector],
-                    n_results=k
-                )
+                query_kwargs = {
+                    "query_embeddings": [query_vector],
+                    "n_results": k
+                }
+                where = to_chroma_where(filter)
+                if where:
+                    query_kwargs["where"] = where
+                include = ["documents", "metadatas"]
+                if with_vectors:
+                    include.append("embeddings")
+                if with_distances:
+                    include.append("distances")
+                if len(include) > 2:
+                    query_kwargs["include"] = include
+                results = self.collection.query(**query_kwargs)
                 # ChromaDB retorna un dict con "ids", "metadatas", "documents", "embeddings" (opcional), etc.
                 # Estructura: {"ids": [["doc1", "doc2"]], "metadatas": [[{}, {}]], "documents": [["texto1", "texto2"]]}
                 found_docs = []
@@ -172,10 +298,8 @@ class ChromaStore:
                     ids_batch = results["ids"][0]
                     meta_batch = results["metadatas"][0] if results.get("metadatas") else [{} for _ in ids_batch]
                     text_batch = results["documents"][0] if results.get("documents") else ["" for _ in ids_batch]
-                    # Chroma 0.3.21 no retorna distancias por defecto, a menos que se activen
-                    #   "include=["embeddings", "distances"]" en query(). Si se desea, se podría habilitar.
-                    # Ejemplo:
-                    # distances = results["distances"][0] if "distances" in results else None
+                    # Chroma no retorna distancias ni embeddings por defecto: se solicitan con
+                    #   "include" cuando with_distances / with_vectors están activos (ver range_search()).
 
                     for idx, doc_id in enumerate(ids_batch):
                         doc_obj = {
@@ -186,7 +310,16 @@ class ChromaStore:
                         found_docs.append(doc_obj)
 
                 logger.info(f"Búsqueda con ChromaDB completada. Encontrados {len(found_docs)} documentos.")
-                return found_docs
+                vectors, distances = None, None
+                if with_vectors:
+                    embeddings = results.get("embeddings") if results else None
+                    batch = embeddings[0] if embeddings is not None and len(embeddings) else []
+                    vectors = np.asarray(batch, dtype="float32").reshape(-1, self.embed_dim)
+                if with_distances:
+                    raw = results.get("distances") if results else None
+                    batch = raw[0] if raw is not None and len(raw) else []
+                    distances = np.asarray(batch, dtype="float32")
+                return found_docs, vectors, distances
 
             except Exception as e:
                 logger.error(f"Error en la búsqueda ChromaDB: {e}")
@@ -195,7 +328,8 @@ class ChromaStore:
     def reindex_collection(self):
         """
         Método opcional avanzado que puede recrear la colección, por si la necesitamos “reindexar”.
-        ¡Tener cuidado con esta operación destructiva!
+        ¡Tener cuidado con esta operación destructiva! Para reindexar sin tiempo de inactividad,
+        usar reindex().
         """
         with self.lock:
             try:
@@ -203,13 +337,133 @@ class ChromaStore:
                 self.chroma_client.delete_collection(name=self.collection_name)
                 self.collection = self.chroma_client.create_collection(
                     name=self.collection_name,
-                    metadata={"reindex": "true"}
+                    metadata={"reindex": "true", "embed_dim": self.embed_dim}
                 )
+                # La colección recreada está vacía: la próxima ingesta registra su embedder
+                self._embedder = None
                 logger.warning(f"Colección '{self.collection_name}' ha sido recreada (reindex).")
             except Exception as e:
                 logger.error(f"Error al reindexar la colección '{self.collection_name}': {e}")
                 raise RuntimeError(f"Error en reindex_collection: {e}")
 
+    def reindex(
+        self,
+        embed_fn=None,
+        batch_size: int = DEFAULT_REINDEX_BATCH_SIZE,
+        background: bool = True,
+        embedder: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Reindexación blue/green: copia (o re-vectoriza) la colección activa en una colección sombra
+        en segundo plano y, al terminar, la publica de forma atómica. Las consultas nunca ven la
+        colección vacía.
+
+        Args:
+            embed_fn (Callable, opcional): Función embed(texts) para re-vectorizar los documentos
+                                           (cambio de modelo). Si es None, se copian los embeddings actuales.
+            batch_size (int): Documentos copiados por página.
+            background (bool): Si True, la construcción corre en un hilo en segundo plano.
+            embedder (str, opcional): Embedder de embed_fn; se registra en la nueva generación.
+
+        Returns:
+            dict: Estado de la reindexación (ver reindex_status()).
+
+        Raises:
+            RuntimeError: Si ya hay una reindexación en curso.
+        """
+        return self._reindex_job.start(
+            lambda report: self._build_generation(embed_fn, batch_size, report, embedder),
+            background=background
+        )
+
+    def reindex_status(self) -> Dict[str, Any]:
+        """
+        Progreso de la última reindexación (estado, procesados/total, porcentaje, error).
+        """
+        return self._reindex_job.status()
+
+    def _copy_page(self, target, page: Dict[str, Any], embed_fn, dim: Optional[int]) -> Optional[int]:
+        """
+        Copia una página en target (re-vectorizándola con embed_fn si se indica) y retorna la dimensión
+        de sus vectores. Todas las páginas de una generación deben tener la misma dimensión (dim).
+        """
+        ids = page["ids"]
+        if not ids:
+            return dim
+        documents = page.get("documents") or ["" for _ in ids]
+        metadatas = page.get("metadatas") or [{} for _ in ids]
+        embeddings = embed_fn(documents) if embed_fn is not None else page["embeddings"]
+        if hasattr(embeddings, "tolist"):
+            embeddings = embeddings.tolist()
+        embeddings = [list(e) for e in embeddings]
+        page_dim = len(embeddings[0])
+        if dim is not None and page_dim != dim:
+            raise ValueError(f"Dimensión inconsistente en la nueva generación: {page_dim}, se esperaba {dim}.")
+        target.add(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+        return page_dim
+
+    def _build_generation(self, embed_fn, batch_size: int, report, embedder: Optional[str] = None) -> None:
+        source = self.collection
+        generation = self._reindex_job.status()["generation"]
+        shadow_name = f"{self.collection_name}__gen{generation}"
+        embedder = embedder or self._embedder
+        metadata = {"description": COLLECTION_DESCRIPTION, "generation": generation, "embed_dim": self.embed_dim}
+        if embedder:
+            metadata["embedder"] = embedder
+        shadow = self.chroma_client.get_or_create_collection(name=shadow_name, metadata=metadata)
+        include = ["embeddings", "metadatas", "documents"]
+        total = source.count()
+        copied = set()
+        offset = 0
+        # Sin re-vectorizar se conserva la dimensión; con embed_fn la fija la primera página
+        dim = self.embed_dim if embed_fn is None else None
+        try:
+            while True:
+                page = source.get(limit=batch_size, offset=offset, include=include)
+                if not page or not page["ids"]:
+                    break
+                dim = self._copy_page(shadow, page, embed_fn, dim)
+                copied.update(page["ids"])
+                offset += len(page["ids"])
+                report(offset, max(total, offset))
+
+            # Catch-up e intercambio con los escritores bloqueados
+            with self.lock:
+                current_ids = set(source.get(include=[])["ids"])
+                missing = list(current_ids - copied)
+                if missing:
+                    dim = self._copy_page(shadow, source.get(ids=missing, include=include), embed_fn, dim)
+                dim = dim if dim is not None else self.embed_dim
+                removed = list(copied - current_ids)
+                if removed:
+                    shadow.delete(ids=removed)
+                report(len(current_ids), len(current_ids), state=ReindexState.SWAPPING)
+                # La colección activa solo se elimina cuando la sombra ya ocupa el nombre lógico
+                # (el que encuentra un reinicio); si el renombrado falla, se restaura la original.
+                source_name = source.name
+                retired_name = f"{self.collection_name}__retired{generation}"
+                source.modify(name=retired_name)
+                try:
+                    shadow.modify(name=self.collection_name, metadata={**metadata, "embed_dim": dim})
+                except Exception:
+                    source.modify(name=source_name)
+                    raise
+                self.collection = shadow
+                self.embed_dim = dim
+                self._embedder = embedder
+                try:
+                    self.chroma_client.delete_collection(name=retired_name)
+                except Exception as e:
+                    logger.warning(f"No se pudo eliminar la generación anterior '{retired_name}': {e}")
+            logger.info(f"Nueva generación de '{self.collection_name}' publicada ({len(current_ids)} documentos).")
+        except Exception:
+            if self.collection is not shadow:
+                try:
+                    self.chroma_client.delete_collection(name=shadow_name)
+                except Exception:
+                    pass
+            raise
+
     def list_documents(self) -> List[str]:
         """
         Retorna la lista de IDs disponibles en la colección.
@@ -2,7 +2,8 @@
 faiss_store.py – Adaptador FAISS para Búsqueda Vectorial
 
 Este módulo implementa la indexación y búsqueda de documentos utilizando FAISS.
-Utiliza un índice de tipo IndexFlatL2 (para búsqueda por distancia euclidiana) y 
+Utiliza por defecto un índice de tipo IndexFlatL2 (para búsqueda por distancia euclidiana), o
+cualquier otro descrito con una cadena de faiss.index_factory (p. ej. "IVF256,Flat", "HNSW32"), y
 mantiene un mapeo interno entre el ID de cada documento y su posición en el índice.
 
 Características:
@@ -10,25 +11,71 @@ Características:
 - Inserción de documentos junto con sus embeddings.
 - Búsqueda semántica para retornar los k documentos más cercanos a un vector de consulta.
 - Manejo de errores, logging y verificación de servicios mediante core/service_detector.py.
-- Soporte para operaciones concurrentes mediante locking.
+- Concurrencia lectores/escritores (utils/rwlock.py): las búsquedas comparten el lock de lectura y se
+  ejecutan en paralelo (FAISS libera el GIL durante search); la ingesta prepara vectores, payloads y
+  metadatos fuera de la sección exclusiva, que solo protege index.add. Cada escritura publica una
+  nueva generación.
+- Búsqueda filtrada por metadatos: un índice invertido (utils/metadata_index.py) resuelve el filtro
+  a un conjunto de posiciones candidatas ANTES de consultar FAISS. Según la selectividad del filtro
+  se elige entre fuerza bruta sobre el subconjunto o búsqueda con un IDSelector de FAISS.
+- Payloads fuera del índice: el texto y los metadatos se guardan en un docstore compacto
+  (utils/docstore.py); el índice solo conoce posiciones enteras y los documentos se cargan
+  de forma perezosa para el top-k final.
+- Reindexación blue/green (scalability/reindexer.py): reindex() construye una nueva generación del
+  índice en segundo plano (otro tipo de índice o re-embedding desde el docstore) mientras las
+  consultas se siguen sirviendo con la actual, y la intercambia de forma atómica al terminar.
+- Documentos multi-vector (utils/parent_aggregation.py): search_parents() agrega las puntuaciones
+  de los chunks por documento padre y retorna el padre o una ventana alrededor del mejor chunk.
 """
 
 import faiss
 import numpy as np
 import threading
 import logging
+from typing import Any, Dict, List, Optional
 from core.service_detector import check_service_availability
+from utils.docstore import DocStore, create_docstore
+from utils.metadata_index import MetadataIndex
+from utils.parent_aggregation import DEFAULT_PARENT_FETCH_FACTOR, collapse_to_parents, make_span_loader
+from utils.rwlock import ReadWriteLock
+from scalability.reindexer import DEFAULT_REINDEX_BATCH_SIZE, ReindexJob, ReindexState
 
 logger = logging.getLogger("RAGLogger")
 logger.setLevel(logging.DEBUG)
 
+# Umbrales para elegir la estrategia de búsqueda filtrada
+DEFAULT_BRUTE_FORCE_SELECTIVITY = 0.05   # fracción del índice por debajo de la cual se usa fuerza bruta
+DEFAULT_BRUTE_FORCE_MAX_CANDIDATES = 4096  # número de candidatos que siempre se resuelven por fuerza bruta
+
 class FaissStore:
-    def __init__(self, dim: int):
+    def __init__(
+        self,
+        dim: int,
+        brute_force_selectivity: float = DEFAULT_BRUTE_FORCE_SELECTIVITY,
+        brute_force_max_candidates: int = DEFAULT_BRUTE_FORCE_MAX_CANDIDATES,
+        docstore: Optional[DocStore] = None,
+        index_factory: Optional[str] = None,
+        embedder: Optional[str] = None
+    ):
         """
         Inicializa el adaptador FAISS.
         
         Args:
             dim (int): Dimensión de los vectores.
+            brute_force_selectivity (float): Si la fracción de documentos que cumplen un filtro es menor
+                                             o igual a este valor, la búsqueda filtrada se resuelve por
+                                             fuerza bruta sobre los candidatos.
+            brute_force_max_candidates (int): Número de candidatos por debajo del cual siempre se usa
+                                              fuerza bruta, independientemente de la selectividad.
+            docstore (DocStore, opcional): Almacén de payloads. Por defecto, un BlobDocStore temporal.
+            index_factory (str, opcional): Cadena de faiss.index_factory (p. ej. "IVF256,Flat", "HNSW32").
+                                           Si es None, se usa IndexFlatL2. Los índices que requieren
+                                           entrenamiento (IVF, PQ) se entrenan con train(muestra) o con
+                                           el primer lote agregado, si tiene al menos
+                                           min_training_points vectores.
+            embedder (str, opcional): Embedder con el que se vectoriza la colección (p. ej.
+                                      "sentence_transformer_embedder:all-MiniLM-L6-v2"). Si es None,
+                                      RAGPipeline registra el suyo en la primera ingesta.
         
         Raises:
             RuntimeError: Si la disponibilidad del servicio FAISS falla.
@@ -39,16 +86,95 @@ class FaissStore:
             raise RuntimeError("Servicio FAISS no disponible.")
         
         self.dim = dim
+        self.index_factory = index_factory
+        self.embedder = embedder
+        # Reducción de dimensionalidad de los vectores indexados (la registra RAGPipeline)
+        self.reducer = None
         try:
-            self.index = faiss.IndexFlatL2(dim)
-            logger.info(f"Índice FAISS inicializado con dimensión {dim}.")
+            self.index = self._create_index(dim, index_factory)
+            logger.info(f"Índice FAISS inicializado con dimensión {dim} ({index_factory or 'IndexFlatL2'}).")
         except Exception as e:
             logger.error(f"Error al inicializar el índice FAISS: {e}")
             raise RuntimeError(f"Error al inicializar el índice FAISS: {e}") from e
         
-        # Mapeo de posición de índice a documento (almacena el documento completo)
-        self.doc_mapping = {}
-        self.lock = threading.Lock()
+        # Mapeo de posición de índice a documento: los payloads viven fuera de la memoria de Python
+        self.doc_mapping = docstore if docstore is not None else create_docstore("blob")
+        # Índice invertido de metadatos para pre-filtrar las búsquedas
+        self.metadata_index = MetadataIndex()
+        self.brute_force_selectivity = brute_force_selectivity
+        self.brute_force_max_candidates = brute_force_max_candidates
+        # Lectores (búsquedas) en paralelo; escritores exclusivos solo durante index.add
+        self.lock = ReadWriteLock()
+        # Serializa a los escritores entre sí para que posiciones del docstore e índice coincidan
+        self._ingest_lock = threading.Lock()
+        self._reindex_job = ReindexJob("faiss_store")
+
+    @staticmethod
+    def _create_index(dim: int, index_factory: Optional[str] = None):
+        if not index_factory:
+            return faiss.IndexFlatL2(dim)
+        return faiss.index_factory(dim, index_factory)
+
+    @staticmethod
+    def _min_training_points(index) -> int:
+        """
+        Vectores mínimos para entrenar el índice: el k-means de FAISS exige al menos tantos puntos
+        como centroides (nlist de un IVF, ksub de un cuantizador PQ).
+        """
+        required = 1
+        try:
+            index = faiss.downcast_index(faiss.extract_index_ivf(index))
+            required = index.nlist
+        except RuntimeError:
+            index = faiss.downcast_index(index)
+        pq = getattr(index, "pq", None)
+        if pq is not None:
+            required = max(required, int(pq.ksub))
+        return required
+
+    @property
+    def min_training_points(self) -> int:
+        """
+        Vectores necesarios para entrenar el índice actual (1 si no requiere entrenamiento).
+        """
+        return 1 if self.index.is_trained else self._min_training_points(self.index)
+
+    def train(self, vectors) -> None:
+        """
+        Entrena un índice que lo requiere (IVF, PQ) con una muestra representativa, antes de agregar
+        documentos. Sin efecto si el índice ya está entrenado.
+
+        Args:
+            vectors: Matriz (n, dim) con n >= min_training_points.
+
+        Raises:
+            ValueError: Si la dimensión es incorrecta o la muestra es demasiado pequeña.
+        """
+        np_vectors = np.ascontiguousarray(np.asarray(vectors, dtype='float32'))
+        if np_vectors.ndim != 2 or np_vectors.shape[1] != self.dim:
+            raise ValueError("La dimensión del vector no coincide con la dimensión del índice.")
+        with self._ingest_lock:
+            if self.index.is_trained:
+                return
+            self._check_training_sample(len(np_vectors))
+            logger.info(f"Entrenando índice FAISS '{self.index_factory}' con {len(np_vectors)} vectores.")
+            self.index.train(np_vectors)
+
+    def _check_training_sample(self, n: int) -> None:
+        required = self._min_training_points(self.index)
+        if n < required:
+            raise ValueError(
+                f"El índice FAISS '{self.index_factory}' requiere entrenamiento con al menos {required} "
+                f"vectores y se recibieron {n}: llama a train(muestra) antes de agregar documentos o "
+                f"agrega un primer lote suficientemente grande."
+            )
+
+    @property
+    def generation(self) -> int:
+        """
+        Número de generaciones publicadas (se incrementa con cada escritura en el índice).
+        """
+        return self.lock.generation
     
     def add(self, document: dict, vector: list):
         """
@@ -64,49 +190,438 @@ class FaissStore:
         if len(vector) != self.dim:
             logger.error("La dimensión del vector no coincide con la dimensión del índice.")
             raise ValueError("La dimensión del vector no coincide con la dimensión del índice.")
-        
-        with self.lock:
-            # Convertir vector a numpy array float32
-            np_vector = np.array(vector, dtype='float32').reshape(1, self.dim)
+        pos = self.add_batch([document], [vector])[0]
+        logger.info(f"Documento '{document.get('id')}' agregado en la posición {pos}.")
+
+    def add_batch(self, documents: List[dict], vectors) -> List[int]:
+        """
+        Agrega varios documentos con una sola escritura en el índice, minimizando el tiempo
+        durante el cual las búsquedas quedan en espera.
+
+        Args:
+            documents (list[dict]): Documentos con al menos la clave "id".
+            vectors: Lista de vectores o matriz (n, dim).
+
+        Returns:
+            list[int]: Posiciones asignadas a cada documento.
+
+        Raises:
+            ValueError: Si el número de vectores no coincide o su dimensión es incorrecta, o si el índice
+                        no está entrenado y el lote es menor que min_training_points.
+            RuntimeError: Si ocurre un error al escribir en el índice.
+        """
+        # Preparación fuera de cualquier lock: conversión a float32 contigua
+        np_vectors = np.ascontiguousarray(np.asarray(vectors, dtype='float32'))
+        if np_vectors.ndim != 2 or np_vectors.shape[1] != self.dim:
+            logger.error("La dimensión del vector no coincide con la dimensión del índice.")
+            raise ValueError("La dimensión del vector no coincide con la dimensión del índice.")
+        if len(documents) != np_vectors.shape[0]:
+            raise ValueError("El número de documentos no coincide con el número de vectores.")
+        if not documents:
+            return []
+
+        with self._ingest_lock:
+            if not self.index.is_trained:
+                self._check_training_sample(len(np_vectors))
+            synced = False
             try:
-                self.index.add(np_vector)
-                pos = self.index.ntotal - 1
-                self.doc_mapping[pos] = document
-                logger.info(f"Documento '{document.get('id')}' agregado en la posición {pos}.")
+                start = self.index.ntotal
+                if len(self.doc_mapping) != start:
+                    raise RuntimeError(f"Docstore desincronizado: {len(self.doc_mapping)} payloads != {start} vectores.")
+                synced = True
+                # Payloads y metadatos se publican antes que los vectores: un lector solo puede
+                # llegar a una posición a través del índice, que aún no la contiene.
+                positions = [self.doc_mapping.append(doc) for doc in documents]
+                for pos, doc in zip(positions, documents):
+                    self.metadata_index.add(pos, doc.get("metadata"))
+                if not self.index.is_trained:
+                    # Entrenamiento fuera de la sección exclusiva: las búsquedas no esperan
+                    logger.info(f"Entrenando índice FAISS '{self.index_factory}' con {len(np_vectors)} vectores.")
+                    self.index.train(np_vectors)
+                with self.lock.write_lock():
+                    self.index.add(np_vectors)
+                return positions
             except Exception as e:
+                if synced:
+                    # Deshacer el lote: docstore y metadatos vuelven a estar alineados con el índice
+                    self.doc_mapping.truncate(start)
+                    self.metadata_index.truncate(start)
                 logger.error(f"Error al agregar el documento: {e}")
                 raise RuntimeError(f"Error al agregar el documento: {e}") from e
     
-    def search(self, query_vector: list, k: int):
+    def search(self, query_vector: list, k: int, filter: Optional[Dict[str, Any]] = None):
         """
         Realiza una búsqueda vectorial y retorna los k documentos más cercanos.
         
         Args:
             query_vector (list): Vector de consulta.
             k (int): Número de documentos a recuperar.
+            filter (dict, opcional): Filtro de metadatos (ver utils/metadata_index.py), p. ej.
+                                     {"tenant": "acme", "fecha": {"$gte": "2025-01-01"}}.
         
         Returns:
             list: Lista de documentos ordenados de mayor a menor similitud.
         
         Raises:
-            ValueError: Si el vector de consulta no tiene la dimensión correcta.
+            ValueError: Si el vector de consulta no tiene la dimensión correcta o el filtro es inválido.
         """
         if len(query_vector) != self.dim:
             logger.error("La dimensión del vector de consulta no coincide con la dimensión del índice.")
             raise ValueError("La dimensión del vector de consulta no coincide con la dimensión del índice.")
         
         # Convertir vector de consulta a numpy array float32
-        np_query = np.array(query_vector, dtype='float32').reshape(1, self.dim)
+        np_query = np.asarray(query_vector, dtype='float32').reshape(1, self.dim)
         try:
-            distances, indices = self.index.search(np_query, k)
-            results = []
-            with self.lock:
-                for idx in indices[0]:
-                    doc = self.doc_mapping.get(idx)
-                    if doc:
-                        results.append(doc)
+            with self.lock.read_lock():
+                if filter:
+                    distances, indices = self._filtered_search(np_query, k, filter)
+                else:
+                    distances, indices = self.index.search(np_query, k)
+            # Carga perezosa de los payloads únicamente para el top-k final
+            results = self.doc_mapping.get_many(indices[0])
             logger.info(f"Búsqueda completada: {len(results)} documentos recuperados.")
             return results
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Error en la búsqueda vectorial: {e}")
+            raise RuntimeError(f"Error en la búsqueda vectorial: {e}") from e
+
+    def search_with_vectors(self, query_vector: list, k: int, filter: Optional[Dict[str, Any]] = None):
+        """
+        Igual que search(), pero retorna también los vectores de los documentos recuperados
+        (p. ej. para diversificar con MMR, ver utils/mmr.py).
+
+        Returns:
+            tuple[list, np.ndarray | None]: (documentos, matriz (n, dim) alineada con ellos). La matriz es
+                                            None si el tipo de índice no permite reconstruir vectores.
+
+        Raises:
+            ValueError: Si el vector de consulta no tiene la dimensión correcta o el filtro es inválido.
+        """
+        if len(query_vector) != self.dim:
+            logger.error("La dimensión del vector de consulta no coincide con la dimensión del índice.")
+            raise ValueError("La dimensión del vector de consulta no coincide con la dimensión del índice.")
+
+        np_query = np.asarray(query_vector, dtype='float32').reshape(1, self.dim)
+        try:
+            with self.lock.read_lock():
+                if filter:
+                    distances, indices = self._filtered_search(np_query, k, filter)
+                else:
+                    distances, indices = self.index.search(np_query, k)
+                positions = indices[0][indices[0] >= 0]
+                try:
+                    vectors = self.index.reconstruct_batch(positions) if len(positions) else np.empty((0, self.dim), dtype="float32")
+                except RuntimeError as e:
+                    logger.warning(f"El índice no permite reconstruir vectores ({e}); se retornan sin vectores.")
+                    vectors = None
+            results = self.doc_mapping.get_many(positions)
+            logger.info(f"Búsqueda completada: {len(results)} documentos recuperados (con vectores).")
+            return results, vectors
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Error en la búsqueda vectorial: {e}")
+            raise RuntimeError(f"Error en la búsqueda vectorial: {e}") from e
+
+    def range_search(
+        self,
+        query_vector: list,
+        threshold: Optional[float] = None,
+        k_max: Optional[int] = None,
+        filter: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Búsqueda por umbral de similitud: retorna todos los documentos cuya distancia L2 (al cuadrado,
+        como IndexFlatL2) sea <= threshold, ordenados de más a menos similar y limitados a k_max.
+
+        Args:
+            query_vector (list): Vector de consulta.
+            threshold (float, opcional): Distancia máxima. Si es None, no se aplica umbral (top-k_max).
+            k_max (int, opcional): Número máximo de resultados. Si es None, no hay límite.
+            filter (dict, opcional): Filtro de metadatos (ver utils/metadata_index.py).
+
+        Returns:
+            tuple[list, np.ndarray]: (documentos, distancias) alineados.
+
+        Raises:
+            ValueError: Si el vector de consulta no tiene la dimensión correcta o no hay ni umbral ni k_max.
+        """
+        if len(query_vector) != self.dim:
+            logger.error("La dimensión del vector de consulta no coincide con la dimensión del índice.")
+            raise ValueError("La dimensión del vector de consulta no coincide con la dimensión del índice.")
+        if threshold is None and k_max is None:
+            raise ValueError("range_search requiere un umbral (threshold) o un número máximo de resultados (k_max).")
+
+        np_query = np.asarray(query_vector, dtype='float32').reshape(1, self.dim)
+        try:
+            with self.lock.read_lock():
+                distances, positions = self._range_positions(np_query, threshold, k_max, filter)
+            results = self.doc_mapping.get_many(positions)
+            logger.info(f"Búsqueda por rango completada: {len(results)} documentos dentro del umbral {threshold}.")
+            return results, distances
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Error en la búsqueda vectorial: {e}")
+            raise RuntimeError(f"Error en la búsqueda vectorial: {e}") from e
+
+    def _range_positions(self, np_query: np.ndarray, threshold: Optional[float], k_max: Optional[int], filter):
+        """
+        Resuelve la búsqueda por rango (con el lock de lectura ya adquirido). Usa index.range_search cuando
+        hay umbral y no hay filtro; en otro caso (o si el índice no la soporta), top-k_max + corte.
+        """
+        ntotal = self.index.ntotal
+        if ntotal == 0:
+            return np.empty(0, dtype="float32"), np.empty(0, dtype="int64")
+        if threshold is not None and not filter:
+            try:
+                lims, distances, positions = self.index.range_search(np_query, float(threshold))
+                distances, positions = distances[lims[0]:lims[1]], positions[lims[0]:lims[1]]
+                order = np.argsort(distances, kind="stable")
+                if k_max is not None:
+                    order = order[:k_max]
+                return distances[order], positions[order]
+            except RuntimeError as e:
+                logger.debug(f"range_search no disponible para este índice ({e}); se usa top-k + umbral.")
+
+        k = min(k_max if k_max is not None else ntotal, ntotal)
+        if filter:
+            distances, positions = self._filtered_search(np_query, k, filter)
+        else:
+            distances, positions = self.index.search(np_query, k)
+        distances, positions = distances[0], positions[0]
+        keep = positions >= 0
+        if threshold is not None:
+            keep &= distances <= threshold
+        return distances[keep], positions[keep]
+
+    def search_parents(
+        self,
+        query_vector: list,
+        k: int,
+        aggregate: str = "max",
+        window: Optional[int] = 0,
+        fetch_factor: int = DEFAULT_PARENT_FETCH_FACTOR,
+        filter: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Búsqueda sobre documentos multi-vector: recupera k * fetch_factor chunks, agrega sus
+        puntuaciones por documento padre (metadata "parent_id") y retorna los k mejores padres.
+
+        Args:
+            query_vector (list): Vector de consulta.
+            k (int): Número de documentos padre a retornar.
+            aggregate (str): "max" o "sum" (ver utils/parent_aggregation.py).
+            window (int, opcional): 0 -> texto del mejor chunk; w -> ventana de ±w chunks a su alrededor;
+                                    None -> padre completo.
+            fetch_factor (int): Chunks recuperados por cada padre solicitado.
+            filter (dict, opcional): Filtro de metadatos aplicado a los chunks.
+
+        Returns:
+            list[dict]: Resultados por padre ("id", "texto", "metadata", "score", "matched_chunks", "best_chunk").
+
+        Raises:
+            ValueError: Si el vector de consulta no tiene la dimensión correcta o la agregación no es válida.
+        """
+        if len(query_vector) != self.dim:
+            logger.error("La dimensión del vector de consulta no coincide con la dimensión del índice.")
+            raise ValueError("La dimensión del vector de consulta no coincide con la dimensión del índice.")
+
+        np_query = np.asarray(query_vector, dtype='float32').reshape(1, self.dim)
+        try:
+            with self.lock.read_lock():
+                fetch = k * max(1, fetch_factor)
+                if filter:
+                    distances, indices = self._filtered_search(np_query, fetch, filter)
+                else:
+                    distances, indices = self.index.search(np_query, fetch)
+                ntotal = self.index.ntotal
+            valid = indices[0] >= 0
+            chunks = self.doc_mapping.get_many(indices[0][valid])
+            load_span = make_span_loader(self.doc_mapping, self.metadata_index, ntotal, window)
+            results = collapse_to_parents(chunks, distances[0][valid], k, aggregate, load_span=load_span)
+            logger.info(f"Búsqueda por padre completada: {len(results)} documentos de {len(chunks)} chunks.")
+            return results
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Error en la búsqueda vectorial: {e}")
             raise RuntimeError(f"Error en la búsqueda vectorial: {e}") from e
+
+    def _filtered_search(self, np_query: np.ndarray, k: int, filter: Dict[str, Any]):
+        """
+        Resuelve el filtro a posiciones candidatas y elige la estrategia de búsqueda según su selectividad
+        (se invoca con el lock de lectura ya adquirido):
+          - Fuerza bruta (distancias exactas sobre los vectores candidatos) si el subconjunto es pequeño.
+          - Búsqueda del índice con un IDSelector de FAISS en caso contrario.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (distancias, posiciones) con forma (1, <=k), como index.search().
+        """
+        ntotal = self.index.ntotal
+        candidates = self.metadata_index.candidate_ids(filter, ntotal)
+
+        n_candidates = len(candidates)
+        if n_candidates == 0 or k <= 0:
+            logger.info("Ningún documento cumple el filtro de metadatos.")
+            return np.empty((1, 0), dtype="float32"), np.empty((1, 0), dtype="int64")
+
+        selectivity = n_candidates / ntotal
+        if n_candidates <= max(k, self.brute_force_max_candidates) or selectivity <= self.brute_force_selectivity:
+            try:
+                logger.debug(f"Búsqueda filtrada por fuerza bruta ({n_candidates} candidatos, selectividad={selectivity:.4f}).")
+                return self._brute_force_search(np_query, k, candidates)
+            except RuntimeError as e:
+                # Índices sin reconstruct() (p. ej. IVF sin direct map): se recurre al IDSelector
+                logger.warning(f"Fuerza bruta no disponible para este índice ({e}); se usa IDSelector.")
+
+        logger.debug(f"Búsqueda filtrada con IDSelector ({n_candidates} candidatos, selectividad={selectivity:.4f}).")
+        selector = faiss.IDSelectorBatch(candidates)
+        params = faiss.SearchParameters(sel=selector)
+        distances, indices = self.index.search(np_query, min(k, n_candidates), params=params)
+        valid = indices[0] >= 0
+        return distances[:, valid], indices[:, valid]
+
+    def _brute_force_search(self, np_query: np.ndarray, k: int, candidates: np.ndarray):
+        """
+        Calcula distancias L2 exactas entre la consulta y los vectores candidatos y retorna los k mejores.
+        """
+        vectors = self.index.reconstruct_batch(candidates)
+        diffs = vectors - np_query
+        distances = np.einsum("ij,ij->i", diffs, diffs)
+        top = min(k, len(candidates))
+        if top < len(candidates):
+            part = np.argpartition(distances, top - 1)[:top]
+        else:
+            part = np.arange(len(candidates))
+        order = part[np.argsort(distances[part], kind="stable")]
+        return distances[order].reshape(1, -1), candidates[order].reshape(1, -1)
+
+    # ======================
+    # REINDEXACIÓN BLUE/GREEN
+    # ======================
+    def reindex(
+        self,
+        index_factory: Optional[str] = None,
+        embed_fn=None,
+        batch_size: int = DEFAULT_REINDEX_BATCH_SIZE,
+        background: bool = True,
+        embedder: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Construye una nueva generación del índice sin interrumpir las consultas y la publica de forma atómica.
+
+        Args:
+            index_factory (str, opcional): Tipo del nuevo índice. Si es None, se conserva el actual.
+            embed_fn (Callable, opcional): Función embed(texts) para re-vectorizar los textos del docstore
+                                           (p. ej. al cambiar de modelo). Si es None, se reutilizan los
+                                           vectores del índice actual mediante reconstruct_n().
+            batch_size (int): Documentos procesados por lote.
+            background (bool): Si True, la construcción corre en un hilo en segundo plano.
+            embedder (str, opcional): Embedder de embed_fn; se registra al publicar la nueva generación.
+
+        Returns:
+            dict: Estado de la reindexación (ver reindex_status()).
+
+        Raises:
+            RuntimeError: Si ya hay una reindexación en curso.
+        """
+        factory = index_factory if index_factory is not None else self.index_factory
+        return self._reindex_job.start(
+            lambda report: self._build_generation(factory, embed_fn, batch_size, report, embedder),
+            background=background
+        )
+
+    def reindex_status(self) -> Dict[str, Any]:
+        """
+        Progreso de la última reindexación (estado, procesados/total, porcentaje, error).
+        """
+        return self._reindex_job.status()
+
+    def _generation_vectors(self, start: int, end: int, embed_fn) -> np.ndarray:
+        """
+        Vectores de las posiciones [start, end) para la nueva generación.
+        """
+        if embed_fn is not None:
+            texts = [doc.get("texto", "") for doc in self.doc_mapping.get_many(range(start, end))]
+            return np.ascontiguousarray(np.asarray(embed_fn(texts), dtype="float32"))
+        with self.lock.read_lock():
+            return self.index.reconstruct_n(start, end - start)
+
+    def _build_generation(
+        self, index_factory: Optional[str], embed_fn, batch_size: int, report, embedder: Optional[str] = None
+    ) -> None:
+        """
+        Construye la nueva generación por lotes, incorpora lo ingerido durante la construcción e
+        intercambia el índice bajo el lock de escritura.
+        """
+        total = self.index.ntotal
+        new_index = None
+        processed = 0
+        pending: List[np.ndarray] = []
+
+        def feed(vectors: np.ndarray) -> None:
+            nonlocal new_index
+            if new_index is None:
+                new_index = self._create_index(vectors.shape[1], index_factory)
+            if not new_index.is_trained:
+                # Acumular hasta tener suficientes vectores para entrenar (o hasta el final)
+                pending.append(vectors)
+                if sum(len(v) for v in pending) < min(total, batch_size * 4):
+                    return
+                sample = np.concatenate(pending)
+                pending.clear()
+                new_index.train(sample)
+                new_index.add(sample)
+                return
+            new_index.add(vectors)
+
+        def flush_pending() -> None:
+            if pending:
+                sample = np.concatenate(pending)
+                pending.clear()
+                if not new_index.is_trained:
+                    required = self._min_training_points(new_index)
+                    if len(sample) < required:
+                        raise ValueError(
+                            f"El índice '{index_factory}' requiere al menos {required} vectores para "
+                            f"entrenarse y la colección tiene {len(sample)}."
+                        )
+                    new_index.train(sample)
+                new_index.add(sample)
+
+        for start in range(0, total, batch_size):
+            end = min(start + batch_size, total)
+            feed(self._generation_vectors(start, end, embed_fn))
+            processed = end
+            report(processed, total)
+        if new_index is not None:
+            flush_pending()
+
+        # Catch-up + intercambio: se bloquea a los escritores (no a los lectores) mientras se
+        # incorporan los documentos agregados durante la construcción.
+        with self._ingest_lock:
+            current_total = self.index.ntotal
+            if current_total > total:
+                delta = self._generation_vectors(total, current_total, embed_fn)
+                feed(delta)
+            if new_index is None:
+                new_index = self._create_index(self.dim, index_factory)
+            flush_pending()
+            report(current_total, current_total, state=ReindexState.SWAPPING)
+            with self.lock.write_lock():
+                self.index = new_index
+                self.dim = new_index.d
+                self.index_factory = index_factory
+                if embedder is not None:
+                    self.embedder = embedder
+        logger.info(f"Nueva generación FAISS publicada: {new_index.ntotal} vectores, dim={new_index.d}, "
+                    f"índice={index_factory or 'IndexFlatL2'}.")
+
+    def close(self):
+        """
+        Persiste y libera el docstore asociado.
+        """
+        self.doc_mapping.close()
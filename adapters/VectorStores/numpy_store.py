@@ -0,0 +1,675 @@
+"""
+numpy_store.py – Adaptador Vectorial en NumPy Puro sobre Matrices Memory-Mapped
+
+Vector store sin dependencias nativas (ni faiss ni chromadb): los vectores se guardan en una
+matriz `.npy` memory-mapped (float32 o float16) y la búsqueda es exacta, por bloques de
+productos matriciales + np.argpartition. Pensado para despliegues donde no se puede instalar
+FAISS/Chroma, corpus de hasta unos pocos millones de vectores y como referencia exacta en benchmarks.
+
+Características:
+- Métricas "l2" (distancia euclídea al cuadrado, como IndexFlatL2) e "ip" (producto interno).
+- Append con crecimiento geométrico de la capacidad (copia amortizada O(1) por vector).
+- Lecturas sin lock: cada búsqueda toma una instantánea inmutable (matriz, normas, n) y los
+  escritores publican una nueva al terminar cada append.
+- Búsqueda filtrada por metadatos (utils/metadata_index.py) y payloads en docstore (utils/docstore.py).
+- snapshot(directorio) / NumpyStore.load(directorio) para persistir y reabrir el store.
+- Modo opcional de cuantización binaria en dos etapas (binary_quantization=True): cada vector se
+  guarda además como código de bits de signo (dim/8 bytes, 32× menos que float32) que se mantiene
+  en RAM; los candidatos se obtienen por distancia de Hamming (popcount vectorizado) y el top-N se
+  re-puntúa de forma exacta contra los vectores de precisión completa del fichero memory-mapped.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.service_detector import check_service_availability
+from utils.dim_reduction import DimensionReducer
+from utils.docstore import DocStore, create_docstore
+from utils.metadata_index import MetadataIndex
+from utils.parent_aggregation import DEFAULT_PARENT_FETCH_FACTOR, collapse_to_parents, make_span_loader
+
+logger = logging.getLogger("RAGLogger")
+logger.setLevel(logging.DEBUG)
+
+DEFAULT_BLOCK_SIZE = 65536       # filas por bloque de producto matricial
+DEFAULT_INITIAL_CAPACITY = 1024
+DEFAULT_RESCORE_FACTOR = 8       # candidatos binarios re-puntuados por cada resultado pedido
+SUPPORTED_DTYPES = ("float32", "float16")
+SUPPORTED_METRICS = ("l2", "ip")
+
+SNAPSHOT_VECTORS_FILE = "vectors.npy"
+SNAPSHOT_DOCS_FILE = "docs.bin"
+SNAPSHOT_META_FILE = "meta.json"
+SNAPSHOT_REDUCER_FILE = "reducer.npz"
+
+# Tabla de popcount por byte para NumPy < 2.0 (sin np.bitwise_count)
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype="uint8")
+
+
+def binary_codes(vectors: np.ndarray) -> np.ndarray:
+    """
+    Cuantiza vectores a códigos binarios de bits de signo (bit = 1 si la componente es > 0).
+
+    Args:
+        vectors (np.ndarray): Matriz (n, dim) o vector (dim,).
+
+    Returns:
+        np.ndarray: Códigos uint8 empaquetados, forma (n, ceil(dim / 8)) o (ceil(dim / 8),).
+    """
+    return np.packbits(np.asarray(vectors) > 0, axis=-1)
+
+
+def hamming_distances(codes: np.ndarray, query_code: np.ndarray) -> np.ndarray:
+    """
+    Distancias de Hamming entre cada fila de `codes` y `query_code` (XOR + popcount vectorizado).
+    """
+    xor = np.bitwise_xor(codes, query_code)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT_TABLE[xor].sum(axis=1, dtype=np.int32)
+
+
+class NumpyStore:
+    def __init__(
+        self,
+        dim: int,
+        path: Optional[str] = None,
+        dtype: str = "float32",
+        metric: str = "l2",
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        initial_capacity: int = DEFAULT_INITIAL_CAPACITY,
+        docstore: Optional[DocStore] = None,
+        binary_quantization: bool = False,
+        rescore_factor: int = DEFAULT_RESCORE_FACTOR,
+        embedder: Optional[str] = None
+    ):
+        """
+        Inicializa el adaptador NumPy.
+
+        Args:
+            dim (int): Dimensión de los vectores.
+            path (str, opcional): Fichero `.npy` donde se mapea la matriz de vectores.
+                                  Si es None, se usa un directorio temporal.
+            dtype (str): "float32" o "float16" (la mitad de memoria/disco; se calcula en float32).
+            metric (str): "l2" (menor es mejor) o "ip" (mayor es mejor).
+            block_size (int): Filas por bloque en la búsqueda exacta.
+            initial_capacity (int): Capacidad inicial de la matriz.
+            docstore (DocStore, opcional): Almacén de payloads. Por defecto, un BlobDocStore temporal.
+            binary_quantization (bool): Si True, la búsqueda se hace en dos etapas: escaneo de Hamming
+                                        sobre códigos de bits de signo y re-puntuación exacta del top-N.
+            rescore_factor (int): En modo binario, se re-puntúan k * rescore_factor candidatos.
+            embedder (str, opcional): Embedder con el que se vectoriza la colección; se guarda en los
+                                      snapshots. Si es None, RAGPipeline registra el suyo en la primera ingesta.
+
+        Raises:
+            RuntimeError: Si el servicio 'numpy_store' no está disponible.
+            ValueError: Si dtype, metric o rescore_factor no son válidos.
+        """
+        if not check_service_availability("numpy_store"):
+            logger.error("Servicio NumpyStore no disponible.")
+            raise RuntimeError("Servicio NumpyStore no disponible.")
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"dtype no soportado: '{dtype}'. Opciones: {SUPPORTED_DTYPES}")
+        if metric not in SUPPORTED_METRICS:
+            raise ValueError(f"Métrica no soportada: '{metric}'. Opciones: {SUPPORTED_METRICS}")
+        if rescore_factor < 1:
+            raise ValueError("rescore_factor debe ser >= 1.")
+
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.metric = metric
+        self.block_size = block_size
+        self.binary_quantization = binary_quantization
+        self.rescore_factor = rescore_factor
+        self.embedder = embedder
+        # Reducción de dimensionalidad de los vectores indexados (la registra RAGPipeline)
+        self.reducer = None
+
+        self._tmpdir = None
+        # Directorio del snapshot reabierto con load(): cada append actualiza su meta.json
+        self._snapshot_dir = None
+        if path is None:
+            self._tmpdir = tempfile.mkdtemp(prefix="rag_numpy_store_")
+            path = os.path.join(self._tmpdir, SNAPSHOT_VECTORS_FILE)
+        self.path = path
+
+        self.doc_mapping = docstore if docstore is not None else create_docstore("blob")
+        self.metadata_index = MetadataIndex()
+        self._write_lock = threading.Lock()
+
+        matrix = np.lib.format.open_memmap(path, mode="w+", dtype=self.dtype, shape=(max(1, initial_capacity), dim))
+        norms = np.zeros(matrix.shape[0], dtype="float32")
+        codes = self._empty_codes(matrix.shape[0]) if binary_quantization else None
+        # Instantánea publicada: (matriz, normas al cuadrado, códigos binarios o None, número de filas válidas)
+        self._state: Tuple[np.ndarray, np.ndarray, Optional[np.ndarray], int] = (matrix, norms, codes, 0)
+        logger.info(
+            f"NumpyStore inicializado: dim={dim}, dtype={dtype}, metric={metric}, "
+            f"binary_quantization={binary_quantization}, path={path}."
+        )
+
+    def _empty_codes(self, capacity: int) -> np.ndarray:
+        return np.zeros((capacity, (self.dim + 7) // 8), dtype="uint8")
+
+    # ======================
+    # ESCRITURA
+    # ======================
+    def __len__(self) -> int:
+        return self._state[3]
+
+    @property
+    def ntotal(self) -> int:
+        return self._state[3]
+
+    @property
+    def code_nbytes(self) -> int:
+        """
+        Bytes en RAM ocupados por los códigos binarios válidos (0 si el modo binario está desactivado).
+        """
+        codes, n = self._state[2], self._state[3]
+        return 0 if codes is None else n * codes.shape[1]
+
+    def add(self, document: dict, vector: list):
+        """
+        Agrega un documento y su vector al store.
+
+        Args:
+            document (dict): Documento con al menos la clave "id".
+            vector (list): Vector numérico (lista o numpy array) del documento.
+
+        Raises:
+            ValueError: Si el vector no tiene la dimensión correcta.
+        """
+        if len(vector) != self.dim:
+            logger.error("La dimensión del vector no coincide con la dimensión del índice.")
+            raise ValueError("La dimensión del vector no coincide con la dimensión del índice.")
+        pos = self.add_batch([document], [vector])[0]
+        logger.info(f"Documento '{document.get('id')}' agregado en la posición {pos}.")
+
+    def add_batch(self, documents: List[dict], vectors) -> List[int]:
+        """
+        Agrega varios documentos y sus vectores en bloque.
+
+        Args:
+            documents (list[dict]): Documentos con al menos la clave "id".
+            vectors: Lista de vectores o matriz (n, dim).
+
+        Returns:
+            list[int]: Posiciones asignadas.
+
+        Raises:
+            ValueError: Si las dimensiones no coinciden.
+            RuntimeError: Si ocurre un error al escribir.
+        """
+        np_vectors = np.asarray(vectors, dtype="float32")
+        if np_vectors.ndim != 2 or np_vectors.shape[1] != self.dim:
+            logger.error("La dimensión del vector no coincide con la dimensión del índice.")
+            raise ValueError("La dimensión del vector no coincide con la dimensión del índice.")
+        if len(documents) != np_vectors.shape[0]:
+            raise ValueError("El número de documentos no coincide con el número de vectores.")
+        if not documents:
+            return []
+
+        with self._write_lock:
+            synced = False
+            try:
+                matrix, norms, codes, n = self._state
+                if len(self.doc_mapping) != n:
+                    raise RuntimeError(f"Docstore desincronizado: {len(self.doc_mapping)} payloads != {n} vectores.")
+                synced = True
+                count = len(documents)
+                if n + count > matrix.shape[0]:
+                    matrix, norms, codes = self._grow(matrix, norms, codes, n, n + count)
+                # Escribir las filas nuevas ANTES de publicar el nuevo n
+                matrix[n:n + count] = np_vectors
+                stored = matrix[n:n + count].astype("float32")
+                norms[n:n + count] = np.einsum("ij,ij->i", stored, stored)
+                if codes is not None:
+                    codes[n:n + count] = binary_codes(stored)
+                positions = [self.doc_mapping.append(doc) for doc in documents]
+                for pos, doc in zip(positions, documents):
+                    self.metadata_index.add(pos, doc.get("metadata"))
+                if self._snapshot_dir is not None:
+                    # Filas y payloads ya están en disco: se publica el nuevo ntotal del snapshot
+                    matrix.flush()
+                    self._write_snapshot_meta(self._snapshot_dir, n + count)
+                self._state = (matrix, norms, codes, n + count)
+                return positions
+            except Exception as e:
+                if synced:
+                    # Las filas escritas quedan fuera de [0, n); se deshacen payloads y metadatos del lote
+                    self.doc_mapping.truncate(n)
+                    self.metadata_index.truncate(n)
+                logger.error(f"Error al agregar el documento: {e}")
+                raise RuntimeError(f"Error al agregar el documento: {e}") from e
+
+    def _grow(self, matrix: np.ndarray, norms: np.ndarray, codes: Optional[np.ndarray], n: int, required: int):
+        """
+        Duplica la capacidad copiando las filas válidas a un nuevo fichero memory-mapped.
+        Las búsquedas en curso siguen usando la matriz anterior hasta publicar la nueva instantánea.
+        """
+        capacity = max(required, matrix.shape[0] * 2)
+        tmp_path = f"{self.path}.grow"
+        new_matrix = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=self.dtype, shape=(capacity, self.dim))
+        new_matrix[:n] = matrix[:n]
+        new_matrix.flush()
+        os.replace(tmp_path, self.path)
+        new_norms = np.zeros(capacity, dtype="float32")
+        new_norms[:n] = norms[:n]
+        new_codes = None
+        if codes is not None:
+            new_codes = self._empty_codes(capacity)
+            new_codes[:n] = codes[:n]
+        logger.debug(f"NumpyStore: capacidad ampliada a {capacity} filas.")
+        return new_matrix, new_norms, new_codes
+
+    # ======================
+    # BÚSQUEDA
+    # ======================
+    def search(self, query_vector: list, k: int, filter: Optional[Dict[str, Any]] = None):
+        """
+        Búsqueda exacta de los k documentos más cercanos.
+
+        Args:
+            query_vector (list): Vector de consulta.
+            k (int): Número de documentos a recuperar.
+            filter (dict, opcional): Filtro de metadatos (ver utils/metadata_index.py).
+
+        Returns:
+            list: Documentos ordenados de mayor a menor similitud.
+
+        Raises:
+            ValueError: Si el vector de consulta no tiene la dimensión correcta.
+        """
+        if len(query_vector) != self.dim:
+            logger.error("La dimensión del vector de consulta no coincide con la dimensión del índice.")
+            raise ValueError("La dimensión del vector de consulta no coincide con la dimensión del índice.")
+        try:
+            _, positions = self.search_positions(query_vector, k, filter=filter)
+            results = self.doc_mapping.get_many(positions)
+            logger.info(f"Búsqueda completada: {len(results)} documentos recuperados.")
+            return results
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Error en la búsqueda vectorial: {e}")
+            raise RuntimeError(f"Error en la búsqueda vectorial: {e}") from e
+
+    def search_with_vectors(self, query_vector: list, k: int, filter: Optional[Dict[str, Any]] = None):
+        """
+        Igual que search(), pero retorna también los vectores (float32) de los documentos recuperados
+        (p. ej. para diversificar con MMR, ver utils/mmr.py).
+
+        Returns:
+            tuple[list, np.ndarray]: (documentos, matriz (n, dim) alineada con ellos).
+        """
+        if len(query_vector) != self.dim:
+            logger.error("La dimensión del vector de consulta no coincide con la dimensión del índice.")
+            raise ValueError("La dimensión del vector de consulta no coincide con la dimensión del índice.")
+        try:
+            _, positions = self.search_positions(query_vector, k, filter=filter)
+            # Las filas ya publicadas nunca cambian: es seguro leerlas de la instantánea actual
+            vectors = np.asarray(self._state[0][positions], dtype="float32")
+            results = self.doc_mapping.get_many(positions)
+            logger.info(f"Búsqueda completada: {len(results)} documentos recuperados (con vectores).")
+            return results, vectors
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Error en la búsqueda vectorial: {e}")
+            raise RuntimeError(f"Error en la búsqueda vectorial: {e}") from e
+
+    def range_search(
+        self,
+        query_vector: list,
+        threshold: Optional[float] = None,
+        k_max: Optional[int] = None,
+        filter: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Búsqueda por umbral: retorna los documentos con distancia <= threshold ("l2") o similitud
+        >= threshold ("ip"), ordenados de más a menos similar y limitados a k_max.
+
+        Returns:
+            tuple[list, np.ndarray]: (documentos, puntuaciones) alineados.
+
+        Raises:
+            ValueError: Si el vector de consulta no tiene la dimensión correcta o no hay ni umbral ni k_max.
+        """
+        if len(query_vector) != self.dim:
+            logger.error("La dimensión del vector de consulta no coincide con la dimensión del índice.")
+            raise ValueError("La dimensión del vector de consulta no coincide con la dimensión del índice.")
+        if threshold is None and k_max is None:
+            raise ValueError("range_search requiere un umbral (threshold) o un número máximo de resultados (k_max).")
+        try:
+            if threshold is None:
+                scores, positions = self.search_positions(query_vector, k_max, filter=filter)
+            else:
+                scores, positions = self._range_positions(query_vector, threshold, k_max, filter)
+            results = self.doc_mapping.get_many(positions)
+            logger.info(f"Búsqueda por rango completada: {len(results)} documentos dentro del umbral {threshold}.")
+            return results, scores
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Error en la búsqueda vectorial: {e}")
+            raise RuntimeError(f"Error en la búsqueda vectorial: {e}") from e
+
+    def _range_positions(self, query_vector, threshold: float, k_max: Optional[int], filter):
+        """
+        Escaneo por bloques que conserva las filas dentro del umbral (en la escala "menor es mejor").
+        """
+        matrix, norms, _, n = self._state
+        q = np.asarray(query_vector, dtype="float32").reshape(-1)
+        mask = self.metadata_index.mask(filter, n) if filter else None
+        limit = -float(threshold) if self.metric == "ip" else float(threshold)
+        kept_scores, kept_ids = [], []
+        for start in range(0, n, self.block_size):
+            end = min(start + self.block_size, n)
+            scores = self._score_block(matrix[start:end], norms[start:end], q)
+            keep = scores <= limit
+            if mask is not None:
+                keep &= mask[start:end]
+            kept_scores.append(scores[keep])
+            kept_ids.append(np.flatnonzero(keep).astype("int64") + start)
+        if not kept_scores:
+            return np.empty(0, dtype="float32"), np.empty(0, dtype="int64")
+        best_scores, best_ids = np.concatenate(kept_scores), np.concatenate(kept_ids)
+        if k_max is not None:
+            best_scores, best_ids = self._merge_topk(best_scores, best_ids, k_max)
+        return self._finalize(best_scores, best_ids)
+
+    def search_parents(
+        self,
+        query_vector: list,
+        k: int,
+        aggregate: str = "max",
+        window: Optional[int] = 0,
+        fetch_factor: int = DEFAULT_PARENT_FETCH_FACTOR,
+        filter: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Búsqueda sobre documentos multi-vector: recupera k * fetch_factor chunks, agrega sus
+        puntuaciones por documento padre (metadata "parent_id") y retorna los k mejores padres.
+        Ver FaissStore.search_parents() y utils/parent_aggregation.py.
+        """
+        if len(query_vector) != self.dim:
+            logger.error("La dimensión del vector de consulta no coincide con la dimensión del índice.")
+            raise ValueError("La dimensión del vector de consulta no coincide con la dimensión del índice.")
+        try:
+            scores, positions = self.search_positions(query_vector, k * max(1, fetch_factor), filter=filter)
+            ntotal = self.ntotal
+            chunks = self.doc_mapping.get_many(positions)
+            load_span = make_span_loader(self.doc_mapping, self.metadata_index, ntotal, window)
+            results = collapse_to_parents(
+                chunks, scores, k, aggregate, higher_is_better=self.metric == "ip", load_span=load_span
+            )
+            logger.info(f"Búsqueda por padre completada: {len(results)} documentos de {len(chunks)} chunks.")
+            return results
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Error en la búsqueda vectorial: {e}")
+            raise RuntimeError(f"Error en la búsqueda vectorial: {e}") from e
+
+    def search_positions(self, query_vector, k: int, filter: Optional[Dict[str, Any]] = None):
+        """
+        Núcleo de la búsqueda: retorna (distancias/puntuaciones, posiciones) ordenadas, sin cargar payloads.
+        Para "l2" las distancias son euclídeas al cuadrado (menor es mejor); para "ip", productos internos.
+        """
+        matrix, norms, codes, n = self._state
+        q = np.asarray(query_vector, dtype="float32").reshape(-1)
+        if n == 0 or k <= 0:
+            return np.empty(0, dtype="float32"), np.empty(0, dtype="int64")
+
+        mask = self.metadata_index.mask(filter, n) if filter else None
+        if mask is not None and not mask.any():
+            return np.empty(0, dtype="float32"), np.empty(0, dtype="int64")
+
+        if codes is not None:
+            candidates = self._hamming_candidates(codes, n, q, k * self.rescore_factor, mask)
+            best_scores, best_ids = self._merge_topk(
+                self._score_block(matrix[candidates], norms[candidates], q), candidates, k
+            )
+            return self._finalize(best_scores, best_ids)
+
+        if mask is not None and np.count_nonzero(mask) <= self.block_size:
+            # Filtro selectivo: se puntúan solo las filas candidatas (un único bloque)
+            candidates = np.flatnonzero(mask).astype("int64")
+            best_scores, best_ids = self._merge_topk(
+                self._score_block(matrix[candidates], norms[candidates], q), candidates, k
+            )
+            return self._finalize(best_scores, best_ids)
+
+        best_scores = np.empty(0, dtype="float32")
+        best_ids = np.empty(0, dtype="int64")
+        for start in range(0, n, self.block_size):
+            end = min(start + self.block_size, n)
+            block_mask = mask[start:end] if mask is not None else None
+            if block_mask is not None and not block_mask.any():
+                continue
+            scores = self._score_block(matrix[start:end], norms[start:end], q)
+            if block_mask is not None:
+                scores[~block_mask] = np.inf
+            ids = np.arange(start, end, dtype="int64")
+            best_scores, best_ids = self._merge_topk(
+                np.concatenate([best_scores, scores]), np.concatenate([best_ids, ids]), k
+            )
+        return self._finalize(best_scores, best_ids)
+
+    def _hamming_candidates(
+        self,
+        codes: np.ndarray,
+        n: int,
+        q: np.ndarray,
+        num_candidates: int,
+        mask: Optional[np.ndarray]
+    ) -> np.ndarray:
+        """
+        Primera etapa del modo binario: posiciones de los num_candidates códigos más cercanos
+        por distancia de Hamming, en orden ascendente (lecturas secuenciales del memmap al re-puntuar).
+        """
+        query_code = binary_codes(q)
+        invalid = np.iinfo(np.int32).max
+        best_dist = np.empty(0, dtype=np.int32)
+        best_ids = np.empty(0, dtype="int64")
+        for start in range(0, n, self.block_size):
+            end = min(start + self.block_size, n)
+            block_mask = mask[start:end] if mask is not None else None
+            if block_mask is not None and not block_mask.any():
+                continue
+            dist = hamming_distances(codes[start:end], query_code)
+            if block_mask is not None:
+                dist[~block_mask] = invalid
+            best_dist, best_ids = self._merge_topk(
+                np.concatenate([best_dist, dist]),
+                np.concatenate([best_ids, np.arange(start, end, dtype="int64")]),
+                num_candidates
+            )
+        return np.sort(best_ids[best_dist != invalid])
+
+    def _finalize(self, best_scores: np.ndarray, best_ids: np.ndarray):
+        """
+        Descarta posiciones excluidas por el filtro, ordena y restaura el signo de "ip".
+        """
+        valid = np.isfinite(best_scores)
+        best_scores, best_ids = best_scores[valid], best_ids[valid]
+        order = np.argsort(best_scores, kind="stable")
+        scores = best_scores[order]
+        if self.metric == "ip":
+            scores = -scores
+        return scores, best_ids[order]
+
+    def _score_block(self, block: np.ndarray, block_norms: np.ndarray, q: np.ndarray) -> np.ndarray:
+        """
+        Puntuaciones "menor es mejor" de un bloque: ||x||² - 2·x·q + ||q||² para l2, -x·q para ip.
+        """
+        if block.dtype != np.float32:
+            block = block.astype("float32")
+        dots = block @ q
+        if self.metric == "ip":
+            return -dots
+        return np.maximum(block_norms - 2.0 * dots + float(q @ q), 0.0)
+
+    @staticmethod
+    def _merge_topk(scores: np.ndarray, ids: np.ndarray, k: int):
+        if len(scores) <= k:
+            return scores, ids
+        part = np.argpartition(scores, k - 1)[:k]
+        return scores[part], ids[part]
+
+    # ======================
+    # PERSISTENCIA
+    # ======================
+    def snapshot(self, directory: str) -> str:
+        """
+        Guarda una copia consistente del store en `directory` (vectores, payloads y configuración).
+
+        El snapshot se escribe en un directorio temporal junto a `directory` y se mueve a su sitio al
+        terminar: un snapshot anterior en la misma ruta se sustituye entero, nunca se mezcla con el nuevo.
+
+        Args:
+            directory (str): Directorio destino (se crea si no existe; si existe, se reemplaza).
+
+        Returns:
+            str: Ruta del directorio del snapshot.
+
+        Raises:
+            ValueError: Si `directory` es el directorio de respaldo del propio store.
+        """
+        target = os.path.realpath(directory)
+        backing = {os.path.realpath(os.path.dirname(self.path))}
+        if self._snapshot_dir is not None:
+            backing.add(os.path.realpath(self._snapshot_dir))
+        if target in backing:
+            raise ValueError(f"No se puede guardar un snapshot en el directorio de respaldo del store: '{directory}'.")
+        parent = os.path.dirname(target)
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".snapshot_", dir=parent)
+        try:
+            matrix, _, _, n = self._state
+            np.save(os.path.join(staging, SNAPSHOT_VECTORS_FILE), np.asarray(matrix[:n]))
+            docstore = create_docstore("blob", path=os.path.join(staging, SNAPSHOT_DOCS_FILE))
+            try:
+                for pos in range(n):
+                    docstore.append(self.doc_mapping[pos])
+            finally:
+                docstore.close()
+            if self.reducer is not None:
+                self.reducer.save(os.path.join(staging, SNAPSHOT_REDUCER_FILE))
+            self._write_snapshot_meta(staging, n)
+            # os.replace no sustituye un directorio no vacío: el anterior se aparta y se borra después
+            retired = None
+            if os.path.exists(target):
+                retired = f"{staging}.old"
+                os.rename(target, retired)
+            os.rename(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        if retired is not None:
+            shutil.rmtree(retired, ignore_errors=True)
+        logger.info(f"Snapshot de NumpyStore guardado en '{directory}' ({n} vectores).")
+        return directory
+
+    def _write_snapshot_meta(self, directory: str, n: int) -> None:
+        """
+        Escribe meta.json de forma atómica. ntotal es la fuente de verdad del snapshot: las filas de la
+        matriz y los payloads posteriores a ntotal (capacidad libre o un lote a medias) se ignoran al cargar.
+        """
+        meta = {
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "metric": self.metric,
+            "ntotal": n,
+            "binary_quantization": self.binary_quantization,
+            "rescore_factor": self.rescore_factor,
+            "embedder": self.embedder,
+        }
+        meta_path = os.path.join(directory, SNAPSHOT_META_FILE)
+        tmp_path = f"{meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    @classmethod
+    def load(cls, directory: str, block_size: int = DEFAULT_BLOCK_SIZE) -> "NumpyStore":
+        """
+        Reabre un snapshot creado con snapshot(). La matriz se mapea en memoria y el store
+        admite nuevos appends: se escriben sobre el propio snapshot y cada lote actualiza el
+        ntotal de meta.json, de modo que el directorio se puede volver a cargar.
+
+        Args:
+            directory (str): Directorio del snapshot.
+
+        Returns:
+            NumpyStore: Instancia con los vectores, payloads e índice de metadatos restaurados.
+
+        Raises:
+            RuntimeError: Si la matriz o el docstore tienen menos filas que el ntotal de meta.json.
+        """
+        with open(os.path.join(directory, SNAPSHOT_META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        docstore = create_docstore("blob", path=os.path.join(directory, SNAPSHOT_DOCS_FILE))
+        vectors_path = os.path.join(directory, SNAPSHOT_VECTORS_FILE)
+        stored = np.load(vectors_path, mmap_mode="r")
+
+        store = cls.__new__(cls)
+        store.dim = meta["dim"]
+        store.dtype = np.dtype(meta["dtype"])
+        store.metric = meta["metric"]
+        store.block_size = block_size
+        store.binary_quantization = meta.get("binary_quantization", False)
+        store.rescore_factor = meta.get("rescore_factor", DEFAULT_RESCORE_FACTOR)
+        store.embedder = meta.get("embedder")
+        reducer_path = os.path.join(directory, SNAPSHOT_REDUCER_FILE)
+        store.reducer = DimensionReducer.load(reducer_path) if os.path.exists(reducer_path) else None
+        store._tmpdir = None
+        store._snapshot_dir = directory
+        store.path = vectors_path
+        store.doc_mapping = docstore
+        store.metadata_index = MetadataIndex()
+        store._write_lock = threading.Lock()
+
+        n = meta["ntotal"]
+        if stored.shape[0] < n or len(docstore) < n:
+            docstore.close()
+            raise RuntimeError(
+                f"Snapshot '{directory}' inconsistente: ntotal={n}, {stored.shape[0]} vectores, "
+                f"{len(docstore)} payloads."
+            )
+        # La matriz puede tener capacidad libre tras un crecimiento; el docstore, un lote sin publicar
+        stored = stored[:n]
+        docstore.truncate(n)
+        norms = np.empty(max(1, n), dtype="float32")
+        codes = store._empty_codes(max(1, n)) if store.binary_quantization else None
+        for start in range(0, n, block_size):
+            block = np.asarray(stored[start:start + block_size], dtype="float32")
+            norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+            if codes is not None:
+                codes[start:start + len(block)] = binary_codes(block)
+        for pos in range(n):
+            store.metadata_index.add(pos, docstore[pos].get("metadata"))
+        # Matriz de solo lectura: el primer append la copiará a una matriz ampliada y escribible
+        store._state = (stored, norms, codes, n)
+        logger.info(f"NumpyStore cargado desde '{directory}' ({n} vectores).")
+        return store
+
+    def close(self):
+        """
+        Persiste el docstore y elimina los ficheros temporales, si los hubiera.
+        """
+        self.doc_mapping.close()
+        matrix = self._state[0]
+        if isinstance(matrix, np.memmap):
+            matrix.flush()
+        self._state = (np.zeros((1, self.dim), dtype=self.dtype), np.zeros(1, dtype="float32"), None, 0)
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
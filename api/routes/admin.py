@@ -9,6 +9,7 @@ from utils.logger import logger
 from utils.cache_manager import clear_schema_cache
 from monitoring.aggregator import get_logs, get_metrics, clear_data
 from core.config import get_config, update_config
+from scalability.reindexer import start_reindex, get_reindex_status
 
 # from security.auth import verify_token  # Ejemplo de security, p.ej. con un "Bearer" token
 
@@ -22,6 +23,11 @@ class UpdateConfigRequest(BaseModel):
     api_key: Optional[str] = None
     # Puedes definir más campos que correspondan con config.py
 
+class ReindexRequest(BaseModel):
+    store: str
+    index_factory: Optional[str] = None
+    reembed: bool = False
+
 @router.get("/logs")
 def admin_get_logs(level: Optional[str] = None):
     """
@@ -87,3 +93,37 @@ def admin_system_reset(full_reset: bool = Query(False, description="Si es True,
         clear_data()
         logger.info("Se limpiaron logs y métricas, NO se tocó la schema cache.")
         return {"message": "Se limpiaron logs y métricas."}
+
+@router.post("/reindex", status_code=status.HTTP_202_ACCEPTED)
+def admin_start_reindex(payload: ReindexRequest):
+    """
+    Dispara una reindexación blue/green en segundo plano de un vector store registrado
+    (ver scalability/reindexer.py). Las consultas siguen sirviéndose desde la generación actual
+    hasta el intercambio atómico.
+    - index_factory: nuevo tipo de índice (solo FAISS), p. ej. "HNSW32".
+    - reembed: si es True, se re-vectorizan los textos con el embedder configurado.
+    """
+    options = {}
+    if payload.index_factory:
+        options["index_factory"] = payload.index_factory
+    logger.warning(f"Reindexación solicitada vía API Admin: {payload}")
+    try:
+        return start_reindex(payload.store, reembed=payload.reembed, **options)
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error iniciando la reindexación: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/reindex/status")
+def admin_reindex_status(store: Optional[str] = None):
+    """
+    Retorna el progreso de la reindexación de un store (o de todos los registrados).
+    Ejemplo: /admin/reindex/status?store=faiss_store
+    """
+    try:
+        return get_reindex_status(store)
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
@@ -9,11 +9,16 @@ Características avanzadas:
 - Manejo robusto de errores y conversión a HTTPException.
 - Registro detallado de la solicitud y respuesta.
 - Integración dinámica con el pipeline RAG (importado desde core.pipeline) para que se pueda hacer patch en tests.
+- Endpoint /ask/stream que envía la respuesta por fragmentos a medida que el LLM la genera y cancela
+  la generación si el cliente se desconecta.
 """
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+from starlette.concurrency import iterate_in_threadpool
 import logging
+import threading
 
 # Importamos la clase RAGPipeline desde core.pipeline
 from core.pipeline import RAGPipeline
@@ -41,7 +46,8 @@ async def ask_endpoint(request: AskRequest):
     """
     try:
         pipeline = RAGPipeline()
-        result = pipeline.run(request.query)
+        # Camino asíncrono: las llamadas al LLM no bloquean el event loop ni ocupan un hilo por petición
+        result = await pipeline.arun(request.query)
         return AskResponse(response=result)
     except Exception as e:
         logger.error(f"Error en el endpoint /ask: {e}", exc_info=True)
@@ -49,3 +55,48 @@ async def ask_endpoint(request: AskRequest):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ocurrió un error interno en el procesamiento de la consulta."
         )
+
+
+@router.post("/stream")
+async def ask_stream_endpoint(request: AskRequest, http_request: Request):
+    """
+    Endpoint que procesa la consulta y devuelve la respuesta en streaming (text/plain por fragmentos).
+
+    La generación corre en el threadpool; entre fragmento y fragmento se comprueba si el cliente sigue
+    conectado. Al desconectarse se activa el evento de cancelación, y el adaptador LLM deja de generar
+    (cierra el stream de OpenAI o detiene el modelo local en el siguiente token).
+    """
+    cancel_event = threading.Event()
+    try:
+        pipeline = RAGPipeline()
+        stream = iterate_in_threadpool(pipeline.run_stream(request.query, cancel_event=cancel_event))
+        # El primer fragmento se espera antes de enviar las cabeceras: los errores de indexado,
+        # recuperación o conexión con el LLM siguen devolviéndose como HTTP 500
+        first_chunk = await stream.__anext__()
+    except StopAsyncIteration:
+        first_chunk = None
+    except Exception as e:
+        cancel_event.set()
+        logger.error(f"Error en el endpoint /ask/stream: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocurrió un error interno en el procesamiento de la consulta."
+        )
+
+    async def chunks():
+        try:
+            if first_chunk is None:
+                return
+            yield first_chunk
+            async for chunk in stream:
+                if await http_request.is_disconnected():
+                    logger.info("Cliente desconectado de /ask/stream; se cancela la generación.")
+                    break
+                yield chunk
+        except Exception as e:
+            # Las cabeceras ya se enviaron: solo queda registrar el error y cortar el stream
+            logger.error(f"Error en el endpoint /ask/stream: {e}", exc_info=True)
+        finally:
+            cancel_event.set()
+
+    return StreamingResponse(chunks(), media_type="text/plain; charset=utf-8")
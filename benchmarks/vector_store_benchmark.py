@@ -0,0 +1,396 @@
+"""
+vector_store_benchmark.py – Benchmark de Vector Stores: recall@k vs latencia vs memoria
+
+Mide los adaptadores de adapters/VectorStores sobre datasets de embeddings sintéticos o
+reproducidos desde ficheros .npy, para elegir configuraciones de índice con datos reales:
+
+  - Generación de datasets sintéticos (clusters gaussianos, opcionalmente normalizados)
+    de tamaño y dimensión configurables, o carga de vectores base/consultas desde .npy.
+  - Ground truth exacto (L2) calculado por bloques con NumPy.
+  - Barrido de FaissStore (tipos de índice + parámetros de búsqueda como nprobe/efSearch),
+    NumpyStore (float32/float16) y ChromaStore (si chromadb está instalado).
+  - Por cada configuración: tiempo de construcción, QPS, latencias p50/p99, recall@k y RSS.
+  - Salida en JSON legible por máquina (stdout o fichero).
+  - Informe de reducción de dimensionalidad (--reduction-dims): recall@k de la búsqueda exacta con
+    vectores reducidos (PCA o truncado Matryoshka, utils/dim_reduction.py) frente a la dimensión completa.
+
+Uso:
+  python -m benchmarks.vector_store_benchmark --n 100000 --dim 384 --queries 500 --k 10 --output bench.json
+  python -m benchmarks.vector_store_benchmark --base base.npy --query-file queries.npy
+  python -m benchmarks.vector_store_benchmark --config sweep.json   # lista de configuraciones propia
+  python -m benchmarks.vector_store_benchmark --base base.npy --reduction pca --reduction-dims 64,128,256 --reduction-only
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.dim_reduction import DEFAULT_FIT_SAMPLE, DimensionReducer
+
+logger = logging.getLogger("RAGLogger")
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DEFAULT_N = 20000
+DEFAULT_DIM = 128
+DEFAULT_QUERIES = 200
+DEFAULT_K = 10
+DEFAULT_CLUSTERS = 64
+GROUND_TRUTH_BLOCK = 8192
+
+# Barrido por defecto: cada entrada es una configuración de construcción con sus variantes de búsqueda
+DEFAULT_SWEEP: List[Dict[str, Any]] = [
+    {"adapter": "faiss_store", "params": {"index_factory": None}},
+    {"adapter": "faiss_store", "params": {"index_factory": "IVF{nlist},Flat"},
+     "search_params": [{"nprobe": 1}, {"nprobe": 8}, {"nprobe": 32}]},
+    {"adapter": "faiss_store", "params": {"index_factory": "HNSW32"},
+     "search_params": [{"efSearch": 16}, {"efSearch": 64}, {"efSearch": 128}]},
+    {"adapter": "faiss_store", "params": {"index_factory": "IVF{nlist},PQ{pq_m}"},
+     "search_params": [{"nprobe": 8}, {"nprobe": 32}]},
+    {"adapter": "numpy_store", "params": {"dtype": "float32"}},
+    {"adapter": "numpy_store", "params": {"dtype": "float16"}},
+    {"adapter": "numpy_store", "params": {"binary_quantization": True, "rescore_factor": 4}},
+    {"adapter": "numpy_store", "params": {"binary_quantization": True, "rescore_factor": 16}},
+    {"adapter": "chroma_store", "params": {}},
+]
+
+
+# ============================
+# DATASETS
+# ============================
+def generate_dataset(
+    n: int,
+    dim: int,
+    n_queries: int,
+    n_clusters: int = DEFAULT_CLUSTERS,
+    normalize: bool = True,
+    seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Genera vectores base y consultas sintéticos con estructura de clusters (más realista que ruido uniforme).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (base (n, dim), consultas (n_queries, dim)) en float32.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n_clusters), dim)).astype("float32")
+
+    def sample(count: int) -> np.ndarray:
+        labels = rng.integers(0, len(centers), size=count)
+        points = centers[labels] + 0.35 * rng.standard_normal((count, dim)).astype("float32")
+        if normalize:
+            points /= np.linalg.norm(points, axis=1, keepdims=True) + 1e-12
+        return points.astype("float32")
+
+    return sample(n), sample(n_queries)
+
+
+def load_dataset(base_path: str, query_path: Optional[str], n_queries: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Carga vectores base (y opcionalmente consultas) desde ficheros .npy. Si no hay fichero de consultas,
+    se muestrean n_queries vectores base con una pequeña perturbación.
+    """
+    base = np.ascontiguousarray(np.load(base_path, mmap_mode="r"), dtype="float32")
+    if query_path:
+        queries = np.ascontiguousarray(np.load(query_path), dtype="float32")
+    else:
+        rng = np.random.default_rng(seed)
+        picks = rng.choice(len(base), size=min(n_queries, len(base)), replace=False)
+        queries = base[picks] + 0.01 * rng.standard_normal((len(picks), base.shape[1])).astype("float32")
+    return base, queries
+
+
+def exact_ground_truth(base: np.ndarray, queries: np.ndarray, k: int, block: int = GROUND_TRUTH_BLOCK) -> np.ndarray:
+    """
+    Top-k exacto por distancia L2, calculado por bloques de vectores base.
+
+    Returns:
+        np.ndarray: Matriz (n_queries, k) de posiciones ordenadas por cercanía.
+    """
+    q_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+    best_d = np.full((len(queries), 0), np.inf, dtype="float32")
+    best_i = np.empty((len(queries), 0), dtype="int64")
+    for start in range(0, len(base), block):
+        chunk = np.asarray(base[start:start + block], dtype="float32")
+        d = q_norms - 2.0 * queries @ chunk.T + np.einsum("ij,ij->i", chunk, chunk)[None, :]
+        ids = np.broadcast_to(np.arange(start, start + len(chunk)), d.shape)
+        all_d = np.concatenate([best_d, d], axis=1)
+        all_i = np.concatenate([best_i, ids], axis=1)
+        keep = min(k, all_d.shape[1])
+        part = np.argpartition(all_d, keep - 1, axis=1)[:, :keep]
+        best_d = np.take_along_axis(all_d, part, axis=1)
+        best_i = np.take_along_axis(all_i, part, axis=1)
+    order = np.argsort(best_d, axis=1, kind="stable")
+    return np.take_along_axis(best_i, order, axis=1)
+
+
+def recall_at_k(retrieved: List[List[int]], ground_truth: np.ndarray, k: int) -> float:
+    """
+    Fracción media de los k vecinos exactos presentes entre los k recuperados.
+    """
+    hits = 0
+    for found, truth in zip(retrieved, ground_truth):
+        hits += len(set(found[:k]) & set(truth[:k].tolist()))
+    return hits / float(len(ground_truth) * k) if len(ground_truth) else 0.0
+
+
+def dim_reduction_report(
+    base: np.ndarray,
+    queries: np.ndarray,
+    dims: List[int],
+    method: str = "pca",
+    k: int = DEFAULT_K,
+    fit_sample: int = DEFAULT_FIT_SAMPLE
+) -> List[Dict[str, Any]]:
+    """
+    Recall@k de la búsqueda exacta con vectores reducidos frente a la búsqueda a dimensión completa.
+
+    Args:
+        dims (list[int]): Dimensiones de salida a evaluar.
+        method (str): "pca" o "truncate" (ver utils/dim_reduction.py).
+        fit_sample (int): Vectores base usados para ajustar PCA.
+
+    Returns:
+        list[dict]: Por dimensión: recall@k, bytes por vector (float32), ratio de memoria y varianza explicada.
+    """
+    ground_truth = exact_ground_truth(base, queries, k)
+    rows = []
+    for dim in dims:
+        t0 = time.perf_counter()
+        reducer = DimensionReducer(method, dim).fit(base, sample_size=fit_sample)
+        reduced_truth = exact_ground_truth(reducer.transform(base), reducer.transform(queries), k)
+        rows.append({
+            "method": method,
+            "dim": int(dim),
+            f"recall@{k}": round(recall_at_k(reduced_truth.tolist(), ground_truth, k), 4),
+            "bytes_per_vector": int(dim) * 4,
+            "memory_ratio": round(dim / float(base.shape[1]), 4),
+            "explained_variance": reducer.explained_variance,
+            "time_s": round(time.perf_counter() - t0, 4),
+        })
+    return rows
+
+
+# ============================
+# MEDICIÓN
+# ============================
+def current_rss_mb() -> float:
+    """
+    Memoria residente actual del proceso en MB (psutil si está disponible; si no, pico vía getrusage).
+    """
+    if psutil is not None:
+        return psutil.Process(os.getpid()).memory_info().rss / (1024 * 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def _resolve_params(params: Dict[str, Any], n: int, dim: int) -> Dict[str, Any]:
+    """
+    Sustituye los marcadores {nlist} y {pq_m} de las cadenas de index_factory según el tamaño del dataset.
+    """
+    resolved = dict(params)
+    factory = resolved.get("index_factory")
+    if isinstance(factory, str):
+        # FAISS recomienda ~39 puntos de entrenamiento por centroide
+        nlist = max(1, min(4096, int(4 * np.sqrt(n)), n // 39))
+        # Subcuantizadores de al menos 4 dimensiones para que el entrenamiento PQ sea razonable
+        pq_m = next((m for m in (64, 32, 16, 8, 4, 2) if dim % m == 0 and dim // m >= 4), 1)
+        resolved["index_factory"] = factory.format(nlist=nlist, pq_m=pq_m)
+    return resolved
+
+
+def _build_store(adapter: str, params: Dict[str, Any], dim: int, run_id: int):
+    if adapter == "faiss_store":
+        from adapters.VectorStores.faiss_store import FaissStore
+        return FaissStore(dim=dim, **params)
+    if adapter == "numpy_store":
+        from adapters.VectorStores.numpy_store import NumpyStore
+        return NumpyStore(dim=dim, **params)
+    if adapter == "chroma_store":
+        from adapters.VectorStores.chroma_store import ChromaStore
+        return ChromaStore(collection_name=f"bench_{os.getpid()}_{run_id}", embed_dim=dim, **params)
+    raise ValueError(f"Adaptador de benchmark desconocido: '{adapter}'")
+
+
+def _ingest(store, base: np.ndarray, batch_size: int = 10000) -> None:
+    docs = lambda start, end: [{"id": str(i), "texto": "", "metadata": {}} for i in range(start, end)]
+    for start in range(0, len(base), batch_size):
+        end = min(start + batch_size, len(base))
+        if hasattr(store, "add_batch"):
+            store.add_batch(docs(start, end), base[start:end])
+        else:
+            for doc, vec in zip(docs(start, end), base[start:end]):
+                store.add(doc, vec.tolist())
+
+
+def _apply_search_params(store, search_params: Dict[str, Any]) -> None:
+    if not search_params:
+        return
+    import faiss
+    space = faiss.ParameterSpace()
+    for name, value in search_params.items():
+        space.set_index_parameter(store.index, name, value)
+
+
+def _measure_queries(store, queries: np.ndarray, k: int, warmup: int = 5) -> Tuple[List[List[int]], np.ndarray, float]:
+    for q in queries[:warmup]:
+        store.search(q.tolist(), k)
+    retrieved: List[List[int]] = []
+    latencies = np.empty(len(queries), dtype="float64")
+    wall_start = time.perf_counter()
+    for i, q in enumerate(queries):
+        t0 = time.perf_counter()
+        docs = store.search(q.tolist(), k)
+        latencies[i] = time.perf_counter() - t0
+        retrieved.append([int(d["id"]) for d in docs])
+    wall = time.perf_counter() - wall_start
+    return retrieved, latencies, wall
+
+
+def run_benchmark(
+    base: np.ndarray,
+    queries: np.ndarray,
+    k: int = DEFAULT_K,
+    sweep: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Ejecuta el barrido completo y retorna un informe serializable a JSON.
+
+    Args:
+        base (np.ndarray): Vectores a indexar (n, dim).
+        queries (np.ndarray): Vectores de consulta (q, dim).
+        k (int): Número de vecinos.
+        sweep (list[dict], opcional): Configuraciones {"adapter", "params", "search_params"}.
+                                      Por defecto, DEFAULT_SWEEP.
+
+    Returns:
+        dict: {"dataset": {...}, "results": [ {...}, ... ]}
+    """
+    sweep = sweep if sweep is not None else DEFAULT_SWEEP
+    n, dim = base.shape
+    t0 = time.perf_counter()
+    ground_truth = exact_ground_truth(base, queries, k)
+    report: Dict[str, Any] = {
+        "dataset": {
+            "n": int(n),
+            "dim": int(dim),
+            "queries": int(len(queries)),
+            "k": k,
+            "ground_truth_time_s": round(time.perf_counter() - t0, 4),
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "results": [],
+    }
+
+    for run_id, entry in enumerate(sweep):
+        adapter = entry["adapter"]
+        params = _resolve_params(entry.get("params", {}), n, dim)
+        variants = entry.get("search_params") or [{}]
+        gc.collect()
+        rss_before = current_rss_mb()
+        store = None
+        try:
+            build_start = time.perf_counter()
+            store = _build_store(adapter, params, dim, run_id)
+            _ingest(store, base)
+            build_time = time.perf_counter() - build_start
+            rss_after = current_rss_mb()
+        except Exception as e:
+            logger.warning(f"Benchmark: no se pudo construir '{adapter}' {params}: {e}")
+            report["results"].append({"adapter": adapter, "params": params, "error": str(e)})
+            continue
+
+        for search_params in variants:
+            result = {"adapter": adapter, "params": params, "search_params": search_params}
+            try:
+                _apply_search_params(store, search_params)
+                retrieved, latencies, wall = _measure_queries(store, queries, k)
+                result.update({
+                    "build_time_s": round(build_time, 4),
+                    "qps": round(len(queries) / wall, 2) if wall > 0 else None,
+                    "latency_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 4),
+                    "latency_p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 4),
+                    f"recall@{k}": round(recall_at_k(retrieved, ground_truth, k), 4),
+                    "rss_mb": round(rss_after, 2),
+                    "rss_delta_mb": round(rss_after - rss_before, 2),
+                })
+            except Exception as e:
+                logger.warning(f"Benchmark: error midiendo '{adapter}' {params} {search_params}: {e}")
+                result["error"] = str(e)
+            report["results"].append(result)
+
+        if hasattr(store, "close"):
+            store.close()
+        del store
+    return report
+
+
+# ============================
+# CLI
+# ============================
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark de vector stores: recall@k vs latencia vs memoria.")
+    parser.add_argument("--n", type=int, default=DEFAULT_N, help="Número de vectores sintéticos.")
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM, help="Dimensión de los vectores sintéticos.")
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES, help="Número de consultas.")
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help="Número de vecinos (recall@k).")
+    parser.add_argument("--clusters", type=int, default=DEFAULT_CLUSTERS, help="Clusters del dataset sintético.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--base", help="Fichero .npy con los vectores base (dataset reproducido).")
+    parser.add_argument("--query-file", help="Fichero .npy con las consultas (opcional con --base).")
+    parser.add_argument("--config", help="Fichero JSON con la lista de configuraciones a barrer.")
+    parser.add_argument("--adapters", help="Filtra el barrido por adaptador, separados por comas (p. ej. faiss_store,numpy_store).")
+    parser.add_argument("--reduction", choices=["pca", "truncate"], default="pca",
+                        help="Método de reducción de dimensionalidad del informe de recall.")
+    parser.add_argument("--reduction-dims", help="Dimensiones reducidas a evaluar, separadas por comas (p. ej. 64,128,256).")
+    parser.add_argument("--reduction-only", action="store_true", help="Solo el informe de reducción, sin barrido de stores.")
+    parser.add_argument("--output", help="Fichero JSON de salida (por defecto, stdout).")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    if args.base:
+        base, queries = load_dataset(args.base, args.query_file, args.queries, seed=args.seed)
+    else:
+        base, queries = generate_dataset(args.n, args.dim, args.queries, n_clusters=args.clusters, seed=args.seed)
+
+    sweep = DEFAULT_SWEEP
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            sweep = json.load(f)
+    if args.adapters:
+        wanted = {a.strip() for a in args.adapters.split(",")}
+        sweep = [entry for entry in sweep if entry["adapter"] in wanted]
+
+    report = run_benchmark(base, queries, k=args.k, sweep=[] if args.reduction_only else sweep)
+    if args.reduction_dims:
+        dims = [int(d) for d in args.reduction_dims.split(",") if d.strip()]
+        report["dim_reduction"] = dim_reduction_report(base, queries, dims, method=args.reduction, k=args.k)
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload)
+    else:
+        sys.stdout.write(payload + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from pydantic import Field, field_validator
+from pydantic import Field, ValidationInfo, field_validator
 
 class Config(BaseSettings):
     # Se usa "openai_api_key" como campo real para la clave API.
@@ -10,6 +12,74 @@ class Config(BaseSettings):
     vector_store: str = Field(..., description="Tipo de índice vectorial (faiss_store, chroma_store, etc.).")
     llm: str = Field(..., description="Identificador del generador de respuestas a utilizar.")
     search_k: int = Field(5, description="Número de documentos a recuperar en la búsqueda vectorial.")
+    search_threshold: Optional[float] = Field(
+        None,
+        description="Distancia máxima para la búsqueda por rango en vector stores de distancia (FAISS, Chroma, NumpyStore 'l2')."
+    )
+    search_min_similarity: Optional[float] = Field(
+        None,
+        description="Similitud mínima para la búsqueda por rango en vector stores de producto interno (NumpyStore 'ip')."
+    )
+    adaptive_k_enabled: bool = Field(
+        False,
+        description="Si es True, el número de documentos se ajusta según los saltos de puntuación (utils/adaptive_k.py)."
+    )
+    adaptive_k_min: int = Field(1, description="Número mínimo de documentos con k adaptativo.")
+    adaptive_k_min_gap: float = Field(
+        0.25,
+        description="Fracción del rango de puntuaciones que debe superar un salto para cortar los resultados."
+    )
+    parent_aggregation: Optional[str] = Field(
+        None,
+        description="Agregación por documento padre de los chunks recuperados ('max' o 'sum'); None la desactiva."
+    )
+    parent_window: int = Field(
+        0,
+        description="Chunks a cada lado del mejor chunk que se incluyen en el contexto (-1 = documento padre completo)."
+    )
+    mmr_enabled: bool = Field(
+        False,
+        description="Si es True, los resultados se diversifican con MMR (utils/mmr.py) antes de construir el prompt."
+    )
+    mmr_fetch_factor: int = Field(4, description="Con MMR, se recuperan search_k * mmr_fetch_factor candidatos.")
+    mmr_lambda: float = Field(0.5, description="Peso de la relevancia frente a la diversidad en MMR (0 a 1).")
+    embedding_model: Optional[str] = Field(
+        None,
+        description="Modelo que se pasa al adaptador de embeddings (p. ej. 'all-MiniLM-L6-v2'); None usa el del adaptador."
+    )
+    embedding_cache_path: Optional[str] = Field(
+        None,
+        description="Directorio de la caché persistente de embeddings (utils/disk_embedding_cache.py); None la desactiva."
+    )
+    embedding_cache_dtype: str = Field(
+        "float16",
+        description="Tipo de los vectores en la caché persistente de embeddings ('float16' o 'float32')."
+    )
+    embedding_backend: Optional[str] = Field(
+        None,
+        description="Backend de inferencia de los embedders locales ('torch', 'onnx' u 'onnx-int8'); None usa el del adaptador."
+    )
+    embedding_near_duplicates: bool = Field(
+        False,
+        description="Si es True, los textos que solo difieren en mayúsculas o puntuación se vectorizan una sola vez."
+    )
+    embedding_reduction: Optional[str] = Field(
+        None,
+        description="Reducción de dimensionalidad de los vectores indexados ('pca' o 'truncate'); None la desactiva."
+    )
+    embedding_reduction_dim: Optional[int] = Field(
+        None,
+        description="Dimensión de los vectores tras la reducción (obligatoria si embedding_reduction está activa).",
+        validate_default=True
+    )
+    embedding_reduction_path: Optional[str] = Field(
+        None,
+        description="Fichero .npz donde se persiste la transformación de reducción (utils/dim_reduction.py)."
+    )
+    embedding_reduction_sample: int = Field(
+        10000,
+        description="Número máximo de vectores del corpus usados para ajustar PCA."
+    )
 
     # Campos adicionales para la integración con Synapcode.
     synapcode_mode: bool = Field(
@@ -52,6 +122,134 @@ class Config(BaseSettings):
             raise ValueError("search_k debe ser mayor que cero")
         return value
 
+    # Valida que search_threshold, si se indica, sea una distancia no negativa.
+    @field_validator("search_threshold")
+    def validate_search_threshold(cls, v: Optional[float]) -> Optional[float]:
+        if v is not None and v < 0:
+            raise ValueError("search_threshold es una distancia máxima y no puede ser negativa")
+        return v
+
+    # Valida que adaptive_k_min sea un entero mayor que cero.
+    @field_validator("adaptive_k_min", mode="before")
+    def validate_adaptive_k_min(cls, v):
+        try:
+            value = int(v)
+        except (TypeError, ValueError):
+            raise ValueError("adaptive_k_min debe ser un entero")
+        if value <= 0:
+            raise ValueError("adaptive_k_min debe ser mayor que cero")
+        return value
+
+    # Valida que adaptive_k_min_gap esté en el rango [0, 1].
+    @field_validator("adaptive_k_min_gap")
+    def validate_adaptive_k_min_gap(cls, v: float) -> float:
+        if not 0.0 <= v <= 1.0:
+            raise ValueError("adaptive_k_min_gap debe estar entre 0 y 1")
+        return v
+
+    # Normaliza el modelo de embeddings (cadena vacía = el por defecto del adaptador).
+    @field_validator("embedding_model", mode="before")
+    def validate_embedding_model(cls, v):
+        if v is None or (isinstance(v, str) and not v.strip()):
+            return None
+        return v.strip()
+
+    # Valida el backend de inferencia de los embeddings (cadena vacía = el por defecto del adaptador).
+    @field_validator("embedding_backend", mode="before")
+    def validate_embedding_backend(cls, v):
+        if v is None or (isinstance(v, str) and not v.strip()):
+            return None
+        if v not in ("torch", "onnx", "onnx-int8"):
+            raise ValueError("embedding_backend debe ser 'torch', 'onnx' u 'onnx-int8'")
+        return v
+
+    # Valida el método de reducción de dimensionalidad.
+    @field_validator("embedding_reduction", mode="before")
+    def validate_embedding_reduction(cls, v):
+        if v is None or (isinstance(v, str) and not v.strip()):
+            return None
+        if v not in ("pca", "truncate"):
+            raise ValueError("embedding_reduction debe ser 'pca' o 'truncate'")
+        return v
+
+    # Valida que embedding_reduction_dim sea un entero mayor que cero, obligatorio si hay reducción.
+    @field_validator("embedding_reduction_dim", mode="before")
+    def validate_embedding_reduction_dim(cls, v, info: ValidationInfo):
+        if v is None or (isinstance(v, str) and not v.strip()):
+            if info.data.get("embedding_reduction"):
+                raise ValueError("embedding_reduction_dim es obligatorio si embedding_reduction está activa")
+            return None
+        try:
+            value = int(v)
+        except (TypeError, ValueError):
+            raise ValueError("embedding_reduction_dim debe ser un entero")
+        if value <= 0:
+            raise ValueError("embedding_reduction_dim debe ser mayor que cero")
+        return value
+
+    # Valida que embedding_reduction_sample sea un entero mayor que cero.
+    @field_validator("embedding_reduction_sample", mode="before")
+    def validate_embedding_reduction_sample(cls, v):
+        try:
+            value = int(v)
+        except (TypeError, ValueError):
+            raise ValueError("embedding_reduction_sample debe ser un entero")
+        if value <= 0:
+            raise ValueError("embedding_reduction_sample debe ser mayor que cero")
+        return value
+
+    # Valida el modo de agregación por documento padre.
+    @field_validator("parent_aggregation", mode="before")
+    def validate_parent_aggregation(cls, v):
+        if v is None or (isinstance(v, str) and not v.strip()):
+            return None
+        if v not in ("max", "sum"):
+            raise ValueError("parent_aggregation debe ser 'max' o 'sum'")
+        return v
+
+    # Valida que parent_window sea un entero mayor o igual que -1.
+    @field_validator("parent_window", mode="before")
+    def validate_parent_window(cls, v):
+        try:
+            value = int(v)
+        except (TypeError, ValueError):
+            raise ValueError("parent_window debe ser un entero")
+        if value < -1:
+            raise ValueError("parent_window debe ser mayor o igual que -1")
+        return value
+
+    # Valida que mmr_fetch_factor sea un entero mayor o igual que uno.
+    @field_validator("mmr_fetch_factor", mode="before")
+    def validate_mmr_fetch_factor(cls, v):
+        try:
+            value = int(v)
+        except (TypeError, ValueError):
+            raise ValueError("mmr_fetch_factor debe ser un entero")
+        if value < 1:
+            raise ValueError("mmr_fetch_factor debe ser mayor o igual que uno")
+        return value
+
+    # Valida que mmr_lambda esté en el rango [0, 1].
+    @field_validator("mmr_lambda")
+    def validate_mmr_lambda(cls, v: float) -> float:
+        if not 0.0 <= v <= 1.0:
+            raise ValueError("mmr_lambda debe estar entre 0 y 1")
+        return v
+
+    # Valida la ruta de la caché persistente de embeddings (cadena vacía = desactivada).
+    @field_validator("embedding_cache_path", mode="before")
+    def validate_embedding_cache_path(cls, v):
+        if v is None or (isinstance(v, str) and not v.strip()):
+            return None
+        return v
+
+    # Valida el tipo de los vectores de la caché persistente de embeddings.
+    @field_validator("embedding_cache_dtype")
+    def validate_embedding_cache_dtype(cls, v: str) -> str:
+        if v not in ("float16", "float32"):
+            raise ValueError("embedding_cache_dtype debe ser 'float16' o 'float32'")
+        return v
+
     # Valida el campo synapcode_mode, permitiendo también valores string (por ejemplo, "true").
     @field_validator("synapcode_mode", mode="before")
     def validate_synapcode_mode(cls, v):
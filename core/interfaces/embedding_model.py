@@ -10,6 +10,8 @@ y exponer metadatos (versión, etc.).
 
 from abc import abstractmethod
 from typing import List, Any
+
+import numpy as np
 from core.interfaces.base import BaseComponent
 
 class EmbeddingModel(BaseComponent):
@@ -18,9 +20,10 @@ class EmbeddingModel(BaseComponent):
     """
 
     @abstractmethod
-    def embed(self, texts: List[str], *args, **kwargs) -> List[Any]:
+    def embed(self, texts: List[str], *args, **kwargs) -> np.ndarray:
         """
-        Convierte una lista de textos en una lista de vectores (list[list[float]] o similar).
+        Convierte una lista de textos en una matriz (len(texts), dim) float32 contigua.
+        Las listas de floats solo deben generarse en los bordes (p. ej. respuestas de una API).
         Puede incluir parámetros de configuración (modelo, batch_size, etc.) en args/kwargs.
         """
         pass
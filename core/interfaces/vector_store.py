@@ -63,13 +63,20 @@ class VectorStore(BaseComponent):
         pass
 
     @abstractmethod
-    def search(self, query_vector: List[float], k: int = 5) -> List[Dict[str, Any]]:
+    def search(
+        self,
+        query_vector: List[float],
+        k: int = 5,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Realiza una búsqueda de los k documentos más cercanos a un vector de consulta.
 
         Args:
             query_vector (List[float]): Vector que representa la búsqueda.
             k (int): Número máximo de resultados a retornar.
+            filter (dict, opcional): Restricción por metadatos aplicada ANTES de la búsqueda
+                                     (p. ej. {"tenant": "acme"}). Ver utils/metadata_index.py.
 
         Returns:
             List[Dict[str, Any]]: Lista de documentos encontrados, cada uno con sus claves ("id", "texto", "metadata", etc.).
@@ -80,6 +87,8 @@ class VectorStore(BaseComponent):
     def reindex(self) -> None:
         """
         Reconstituye o recrea el índice interno, en caso de que se necesite una reindexación completa.
+        Las implementaciones deberían construir la nueva generación sin dejar de servir consultas y
+        publicarla de forma atómica (ver scalability/reindexer.py).
 
         Raises:
             RuntimeError: Si ocurre un error en la recreación del índice.
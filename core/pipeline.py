@@ -1,13 +1,21 @@
+import asyncio
+import inspect
 import logging
 import os
 import json
 import glob
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
+
+import numpy as np
 
 from core.config import get_config
 from core.loader import load_all_adapters
 from core.service_detector import check_service_availability
-from utils.cache_manager import get_cache, set_cache
+from utils.dim_reduction import DimensionReducer
+from utils.disk_embedding_cache import install_disk_embedding_cache
+from utils.adaptive_k import adaptive_k
+from utils.mmr import mmr_rerank
+from scalability.reindexer import register_store
 # Se asume que utils/logger.py expone un logger configurado
 from utils.logger import logger
 
@@ -31,6 +39,10 @@ class RAGPipeline:
         self.adapters = load_all_adapters()  # Diccionario con adaptadores por categorías.
         self.logger = logger  # Se utiliza el logger centralizado.
         self.pre_rag_json = None  # Aquí se guardará el JSON consolidado del pre-RAG.
+        self._reducer = None  # Reducción de dimensionalidad ajustada (utils/dim_reduction.py).
+        if self.config.embedding_cache_path:
+            # Caché de embeddings persistente: los reinicios y las réplicas no vuelven a vectorizar
+            install_disk_embedding_cache(self.config.embedding_cache_path, self.config.embedding_cache_dtype)
 
     def preprocess(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -66,80 +78,336 @@ class RAGPipeline:
             self.logger.error(f"Error en load_data: {e}")
             raise
 
-    def compute_embeddings(self, texts: List[str]) -> List[Any]:
+    def embedder_id(self) -> str:
+        """
+        Identificador del embedder configurado: "adaptador" o "adaptador:modelo" si embedding_model está definido.
+        """
+        model = self.config.embedding_model
+        return f"{self.config.embedder}:{model}" if model else self.config.embedder
+
+    def compute_embeddings(self, texts: List[str], embedder: Optional[str] = None) -> np.ndarray:
         """
-        Calcula los embeddings para una lista de textos usando el adaptador de embeddings configurado.
-        Se implementa caching para evitar reprocesamientos innecesarios.
+        Calcula los embeddings para una lista de textos usando el adaptador de embeddings configurado
+        (o el indicado en embedder, con el formato de embedder_id()).
+        La caché por texto (utils/embedding_cache.py) la aplica cada adaptador con una clave que incluye
+        su modelo y configuración efectivos: solo se calculan los textos nuevos y los repetidos una sola
+        vez (embedding_near_duplicates se pasa al adaptador para agrupar también los casi duplicados).
+        Retorna una matriz float32 (len(texts), dim) que se pasa tal cual a add_batch() del vector
+        store, sin listas intermedias.
         """
-        embedder_name = self.config.embedder  # Ej.: "openai_embedder"
+        embedder = embedder or self.embedder_id()
+        embedder_name, _, model = embedder.partition(":")  # Ej.: "openai_embedder"
         category = "Embeddings"
         try:
             adapter_module = self.adapters.get(category, {}).get(embedder_name)
             if not adapter_module or not hasattr(adapter_module, "embed"):
                 raise RuntimeError(f"Adaptador de embeddings '{embedder_name}' no encontrado o sin método embed()")
-            cache_key = f"embeddings:{hash(tuple(texts))}"
-            cached = get_cache(cache_key)
-            if cached:
-                self.logger.info("Embeddings recuperados de cache.")
-                return cached
-            embeddings = adapter_module.embed(texts)
-            set_cache(cache_key, embeddings)
-            return embeddings
+            embed_fn = adapter_module.embed
+            embeddings = embed_fn(list(texts), **self._embed_kwargs(embedder_name, embed_fn, model))
+            return np.asarray(embeddings, dtype="float32")
         except Exception as e:
             self.logger.error(f"Error en compute_embeddings: {e}")
             raise
 
+    async def acompute_embeddings(self, texts: List[str], embedder: Optional[str] = None) -> np.ndarray:
+        """
+        Versión asíncrona de compute_embeddings(): usa aembed() del adaptador si existe (con la misma
+        caché por texto del adaptador) y, si no, ejecuta compute_embeddings() en el threadpool.
+        """
+        embedder = embedder or self.embedder_id()
+        embedder_name, _, model = embedder.partition(":")
+        adapter_module = self.adapters.get("Embeddings", {}).get(embedder_name)
+        aembed_fn = getattr(adapter_module, "aembed", None)
+        if aembed_fn is None:
+            return await asyncio.to_thread(self.compute_embeddings, texts, embedder)
+        try:
+            embeddings = await aembed_fn(list(texts), **self._embed_kwargs(embedder_name, aembed_fn, model))
+            return np.asarray(embeddings, dtype="float32")
+        except Exception as e:
+            self.logger.error(f"Error en acompute_embeddings: {e}")
+            raise
+
+    @staticmethod
+    def _model_param(embedder_name: str, embed_fn: Any) -> str:
+        """
+        Nombre del parámetro de embed() que selecciona el modelo ("model_name" o "model").
+        """
+        parameters = inspect.signature(embed_fn).parameters
+        for name in ("model_name", "model"):
+            if name in parameters:
+                return name
+        raise RuntimeError(f"El adaptador de embeddings '{embedder_name}' no admite seleccionar el modelo.")
+
+    def _embed_kwargs(self, embedder_name: str, embed_fn: Any, model: str) -> Dict[str, Any]:
+        """
+        Argumentos de embed()/aembed(): el modelo del embedder (si se indica), y near_duplicates y el
+        backend configurado (embedding_backend) si el adaptador los admite.
+        """
+        kwargs = {}
+        if model:
+            kwargs[self._model_param(embedder_name, embed_fn)] = model
+        parameters = inspect.signature(embed_fn).parameters
+        if "near_duplicates" in parameters:
+            kwargs["near_duplicates"] = self.config.embedding_near_duplicates
+        if self.config.embedding_backend and "backend" in parameters:
+            kwargs["backend"] = self.config.embedding_backend
+        return kwargs
+
+    def _bind_collection(self, adapter_vs: Any, embeddings: Any) -> None:
+        """
+        Registra en la colección el embedder con el que se indexa (la primera vez) o verifica que
+        coincida con el registrado: mezclar vectores de modelos distintos corrompe las búsquedas.
+        """
+        recorded = getattr(adapter_vs, "embedder", None)
+        embedder = self.embedder_id()
+        if isinstance(recorded, str):
+            if recorded != embedder:
+                raise RuntimeError(
+                    f"La colección se indexó con el embedder '{recorded}' y se intenta agregar vectores de '{embedder}'."
+                )
+        elif recorded is None and hasattr(adapter_vs, "embedder"):
+            adapter_vs.embedder = embedder
+            self.logger.info(f"Colección asociada al embedder '{embedder}' (dim={np.shape(embeddings)[-1]}).")
+
+    def _collection_embedder(self, adapter_vs: Any) -> str:
+        """
+        Embedder con el que se vectorizan las consultas a una colección: el registrado en ella o el configurado.
+        """
+        recorded = getattr(adapter_vs, "embedder", None)
+        return recorded if isinstance(recorded, str) else self.embedder_id()
+
+    def reduce_embeddings(self, embeddings: Any, fit: bool = False) -> Any:
+        """
+        Etapa opcional entre compute_embeddings() y store_vectors(): reduce la dimensión de los
+        vectores con la transformación de embedding_reduction ("pca" o "truncate").
+        La transformación se toma del vector store (si ya tiene una), de embedding_reduction_path o,
+        con fit=True (ingesta), se ajusta con los propios vectores y se persiste en esa ruta. Las
+        consultas usan siempre la misma transformación que los documentos indexados.
+        """
+        if not self.config.embedding_reduction:
+            return embeddings
+        adapter_vs = self.vector_store()
+        reducer = self._get_reducer(adapter_vs, embeddings if fit else None)
+        return reducer.transform(embeddings)
+
+    def _get_reducer(self, adapter_vs: Any, fit_vectors: Any) -> DimensionReducer:
+        recorded = getattr(adapter_vs, "reducer", None)
+        if isinstance(recorded, DimensionReducer):
+            return recorded
+        if self._reducer is None:
+            method, dim = self.config.embedding_reduction, self.config.embedding_reduction_dim
+            path = self.config.embedding_reduction_path
+            if path and os.path.exists(path):
+                reducer = DimensionReducer.load(path)
+                if (reducer.method, reducer.dim) != (method, dim):
+                    raise RuntimeError(
+                        f"La reducción guardada en '{path}' ({reducer.method}, {reducer.dim}) no coincide "
+                        f"con la configurada ({method}, {dim})."
+                    )
+            elif fit_vectors is not None:
+                reducer = DimensionReducer(method, dim).fit(fit_vectors, sample_size=self.config.embedding_reduction_sample)
+                if path:
+                    reducer.save(path)
+                self.logger.info(f"Reducción de dimensionalidad ajustada: {reducer.describe()}.")
+            else:
+                raise RuntimeError(
+                    "La reducción de dimensionalidad no está ajustada: indexa documentos primero o "
+                    "configura embedding_reduction_path."
+                )
+            self._reducer = reducer
+        if recorded is None and hasattr(adapter_vs, "reducer"):
+            # Se guarda junto al índice (p. ej. en los snapshots de NumpyStore)
+            adapter_vs.reducer = self._reducer
+        return self._reducer
+
+    def vector_store(self) -> Any:
+        """
+        Retorna el adaptador de vector store configurado. Si admite reindexación (reindex() y
+        reindex_status()), queda registrado con su nombre para /admin/reindex (scalability/reindexer.py).
+        """
+        vs_name = self.config.vector_store
+        adapter_vs = self.adapters.get("VectorStores", {}).get(vs_name)
+        if hasattr(adapter_vs, "reindex") and hasattr(adapter_vs, "reindex_status"):
+            register_store(vs_name, adapter_vs)
+        return adapter_vs
+
     def store_vectors(self, documents: List[Dict[str, Any]], embeddings: List[Any]) -> None:
         """
         Inserta cada documento junto a su vector en el adaptador de vector store configurado.
+        La colección registra el embedder de sus vectores; la dimensión la valida el propio store.
         """
         vs_name = self.config.vector_store  # Ej.: "faiss_store"
-        category = "VectorStores"
         try:
-            adapter_module = self.adapters.get(category, {}).get(vs_name)
+            adapter_module = self.vector_store()
             if not adapter_module or not hasattr(adapter_module, "add"):
                 raise RuntimeError(f"Adaptador de vector store '{vs_name}' no encontrado o sin método add()")
-            for doc, emb in zip(documents, embeddings):
-                adapter_module.add(doc, emb)
+            self._bind_collection(adapter_module, embeddings)
+            if hasattr(adapter_module, "add_batch"):
+                # Una sola escritura en el índice: las búsquedas concurrentes esperan menos
+                adapter_module.add_batch(documents, embeddings)
+            else:
+                for doc, emb in zip(documents, embeddings):
+                    adapter_module.add(doc, emb)
             self.logger.info("Documentos indexados correctamente.")
         except Exception as e:
             self.logger.error(f"Error en store_vectors: {e}")
             raise
 
-    def retrieve_and_generate(self, query: str) -> str:
+    def retrieve(self, adapter_vs: Any, query_embedding: Any) -> List[Dict[str, Any]]:
         """
-        Realiza la búsqueda vectorial y genera una respuesta utilizando el LLM configurado.
-        Verifica previamente la disponibilidad de los servicios requeridos.
+        Recupera hasta search_k documentos para el embedding de la consulta.
+          - Con parent_aggregation (y search_parents() en el vector store), los chunks se agregan por
+            documento padre y se retorna el padre o una ventana de parent_window chunks alrededor del mejor.
+          - Con mmr_enabled (y search_with_vectors() en el vector store), se recuperan
+            search_k * mmr_fetch_factor candidatos y se seleccionan search_k diversos con MMR.
+          - Con un umbral y/o adaptive_k_enabled (y range_search() en el vector store), se
+            descartan los documentos fuera del umbral y se corta en el mayor salto de puntuación,
+            de modo que el número de pasajes sigue a la relevancia (search_k actúa como máximo).
+            El umbral es search_threshold (distancia máxima) o, en stores de producto interno
+            (metric "ip"), search_min_similarity (similitud mínima).
+        """
+        k = self.config.search_k
+        if self.config.parent_aggregation and hasattr(adapter_vs, "search_parents"):
+            window = None if self.config.parent_window < 0 else self.config.parent_window
+            return adapter_vs.search_parents(
+                query_embedding, k, aggregate=self.config.parent_aggregation, window=window
+            )
+        if self.config.mmr_enabled and hasattr(adapter_vs, "search_with_vectors"):
+            candidates, vectors = adapter_vs.search_with_vectors(query_embedding, k * self.config.mmr_fetch_factor)
+            if vectors is None or len(candidates) != len(vectors):
+                self.logger.warning("Vectores no disponibles para MMR; se usa el orden por similitud.")
+                return candidates[:k]
+            selected = mmr_rerank(query_embedding, candidates, vectors, k, self.config.mmr_lambda)
+            self.logger.info(f"MMR: {len(selected)} documentos seleccionados de {len(candidates)} candidatos.")
+            return selected
+
+        higher_is_better = getattr(adapter_vs, "metric", "l2") == "ip"
+        threshold = self._range_threshold(higher_is_better)
+        if (threshold is None and not self.config.adaptive_k_enabled) or not hasattr(adapter_vs, "range_search"):
+            return adapter_vs.search(query_embedding, k)
+        results, scores = adapter_vs.range_search(query_embedding, threshold=threshold, k_max=k)
+        if self.config.adaptive_k_enabled:
+            keep = adaptive_k(
+                scores,
+                min_k=self.config.adaptive_k_min,
+                max_k=k,
+                min_gap=self.config.adaptive_k_min_gap,
+                higher_is_better=higher_is_better
+            )
+            results = results[:keep]
+        self.logger.info(f"Recuperación por relevancia: {len(results)} de un máximo de {k} documentos.")
+        return results
+
+    def _range_threshold(self, higher_is_better: bool) -> Optional[float]:
+        """
+        Umbral de range_search() en la escala del vector store: distancia máxima (search_threshold) o,
+        si las puntuaciones son similitudes, similitud mínima (search_min_similarity). El campo de la
+        otra escala no se aplica.
+        """
+        used, ignored = ("search_min_similarity", "search_threshold") if higher_is_better else (
+            "search_threshold", "search_min_similarity"
+        )
+        if getattr(self.config, ignored) is not None:
+            self.logger.warning(
+                f"{ignored} no se aplica a este vector store (métrica {'ip' if higher_is_better else 'de distancia'}); "
+                f"se usa {used}."
+            )
+        return getattr(self.config, used)
+
+    def _generation_adapters(self):
+        """
+        Verifica la disponibilidad de los servicios y retorna (adaptador de vector store, adaptador LLM).
         """
         vs_name = self.config.vector_store
         llm_name = self.config.llm
-        category_vs = "VectorStores"
         category_llm = "LLMs"
 
+        if not check_service_availability(vs_name):
+            raise RuntimeError(f"Servicio vector store '{vs_name}' no disponible.")
+        if not check_service_availability(llm_name):
+            raise RuntimeError(f"Servicio LLM '{llm_name}' no disponible.")
+
+        adapter_vs = self.vector_store()
+        if not adapter_vs or not hasattr(adapter_vs, "search"):
+            raise RuntimeError(f"Adaptador de vector store '{vs_name}' no encontrado o sin método search()")
+        adapter_llm = self.adapters.get(category_llm, {}).get(llm_name)
+        if not adapter_llm or not hasattr(adapter_llm, "generate"):
+            raise RuntimeError(f"Adaptador LLM '{llm_name}' no encontrado o sin método generate()")
+        return adapter_vs, adapter_llm
+
+    def _build_prompt(self, query: str, adapter_vs: Any, query_embedding: Any) -> str:
+        """
+        Recupera el contexto de la consulta y construye el prompt. El andamiaje y cada documento
+        terminan en salto de línea: son los puntos de corte de la caché de prefijos del modelo local
+        (adapters/LLMs/local_llm_generator.py), así que las consultas que recuperan los mismos primeros
+        documentos reutilizan su prefill.
+        """
+        query_embedding = self.reduce_embeddings(query_embedding)[0]
+        results = self.retrieve(adapter_vs, query_embedding)
+        context = "".join(f"{doc.get('texto', '')}\n" for doc in results)
+        return f"Contexto:\n{context}Consulta: {query}"
+
+    def _prepare_generation(self, query: str):
+        """
+        Verifica los servicios, recupera el contexto de la consulta y construye el prompt.
+        Retorna (prompt, adaptador LLM).
+        """
+        adapter_vs, adapter_llm = self._generation_adapters()
+        # Calcular embedding del query con el embedder de la colección
+        query_embedding = self.compute_embeddings([query], embedder=self._collection_embedder(adapter_vs))
+        return self._build_prompt(query, adapter_vs, query_embedding), adapter_llm
+
+    async def aretrieve_and_generate(self, query: str) -> str:
+        """
+        Versión asíncrona de retrieve_and_generate(): la consulta se vectoriza con aembed() y la
+        respuesta se genera con agenerate() cuando los adaptadores los implementan (utils/openai_client.py),
+        de modo que las llamadas a la API no ocupan un hilo por petición. Los adaptadores solo síncronos
+        se ejecutan en el threadpool.
+        """
+        try:
+            adapter_vs, adapter_llm = self._generation_adapters()
+            query_embedding = await self.acompute_embeddings([query], embedder=self._collection_embedder(adapter_vs))
+            prompt = self._build_prompt(query, adapter_vs, query_embedding)
+            agenerate = getattr(adapter_llm, "agenerate", None)
+            if agenerate is not None:
+                return await agenerate(prompt)
+            return await asyncio.to_thread(adapter_llm.generate, prompt)
+        except Exception as e:
+            self.logger.error(f"Error en aretrieve_and_generate: {e}")
+            raise
+
+    def retrieve_and_generate(self, query: str) -> str:
+        """
+        Realiza la búsqueda vectorial y genera una respuesta utilizando el LLM configurado.
+        Verifica previamente la disponibilidad de los servicios requeridos.
+        """
         try:
-            if not check_service_availability(vs_name):
-                raise RuntimeError(f"Servicio vector store '{vs_name}' no disponible.")
-            if not check_service_availability(llm_name):
-                raise RuntimeError(f"Servicio LLM '{llm_name}' no disponible.")
-
-            adapter_vs = self.adapters.get(category_vs, {}).get(vs_name)
-            if not adapter_vs or not hasattr(adapter_vs, "search"):
-                raise RuntimeError(f"Adaptador de vector store '{vs_name}' no encontrado o sin método search()")
-            # Calcular embedding del query
-            query_embedding = self.compute_embeddings([query])[0]
-            results = adapter_vs.search(query_embedding, self.config.search_k)
-            context = " ".join([doc.get("texto", "") for doc in results])
-            prompt = f"Contexto: {context}\nConsulta: {query}"
-
-            adapter_llm = self.adapters.get(category_llm, {}).get(llm_name)
-            if not adapter_llm or not hasattr(adapter_llm, "generate"):
-                raise RuntimeError(f"Adaptador LLM '{llm_name}' no encontrado o sin método generate()")
+            prompt, adapter_llm = self._prepare_generation(query)
             response = adapter_llm.generate(prompt)
             return response
         except Exception as e:
             self.logger.error(f"Error en retrieve_and_generate: {e}")
             raise
 
+    def retrieve_and_generate_stream(self, query: str, cancel_event=None) -> Iterator[str]:
+        """
+        Igual que retrieve_and_generate, pero produce la respuesta por fragmentos con generate_stream()
+        del adaptador LLM. Si el adaptador no soporta streaming, produce la respuesta completa de una vez.
+
+        cancel_event (threading.Event) se pasa al adaptador para que deje de generar cuando el cliente
+        se desconecta.
+        """
+        try:
+            prompt, adapter_llm = self._prepare_generation(query)
+            stream = getattr(adapter_llm, "generate_stream", None)
+            if stream is None:
+                yield adapter_llm.generate(prompt)
+                return
+            yield from stream(prompt, cancel_event=cancel_event)
+        except Exception as e:
+            self.logger.error(f"Error en retrieve_and_generate_stream: {e}")
+            raise
+
     def process_pre_rag(self, project_path: str) -> Dict[str, Any]:
         """
         Procesa el pre‑RAG extrayendo información del proyecto mediante los “vagones” que generan JSON.
@@ -164,6 +432,19 @@ class RAGPipeline:
             raise
         return consolidated
 
+    def index_documents(self, project_path: str = None) -> None:
+        """
+        Carga los documentos (tras el pre-RAG opcional), calcula sus embeddings y los indexa.
+        """
+        if project_path:
+            self.process_pre_rag(project_path)
+        documents = self.load_data()
+        if not documents:
+            raise RuntimeError("No se cargaron documentos para procesar.")
+        texts = [doc.get("texto", "") for doc in documents]
+        embeddings = self.reduce_embeddings(self.compute_embeddings(texts), fit=True)
+        self.store_vectors(documents, embeddings)
+
     def run(self, query: str, project_path: str = None) -> str:
         """
         Ejecuta el pipeline completo.
@@ -174,20 +455,36 @@ class RAGPipeline:
         Retorna la respuesta generada por el sistema RAG.
         """
         try:
-            if project_path:
-                self.process_pre_rag(project_path)
-            documents = self.load_data()
-            if not documents:
-                raise RuntimeError("No se cargaron documentos para procesar.")
-            texts = [doc.get("texto", "") for doc in documents]
-            embeddings = self.compute_embeddings(texts)
-            self.store_vectors(documents, embeddings)
+            self.index_documents(project_path)
             response = self.retrieve_and_generate(query)
             return response
         except Exception as e:
             self.logger.error(f"Error en la ejecución del pipeline: {e}")
             raise
 
+    async def arun(self, query: str, project_path: str = None) -> str:
+        """
+        Versión asíncrona de run(): la indexación (carga y cómputo local) se ejecuta en el threadpool y la
+        generación usa aretrieve_and_generate().
+        """
+        try:
+            await asyncio.to_thread(self.index_documents, project_path)
+            return await self.aretrieve_and_generate(query)
+        except Exception as e:
+            self.logger.error(f"Error en la ejecución del pipeline: {e}")
+            raise
+
+    def run_stream(self, query: str, project_path: str = None, cancel_event=None) -> Iterator[str]:
+        """
+        Ejecuta el pipeline completo produciendo la respuesta por fragmentos (ver retrieve_and_generate_stream).
+        """
+        try:
+            self.index_documents(project_path)
+            yield from self.retrieve_and_generate_stream(query, cancel_event=cancel_event)
+        except Exception as e:
+            self.logger.error(f"Error en la ejecución del pipeline: {e}")
+            raise
+
 # Ejecución cuando se invoque este script directamente.
 if __name__ == "__main__":
     import sys
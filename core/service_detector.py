@@ -18,7 +18,7 @@ def check_service_availability(service_name: str) -> bool:
     
       - Para servicios basados en OpenAI (por ejemplo, 'openai', 'openai_generator', 'openai_embedder'),
         se verifica que la variable de entorno OPENAI_API_KEY esté definida.
-      - Para adaptadores de vector store (por ejemplo, 'faiss_store', 'chroma_store'), se asume que
+      - Para adaptadores de vector store (por ejemplo, 'faiss_store', 'chroma_store', 'numpy_store'), se asume que
         si la librería está instalada, el servicio es local y está disponible.
       - Para generadores locales (por ejemplo, 'local_llm_generator', 'gguf'),
         se comprueba que la variable de entorno GGUF_MODEL_PATH esté definida y apunte a un archivo existente.
@@ -42,7 +42,7 @@ def check_service_availability(service_name: str) -> bool:
                 return False
             return True
 
-        elif service in {"faiss_store", "chroma_store"}:
+        elif service in {"faiss_store", "chroma_store", "numpy_store"}:
             # Se asume que la instalación local de la librería implica disponibilidad.
             return True
 
@@ -0,0 +1,235 @@
+"""
+reindexer.py – Reindexación Blue/Green en Segundo Plano para los Vector Stores
+
+Este módulo permite reconstruir el índice de un vector store (nuevo tipo de índice, re-embedding
+con otro modelo, etc.) sin tiempo de inactividad:
+  - La nueva generación se construye en un hilo en segundo plano a partir del docstore o de la fuente.
+  - Mientras tanto, las consultas siguen sirviéndose desde la generación actual.
+  - Al terminar, el store intercambia ambas generaciones de forma atómica.
+
+Características:
+  - ReindexJob: ejecuta la construcción en segundo plano, impide reindexaciones simultáneas sobre
+    el mismo store y expone el progreso (estado, procesados/total, porcentaje, errores, tiempos).
+  - Registro de stores activos (register_store / get_registered_stores) para que la API de
+    administración pueda disparar reindexaciones y consultar su progreso. RAGPipeline registra el
+    vector store configurado (si admite reindexación) al resolverlo.
+"""
+
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("RAGLogger")
+logger.setLevel(logging.DEBUG)
+
+DEFAULT_REINDEX_BATCH_SIZE = 4096
+
+
+class ReindexState:
+    IDLE = "idle"
+    BUILDING = "building"
+    SWAPPING = "swapping"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class ReindexJob:
+    """
+    Ejecuta la construcción de una nueva generación de índice y reporta su progreso.
+
+    La función de construcción recibe un callback `report(processed, total, state=None)` y es
+    responsable de realizar el intercambio atómico al final (lo que suele requerir el lock del store).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._status: Dict[str, Any] = {
+            "store": name,
+            "state": ReindexState.IDLE,
+            "generation": 0,
+            "processed": 0,
+            "total": 0,
+            "progress": 0.0,
+            "error": None,
+            "started_at": None,
+            "finished_at": None,
+        }
+
+    @property
+    def running(self) -> bool:
+        with self._lock:
+            return self._status["state"] in (ReindexState.BUILDING, ReindexState.SWAPPING)
+
+    def start(self, build_fn: Callable[[Callable], Any], background: bool = True) -> Dict[str, Any]:
+        """
+        Inicia la reindexación.
+
+        Args:
+            build_fn (Callable): Función build_fn(report) que construye la nueva generación y la intercambia.
+            background (bool): Si True, se ejecuta en un hilo daemon; si False, de forma síncrona.
+
+        Returns:
+            dict: Estado inicial (o final, si background=False).
+
+        Raises:
+            RuntimeError: Si ya hay una reindexación en curso para este store.
+        """
+        with self._lock:
+            if self._status["state"] in (ReindexState.BUILDING, ReindexState.SWAPPING):
+                raise RuntimeError(f"Ya hay una reindexación en curso para '{self.name}'.")
+            self._status.update({
+                "state": ReindexState.BUILDING,
+                "generation": self._status["generation"] + 1,
+                "processed": 0,
+                "total": 0,
+                "progress": 0.0,
+                "error": None,
+                "started_at": time.time(),
+                "finished_at": None,
+            })
+        logger.info(f"Reindexación de '{self.name}' iniciada (generación {self._status['generation']}).")
+
+        if background:
+            self._thread = threading.Thread(target=self._run, args=(build_fn,), name=f"reindex-{self.name}", daemon=True)
+            self._thread.start()
+        else:
+            self._run(build_fn)
+        return self.status()
+
+    def _run(self, build_fn: Callable[[Callable], Any]) -> None:
+        try:
+            build_fn(self.report)
+            with self._lock:
+                self._status["state"] = ReindexState.DONE
+                self._status["progress"] = 1.0
+                self._status["finished_at"] = time.time()
+            logger.info(f"Reindexación de '{self.name}' completada y publicada.")
+        except Exception as e:
+            with self._lock:
+                self._status["state"] = ReindexState.FAILED
+                self._status["error"] = str(e)
+                self._status["finished_at"] = time.time()
+            logger.error(f"Reindexación de '{self.name}' fallida; se mantiene la generación actual: {e}")
+
+    def report(self, processed: int, total: int, state: Optional[str] = None) -> None:
+        """
+        Callback de progreso para la función de construcción.
+        """
+        with self._lock:
+            self._status["processed"] = processed
+            self._status["total"] = total
+            self._status["progress"] = (processed / total) if total else 0.0
+            if state:
+                self._status["state"] = state
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Retorna una copia del estado actual de la reindexación.
+        """
+        with self._lock:
+            return dict(self._status)
+
+    def wait(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Espera a que termine la reindexación en segundo plano (útil en tests y scripts).
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.status()
+
+
+# ============================
+# REGISTRO DE STORES ACTIVOS
+# ============================
+_REGISTRY_LOCK = threading.Lock()
+_STORES: Dict[str, Any] = {}
+
+
+def register_store(name: str, store: Any) -> None:
+    """
+    Registra una instancia de vector store para que pueda reindexarse desde la API de administración.
+    El store debe exponer reindex(**opciones) y reindex_status().
+    """
+    if not hasattr(store, "reindex") or not hasattr(store, "reindex_status"):
+        raise ValueError(f"El store '{name}' no soporta reindexación (faltan reindex()/reindex_status()).")
+    with _REGISTRY_LOCK:
+        if _STORES.get(name) is store:
+            return
+        _STORES[name] = store
+    logger.info(f"Vector store '{name}' registrado para reindexación.")
+
+
+def unregister_store(name: str) -> None:
+    with _REGISTRY_LOCK:
+        _STORES.pop(name, None)
+
+
+def get_registered_stores() -> List[str]:
+    with _REGISTRY_LOCK:
+        return list(_STORES.keys())
+
+
+def get_store(name: str) -> Any:
+    """
+    Raises:
+        KeyError: Si no hay ningún store registrado con ese nombre.
+    """
+    with _REGISTRY_LOCK:
+        if name not in _STORES:
+            raise KeyError(f"Vector store '{name}' no registrado.")
+        return _STORES[name]
+
+
+def start_reindex(name: str, reembed: bool = False, **options) -> Dict[str, Any]:
+    """
+    Dispara la reindexación en segundo plano de un store registrado.
+
+    Args:
+        name (str): Nombre con el que se registró el store.
+        reembed (bool): Si True, los textos se vuelven a vectorizar con el embedder configurado, que
+                        se registra en la nueva generación.
+        **options: Opciones específicas del store (p. ej. index_factory para FAISS).
+
+    Returns:
+        dict: Estado inicial de la reindexación.
+    """
+    store = get_store(name)
+    if reembed:
+        options["embedder"], options["embed_fn"] = configured_embedder()
+    return store.reindex(**options)
+
+
+def get_reindex_status(name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Retorna el progreso de la reindexación de un store, o de todos los registrados si name es None.
+    """
+    if name is not None:
+        return get_store(name).reindex_status()
+    with _REGISTRY_LOCK:
+        stores = dict(_STORES)
+    return {store_name: store.reindex_status() for store_name, store in stores.items()}
+
+
+def configured_embedder(pipeline=None) -> Tuple[str, Callable[[List[str]], Any]]:
+    """
+    Retorna (identificador, función embed(texts)) del embedder configurado en core/config.py, con el
+    mismo formato "adaptador[:modelo]" que RAGPipeline registra en las colecciones.
+    Los vectores pasan por la reducción de dimensionalidad del pipeline (embedding_reduction), igual
+    que en la ingesta y en las consultas: la nueva generación queda en la dimensión de las consultas.
+
+    Args:
+        pipeline (RAGPipeline, opcional): Pipeline cuyo embedder y reducción se usan (por defecto, uno nuevo).
+    """
+    if pipeline is None:
+        from core.pipeline import RAGPipeline
+
+        pipeline = RAGPipeline()
+    embedder = pipeline.embedder_id()
+
+    def embed(texts: List[str]) -> Any:
+        return pipeline.reduce_embeddings(pipeline.compute_embeddings(texts, embedder=embedder))
+
+    return embedder, embed
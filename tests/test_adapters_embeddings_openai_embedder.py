@@ -15,7 +15,7 @@ class DummyResponse:
             return self.data
         raise KeyError(key)
 
-def dummy_embedding_create(input, model):
+def dummy_embedding_create(input, model, **kwargs):
     """
     Función dummy para simular openai.Embedding.create.
     Retorna un embedding simple basado en la longitud del texto.
@@ -44,11 +44,11 @@ def test_embed_success(monkeypatch):
     texts = ["Hola", "Mundo"]
     embeddings = openai_embedder.embed(texts, model="text-embedding-ada-002", cache_ttl=3600)
     # Verificar que se generen embeddings; cada embedding es una lista de 5 elementos con el valor len(text)
-    assert embeddings == [[4.0, 4.0, 4.0, 4.0, 4.0], [5.0, 5.0, 5.0, 5.0, 5.0]]
+    assert embeddings.tolist() == [[4.0, 4.0, 4.0, 4.0, 4.0], [5.0, 5.0, 5.0, 5.0, 5.0]]
     
     # Verificar que al llamar nuevamente se use la caché
     embeddings_cached = openai_embedder.embed(texts, model="text-embedding-ada-002", cache_ttl=3600)
-    assert embeddings_cached == embeddings
+    assert embeddings_cached.tolist() == embeddings.tolist()
 
 def test_embed_without_api_key(monkeypatch):
     monkeypatch.delenv("OPENAI_API_KEY", raising=False)
@@ -67,3 +67,74 @@ def test_embed_api_error(monkeypatch):
     texts = ["Error"]
     with pytest.raises(RuntimeError, match="Error generando embeddings:"):
         openai_embedder.embed(texts)
+
+def test_token_bounded_batches():
+    texts = ["a" * 30, "b" * 30, "c" * 30, "d" * 300]
+    batches = openai_embedder.token_bounded_batches(texts, max_batch_size=2, max_batch_tokens=50)
+    assert [i for b in batches for i in b] == [0, 1, 2, 3]
+    assert all(len(b) <= 2 for b in batches)
+    # El texto largo supera el límite de tokens y va en su propio lote
+    assert batches[-1] == [3]
+
+def test_embed_concurrent_batches_keep_order_and_retry(monkeypatch):
+    import threading
+    from openai.error import RateLimitError
+    monkeypatch.setenv("OPENAI_API_KEY", "test_api_key")
+    monkeypatch.setattr(openai_embedder.time, "sleep", lambda s: None)
+    calls = []
+    failed_once = set()
+    lock = threading.Lock()
+
+    def flaky_create(input, model, **kwargs):
+        with lock:
+            calls.append(list(input))
+            if input[0] not in failed_once:
+                failed_once.add(input[0])
+                raise RateLimitError("límite de peticiones")
+        # Respuesta desordenada con "index", como la API real
+        data = [{"embedding": [float(len(t))] * 3, "index": i} for i, t in enumerate(input)]
+        return {"data": list(reversed(data))}
+
+    monkeypatch.setattr(openai_embedder, "openai", type("dummy", (), {"Embedding": type("DummyEmbedding", (), {"create": staticmethod(flaky_create)})}))
+    texts = ["x" * n for n in range(1, 11)]
+    embeddings = openai_embedder.embed(texts, max_batch_size=3, max_workers=4)
+    assert embeddings.tolist() == [[float(n)] * 3 for n in range(1, 11)]
+    # 4 lotes, cada uno falla una vez y se reintenta individualmente
+    assert len(calls) == 8
+
+def test_embed_gives_up_after_retries(monkeypatch):
+    from openai.error import RateLimitError
+    monkeypatch.setenv("OPENAI_API_KEY", "test_api_key")
+    monkeypatch.setattr(openai_embedder.time, "sleep", lambda s: None)
+    def always_limited(input, model, **kwargs):
+        raise RateLimitError("límite de peticiones")
+    monkeypatch.setattr(openai_embedder, "openai", type("dummy", (), {"Embedding": type("DummyEmbedding", (), {"create": staticmethod(always_limited)})}))
+    with pytest.raises(RuntimeError, match="Error generando embeddings:"):
+        openai_embedder.embed(["a", "b"], retries=2)
+
+
+class DummyAsyncClient:
+    """Cliente asíncrono dummy que simula utils.openai_client.AsyncOpenAIClient."""
+    def __init__(self):
+        self.batches = []
+
+    async def embedding(self, retries=3, backoff_factor=2.0, input=None, model=None):
+        self.batches.append(list(input))
+        return DummyResponse([[float(len(text))] * 3 for text in input])
+
+def test_aembed_sends_batches_as_coroutines(monkeypatch):
+    import asyncio
+    monkeypatch.setenv("OPENAI_API_KEY", "test_api_key")
+    client = DummyAsyncClient()
+    texts = ["a", "bb", "ccc", "bb", "dddd"]
+    result = asyncio.run(openai_embedder.aembed(texts, max_batch_size=2, client=client))
+    assert result[:, 0].tolist() == [1.0, 2.0, 3.0, 2.0, 4.0]
+    assert client.batches == [["a", "bb"], ["ccc", "dddd"]]
+    # La caché por texto es la misma que la del camino síncrono
+    assert openai_embedder.embed(["ccc"], model="text-embedding-ada-002").tolist() == [[3.0] * 3]
+
+def test_aembed_without_api_key(monkeypatch):
+    import asyncio
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with pytest.raises(RuntimeError, match="OPENAI_API_KEY no está configurada"):
+        asyncio.run(openai_embedder.aembed(["a"], client=DummyAsyncClient()))
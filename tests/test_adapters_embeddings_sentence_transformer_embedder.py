@@ -11,12 +11,15 @@ sentence_transformer_embedder.py, cubriendo:
 
 import pytest
 import os
+import json
+import numpy as np
 import time
 import threading
 from unittest.mock import patch, MagicMock
 
 from adapters.Embeddings import sentence_transformer_embedder
 from utils.cache_manager import _cache  # para limpiar la cache entre tests
+from utils.model_registry import ModelRegistry
 
 @pytest.fixture
 def clear_cache():
@@ -57,6 +60,11 @@ def mock_model(monkeypatch):
     # Para simular la función SentenceTransformer(...) que retorna fake_model
     mock_transformer = MagicMock(return_value=fake_model)
     monkeypatch.setattr("adapters.Embeddings.sentence_transformer_embedder.SentenceTransformer", mock_transformer)
+    # Registro de modelos vacío en cada test
+    monkeypatch.setattr(
+        sentence_transformer_embedder, "_model_registry",
+        ModelRegistry(sentence_transformer_embedder._create_backend_model)
+    )
 
 def test_create_sentence_transformer_embedder():
     result = sentence_transformer_embedder.create()
@@ -67,8 +75,8 @@ def test_embed_simple(mock_availability, mock_model, clear_cache):
     emb = sentence_transformer_embedder.embed(texts, enable_chunking=False)
     assert len(emb) == 2
     # Cada embedding es de dimensión 3, con un valor = len(text)
-    assert emb[0] == [4.0, 4.0, 4.0]
-    assert emb[1] == [5.0, 5.0, 5.0]
+    assert emb.dtype == np.float32 and emb.flags["C_CONTIGUOUS"]
+    assert emb.tolist() == [[4.0, 4.0, 4.0], [5.0, 5.0, 5.0]]
 
 def test_embed_with_chunking(mock_availability, mock_model, clear_cache):
     # Texto muy largo (más de chunk_size)
@@ -92,7 +100,7 @@ def test_cache_mechanism(mock_availability, mock_model, clear_cache):
     emb1 = sentence_transformer_embedder.embed(texts)
     # Segunda vez -> caché
     emb2 = sentence_transformer_embedder.embed(texts)
-    assert emb1 == emb2
+    assert np.array_equal(emb1, emb2)
 
 def test_concurrent_load(mock_availability, mock_model, clear_cache):
     """
@@ -117,7 +125,7 @@ def test_concurrent_load(mock_availability, mock_model, clear_cache):
 
     # Todos deberían recibir el mismo resultado
     for r in results[1:]:
-        assert r == results[0]
+        assert np.array_equal(r, results[0])
 
 def test_service_unavailable(monkeypatch):
     """
@@ -128,3 +136,150 @@ def test_service_unavailable(monkeypatch):
     monkeypatch.setattr("adapters.Embeddings.sentence_transformer_embedder.check_service_availability", dummy_check)
     with pytest.raises(RuntimeError, match="no disponible"):
         sentence_transformer_embedder.embed(["Test"])
+
+def test_chunking_uses_single_encode_call(mock_availability, mock_model, clear_cache, monkeypatch):
+    texts = ["A" * 10, "BB", ""]
+    emb = sentence_transformer_embedder.embed(texts, enable_chunking=True, chunk_size=4)
+    model = sentence_transformer_embedder._load_model("all-MiniLM-L6-v2")
+    assert model.encode.call_count == 1
+    assert model.encode.call_args[0][0] == ["AAAA", "AAAA", "AA", "BB", ""]
+    assert [round(e[0], 4) for e in emb] == [3.3333, 2.0, 0.0]
+
+def test_each_model_name_loads_its_own_model(mock_availability, clear_cache, monkeypatch):
+    def fake_transformer(model_name):
+        model = MagicMock()
+        dim = 2 if model_name == "modelo-a" else 4
+        model.encode.side_effect = lambda texts, batch_size=16: [[1.0] * dim for _ in texts]
+        return model
+    monkeypatch.setattr(sentence_transformer_embedder, "SentenceTransformer", fake_transformer)
+    monkeypatch.setattr(
+        sentence_transformer_embedder, "_model_registry",
+        ModelRegistry(sentence_transformer_embedder._create_backend_model)
+    )
+    assert sentence_transformer_embedder.embed(["x"], model_name="modelo-a").shape == (1, 2)
+    assert sentence_transformer_embedder.embed(["x"], model_name="modelo-b").shape == (1, 4)
+    assert sentence_transformer_embedder._model_registry.keys() == [("modelo-a", "torch"), ("modelo-b", "torch")]
+
+def test_model_registry_evicts_under_memory_budget(mock_availability, mock_model, clear_cache, monkeypatch):
+    registry = ModelRegistry(sentence_transformer_embedder._create_backend_model, max_bytes=100, size_fn=lambda m: 60)
+    monkeypatch.setattr(sentence_transformer_embedder, "_model_registry", registry)
+    sentence_transformer_embedder.embed(["x"], model_name="modelo-a")
+    sentence_transformer_embedder.embed(["x"], model_name="modelo-b")
+    assert registry.keys() == [("modelo-b", "torch")]
+
+class FakeWorkerPool:
+    """
+    Sustituto de EmbeddingWorkerPool: una copia de 30 bytes del modelo por worker.
+    """
+    def __init__(self, model_factory, encode_fn, num_workers, threads_per_worker):
+        self.nbytes = 30 * num_workers
+        self.closed = False
+
+    def encode(self, texts, **kwargs):
+        if self.closed:
+            raise RuntimeError("El pool de embeddings está cerrado.")
+        return np.ones((len(texts), 2), dtype=np.float32)
+
+    def close(self):
+        self.closed = True
+
+def test_worker_pools_count_against_the_memory_budget(mock_availability, clear_cache, monkeypatch):
+    monkeypatch.setattr(sentence_transformer_embedder, "EmbeddingWorkerPool", FakeWorkerPool)
+    registry = ModelRegistry(
+        sentence_transformer_embedder._create_backend_model, max_bytes=100,
+        on_evict=sentence_transformer_embedder._release_model
+    )
+    monkeypatch.setattr(sentence_transformer_embedder, "_model_registry", registry)
+    pool_a = sentence_transformer_embedder.get_worker_pool("modelo-a", num_workers=2)
+    assert registry.total_bytes == 60
+    assert sentence_transformer_embedder.embed(["x"], model_name="modelo-b", num_workers=2).shape == (1, 2)
+    # El pool de modelo-a se expulsa por presupuesto y sus procesos se detienen
+    assert registry.keys() == [("modelo-b", "torch", 2, sentence_transformer_embedder.DEFAULT_THREADS_PER_WORKER)]
+    assert pool_a.closed
+    sentence_transformer_embedder.shutdown_worker_pools()
+    assert len(registry) == 0
+
+def test_closed_worker_pool_is_replaced(mock_availability, clear_cache, monkeypatch):
+    monkeypatch.setattr(sentence_transformer_embedder, "EmbeddingWorkerPool", FakeWorkerPool)
+    monkeypatch.setattr(
+        sentence_transformer_embedder, "_model_registry",
+        ModelRegistry(sentence_transformer_embedder._create_backend_model)
+    )
+    pool = sentence_transformer_embedder.get_worker_pool("modelo-a", num_workers=1)
+    pool.close()  # p. ej. tras la caída de un worker
+    assert sentence_transformer_embedder.embed(["x"], model_name="modelo-a", num_workers=1).shape == (1, 2)
+    assert sentence_transformer_embedder.get_worker_pool("modelo-a", num_workers=1) is not pool
+
+def test_chunking_length_weighted(mock_availability, mock_model, clear_cache):
+    emb = sentence_transformer_embedder.embed(["A" * 10], enable_chunking=True, chunk_size=4, length_weighted=True)
+    # (4*4 + 4*4 + 2*2) / 10
+    assert abs(emb[0][0] - 3.6) < 0.001
+
+def test_pool_chunk_embeddings():
+    chunks, offsets, lengths = sentence_transformer_embedder.split_into_chunks(["abcde", "xy"], 2)
+    assert chunks == ["ab", "cd", "e", "xy"]
+    assert offsets.tolist() == [0, 3]
+    pooled = sentence_transformer_embedder.pool_chunk_embeddings(np.array([[1.0], [3.0], [5.0], [7.0]]), offsets)
+    assert pooled.tolist() == [[3.0], [7.0]]
+
+def test_length_bucketed_batches_respect_token_budget():
+    lengths = np.array([2, 40, 3, 38, 1, 2])
+    batches = sentence_transformer_embedder.length_bucketed_batches(lengths, max_batch_tokens=80, max_batch_items=3)
+    assert [b.tolist() for b in batches] == [[1, 3], [2, 0, 5], [4]]
+    for batch in batches:
+        assert len(batch) * lengths[batch].max() <= 80
+
+def test_embed_token_budget_batches_restore_order(mock_availability, mock_model, clear_cache, monkeypatch):
+    texts = ["a" * 40, "b", "c" * 39, "dd", "e" * 41]
+    emb = sentence_transformer_embedder.embed(texts, max_batch_tokens=30)
+    assert [e[0] for e in emb] == [40.0, 1.0, 39.0, 2.0, 41.0]
+    model = sentence_transformer_embedder._load_model("all-MiniLM-L6-v2")
+    # Los textos largos (11 tokens estimados) van de dos en dos; los cortos juntos
+    assert [call.args[0] for call in model.encode.call_args_list] == [["a" * 40, "e" * 41], ["c" * 39, "b", "dd"]]
+
+def test_mean_pool_ignores_padding():
+    tokens = np.array([[[1.0, 2.0], [3.0, 4.0], [100.0, 100.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0]])
+    assert sentence_transformer_embedder.mean_pool(tokens, mask).tolist() == [[2.0, 3.0]]
+
+def test_invalid_backend(mock_availability, clear_cache):
+    with pytest.raises(ValueError, match="no soportado"):
+        sentence_transformer_embedder.embed(["x"], backend="tensorrt")
+
+def test_onnx_backend_requires_onnxruntime(mock_availability, clear_cache, monkeypatch):
+    monkeypatch.setattr(sentence_transformer_embedder, "ort", None)
+    monkeypatch.setattr(
+        sentence_transformer_embedder, "_model_registry",
+        ModelRegistry(sentence_transformer_embedder._create_backend_model)
+    )
+    with pytest.raises(RuntimeError, match="onnxruntime"):
+        sentence_transformer_embedder.embed(["x"], backend="onnx-int8", model_name="modelo-inexistente")
+
+def _tiny_sentence_transformer(directory):
+    from transformers import BertConfig, BertModel, BertTokenizer
+    from sentence_transformers import SentenceTransformer, models
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + list("abcdefghijklmnopqrstuvwxyz")
+    vocab_file = os.path.join(directory, "vocab.txt")
+    with open(vocab_file, "w") as f:
+        f.write("\n".join(vocab))
+    BertTokenizer(vocab_file).save_pretrained(directory)
+    BertModel(BertConfig(
+        vocab_size=len(vocab), hidden_size=16, num_hidden_layers=1, num_attention_heads=2,
+        intermediate_size=32, max_position_embeddings=64
+    )).save_pretrained(directory)
+    transformer = models.Transformer(directory, max_seq_length=32)
+    st_dir = os.path.join(directory, "st")
+    SentenceTransformer(modules=[transformer, models.Pooling(16), models.Normalize()]).save(st_dir)
+    return st_dir
+
+def test_onnx_export_parity_and_int8_session(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    st_dir = _tiny_sentence_transformer(str(tmp_path))
+    export_dir = sentence_transformer_embedder.export_onnx(st_dir, str(tmp_path / "onnx"))
+    with open(os.path.join(export_dir, sentence_transformer_embedder.ONNX_CONFIG_FILE)) as f:
+        config = json.load(f)
+    assert config["parity"]["onnx"] >= 0.999 and config["parity"]["onnx-int8"] >= 0.98
+    encoder = sentence_transformer_embedder.OnnxEncoder(export_dir, quantized=True)
+    vectors = encoder.encode(["hola mundo", "abc"], batch_size=2)
+    assert vectors.shape == (2, 16) and np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-4)
@@ -41,3 +41,215 @@ def test_load_local_model_with_invalid_path(monkeypatch):
     with pytest.raises(RuntimeError, match="Error cargando el modelo local"):
         local_llm_generator.load_local_model()
     monkeypatch.delenv("LOCAL_LLM_MODEL_PATH", raising=False)
+
+# --- Streaming ---
+
+import threading
+import time
+import torch
+
+class DummyStreamingPipeline:
+    """Pipeline que emite palabras por el streamer y consulta el criterio de parada en cada paso."""
+    tokenizer = None
+
+    def __init__(self, words, delay=0.0, fail=False):
+        self.words = words
+        self.delay = delay
+        self.fail = fail
+        self.generated = 0
+
+    def __call__(self, prompt, max_new_tokens, do_sample, streamer, stopping_criteria):
+        input_ids = torch.zeros((1, 1), dtype=torch.long)
+        for word in self.words[:max_new_tokens]:
+            if stopping_criteria(input_ids, None).all():
+                break
+            if self.fail:
+                raise ValueError("fallo en generate")
+            self.generated += 1
+            streamer.on_finalized_text(word)
+            time.sleep(self.delay)
+        streamer.end()
+
+def test_generate_stream_yields_text_incrementally(monkeypatch):
+    model = DummyStreamingPipeline(["Hola ", "mundo"])
+    monkeypatch.setattr(local_llm_generator, "load_local_model", lambda: model)
+    assert list(local_llm_generator.generate_stream("Prompt")) == ["Hola ", "mundo"]
+
+def test_generate_stream_stops_generation_when_consumer_leaves(monkeypatch):
+    model = DummyStreamingPipeline([f"t{i} " for i in range(200)], delay=0.01)
+    monkeypatch.setattr(local_llm_generator, "load_local_model", lambda: model)
+    gen = local_llm_generator.generate_stream("Prompt", max_new_tokens=200)
+    next(gen)
+    gen.close()
+    time.sleep(0.1)
+    assert model.generated < 50
+
+def test_generate_stream_honours_cancel_event(monkeypatch):
+    model = DummyStreamingPipeline([f"t{i} " for i in range(200)], delay=0.01)
+    monkeypatch.setattr(local_llm_generator, "load_local_model", lambda: model)
+    cancel = threading.Event()
+    chunks = []
+    for chunk in local_llm_generator.generate_stream("Prompt", max_new_tokens=200, cancel_event=cancel):
+        chunks.append(chunk)
+        cancel.set()
+    assert len(chunks) == 1
+    time.sleep(0.1)
+    assert model.generated < 50
+
+def test_generate_stream_propagates_errors(monkeypatch):
+    monkeypatch.setattr(local_llm_generator, "load_local_model", lambda: DummyStreamingPipeline(["x"], fail=True))
+    with pytest.raises(RuntimeError, match="Error en la generación local: fallo en generate"):
+        list(local_llm_generator.generate_stream("Prompt"))
+
+# --- Agrupación dinámica en lotes ---
+
+from utils.dynamic_batcher import DynamicBatcher
+
+class DummyBatchPipeline:
+    """Pipeline que acepta listas de prompts y registra el tamaño de cada llamada."""
+    def __init__(self):
+        self.calls = []
+        self.tokenizer = type("Tok", (), {"pad_token": None, "eos_token": "<eos>", "padding_side": "right"})()
+
+    def __call__(self, prompts, max_length, do_sample, batch_size=None):
+        if isinstance(prompts, str):
+            self.calls.append(1)
+            return [{"generated_text": f"{prompts} -> ok"}]
+        self.calls.append(len(prompts))
+        self.padding = (self.tokenizer.pad_token, self.tokenizer.padding_side)
+        return [[{"generated_text": f"{p} -> ok"}] for p in prompts]
+
+def test_concurrent_generate_calls_are_batched(monkeypatch):
+    model = DummyBatchPipeline()
+    monkeypatch.setattr(local_llm_generator, "load_local_model", lambda: model)
+    batcher = DynamicBatcher(local_llm_generator._generate_batch, max_batch_size=8, max_delay=0.2)
+    monkeypatch.setattr(local_llm_generator, "_batcher", batcher)
+    prompts = [f"prompt {i}" for i in range(5)]
+    results = {}
+    threads = [threading.Thread(target=lambda p=p: results.__setitem__(p, local_llm_generator.generate(p))) for p in prompts]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.close()
+    assert results == {p: f"{p} -> ok" for p in prompts}
+    assert model.calls == [5]
+    # Padding por la izquierda con el token de fin de secuencia solo durante el lote
+    assert model.padding == ("<eos>", "left")
+    assert model.tokenizer.pad_token is None and model.tokenizer.padding_side == "right"
+
+def test_streaming_waits_for_the_batch_holding_the_model(monkeypatch):
+    model = DummyStreamingPipeline(["Hola"])
+    monkeypatch.setattr(local_llm_generator, "load_local_model", lambda: model)
+    local_llm_generator._model_lock.acquire()  # un lote del planificador en curso
+    try:
+        gen = local_llm_generator.generate_stream("Prompt")
+        worker = threading.Thread(target=lambda: list(gen))
+        worker.start()
+        time.sleep(0.1)
+        assert model.generated == 0
+    finally:
+        local_llm_generator._model_lock.release()
+    worker.join(2)
+    assert model.generated == 1
+
+
+def test_batcher_is_configured_from_environment(monkeypatch):
+    monkeypatch.setattr(local_llm_generator, "_batcher", None)
+    monkeypatch.setenv("LOCAL_LLM_MAX_BATCH_SIZE", "4")
+    monkeypatch.setenv("LOCAL_LLM_BATCH_DELAY_MS", "25")
+    batcher = local_llm_generator._get_batcher()
+    assert batcher.max_batch_size == 4 and batcher.max_delay == pytest.approx(0.025)
+    assert local_llm_generator._get_batcher() is batcher
+    batcher.close()
+
+# --- Caché de prefijos (past key/values) ---
+
+from utils.prefix_cache import PrefixCache
+
+@pytest.fixture
+def tiny_pipeline(tmp_path):
+    """Pipeline real de transformers con un GPT-2 diminuto y un tokenizer de palabras, sin descargas."""
+    tokenizers = pytest.importorskip("tokenizers")
+    from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+    words = "contexto consulta documento hola mundo el la de que y".split()
+    vocab = {"<unk>": 0, "<eos>": 1, **{w: i + 2 for i, w in enumerate(words)}}
+    tok = tokenizers.Tokenizer(tokenizers.models.WordLevel(vocab, unk_token="<unk>"))
+    tok.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    PreTrainedTokenizerFast(tokenizer_object=tok, unk_token="<unk>", eos_token="<eos>").save_pretrained(tmp_path)
+    config = GPT2Config(vocab_size=len(vocab), n_positions=128, n_embd=16, n_layer=1, n_head=2, bos_token_id=1, eos_token_id=1)
+    GPT2LMHeadModel(config).save_pretrained(tmp_path)
+    from transformers import pipeline
+    return pipeline("text-generation", model=str(tmp_path))
+
+def test_shared_prompt_prefix_is_prefilled_once(monkeypatch, tiny_pipeline):
+    monkeypatch.setattr(local_llm_generator, "load_local_model", lambda: tiny_pipeline)
+    monkeypatch.setattr(local_llm_generator, "_prefix_cache", PrefixCache(8))
+    monkeypatch.setenv("LOCAL_LLM_PREFIX_MIN_TOKENS", "2")
+    prefilled = []
+    hook = tiny_pipeline.model.register_forward_pre_hook(
+        lambda module, args, kwargs: prefilled.append((args[0] if args else kwargs["input_ids"]).shape[1]),
+        with_kwargs=True
+    )
+    scaffold = "el contexto de la consulta\n"
+    context = scaffold + "documento de la consulta " * 4 + "\n"
+    try:
+        first = local_llm_generator._generate_batch([context + "consulta hola"])[0]
+        prefilled.clear()
+        second = local_llm_generator._generate_batch([context + "consulta el mundo"])[0]
+        third_prefill = len(prefilled)
+        # Otro contexto con el mismo andamiaje reutiliza el estado recortado a la primera línea (5 tokens)
+        local_llm_generator._generate_batch([scaffold + "hola mundo\nconsulta hola"])
+    finally:
+        hook.remove()
+    assert first[0]["generated_text"].startswith(context + "consulta hola")
+    assert second[0]["generated_text"].startswith(context + "consulta el mundo")
+    # El segundo prompt solo procesa los tokens posteriores al prefijo cacheado (3 de 24)
+    assert prefilled[0] == 3
+    assert prefilled[third_prefill] == 4
+    assert local_llm_generator._prefix_cache.hits == 2
+
+def test_pipeline_prompts_sharing_first_documents_reuse_the_prefix(monkeypatch, tiny_pipeline):
+    monkeypatch.setattr(local_llm_generator, "load_local_model", lambda: tiny_pipeline)
+    monkeypatch.setattr(local_llm_generator, "_prefix_cache", PrefixCache(8))
+    monkeypatch.setenv("LOCAL_LLM_PREFIX_MIN_TOKENS", "2")
+    first_doc = "el documento de la consulta\n"
+    # Formato de RAGPipeline._build_prompt: andamiaje y documentos terminados en salto de línea
+    local_llm_generator._generate_batch(["contexto\n" + first_doc + "hola mundo\nconsulta hola"])
+    local_llm_generator._generate_batch(["contexto\n" + first_doc + "que y de\nconsulta el mundo"])
+    # El segundo prompt reutiliza el estado del andamiaje y del primer documento (6 tokens)
+    assert local_llm_generator._prefix_cache.hits == 1
+    assert local_llm_generator._prefix_cache.tokens == 8
+
+
+def test_prefix_cache_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(local_llm_generator, "_prefix_cache", None)
+    monkeypatch.setenv("LOCAL_LLM_PREFIX_CACHE_SIZE", "0")
+    assert local_llm_generator._get_prefix_cache() is None
+
+def test_prefix_cache_is_disabled_without_cache_position_support(monkeypatch):
+    monkeypatch.setattr(local_llm_generator, "_prefix_cache", None)
+    monkeypatch.delenv("LOCAL_LLM_PREFIX_CACHE_SIZE", raising=False)
+    monkeypatch.setattr(local_llm_generator, "PREFIX_CACHE_SUPPORTED", False)
+    assert local_llm_generator._get_prefix_cache() is None
+
+def test_legacy_tuple_past_falls_back_to_plain_generation(monkeypatch):
+    import torch
+    from unittest.mock import MagicMock
+
+    class LegacyOutput:
+        past_key_values = ((torch.zeros(1), torch.zeros(1)),)
+
+    class Tokenizer:
+        def __call__(self, text):
+            return {"input_ids": list(range(len(text.split())))}
+
+    model = MagicMock(return_value=[{"generated_text": "respuesta"}])
+    model.tokenizer = Tokenizer()
+    model.model = MagicMock(return_value=LegacyOutput(), device="cpu")
+    monkeypatch.setenv("LOCAL_LLM_PREFIX_MIN_TOKENS", "2")
+    cache = PrefixCache(8)
+    prompt = "contexto de la consulta\nconsulta hola"
+    assert local_llm_generator._generate_with_prefix_cache(model, prompt, cache) == [{"generated_text": "respuesta"}]
+    model.model.generate.assert_not_called()
+    assert len(cache) == 0
@@ -83,3 +83,113 @@ def test_generate_api_error(monkeypatch):
     
     with pytest.raises(RuntimeError, match="Error en la API de OpenAI: Critical API error"):
         openai_generator.generate("Prompt de error")
+
+# --- Streaming ---
+
+from types import SimpleNamespace
+import threading
+
+def dummy_chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta={"content": content} if content is not None else {})])
+
+class DummyStream:
+    """Respuesta en streaming que registra si se cerró."""
+    def __init__(self, contents):
+        self.contents = contents
+        self.closed = False
+        self.served = 0
+
+    def __iter__(self):
+        for content in self.contents:
+            self.served += 1
+            yield dummy_chunk(content)
+
+    def close(self):
+        self.closed = True
+
+def test_generate_stream_yields_deltas(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test_api_key")
+    stream = DummyStream([None, "Hola", ", ", "mundo"])
+    dummy_create = MagicMock(return_value=stream)
+    monkeypatch.setattr(openai_generator.openai.ChatCompletion, "create", dummy_create)
+
+    chunks = list(openai_generator.generate_stream("Prompt", max_tokens=20))
+    assert chunks == ["Hola", ", ", "mundo"]
+    assert dummy_create.call_args.kwargs["stream"] is True
+    assert stream.closed
+
+def test_generate_stream_retries_before_first_token(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test_api_key")
+    monkeypatch.setattr(openai_generator.time, "sleep", lambda s: None)
+    calls = {"count": 0}
+
+    def dummy_create(**kwargs):
+        calls["count"] += 1
+        if calls["count"] == 1:
+            raise openai.error.RateLimitError("Rate limit exceeded")
+        return DummyStream(["ok"])
+
+    monkeypatch.setattr(openai_generator.openai.ChatCompletion, "create", dummy_create)
+    assert list(openai_generator.generate_stream("Prompt")) == ["ok"]
+    assert calls["count"] == 2
+
+def test_generate_stream_stops_on_cancel_and_close(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test_api_key")
+    stream = DummyStream(["a", "b", "c", "d"])
+    monkeypatch.setattr(openai_generator.openai.ChatCompletion, "create", MagicMock(return_value=stream))
+    cancel = threading.Event()
+    gen = openai_generator.generate_stream("Prompt", cancel_event=cancel)
+    assert next(gen) == "a"
+    cancel.set()
+    assert list(gen) == []
+    assert stream.closed and stream.served == 2
+
+    # El consumidor abandona el generador (p. ej. el cliente cierra la conexión)
+    stream = DummyStream(["a", "b", "c"])
+    monkeypatch.setattr(openai_generator.openai.ChatCompletion, "create", MagicMock(return_value=stream))
+    gen = openai_generator.generate_stream("Prompt")
+    next(gen)
+    gen.close()
+    assert stream.closed and stream.served == 1
+
+
+# --- Camino asíncrono ---
+
+import asyncio
+
+class DummyAsyncClient:
+    def __init__(self, error=None):
+        self.error = error
+        self.payloads = []
+
+    async def chat_completion(self, retries=3, backoff_factor=2.0, **payload):
+        self.payloads.append(payload)
+        if self.error:
+            raise self.error
+        return DummyChatCompletionResponse("  Respuesta asíncrona ")
+
+def test_agenerate_uses_shared_client(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test_api_key")
+    monkeypatch.setattr(openai, "api_key", None)
+    client = DummyAsyncClient()
+    response = asyncio.run(openai_generator.agenerate("Hola", max_tokens=10, client=client))
+    assert response == "Respuesta asíncrona"
+    assert client.payloads[0]["messages"] == [{"role": "user", "content": "Hola"}]
+    assert client.payloads[0]["max_tokens"] == 10
+    assert openai.api_key is None
+
+def test_agenerate_errors(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test_api_key")
+    with pytest.raises(RuntimeError, match="Error en la API de OpenAI"):
+        asyncio.run(openai_generator.agenerate("Hola", client=DummyAsyncClient(openai.error.APIError("fallo"))))
+    with pytest.raises(RuntimeError, match="múltiples intentos"):
+        asyncio.run(openai_generator.agenerate("Hola", client=DummyAsyncClient(openai.error.RateLimitError("límite"))))
+
+def test_generate_does_not_set_global_api_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test_api_key")
+    monkeypatch.setattr(openai, "api_key", None)
+    dummy_create = MagicMock(return_value=DummyChatCompletionResponse("ok"))
+    monkeypatch.setattr(openai_generator.openai.ChatCompletion, "create", dummy_create)
+    openai_generator.generate("Hola")
+    assert dummy_create.call_args.kwargs["api_key"] == "test_api_key"
+    assert openai.api_key is None
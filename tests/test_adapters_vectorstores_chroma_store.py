@@ -66,6 +66,12 @@ def test_add_document_wrong_dimension(temp_chroma_store):
     with pytest.raises(ValueError, match="dimensión del vector"):
         temp_chroma_store.add(doc, vector)
 
+def test_search_with_metadata_filter(temp_chroma_store):
+    temp_chroma_store.add({"id": "t1", "texto": "acme", "metadata": {"tenant": "acme"}}, [0.1, 0.2, 0.3, 0.4])
+    temp_chroma_store.add({"id": "t2", "texto": "beta", "metadata": {"tenant": "beta"}}, [0.1, 0.2, 0.3, 0.41])
+    results = temp_chroma_store.search([0.1, 0.2, 0.3, 0.41], k=1, filter={"tenant": "acme"})
+    assert [d["id"] for d in results] == ["t1"]
+
 def test_remove_document(temp_chroma_store):
     # Insertamos
     temp_chroma_store.add({"id": "doc3", "texto": "Texto doc3"}, [0.9, 0.8, 0.7, 0.6])
@@ -137,3 +143,26 @@ def test_service_unavailable(monkeypatch):
     monkeypatch.setattr("adapters.VectorStores.chroma_store.check_service_availability", dummy_check)
     with pytest.raises(RuntimeError, match="no disponible"):
         _ = ChromaStore()
+
+def test_blue_green_reindex_keeps_logical_name(temp_chroma_store):
+    for i in range(3):
+        temp_chroma_store.add({"id": f"doc_{i}", "texto": f"texto {i}"}, [0.1 * i, 0.2, 0.3, 0.4])
+    status = temp_chroma_store.reindex(background=False)
+    assert status["state"] == "done"
+    # La nueva generación ocupa el nombre lógico y la anterior se eliminó tras el renombrado
+    assert temp_chroma_store.collection.name == "test_collection"
+    names = [getattr(c, "name", c) for c in temp_chroma_store.chroma_client.list_collections()]
+    assert names == ["test_collection"]
+    assert len(temp_chroma_store.list_documents()) == 3
+
+def test_reindex_with_reembedding_updates_dimension(temp_chroma_store):
+    for i in range(3):
+        temp_chroma_store.add({"id": f"doc_{i}", "texto": f"texto {i}"}, [0.1 * i, 0.2, 0.3, 0.4])
+    embed_fn = lambda texts: [[float(len(t)), 1.0] for t in texts]
+    status = temp_chroma_store.reindex(embed_fn=embed_fn, embedder="local:modelo-2d", background=False)
+    assert status["state"] == "done"
+    assert temp_chroma_store.embed_dim == 2
+    assert temp_chroma_store.collection.metadata["embed_dim"] == 2
+    # Los documentos nuevos se validan con la dimensión de la nueva generación
+    temp_chroma_store.add({"id": "doc_3", "texto": "texto 3"}, [7.0, 1.0])
+    assert len(temp_chroma_store.list_documents()) == 4
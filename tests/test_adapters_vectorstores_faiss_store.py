@@ -67,3 +67,182 @@ def test_search_wrong_dimension(faiss_instance):
     query_vector = [0.1, 0.2]  # Dimensión incorrecta
     with pytest.raises(ValueError, match="dimensión del vector de consulta"):
         faiss_instance.search(query_vector, k=1)
+
+def _add_tenant_docs(store):
+    docs = [
+        ({"id": "a1", "texto": "acme 1", "metadata": {"tenant": "acme", "fecha": "2025-01-10"}}, [0.1, 0.2, 0.3, 0.4]),
+        ({"id": "a2", "texto": "acme 2", "metadata": {"tenant": "acme", "fecha": "2025-03-01"}}, [0.9, 0.8, 0.7, 0.6]),
+        ({"id": "b1", "texto": "beta 1", "metadata": {"tenant": "beta", "fecha": "2025-02-15"}}, [0.1, 0.2, 0.3, 0.41]),
+        ({"id": "b2", "texto": "beta 2", "metadata": {"tenant": "beta", "fecha": "2024-12-31"}}, [0.5, 0.5, 0.5, 0.5]),
+    ]
+    for doc, vec in docs:
+        store.add(doc, vec)
+
+def test_search_with_metadata_filter(faiss_instance):
+    _add_tenant_docs(faiss_instance)
+    query_vector = [0.1, 0.2, 0.3, 0.41]
+    results = faiss_instance.search(query_vector, k=2, filter={"tenant": "acme"})
+    assert [d["id"] for d in results] == ["a1", "a2"]
+
+    results = faiss_instance.search(query_vector, k=5, filter={"fecha": {"$gte": "2025-02-01"}})
+    assert [d["id"] for d in results] == ["b1", "a2"]
+
+    assert faiss_instance.search(query_vector, k=3, filter={"tenant": "inexistente"}) == []
+
+def test_search_with_filter_uses_id_selector(faiss_instance):
+    # Forzar la estrategia ANN + IDSelector desactivando la fuerza bruta
+    faiss_instance.brute_force_selectivity = 0.0
+    faiss_instance.brute_force_max_candidates = 0
+    _add_tenant_docs(faiss_instance)
+    results = faiss_instance.search([0.1, 0.2, 0.3, 0.41], k=1, filter={"tenant": {"$in": ["beta"]}})
+    assert [d["id"] for d in results] == ["b1"]
+
+def test_add_batch(faiss_instance):
+    docs = [DummyDocument(f"doc{i}", f"Texto {i}").to_dict() for i in range(3)]
+    vectors = np.eye(3, DIM, dtype="float32")
+    positions = faiss_instance.add_batch(docs, vectors)
+    assert positions == [0, 1, 2]
+    assert faiss_instance.index.ntotal == 3
+    assert faiss_instance.generation == 1
+    assert faiss_instance.search(vectors[1].tolist(), k=1)[0]["id"] == "doc1"
+
+def test_concurrent_search_during_ingest(faiss_instance):
+    import threading
+    rng = np.random.default_rng(0)
+    vectors = rng.random((400, DIM), dtype="float32")
+    errors = []
+
+    def ingest():
+        for i in range(0, 400, 20):
+            docs = [{"id": f"d{j}", "texto": "", "metadata": {}} for j in range(i, i + 20)]
+            faiss_instance.add_batch(docs, vectors[i:i + 20])
+
+    def searcher():
+        try:
+            for _ in range(50):
+                results = faiss_instance.search(vectors[0].tolist(), k=5)
+                assert len(results) <= 5
+        except Exception as e:  # pragma: no cover - solo se registra si falla
+            errors.append(e)
+
+    threads = [threading.Thread(target=ingest)] + [threading.Thread(target=searcher) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert faiss_instance.index.ntotal == 400
+    assert faiss_instance.search(vectors[0].tolist(), k=1)[0]["id"] == "d0"
+
+def test_blue_green_reindex_changes_index_type(faiss_instance):
+    rng = np.random.default_rng(1)
+    vectors = rng.random((200, DIM), dtype="float32")
+    faiss_instance.add_batch([{"id": f"d{i}", "texto": f"t{i}", "metadata": {}} for i in range(200)], vectors)
+
+    status = faiss_instance.reindex(index_factory="HNSW16", batch_size=64, background=False)
+    assert status["state"] == "done"
+    assert faiss_instance.index_factory == "HNSW16"
+    assert faiss_instance.index.ntotal == 200
+    assert faiss_instance.search(vectors[5].tolist(), k=1)[0]["id"] == "d5"
+
+def test_reindex_catches_up_with_writes_during_build(faiss_instance):
+    rng = np.random.default_rng(2)
+    vectors = rng.random((120, DIM), dtype="float32")
+    faiss_instance.add_batch([{"id": f"d{i}", "texto": "", "metadata": {}} for i in range(100)], vectors[:100])
+
+    original = faiss_instance._generation_vectors
+    def slow_generation_vectors(start, end, embed_fn):
+        # Durante la construcción se siguen ingiriendo y consultando documentos
+        if start == 0:
+            faiss_instance.add_batch([{"id": f"d{i}", "texto": "", "metadata": {}} for i in range(100, 120)], vectors[100:])
+            assert faiss_instance.search(vectors[110].tolist(), k=1)[0]["id"] == "d110"
+        return original(start, end, embed_fn)
+    faiss_instance._generation_vectors = slow_generation_vectors
+
+    faiss_instance.reindex(batch_size=50, background=True)
+    status = faiss_instance._reindex_job.wait(5)
+    assert status["state"] == "done"
+    assert faiss_instance.index.ntotal == 120
+    assert faiss_instance.search(vectors[115].tolist(), k=1)[0]["id"] == "d115"
+
+def test_reindex_with_reembedding_changes_dimension(faiss_instance):
+    _add_tenant_docs(faiss_instance)
+    embed_fn = lambda texts: [[float(len(t)), 1.0] for t in texts]
+    status = faiss_instance.reindex(embed_fn=embed_fn, background=False)
+    assert status["state"] == "done"
+    assert faiss_instance.dim == 2
+    assert faiss_instance.index.ntotal == 4
+    assert len(faiss_instance.search([6.0, 1.0], k=2)) == 2
+
+def test_search_with_vectors_returns_aligned_vectors(faiss_instance):
+    rng = np.random.default_rng(3)
+    vectors = rng.random((20, DIM), dtype="float32")
+    faiss_instance.add_batch([{"id": f"d{i}", "texto": "", "metadata": {}} for i in range(20)], vectors)
+    docs, found = faiss_instance.search_with_vectors(vectors[4].tolist(), k=30)
+    assert len(docs) == 20 and found.shape == (20, DIM)
+    assert docs[0]["id"] == "d4"
+    for doc, vec in zip(docs, found):
+        assert np.allclose(vec, vectors[int(doc["id"][1:])])
+
+def test_range_search_with_threshold_and_filter(faiss_instance):
+    vectors = np.zeros((6, DIM), dtype="float32")
+    vectors[:, 0] = [0.0, 0.1, 0.2, 3.0, 4.0, 5.0]
+    faiss_instance.add_batch(
+        [{"id": f"d{i}", "texto": "", "metadata": {"par": i % 2 == 0}} for i in range(6)], vectors
+    )
+    query = [0.0] * DIM
+    docs, distances = faiss_instance.range_search(query, threshold=0.05)
+    assert [d["id"] for d in docs] == ["d0", "d1", "d2"]
+    assert np.all(np.diff(distances) >= 0) and distances[-1] <= 0.05
+    docs, _ = faiss_instance.range_search(query, threshold=0.05, k_max=2)
+    assert [d["id"] for d in docs] == ["d0", "d1"]
+    docs, _ = faiss_instance.range_search(query, threshold=10.0, filter={"par": True})
+    assert [d["id"] for d in docs] == ["d0", "d2"]
+    with pytest.raises(ValueError):
+        faiss_instance.range_search(query)
+
+def test_search_parents_aggregates_chunks(faiss_instance):
+    from utils.parent_aggregation import make_child_documents
+    children = make_child_documents({"id": "p1"}, ["a0", "a1", "a2"]) + make_child_documents({"id": "p2"}, ["b0", "b1"])
+    vectors = np.zeros((5, DIM), dtype="float32")
+    vectors[:, 0] = [0.0, 0.05, 0.1, 0.2, 3.0]
+    faiss_instance.add_batch(children, vectors)
+    results = faiss_instance.search_parents([0.0] * DIM, k=2, window=1)
+    assert [r["id"] for r in results] == ["p1", "p2"]
+    assert results[0]["texto"] == "a0\na1"
+    assert results[0]["matched_chunks"] == ["p1#0", "p1#1", "p1#2"]
+
+def test_add_batch_rolls_back_on_index_failure(faiss_instance, monkeypatch):
+    faiss_instance.add_batch([{"id": "a", "metadata": {"origen": "x"}}], [[0.1, 0.2, 0.3, 0.4]])
+    def failing_add(vectors):
+        raise MemoryError("sin memoria")
+    monkeypatch.setattr(faiss_instance.index, "add", failing_add)
+    with pytest.raises(RuntimeError, match="sin memoria"):
+        faiss_instance.add_batch([{"id": "b", "metadata": {"origen": "y"}}], [[0.4, 0.3, 0.2, 0.1]])
+    monkeypatch.undo()
+    # El docstore y los metadatos vuelven a la posición previa al lote fallido
+    assert len(faiss_instance.doc_mapping) == faiss_instance.index.ntotal == 1
+    assert faiss_instance.metadata_index.candidate_ids({"origen": "y"}, 1).size == 0
+    assert faiss_instance.add_batch([{"id": "c", "metadata": {"origen": "y"}}], [[0.4, 0.3, 0.2, 0.1]]) == [1]
+    assert faiss_instance.search([0.4, 0.3, 0.2, 0.1], k=1, filter={"origen": "y"})[0]["id"] == "c"
+
+def test_untrained_ivf_index_requires_a_training_sample():
+    store = faiss_store.FaissStore(dim=DIM, index_factory="IVF4,Flat")
+    assert store.min_training_points == 4
+    doc = DummyDocument("doc1", "uno").to_dict()
+    with pytest.raises(ValueError, match="train"):
+        store.add(doc, [0.1, 0.2, 0.3, 0.4])
+    assert len(store.doc_mapping) == 0
+    with pytest.raises(ValueError, match="al menos 4"):
+        store.train(np.ones((2, DIM), dtype="float32"))
+    rng = np.random.default_rng(0)
+    store.train(rng.random((64, DIM), dtype="float32"))
+    assert store.min_training_points == 1
+    store.add(doc, [0.1, 0.2, 0.3, 0.4])
+    assert store.index.ntotal == 1
+
+def test_first_batch_trains_the_index_when_large_enough():
+    store = faiss_store.FaissStore(dim=DIM, index_factory="IVF4,Flat")
+    vectors = np.random.default_rng(1).random((40, DIM), dtype="float32")
+    store.add_batch([{"id": f"d{i}", "texto": "", "metadata": {}} for i in range(40)], vectors)
+    assert store.index.is_trained and store.index.ntotal == 40
@@ -0,0 +1,213 @@
+"""
+test_adapters_vectorstores_numpy_store.py – Pruebas para el adaptador NumpyStore.
+
+Cubre:
+  1. Inserción (individual y por lotes) con crecimiento de capacidad.
+  2. Búsqueda exacta por bloques frente a una referencia por fuerza bruta (l2 e ip, float32/float16).
+  3. Búsqueda filtrada por metadatos.
+  4. Snapshot y recarga.
+  5. Búsqueda en dos etapas con cuantización binaria y re-puntuación exacta.
+"""
+
+import os
+
+import numpy as np
+import pytest
+from adapters.VectorStores.numpy_store import NumpyStore, binary_codes, hamming_distances
+from utils.dim_reduction import DimensionReducer
+
+DIM = 8
+
+def _docs(n, offset=0):
+    return [{"id": f"doc{i}", "texto": f"texto {i}", "metadata": {"par": i % 2 == 0}} for i in range(offset, offset + n)]
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(42).standard_normal((300, DIM)).astype("float32")
+
+def test_add_and_wrong_dimension():
+    store = NumpyStore(dim=4, initial_capacity=1)
+    store.add({"id": "a", "texto": "x", "metadata": {}}, [0.1, 0.2, 0.3, 0.4])
+    store.add({"id": "b", "texto": "y", "metadata": {}}, [0.9, 0.8, 0.7, 0.6])
+    assert store.ntotal == 2
+    assert store.search([0.9, 0.8, 0.7, 0.6], k=1)[0]["id"] == "b"
+    with pytest.raises(ValueError, match="dimensión del vector"):
+        store.add({"id": "c"}, [0.1, 0.2])
+    with pytest.raises(ValueError, match="dimensión del vector de consulta"):
+        store.search([0.1], k=1)
+    store.close()
+
+@pytest.mark.parametrize("metric", ["l2", "ip"])
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_blocked_search_matches_brute_force(vectors, metric, dtype):
+    store = NumpyStore(dim=DIM, metric=metric, dtype=dtype, block_size=64, initial_capacity=16)
+    store.add_batch(_docs(len(vectors)), vectors)
+    stored = vectors.astype(dtype).astype("float32")
+    q = vectors[7]
+    if metric == "l2":
+        expected = np.argsort(((stored - q) ** 2).sum(axis=1), kind="stable")[:10]
+    else:
+        expected = np.argsort(-(stored @ q), kind="stable")[:10]
+    _, positions = store.search_positions(q, 10)
+    assert set(positions.tolist()) == set(expected.tolist())
+    assert store.search(q.tolist(), k=1)[0]["id"] == f"doc{expected[0]}"
+    store.close()
+
+def test_filtered_search(vectors):
+    store = NumpyStore(dim=DIM, block_size=32)
+    store.add_batch(_docs(len(vectors)), vectors)
+    results = store.search(vectors[3].tolist(), k=5, filter={"par": False})
+    assert len(results) == 5
+    assert results[0]["id"] == "doc3"
+    assert all(int(d["id"][3:]) % 2 == 1 for d in results)
+    assert store.search(vectors[3].tolist(), k=5, filter={"par": "nunca"}) == []
+    store.close()
+
+def test_snapshot_and_load(tmp_path, vectors):
+    store = NumpyStore(dim=DIM, dtype="float16", embedder="sentence_transformer_embedder:all-MiniLM-L6-v2")
+    store.add_batch(_docs(50), vectors[:50])
+    store.reducer = DimensionReducer("truncate", DIM)
+    snap = store.snapshot(str(tmp_path / "snap"))
+    store.close()
+
+    loaded = NumpyStore.load(snap)
+    assert loaded.ntotal == 50
+    assert loaded.dtype == np.float16
+    assert loaded.embedder == "sentence_transformer_embedder:all-MiniLM-L6-v2"
+    assert loaded.reducer.describe() == DimensionReducer("truncate", DIM).describe()
+    assert loaded.search(vectors[10].tolist(), k=1)[0]["id"] == "doc10"
+    assert loaded.search(vectors[10].tolist(), k=1, filter={"par": True})[0]["id"] == "doc10"
+    # Tras recargar se pueden seguir agregando vectores
+    loaded.add_batch(_docs(10, offset=50), vectors[50:60])
+    assert loaded.ntotal == 60
+    assert loaded.search(vectors[55].tolist(), k=1)[0]["id"] == "doc55"
+    loaded.close()
+
+def test_hamming_distances():
+    codes = binary_codes(np.array([[1, -1, 1, -1, 1, 1, 1, 1, -1], [-1, -1, -1, -1, -1, -1, -1, -1, -1]]))
+    assert codes.shape == (2, 2)
+    query = binary_codes(np.ones(9))
+    assert hamming_distances(codes, query).tolist() == [3, 9]
+
+def test_binary_quantization_rescoring(tmp_path):
+    rng = np.random.default_rng(7)
+    base = rng.standard_normal((2000, 64)).astype("float32")
+    queries = base[:20] + 0.05 * rng.standard_normal((20, 64)).astype("float32")
+    store = NumpyStore(dim=64, binary_quantization=True, rescore_factor=10, block_size=256, initial_capacity=64)
+    exact = NumpyStore(dim=64)
+    store.add_batch(_docs(len(base)), base)
+    exact.add_batch(_docs(len(base)), base)
+    assert store.code_nbytes == len(base) * 8
+    for i, q in enumerate(queries):
+        scores, positions = store.search_positions(q, k=5)
+        exact_scores, exact_positions = exact.search_positions(q, k=5)
+        # El vecino casi idéntico se encuentra y su puntuación re-calculada es la exacta
+        assert positions[0] == exact_positions[0] == i
+        assert scores[0] == pytest.approx(exact_scores[0], rel=1e-4)
+        assert np.all(np.diff(scores) >= 0)
+    filtered = store.search(queries[0], k=3, filter={"par": True})
+    assert filtered and all(d["metadata"]["par"] for d in filtered)
+
+    store.snapshot(str(tmp_path / "snap"))
+    loaded = NumpyStore.load(str(tmp_path / "snap"), block_size=256)
+    assert loaded.binary_quantization and loaded.code_nbytes == store.code_nbytes
+    assert np.array_equal(loaded.search_positions(queries[1], k=5)[1], store.search_positions(queries[1], k=5)[1])
+    for s in (store, exact, loaded):
+        s.close()
+
+def test_search_with_vectors(vectors):
+    store = NumpyStore(dim=DIM, dtype="float16")
+    store.add_batch(_docs(len(vectors)), vectors)
+    docs, found = store.search_with_vectors(vectors[9], k=4, filter={"par": False})
+    assert docs[0]["id"] == "doc9" and found.shape == (4, DIM) and found.dtype == np.float32
+    assert np.allclose(found[0], vectors[9], atol=1e-2)
+    store.close()
+
+@pytest.mark.parametrize("metric", ["l2", "ip"])
+def test_range_search(vectors, metric):
+    store = NumpyStore(dim=DIM, metric=metric, block_size=64)
+    store.add_batch(_docs(len(vectors)), vectors)
+    scores_all, positions_all = store.search_positions(vectors[0], k=len(vectors))
+    threshold = float(scores_all[9])
+    docs, scores = store.range_search(vectors[0], threshold=threshold)
+    assert len(docs) >= 10 and docs[0]["id"] == f"doc{positions_all[0]}"
+    assert np.all(scores <= threshold) if metric == "l2" else np.all(scores >= threshold)
+    docs, _ = store.range_search(vectors[0], threshold=threshold, k_max=3, filter={"par": True})
+    assert len(docs) == 3 and all(d["metadata"]["par"] for d in docs)
+    store.close()
+
+def test_search_parents():
+    from utils.parent_aggregation import make_child_documents
+    store = NumpyStore(dim=2)
+    children = make_child_documents({"id": "p1"}, ["a0", "a1"]) + make_child_documents({"id": "p2"}, ["b0"])
+    store.add_batch(children, np.array([[0.0, 0.1], [0.0, 0.2], [0.0, 0.15]], dtype="float32"))
+    by_max = store.search_parents([0.0, 0.0], k=2, aggregate="max", window=None)
+    assert [r["id"] for r in by_max] == ["p1", "p2"] and by_max[0]["texto"] == "a0\na1"
+    by_sum = store.search_parents([0.0, 0.15], k=1, aggregate="sum")
+    assert by_sum[0]["id"] == "p1"
+    store.close()
+
+def test_add_batch_rolls_back_on_failure(monkeypatch):
+    store = NumpyStore(dim=4, initial_capacity=1)
+    store.add_batch(_docs(1), [[0.1, 0.2, 0.3, 0.4]])
+    def failing_add(pos, metadata):
+        raise MemoryError("sin memoria")
+    monkeypatch.setattr(store.metadata_index, "add", failing_add)
+    with pytest.raises(RuntimeError, match="sin memoria"):
+        store.add_batch(_docs(2, offset=1), [[0.4, 0.3, 0.2, 0.1], [0.5, 0.5, 0.5, 0.5]])
+    monkeypatch.undo()
+    assert store.ntotal == len(store.doc_mapping) == 1
+    assert store.add_batch(_docs(1, offset=5), [[0.4, 0.3, 0.2, 0.1]]) == [1]
+    assert store.search([0.4, 0.3, 0.2, 0.1], k=1)[0]["id"] == "doc5"
+    store.close()
+
+def test_reload_after_appending_to_loaded_snapshot(tmp_path, vectors):
+    store = NumpyStore(dim=DIM)
+    store.add_batch(_docs(3), vectors[:3])
+    snap = store.snapshot(str(tmp_path / "snap"))
+    store.close()
+
+    loaded = NumpyStore.load(snap)
+    loaded.add_batch(_docs(1, offset=3), vectors[3:4])  # amplía (y reemplaza) vectors.npy
+    loaded.close()
+
+    reloaded = NumpyStore.load(snap)
+    assert reloaded.ntotal == 4
+    assert [d["id"] for d in reloaded.search(vectors[3].tolist(), k=4)][0] == "doc3"
+    assert reloaded.search(vectors[1].tolist(), k=1)[0]["id"] == "doc1"
+    reloaded.add_batch(_docs(2, offset=4), vectors[4:6])
+    reloaded.close()
+    assert NumpyStore.load(snap).ntotal == 6
+
+def test_load_ignores_payloads_beyond_ntotal(tmp_path, vectors):
+    store = NumpyStore(dim=DIM)
+    store.add_batch(_docs(3), vectors[:3])
+    snap = store.snapshot(str(tmp_path / "snap"))
+    store.close()
+    # Lote interrumpido: el payload llegó al docstore pero meta.json no se actualizó
+    from utils.docstore import create_docstore
+    docs = create_docstore("blob", path=str(tmp_path / "snap" / "docs.bin"))
+    docs.append({"id": "huerfano"})
+    docs.close()
+
+    loaded = NumpyStore.load(snap)
+    assert loaded.ntotal == len(loaded.doc_mapping) == 3
+    assert loaded.add_batch(_docs(1, offset=3), vectors[3:4]) == [3]
+    loaded.close()
+
+def test_snapshot_twice_to_the_same_directory_replaces_it(tmp_path, vectors):
+    store = NumpyStore(dim=DIM)
+    store.add_batch(_docs(2), vectors[:2])
+    snap = store.snapshot(str(tmp_path / "snap"))
+    store.add_batch(_docs(1, offset=2), vectors[2:3])
+    assert store.snapshot(snap) == snap
+    store.close()
+
+    loaded = NumpyStore.load(snap)
+    assert [loaded.doc_mapping[pos]["id"] for pos in range(loaded.ntotal)] == ["doc0", "doc1", "doc2"]
+    assert loaded.search(vectors[2].tolist(), k=1)[0]["id"] == "doc2"
+    assert sorted(os.listdir(tmp_path)) == ["snap"]
+    # El directorio de respaldo del store cargado no puede ser destino de su propio snapshot
+    with pytest.raises(ValueError):
+        loaded.snapshot(snap)
+    loaded.close()
@@ -83,3 +83,35 @@ def test_admin_system_reset(monkeypatch):
     data = resp.json()
     assert resp.status_code == 200
     assert "FULL RESET completado" in data["message"]
+
+class _DummyReindexStore:
+    def __init__(self):
+        self.options = None
+    def reindex(self, **options):
+        self.options = options
+        return {"store": "dummy_store", "state": "building", "generation": 1}
+    def reindex_status(self):
+        return {"store": "dummy_store", "state": "done", "progress": 1.0}
+
+@pytest.fixture
+def registered_store():
+    from scalability.reindexer import register_store, unregister_store
+    store = _DummyReindexStore()
+    register_store("dummy_store", store)
+    yield store
+    unregister_store("dummy_store")
+
+def test_admin_start_reindex(registered_store):
+    resp = client.post("/admin/reindex", json={"store": "dummy_store", "index_factory": "HNSW32"})
+    assert resp.status_code == 202
+    assert resp.json()["state"] == "building"
+    assert registered_store.options == {"index_factory": "HNSW32"}
+
+def test_admin_reindex_unknown_store():
+    resp = client.post("/admin/reindex", json={"store": "no_registrado"})
+    assert resp.status_code == 404
+
+def test_admin_reindex_status(registered_store):
+    resp = client.get("/admin/reindex/status?store=dummy_store")
+    assert resp.status_code == 200
+    assert resp.json()["state"] == "done"
@@ -63,3 +63,38 @@ def test_ask_endpoint_pipeline_error(monkeypatch):
         assert response.status_code == 500
         data = response.json()
         assert "Ocurrió un error interno" in data.get("detail", "")
+
+def patch_stream_pipeline(pipeline):
+    # api/app.py carga las rutas con spec_from_file_location (fuera de sys.modules):
+    # se parchea RAGPipeline en los globals del propio endpoint
+    routes = [r for entry in app.routes for r in getattr(getattr(entry, "original_router", None), "routes", [entry])]
+    route = next(r for r in routes if getattr(r, "path", None) == "/ask/stream")
+    return patch.dict(route.endpoint.__globals__, {"RAGPipeline": MagicMock(return_value=pipeline)})
+
+class DummyStreamingPipeline:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.cancel_event = None
+
+    def run_stream(self, query, project_path=None, cancel_event=None):
+        self.cancel_event = cancel_event
+        if self.fail:
+            raise RuntimeError("Error en el pipeline")
+        yield "Respuesta "
+        yield f"para: {query}"
+
+def test_ask_stream_endpoint_streams_chunks():
+    pipeline = DummyStreamingPipeline()
+    with patch_stream_pipeline(pipeline):
+        response = client.post("/ask/stream", json={"query": "Hola"})
+    assert response.status_code == 200
+    assert response.text == "Respuesta para: Hola"
+    assert response.headers["content-type"].startswith("text/plain")
+    # Al terminar (o desconectarse el cliente) se activa el evento de cancelación
+    assert pipeline.cancel_event.is_set()
+
+def test_ask_stream_endpoint_error_before_first_chunk():
+    with patch_stream_pipeline(DummyStreamingPipeline(fail=True)):
+        response = client.post("/ask/stream", json={"query": "Hola"})
+    assert response.status_code == 500
+    assert "Ocurrió un error interno" in response.json().get("detail", "")
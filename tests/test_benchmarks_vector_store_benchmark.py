@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.vector_store_benchmark import (
+    dim_reduction_report,
+    exact_ground_truth,
+    generate_dataset,
+    main,
+    recall_at_k,
+    run_benchmark,
+)
+
+
+def test_exact_ground_truth_matches_brute_force():
+    base, queries = generate_dataset(n=500, dim=16, n_queries=10, seed=1)
+    gt = exact_ground_truth(base, queries, k=5, block=64)
+    dists = ((queries[:, None, :] - base[None, :, :]) ** 2).sum(-1)
+    expected = np.argsort(dists, axis=1)[:, :5]
+    assert np.array_equal(gt, expected)
+
+
+def test_recall_at_k():
+    gt = np.array([[0, 1], [2, 3]])
+    assert recall_at_k([[0, 1], [3, 9]], gt, k=2) == pytest.approx(0.75)
+
+
+def test_run_benchmark_reports_metrics_and_errors():
+    pytest.importorskip("faiss")
+    base, queries = generate_dataset(n=400, dim=8, n_queries=20, seed=2)
+    sweep = [
+        {"adapter": "faiss_store", "params": {"index_factory": None}},
+        {"adapter": "faiss_store", "params": {"index_factory": "HNSW8"}, "search_params": [{"efSearch": 16}, {"efSearch": 64}]},
+        {"adapter": "numpy_store", "params": {}},
+        {"adapter": "desconocido", "params": {}},
+    ]
+    report = run_benchmark(base, queries, k=5, sweep=sweep)
+    assert report["dataset"]["n"] == 400
+    results = report["results"]
+    assert len(results) == 5
+    for result in results[:4]:
+        assert "error" not in result
+        assert result["qps"] > 0
+        assert result["latency_p99_ms"] >= result["latency_p50_ms"]
+        assert "rss_mb" in result
+    assert results[0]["recall@5"] == 1.0
+    assert results[3]["recall@5"] == 1.0
+    assert "error" in results[4]
+    json.dumps(report)
+
+
+def test_main_writes_json(tmp_path):
+    out = tmp_path / "bench.json"
+    main(["--n", "200", "--dim", "8", "--queries", "5", "--k", "3",
+          "--adapters", "numpy_store", "--output", str(out)])
+    report = json.loads(out.read_text())
+    assert report["results"][0]["adapter"] == "numpy_store"
+
+
+def test_dim_reduction_report_recall_grows_with_dimension():
+    base, queries = generate_dataset(n=400, dim=32, n_queries=20, seed=3)
+    rows = dim_reduction_report(base, queries, dims=[4, 32], method="pca", k=5)
+    assert [r["dim"] for r in rows] == [4, 32]
+    assert rows[0]["recall@5"] <= rows[1]["recall@5"]
+    assert rows[1]["recall@5"] > 0.9
+    assert rows[0]["memory_ratio"] == 0.125
+
+
+def test_main_reduction_only(tmp_path):
+    out = tmp_path / "bench.json"
+    main(["--n", "200", "--dim", "8", "--queries", "5", "--k", "3", "--reduction", "truncate",
+          "--reduction-dims", "4,8", "--reduction-only", "--output", str(out)])
+    report = json.loads(out.read_text())
+    assert report["results"] == []
+    assert [r["dim"] for r in report["dim_reduction"]] == [4, 8]
@@ -60,3 +60,31 @@ def test_update_config(monkeypatch):
     config_updated = get_config()
     assert config_updated.search_k == 7
     assert config_updated.api_key == "key2"
+
+def _base_env(monkeypatch):
+    for key, value in {"openai_api_key": "key1", "db_connection": "conn1", "input": "json_loader",
+                       "embedder": "openai_embedder", "vector_store": "faiss_store", "llm": "openai_generator"}.items():
+        monkeypatch.setenv(key, value)
+
+def test_search_threshold_is_a_non_negative_distance(monkeypatch):
+    _base_env(monkeypatch)
+    assert Config(search_threshold=1.5, search_min_similarity=-0.2).search_min_similarity == -0.2
+    with pytest.raises(ValueError, match="distancia máxima"):
+        Config(search_threshold=-0.5)
+
+def test_embedding_reduction_requires_a_dimension(monkeypatch):
+    _base_env(monkeypatch)
+    assert Config(embedding_reduction="pca", embedding_reduction_dim=64).embedding_reduction_dim == 64
+    assert Config().embedding_reduction_dim is None
+    with pytest.raises(ValueError, match="embedding_reduction_dim es obligatorio"):
+        Config(embedding_reduction="pca")
+    with pytest.raises(ValueError, match="mayor que cero"):
+        Config(embedding_reduction="truncate", embedding_reduction_dim=0)
+
+def test_embedding_backend_is_validated(monkeypatch):
+    _base_env(monkeypatch)
+    assert Config().embedding_backend is None
+    assert Config(embedding_backend="").embedding_backend is None
+    assert Config(embedding_backend="onnx-int8").embedding_backend == "onnx-int8"
+    with pytest.raises(ValueError, match="embedding_backend"):
+        Config(embedding_backend="tensorrt")
@@ -43,3 +43,244 @@ def test_pre_rag_integration(pipeline_instance):
     project_path = "/ruta/proyecto"
     pipeline_instance.run(query, project_path)
     pipeline_instance.process_pre_rag.assert_called_once_with(project_path)
+
+def test_retrieve_applies_mmr_when_enabled(pipeline_instance, monkeypatch):
+    import numpy as np
+    monkeypatch.setattr(pipeline_instance, "config", pipeline_instance.config.model_copy(
+        update={"mmr_enabled": True, "search_k": 2, "mmr_fetch_factor": 2, "mmr_lambda": 0.3}))
+    candidates = [{"id": "a"}, {"id": "a-dup"}, {"id": "b"}]
+    vectors = np.array([[1.0, 0.0], [0.99, 0.01], [0.6, 0.8]], dtype="float32")
+    store = MagicMock()
+    store.search_with_vectors.return_value = (candidates, vectors)
+    results = pipeline_instance.retrieve(store, [1.0, 0.0])
+    store.search_with_vectors.assert_called_once_with([1.0, 0.0], 4)
+    assert [d["id"] for d in results] == ["a", "b"]
+
+def test_retrieve_without_mmr_uses_search(pipeline_instance):
+    store = MagicMock()
+    store.search.return_value = [{"id": "a"}]
+    assert pipeline_instance.retrieve(store, [1.0, 0.1]) == [{"id": "a"}]
+    store.search.assert_called_once_with([1.0, 0.1], pipeline_instance.config.search_k)
+
+def test_retrieve_with_threshold_and_adaptive_k(pipeline_instance, monkeypatch):
+    import numpy as np
+    monkeypatch.setattr(pipeline_instance, "config", pipeline_instance.config.model_copy(
+        update={"search_k": 4, "search_threshold": 2.0, "adaptive_k_enabled": True}))
+    store = MagicMock(spec=["search", "range_search"])
+    docs = [{"id": "a"}, {"id": "b"}, {"id": "c"}, {"id": "d"}]
+    store.range_search.return_value = (docs, np.array([0.1, 0.12, 1.5, 1.6]))
+    results = pipeline_instance.retrieve(store, [1.0, 0.0])
+    store.range_search.assert_called_once_with([1.0, 0.0], threshold=2.0, k_max=4)
+    assert [d["id"] for d in results] == ["a", "b"]
+
+def test_retrieve_with_parent_aggregation(pipeline_instance, monkeypatch):
+    monkeypatch.setattr(pipeline_instance, "config", pipeline_instance.config.model_copy(
+        update={"search_k": 3, "parent_aggregation": "sum", "parent_window": -1}))
+    store = MagicMock()
+    store.search_parents.return_value = [{"id": "p1"}]
+    assert pipeline_instance.retrieve(store, [1.0, 0.0]) == [{"id": "p1"}]
+    store.search_parents.assert_called_once_with([1.0, 0.0], 3, aggregate="sum", window=None)
+
+def test_embeddings_flow_as_matrix_without_copies():
+    import numpy as np
+    from types import SimpleNamespace
+    from utils.cache_manager import _cache
+    _cache.clear()
+    pipeline = RAGPipeline()
+    matrix = np.ones((2, 3), dtype="float32")
+    store = MagicMock()
+    pipeline.adapters = {
+        "Embeddings": {pipeline.config.embedder: SimpleNamespace(embed=lambda texts: matrix)},
+        "VectorStores": {pipeline.config.vector_store: store},
+    }
+    embeddings = pipeline.compute_embeddings(["uno", "dos"])
+    assert embeddings is matrix
+    pipeline.store_vectors([{"id": "1"}, {"id": "2"}], embeddings)
+    assert store.add_batch.call_args[0][1] is matrix
+    _cache.clear()
+
+def test_collection_records_embedder_and_rejects_other_models(monkeypatch):
+    import numpy as np
+    from types import SimpleNamespace
+    pipeline = RAGPipeline()
+    monkeypatch.setattr(pipeline, "config", pipeline.config.model_copy(update={"embedding_model": "modelo-a"}))
+    store = SimpleNamespace(embedder=None, add=MagicMock(), add_batch=MagicMock())
+    pipeline.adapters = {"VectorStores": {pipeline.config.vector_store: store}}
+    matrix = np.ones((1, 3), dtype="float32")
+    pipeline.store_vectors([{"id": "1"}], matrix)
+    assert store.embedder == f"{pipeline.config.embedder}:modelo-a"
+
+    monkeypatch.setattr(pipeline, "config", pipeline.config.model_copy(update={"embedding_model": "modelo-b"}))
+    with pytest.raises(RuntimeError, match="modelo-a"):
+        pipeline.store_vectors([{"id": "2"}], matrix)
+    assert store.add_batch.call_count == 1
+
+def test_queries_use_the_collection_embedder():
+    import numpy as np
+    from types import SimpleNamespace
+    from utils.cache_manager import _cache
+    _cache.clear()
+    pipeline = RAGPipeline()
+    calls = []
+
+    def embed(texts, model_name=None):
+        calls.append(model_name)
+        return np.ones((len(texts), 2), dtype="float32")
+
+    pipeline.adapters = {"Embeddings": {"local": SimpleNamespace(embed=embed)}}
+    store = SimpleNamespace(embedder="local:modelo-tenant")
+    embeddings = pipeline.compute_embeddings(["consulta"], embedder=pipeline._collection_embedder(store))
+    assert embeddings.shape == (1, 2)
+    assert calls == ["modelo-tenant"]
+    _cache.clear()
+
+def test_reduction_is_fitted_on_ingest_persisted_and_applied_to_queries(tmp_path, monkeypatch):
+    import numpy as np
+    from types import SimpleNamespace
+    from utils.dim_reduction import DimensionReducer
+    pipeline = RAGPipeline()
+    path = str(tmp_path / "reducer.npz")
+    monkeypatch.setattr(pipeline, "config", pipeline.config.model_copy(update={
+        "embedding_reduction": "pca", "embedding_reduction_dim": 2, "embedding_reduction_path": path}))
+    store = SimpleNamespace(reducer=None)
+    pipeline.adapters = {"VectorStores": {pipeline.config.vector_store: store}}
+    rng = np.random.default_rng(0)
+    corpus = rng.standard_normal((20, 6)).astype("float32")
+
+    reduced = pipeline.reduce_embeddings(corpus, fit=True)
+    assert reduced.shape == (20, 2)
+    assert isinstance(store.reducer, DimensionReducer)
+    assert DimensionReducer.load(path).dim == 2
+
+    # Otra instancia (p. ej. tras un reinicio) reutiliza la transformación persistida
+    other = RAGPipeline()
+    monkeypatch.setattr(other, "config", pipeline.config)
+    other.adapters = {"VectorStores": {pipeline.config.vector_store: SimpleNamespace(reducer=None)}}
+    assert np.allclose(other.reduce_embeddings(corpus[:1]), reduced[:1], atol=1e-6)
+
+def test_reduction_requires_a_fitted_transform_for_queries(monkeypatch):
+    import numpy as np
+    pipeline = RAGPipeline()
+    monkeypatch.setattr(pipeline, "config", pipeline.config.model_copy(update={
+        "embedding_reduction": "pca", "embedding_reduction_dim": 2}))
+    pipeline.adapters = {}
+    with pytest.raises(RuntimeError, match="no está ajustada"):
+        pipeline.reduce_embeddings(np.ones((1, 4), dtype="float32"))
+
+def test_run_stream_uses_adapter_generate_stream(pipeline_instance, monkeypatch):
+    import threading
+    llm = MagicMock()
+    llm.generate_stream.side_effect = lambda prompt, cancel_event=None: iter(["Hola ", "mundo"])
+    monkeypatch.setattr(pipeline_instance, "_prepare_generation", MagicMock(return_value=("prompt", llm)))
+    cancel = threading.Event()
+    chunks = list(pipeline_instance.run_stream("Consulta", cancel_event=cancel))
+    assert chunks == ["Hola ", "mundo"]
+    pipeline_instance.store_vectors.assert_called_once()
+    llm.generate_stream.assert_called_once_with("prompt", cancel_event=cancel)
+
+def test_stream_falls_back_to_generate_without_streaming(pipeline_instance, monkeypatch):
+    class BlockingLLM:
+        def generate(self, prompt):
+            return f"Respuesta completa a {prompt}"
+    monkeypatch.setattr(pipeline_instance, "_prepare_generation", MagicMock(return_value=("prompt", BlockingLLM())))
+    assert list(pipeline_instance.retrieve_and_generate_stream("Consulta")) == ["Respuesta completa a prompt"]
+
+
+def test_arun_awaits_async_adapters(pipeline_instance, monkeypatch):
+    import asyncio
+
+    class AsyncLLM:
+        def generate(self, prompt):
+            raise AssertionError("no debe usarse el camino síncrono")
+
+        async def agenerate(self, prompt):
+            return f"async: {prompt}"
+
+    store = MagicMock()
+    monkeypatch.setattr(pipeline_instance, "_generation_adapters", MagicMock(return_value=(store, AsyncLLM())))
+    monkeypatch.setattr(pipeline_instance, "acompute_embeddings", MagicMock(side_effect=lambda texts, embedder=None: asyncio.sleep(0, result=[[1.0, 0.0]])))
+    monkeypatch.setattr(pipeline_instance, "_build_prompt", MagicMock(return_value="prompt"))
+    assert asyncio.run(pipeline_instance.arun("Consulta")) == "async: prompt"
+    pipeline_instance.store_vectors.assert_called_once()
+
+def test_acompute_embeddings_uses_aembed(pipeline_instance, monkeypatch):
+    import asyncio
+    import types
+    calls = []
+
+    async def aembed(texts, model=None):
+        calls.append((list(texts), model))
+        return [[float(len(t)), 0.0] for t in texts]
+
+    adapter = types.SimpleNamespace(embed=lambda texts, model=None: None, aembed=aembed)
+    monkeypatch.setitem(pipeline_instance.adapters.setdefault("Embeddings", {}), "async_embedder", adapter)
+    result = asyncio.run(pipeline_instance.acompute_embeddings(["ab", "c"], embedder="async_embedder:mi-modelo"))
+    assert result[:, 0].tolist() == [2.0, 1.0]
+    assert calls == [(["ab", "c"], "mi-modelo")]
+
+def test_configured_vector_store_is_registered_for_reindex():
+    from scalability import reindexer
+    pipeline = RAGPipeline()
+    store = MagicMock()
+    pipeline.adapters = {"VectorStores": {pipeline.config.vector_store: store}}
+    try:
+        assert pipeline.vector_store() is store
+        assert reindexer.get_store(pipeline.config.vector_store) is store
+    finally:
+        reindexer.unregister_store(pipeline.config.vector_store)
+
+def test_compute_embeddings_delegates_caching_to_the_adapter():
+    import numpy as np
+    from types import SimpleNamespace
+    pipeline = RAGPipeline()
+    calls = []
+
+    def embed(texts, near_duplicates=False):
+        calls.append((list(texts), near_duplicates))
+        return [[float(len(calls))] * 2 for _ in texts]
+
+    pipeline.adapters = {"Embeddings": {pipeline.config.embedder: SimpleNamespace(embed=embed)}}
+    first = pipeline.compute_embeddings(["hola"])
+    # Sin caché propia del pipeline: un cambio de configuración del adaptador no sirve vectores viejos
+    second = pipeline.compute_embeddings(["hola"])
+    assert first.dtype == np.float32 and first.shape == (1, 2)
+    assert second[0, 0] == 2.0
+    assert calls == [(["hola"], pipeline.config.embedding_near_duplicates)] * 2
+
+def test_configured_embedding_backend_is_passed_to_the_adapter(monkeypatch):
+    from types import SimpleNamespace
+    pipeline = RAGPipeline()
+    monkeypatch.setattr(pipeline, "config", pipeline.config.model_copy(update={"embedding_backend": "onnx-int8"}))
+    calls = []
+
+    def embed(texts, backend=None):
+        calls.append(backend)
+        return [[1.0, 0.0] for _ in texts]
+
+    def embed_without_backend(texts):
+        return [[1.0, 0.0] for _ in texts]
+
+    pipeline.adapters = {"Embeddings": {pipeline.config.embedder: SimpleNamespace(embed=embed)}}
+    pipeline.compute_embeddings(["hola"])
+    assert calls == ["onnx-int8"]
+    # Un adaptador sin backends sigue funcionando
+    pipeline.adapters = {"Embeddings": {pipeline.config.embedder: SimpleNamespace(embed=embed_without_backend)}}
+    assert pipeline.compute_embeddings(["hola"]).shape == (1, 2)
+
+def test_prompt_ends_scaffold_and_each_document_with_newline(monkeypatch):
+    pipeline = RAGPipeline()
+    monkeypatch.setattr(pipeline, "reduce_embeddings", lambda embeddings: embeddings)
+    monkeypatch.setattr(pipeline, "retrieve", lambda store, emb: [{"texto": "uno"}, {"texto": "dos"}])
+    prompt = pipeline._build_prompt("¿qué?", None, [[0.0]])
+    assert prompt == "Contexto:\nuno\ndos\nConsulta: ¿qué?"
+
+def test_similarity_stores_use_search_min_similarity(pipeline_instance, monkeypatch):
+    import numpy as np
+    monkeypatch.setattr(pipeline_instance, "config", pipeline_instance.config.model_copy(
+        update={"search_k": 3, "search_threshold": 2.0, "search_min_similarity": 0.8}))
+    store = MagicMock(spec=["search", "range_search", "metric"])
+    store.metric = "ip"
+    store.range_search.return_value = ([{"id": "a"}], np.array([0.9]))
+    assert pipeline_instance.retrieve(store, [1.0, 0.0]) == [{"id": "a"}]
+    # La distancia máxima no se reinterpreta como similitud mínima
+    store.range_search.assert_called_once_with([1.0, 0.0], threshold=0.8, k_max=3)
@@ -0,0 +1,108 @@
+import threading
+import pytest
+from scalability import reindexer
+from scalability.reindexer import ReindexJob, ReindexState
+
+def test_job_reports_progress_and_completes():
+    job = ReindexJob("dummy")
+
+    def build(report):
+        for i in range(1, 5):
+            report(i, 4)
+
+    status = job.start(build, background=False)
+    assert status["state"] == ReindexState.DONE
+    assert status["progress"] == 1.0
+    assert status["processed"] == 4
+    assert status["generation"] == 1
+
+def test_job_failure_is_reported():
+    job = ReindexJob("dummy")
+
+    def build(report):
+        raise ValueError("fallo de construcción")
+
+    status = job.start(build, background=False)
+    assert status["state"] == ReindexState.FAILED
+    assert "fallo de construcción" in status["error"]
+
+def test_concurrent_reindex_is_rejected():
+    job = ReindexJob("dummy")
+    release = threading.Event()
+    job.start(lambda report: release.wait(2), background=True)
+    with pytest.raises(RuntimeError, match="en curso"):
+        job.start(lambda report: None)
+    release.set()
+    assert job.wait(2)["state"] == ReindexState.DONE
+
+def test_registry_and_start_reindex():
+    class DummyStore:
+        def __init__(self):
+            self.options = None
+        def reindex(self, **options):
+            self.options = options
+            return {"state": "building"}
+        def reindex_status(self):
+            return {"state": "idle"}
+
+    store = DummyStore()
+    reindexer.register_store("dummy_store", store)
+    try:
+        assert "dummy_store" in reindexer.get_registered_stores()
+        assert reindexer.start_reindex("dummy_store", index_factory="HNSW32") == {"state": "building"}
+        assert store.options == {"index_factory": "HNSW32"}
+        assert reindexer.get_reindex_status("dummy_store") == {"state": "idle"}
+    finally:
+        reindexer.unregister_store("dummy_store")
+    with pytest.raises(KeyError):
+        reindexer.get_store("dummy_store")
+
+def test_register_store_requires_reindex_support():
+    with pytest.raises(ValueError, match="no soporta"):
+        reindexer.register_store("invalido", object())
+
+def test_start_reindex_with_reembed_passes_embedder(monkeypatch):
+    class DummyStore:
+        def reindex(self, **options):
+            self.options = options
+            return {"state": "building"}
+        def reindex_status(self):
+            return {"state": "idle"}
+
+    embed_fn = lambda texts: [[0.0] for _ in texts]
+    monkeypatch.setattr(reindexer, "configured_embedder", lambda: ("sentence_transformer_embedder:modelo-b", embed_fn))
+    store = DummyStore()
+    reindexer.register_store("dummy_store", store)
+    try:
+        reindexer.start_reindex("dummy_store", reembed=True)
+        assert store.options == {"embed_fn": embed_fn, "embedder": "sentence_transformer_embedder:modelo-b"}
+    finally:
+        reindexer.unregister_store("dummy_store")
+
+def test_reembed_with_reduction_builds_vectors_in_query_dimension(monkeypatch):
+    import numpy as np
+    from adapters.VectorStores.faiss_store import FaissStore
+    from core.pipeline import RAGPipeline
+    from utils.dim_reduction import DimensionReducer
+
+    pipeline = RAGPipeline()
+    monkeypatch.setattr(pipeline, "config", pipeline.config.model_copy(update={
+        "embedding_reduction": "truncate", "embedding_reduction_dim": 2}))
+    # Embedder nuevo de dimensión 6; la colección y las consultas usan la reducción a 2
+    monkeypatch.setattr(pipeline, "compute_embeddings", lambda texts, embedder=None: np.array(
+        [[float(len(t)), 1.0, 0.5, 0.5, 0.5, 0.5] for t in texts], dtype="float32"))
+    store = FaissStore(dim=2)
+    store.reducer = DimensionReducer("truncate", 2)  # la registra la ingesta
+    pipeline.adapters = {"VectorStores": {pipeline.config.vector_store: store}}
+    store.add_batch([{"id": f"d{i}", "texto": "x" * (i + 1), "metadata": {}} for i in range(4)],
+                    np.zeros((4, 2), dtype="float32"))
+
+    try:
+        embedder, embed_fn = reindexer.configured_embedder(pipeline)
+        status = store.reindex(embed_fn=embed_fn, embedder=embedder, background=False)
+        assert status["state"] == "done"
+        assert store.dim == 2
+        query = pipeline.reduce_embeddings(pipeline.compute_embeddings(["xxx"]))[0]
+        assert store.search(query.tolist(), k=1)[0]["id"] == "d2"
+    finally:
+        reindexer.unregister_store(pipeline.config.vector_store)
@@ -0,0 +1,31 @@
+import pytest
+
+from utils.adaptive_k import adaptive_k
+
+
+def test_cuts_at_largest_gap():
+    # Dos coincidencias fuertes y luego un salto claro
+    assert adaptive_k([0.10, 0.12, 0.90, 0.95, 1.00], max_k=5) == 2
+
+
+def test_keeps_all_when_scores_are_smooth():
+    assert adaptive_k([0.1, 0.2, 0.3, 0.4, 0.5], min_gap=0.3) == 5
+
+
+def test_respects_min_and_max_k():
+    # El salto tras el primer resultado no se considera si min_k=2
+    assert adaptive_k([0.1, 0.9, 0.95, 1.0], min_k=2) == 4
+    assert adaptive_k([0.1, 0.9, 0.95, 1.0], min_k=1) == 1
+    assert adaptive_k([0.1, 0.2, 0.3, 0.4, 0.5], max_k=3, min_gap=0.9) == 3
+    assert adaptive_k([], max_k=3) == 0
+
+
+def test_similarity_scores():
+    assert adaptive_k([0.95, 0.93, 0.40, 0.38], higher_is_better=True) == 2
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        adaptive_k([0.1, 0.2], min_k=0)
+    with pytest.raises(ValueError):
+        adaptive_k([0.1, 0.2], min_gap=2.0)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from utils.dim_reduction import DimensionReducer
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    # 8 direcciones con mucha varianza y 24 con ruido pequeño
+    signal = rng.standard_normal((400, 8)) @ rng.standard_normal((8, 32))
+    return (signal + 0.01 * rng.standard_normal((400, 32))).astype("float32")
+
+
+def test_pca_keeps_neighbours_of_low_rank_data(vectors):
+    reducer = DimensionReducer("pca", 8, normalize=False).fit(vectors)
+    reduced = reducer.transform(vectors)
+    assert reduced.shape == (400, 8) and reduced.dtype == np.float32
+    assert reducer.explained_variance > 0.99
+    # Las distancias se conservan casi exactamente al proyectar sobre el subespacio principal
+    full = np.linalg.norm(vectors[:50, None] - vectors[None, :50], axis=-1)
+    small = np.linalg.norm(reduced[:50, None] - reduced[None, :50], axis=-1)
+    assert np.allclose(full, small, atol=0.1)
+
+
+def test_truncate_renormalizes_without_fitting():
+    reducer = DimensionReducer("truncate", 2)
+    assert reducer.fitted
+    reduced = reducer.transform(np.array([[3.0, 4.0, 10.0], [0.0, 2.0, 1.0]]))
+    assert np.allclose(reduced, [[0.6, 0.8], [0.0, 1.0]])
+
+
+def test_single_vector_and_dimension_checks(vectors):
+    reducer = DimensionReducer("pca", 4).fit(vectors)
+    assert reducer.transform(vectors[0]).shape == (4,)
+    assert np.linalg.norm(reducer.transform(vectors[0])) == pytest.approx(1.0, abs=1e-5)
+    with pytest.raises(ValueError, match="incompatible"):
+        reducer.transform(np.ones(16))
+    with pytest.raises(RuntimeError, match="no está ajustada"):
+        DimensionReducer("pca", 4).transform(vectors)
+    with pytest.raises(ValueError):
+        DimensionReducer("pca", 64).fit(vectors)
+    with pytest.raises(ValueError, match="no soportado"):
+        DimensionReducer("umap", 4)
+
+
+def test_fit_uses_a_bounded_sample(vectors):
+    reducer = DimensionReducer("pca", 4).fit(vectors, sample_size=100)
+    assert reducer.components.shape == (4, 32)
+
+
+def test_save_and_load_roundtrip(tmp_path, vectors):
+    reducer = DimensionReducer("pca", 6).fit(vectors)
+    path = reducer.save(str(tmp_path / "reducer.npz"))
+    loaded = DimensionReducer.load(path)
+    assert loaded.describe() == reducer.describe()
+    assert np.array_equal(loaded.transform(vectors[:5]), reducer.transform(vectors[:5]))
+
+    truncate = DimensionReducer.load(DimensionReducer("truncate", 3).save(str(tmp_path / "t.npz")))
+    assert truncate.method == "truncate" and truncate.dim == 3 and truncate.input_dim is None
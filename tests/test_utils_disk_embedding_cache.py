@@ -0,0 +1,91 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from utils.disk_embedding_cache import DiskEmbeddingCache, install_disk_embedding_cache
+from utils.embedding_cache import cached_embed, get_embedding_cache, set_embedding_cache
+
+
+def _lists(rows):
+    return [None if row is None else row.tolist() for row in rows]
+
+
+def test_roundtrip_and_persistence_across_instances(tmp_path):
+    cache = DiskEmbeddingCache(str(tmp_path), dtype="float32")
+    assert cache.set_many(["a", "b"], [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]) == 2
+    assert cache.set_many(["a", "c"], [[9.0, 9.0, 9.0], [0.5, 0.25]]) == 1  # "a" ya existe
+    assert _lists(cache.get_many(["b", "x", "a", "c"])) == [[4.0, 5.0, 6.0], None, [1.0, 2.0, 3.0], [0.5, 0.25]]
+    cache.close()
+
+    reopened = DiskEmbeddingCache(str(tmp_path))
+    assert len(reopened) == 3
+    assert _lists(reopened.get_many(["a"])) == [[1.0, 2.0, 3.0]]
+
+
+def test_float16_shards_and_rotation(tmp_path):
+    cache = DiskEmbeddingCache(str(tmp_path), dtype="float16", max_shard_rows=2)
+    rng = np.random.default_rng(0)
+    vectors = rng.random((5, 8), dtype="float32")
+    cache.set_many([f"k{i}" for i in range(5)], vectors)
+    assert len(list(tmp_path.glob("shard-*"))) == 3
+    found = np.array(cache.get_many([f"k{i}" for i in range(5)]))
+    assert np.allclose(found, vectors, atol=1e-3)
+
+
+def test_reader_sees_rows_appended_by_other_instance(tmp_path):
+    reader = DiskEmbeddingCache(str(tmp_path))
+    writer = DiskEmbeddingCache(str(tmp_path))
+    writer.set_many(["a"], [[1.0, 0.0]])
+    assert _lists(reader.get_many(["a"])) == [[1.0, 0.0]]
+    writer.set_many(["b"], [[0.0, 1.0]])  # el shard ya mapeado por el lector crece
+    assert _lists(reader.get_many(["b", "a"])) == [[0.0, 1.0], [1.0, 0.0]]
+
+
+def _write_range(path, start):
+    cache = DiskEmbeddingCache(path)
+    cache.set_many([f"k{i}" for i in range(start, start + 50)], [[float(i), 1.0] for i in range(start, start + 50)])
+
+
+def test_concurrent_writers_in_separate_processes(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=_write_range, args=(str(tmp_path), start)) for start in (0, 25, 50)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join(60)
+        assert p.exitcode == 0
+    cache = DiskEmbeddingCache(str(tmp_path))
+    assert len(cache) == 100
+    assert _lists(cache.get_many(["k0", "k60", "k99"])) == [[0.0, 1.0], [60.0, 1.0], [99.0, 1.0]]
+
+
+def test_export_import(tmp_path):
+    source = DiskEmbeddingCache(str(tmp_path / "origen"))
+    source.set_many(["a", "b", "c"], [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0, 7.0]])
+    dump = str(tmp_path / "cache.npz")
+    assert source.export_to(dump) == 3
+
+    target = DiskEmbeddingCache(str(tmp_path / "destino"))
+    target.set_many(["a"], [[1.0, 2.0]])
+    assert target.import_from(dump) == 2
+    assert _lists(target.get_many(["c", "b"])) == [[5.0, 6.0, 7.0], [3.0, 4.0]]
+
+
+def test_install_backend_for_cached_embed(tmp_path):
+    previous = get_embedding_cache()
+    try:
+        cache = install_disk_embedding_cache(str(tmp_path))
+        assert install_disk_embedding_cache(str(tmp_path)) is cache
+        calls = []
+        embed_fn = lambda texts: calls.append(texts) or [[float(len(t)), 0.0] for t in texts]
+        cached_embed(["hola", "mundo"], "m", embed_fn)
+        assert cached_embed(["mundo", "hola"], "m", embed_fn).tolist() == [[5.0, 0.0], [4.0, 0.0]]
+        assert len(calls) == 1
+    finally:
+        set_embedding_cache(previous)
+
+
+def test_invalid_dtype(tmp_path):
+    with pytest.raises(ValueError):
+        DiskEmbeddingCache(str(tmp_path), dtype="int8")
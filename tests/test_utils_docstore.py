@@ -0,0 +1,119 @@
+import threading
+import pytest
+from utils.docstore import BlobDocStore, SQLiteDocStore, create_docstore
+
+DOCS = [
+    {"id": "doc1", "texto": "Texto de ejemplo 1", "metadata": {"origen": "test"}},
+    {"id": "doc2", "texto": "Texto con acentos: áéíóú ñ", "metadata": {}},
+    {"id": "doc3", "texto": "x" * 5000, "metadata": {"n": 3}},
+]
+
+@pytest.fixture(params=[("blob", False), ("blob", True), ("sqlite", False), ("sqlite", True)])
+def store(request):
+    backend, compress = request.param
+    ds = create_docstore(backend, compress=compress)
+    yield ds
+    ds.close()
+
+def test_append_and_get(store):
+    positions = [store.append(d) for d in DOCS]
+    assert positions == [0, 1, 2]
+    assert len(store) == 3
+    assert store[1] == DOCS[1]
+    assert 2 in store and 3 not in store
+    assert store.get(99) is None
+
+def test_get_many_preserves_order_and_skips_missing(store):
+    for d in DOCS:
+        store.append(d)
+    docs = store.get_many([2, -1, 0])
+    assert [d["id"] for d in docs] == ["doc3", "doc1"]
+
+def test_empty_store_equals_empty_dict(store):
+    assert store == {}
+
+def test_compression_reduces_size():
+    plain, packed = BlobDocStore(), BlobDocStore(compress=True)
+    for ds in (plain, packed):
+        ds.append(DOCS[2])
+    assert packed.nbytes < plain.nbytes
+
+@pytest.mark.parametrize("cls", [BlobDocStore, SQLiteDocStore])
+def test_persistence_roundtrip(tmp_path, cls):
+    path = str(tmp_path / "docs.bin")
+    ds = cls(path=path)
+    for d in DOCS:
+        ds.append(d)
+    ds.close()
+    reopened = cls(path=path)
+    assert len(reopened) == 3
+    assert reopened[2] == DOCS[2]
+    assert reopened.append({"id": "doc4"}) == 3
+    reopened.close()
+
+def test_concurrent_appends():
+    ds = BlobDocStore()
+    def worker(start):
+        for i in range(start, start + 50):
+            ds.append({"id": f"d{i}"})
+    threads = [threading.Thread(target=worker, args=(t * 50,)) for t in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(ds) == 200
+    assert sorted(d["id"] for d in ds.values()) == sorted(f"d{i}" for i in range(200))
+
+def test_docstore_base_is_abstract():
+    from utils.docstore import DocStore
+    with pytest.raises(TypeError):
+        DocStore()
+
+def test_offsets_are_persisted_on_every_append(tmp_path):
+    path = str(tmp_path / "docs.bin")
+    ds = BlobDocStore(path=path)
+    for d in DOCS:
+        ds.append(d)
+    # Sin flush()/close() (p. ej. una caída del proceso) los documentos siguen indexados
+    reopened = BlobDocStore(path=path)
+    assert len(reopened) == 3 and reopened[2] == DOCS[2]
+    reopened.close()
+    ds.close()
+
+def test_partial_offset_write_is_discarded(tmp_path):
+    path = str(tmp_path / "docs.bin")
+    ds = BlobDocStore(path=path)
+    for d in DOCS:
+        ds.append(d)
+    ds.close()
+    with open(path + ".offsets", "ab") as f:
+        f.write(b"\x01\x02\x03")  # offset escrito a medias
+    reopened = BlobDocStore(path=path)
+    assert len(reopened) == 3
+    assert reopened.append({"id": "doc4"}) == 3
+    reopened.close()
+    assert BlobDocStore(path=path)[3] == {"id": "doc4"}
+
+def test_blob_without_offsets_is_not_overwritten(tmp_path):
+    path = tmp_path / "docs.bin"
+    ds = BlobDocStore(path=str(path))
+    ds.append(DOCS[0])
+    ds.close()
+    (tmp_path / "docs.bin.offsets").unlink()
+    with pytest.raises(RuntimeError, match="falta"):
+        BlobDocStore(path=str(path))
+    assert path.stat().st_size > 0
+
+@pytest.mark.parametrize("backend", ["blob", "sqlite"])
+def test_truncate_discards_tail(tmp_path, backend):
+    path = str(tmp_path / f"docs.{backend}")
+    store = create_docstore(backend, path=path)
+    for d in DOCS:
+        store.append(d)
+    store.truncate(1)
+    assert len(store) == 1 and 1 not in store
+    assert store.append({"id": "nuevo"}) == 1
+    store.close()
+    reopened = create_docstore(backend, path=path)
+    assert len(reopened) == 2 and reopened[1] == {"id": "nuevo"}
+    reopened.close()
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from utils.dynamic_batcher import DynamicBatcher
+
+
+def test_concurrent_requests_are_batched_and_answered_individually():
+    batches = []
+
+    def process(items):
+        batches.append(list(items))
+        return [item.upper() for item in items]
+
+    batcher = DynamicBatcher(process, max_batch_size=8, max_delay=0.2)
+    results = {}
+    threads = [threading.Thread(target=lambda w=w: results.__setitem__(w, batcher(w))) for w in ["a", "b", "c", "d"]]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.close()
+    assert results == {"a": "A", "b": "B", "c": "C", "d": "D"}
+    assert len(batches) == 1 and sorted(batches[0]) == ["a", "b", "c", "d"]
+
+
+def test_batches_respect_max_batch_size():
+    batches = []
+    release = threading.Event()
+
+    def process(items):
+        release.wait(1)
+        batches.append(len(items))
+        return items
+
+    batcher = DynamicBatcher(process, max_batch_size=3, max_delay=0.05)
+    futures = [batcher.submit(i) for i in range(7)]
+    release.set()
+    assert [f.result(2) for f in futures] == list(range(7))
+    assert max(batches) <= 3 and sum(batches) == 7
+    batcher.close()
+
+
+def test_single_request_waits_at_most_max_delay():
+    batcher = DynamicBatcher(lambda items: items, max_batch_size=64, max_delay=0.05)
+    start = time.monotonic()
+    assert batcher("x") == "x"
+    assert time.monotonic() - start < 1.0
+    batcher.close()
+
+
+def test_errors_reach_every_caller_of_the_batch():
+    def process(items):
+        raise ValueError("fallo del modelo")
+
+    batcher = DynamicBatcher(process, max_delay=0.05)
+    futures = [batcher.submit(i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(ValueError, match="fallo del modelo"):
+            future.result(2)
+    misaligned = DynamicBatcher(lambda items: items[:1], max_delay=0.05)
+    futures = [misaligned.submit(i) for i in range(2)]
+    with pytest.raises(RuntimeError, match="resultados"):
+        futures[-1].result(2)
+    batcher.close()
+    misaligned.close()
+
+
+def test_close_drains_pending_requests_and_rejects_new_ones():
+    batcher = DynamicBatcher(lambda items: [i * 2 for i in items], max_delay=0.05)
+    futures = [batcher.submit(i) for i in range(5)]
+    batcher.close(timeout=2)
+    assert [f.result(0) for f in futures] == [0, 2, 4, 6, 8]
+    with pytest.raises(RuntimeError, match="cerrado"):
+        batcher.submit(1)
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError):
+        DynamicBatcher(lambda items: items, max_batch_size=0)
+    with pytest.raises(ValueError):
+        DynamicBatcher(lambda items: items, max_delay=-1)
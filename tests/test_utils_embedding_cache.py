@@ -0,0 +1,117 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from utils.cache_manager import _cache
+from utils.embedding_cache import acached_embed, cached_embed, deduplicate, embedding_key, near_duplicate_key
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    _cache.clear()
+    yield
+    _cache.clear()
+
+
+def _counting_embedder(calls):
+    def embed_fn(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+    return embed_fn
+
+
+def test_embedding_key_is_stable_and_normalized():
+    key = embedding_key("m", "Hola  mundo ")
+    assert key == embedding_key("m", "Hola mundo")
+    assert key == embedding_key("m", "Hola\nmundo")
+    assert key != embedding_key("otro", "Hola mundo")
+    assert key != embedding_key("m", "Hola mundos")
+    assert len(key) == 32
+
+
+def test_only_missing_texts_are_embedded_in_order():
+    calls = []
+    embed_fn = _counting_embedder(calls)
+    first = cached_embed(["a", "bb", "ccc"], "m", embed_fn)
+    assert first.dtype == np.float32 and first.tolist() == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+
+    second = cached_embed(["dddd", "bb", "a"], "m", embed_fn)
+    assert second.tolist() == [[4.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert calls == [["a", "bb", "ccc"], ["dddd"]]
+
+    cached_embed(["a", "bb"], "m", embed_fn)
+    assert len(calls) == 2
+    cached_embed(["a"], "otro-modelo", embed_fn)
+    assert calls[-1] == ["a"]
+
+
+def test_misaligned_embedder_raises():
+    with pytest.raises(RuntimeError):
+        cached_embed(["a", "b"], "m", lambda texts: [[1.0]])
+
+
+def test_matrix_from_embedder_is_returned_without_copy():
+    computed = np.arange(6, dtype=np.float32).reshape(3, 2)
+    result = cached_embed(["a", "b", "c"], "m", lambda texts: computed)
+    assert result is computed and not result.flags.writeable
+    assert cached_embed([], "m", lambda texts: computed).shape == (0, 0)
+
+
+def test_duplicates_are_embedded_once_and_scattered_back():
+    calls = []
+    embed_fn = _counting_embedder(calls)
+    result = cached_embed(["boiler", "x", "boiler", "boiler  ", "yy", "x"], "m", embed_fn)
+    assert calls == [["boiler", "x", "yy"]]
+    assert result[:, 0].tolist() == [6.0, 1.0, 6.0, 6.0, 2.0, 1.0]
+    assert not result.flags.writeable
+
+    # Mezcla de aciertos y duplicados nuevos
+    result = cached_embed(["zzz", "x", "zzz"], "m", embed_fn)
+    assert calls[-1] == ["zzz"]
+    assert result[:, 0].tolist() == [3.0, 1.0, 3.0]
+
+
+def test_near_duplicates_share_one_embedding():
+    calls = []
+    embed_fn = _counting_embedder(calls)
+    texts = ["Aviso legal.", "aviso legal", "AVISO LEGAL!", "Otro texto"]
+    result = cached_embed(texts, "m", embed_fn, near_duplicates=True)
+    assert calls == [["Aviso legal.", "Otro texto"]]
+    assert result[:, 0].tolist() == [12.0, 12.0, 12.0, 10.0]
+    # Sin la opción, solo se agrupan los duplicados exactos
+    assert len(cached_embed(texts, "m2", embed_fn)) == 4 and len(calls[-1]) == 4
+
+
+def test_near_duplicates_do_not_pollute_exact_cache_entries():
+    calls = []
+    embed_fn = _counting_embedder(calls)
+    cached_embed(["Aviso legal.", "aviso legal"], "m", embed_fn, near_duplicates=True)
+    assert calls == [["Aviso legal."]]
+    # Sin agrupar casi duplicados, "aviso legal" no debe recibir el vector cacheado de "Aviso legal."
+    result = cached_embed(["Aviso legal.", "aviso legal"], "m", embed_fn)
+    assert calls[-1] == ["aviso legal"]
+    assert result[:, 0].tolist() == [12.0, 11.0]
+
+
+def test_deduplicate_and_near_duplicate_key():
+    unique, inverse = deduplicate(["a", "b", "a", "c", "b"])
+    assert unique == [0, 1, 3]
+    assert inverse.tolist() == [0, 1, 0, 2, 1]
+    assert near_duplicate_key("  ¡Hola,   MUNDO! ") == "hola mundo"
+
+
+def test_async_variant_shares_the_cache():
+    calls = []
+    embed_fn = _counting_embedder(calls)
+
+    async def aembed_fn(texts):
+        return embed_fn(texts)
+
+    first = asyncio.run(acached_embed(["a", "bb", "a"], "m", aembed_fn))
+    assert first[:, 0].tolist() == [1.0, 2.0, 1.0]
+    # Los aciertos del camino asíncrono sirven al síncrono y viceversa
+    cached_embed(["a", "ccc"], "m", embed_fn)
+    second = asyncio.run(acached_embed(["ccc", "bb"], "m", aembed_fn))
+    assert second[:, 0].tolist() == [3.0, 2.0]
+    assert calls == [["a", "bb"], ["ccc"]]
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils.embedding_pool import EmbeddingWorkerPool
+
+
+class FakeModel:
+    nbytes = 1000
+
+    def encode(self, texts, batch_size=None):
+        if any(t == "boom" for t in texts):
+            raise ValueError("texto inválido")
+        return np.array([[float(len(t)), float(os.getpid()), float(os.environ["OMP_NUM_THREADS"])] for t in texts])
+
+
+def fake_factory():
+    return FakeModel()
+
+
+def failing_factory():
+    raise OSError("modelo inexistente")
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with EmbeddingWorkerPool(fake_factory, num_workers=2, threads_per_worker=1, task_size=3) as p:
+        yield p
+
+
+def test_pool_encodes_in_order_across_workers(pool):
+    texts = ["x" * n for n in [5, 1, 9, 3, 7, 2, 8, 4]]
+    vectors = pool.encode(texts, batch_size=4)
+    assert pool.dim == 3
+    assert pool.nbytes == 2000                              # una copia del modelo por worker
+    assert vectors.dtype == np.float32 and vectors.shape == (8, 3)
+    assert vectors[:, 0].tolist() == [5.0, 1.0, 9.0, 3.0, 7.0, 2.0, 8.0, 4.0]
+    assert set(vectors[:, 2].tolist()) == {1.0}            # hilos por worker limitados
+    assert os.getpid() not in vectors[:, 1].tolist()
+    assert pool.encode([]).shape == (0, 3)
+
+
+def test_pool_reports_task_errors_and_stays_usable(pool):
+    with pytest.raises(RuntimeError, match="texto inválido"):
+        pool.encode(["ok", "boom"])
+    assert pool.encode(["abc"])[0, 0] == 3.0
+
+
+def test_closed_pool_rejects_work():
+    p = EmbeddingWorkerPool(fake_factory, num_workers=1, threads_per_worker=1)
+    p.close()
+    assert p.closed
+    with pytest.raises(RuntimeError, match="cerrado"):
+        p.encode(["abc"])
+
+
+def test_pool_fails_when_model_cannot_load():
+    with pytest.raises(RuntimeError, match="modelo inexistente"):
+        EmbeddingWorkerPool(failing_factory, num_workers=1)
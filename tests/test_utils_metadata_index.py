@@ -0,0 +1,55 @@
+import pytest
+from utils.metadata_index import MetadataIndex, to_chroma_where
+
+@pytest.fixture
+def index():
+    idx = MetadataIndex()
+    idx.add(0, {"tenant": "acme", "source": "api", "year": 2024})
+    idx.add(1, {"tenant": "acme", "source": "sql", "year": 2025})
+    idx.add(2, {"tenant": "beta", "source": "api", "year": 2025, "tags": ["ignorada"]})
+    idx.add(3, None)
+    return idx
+
+def test_equality_and_implicit_and(index):
+    assert index.candidate_ids({"tenant": "acme"}, 4).tolist() == [0, 1]
+    assert index.candidate_ids({"tenant": "acme", "source": "api"}, 4).tolist() == [0]
+
+def test_operators(index):
+    assert index.candidate_ids({"source": {"$in": ["sql", "csv"]}}, 4).tolist() == [1]
+    assert index.candidate_ids({"tenant": {"$ne": "acme"}}, 4).tolist() == [2, 3]
+    assert index.candidate_ids({"year": {"$gte": 2025}}, 4).tolist() == [1, 2]
+    assert index.candidate_ids({"$or": [{"tenant": "beta"}, {"year": 2024}]}, 4).tolist() == [0, 2]
+
+def test_non_scalar_values_are_not_indexed(index):
+    assert "tags" not in index.keys()
+
+def test_unsupported_operator(index):
+    with pytest.raises(ValueError, match="no soportado"):
+        index.mask({"year": {"$regex": "20.*"}}, 4)
+
+def test_to_chroma_where():
+    assert to_chroma_where(None) is None
+    assert to_chroma_where({"tenant": "acme"}) == {"tenant": "acme"}
+    assert to_chroma_where({"tenant": "acme", "year": {"$gt": 2024}}) == {
+        "$and": [{"tenant": "acme"}, {"year": {"$gt": 2024}}]
+    }
+    assert to_chroma_where({"source": {"$in": ["api", "sql"]}}) == {
+        "$or": [{"source": {"$eq": "api"}}, {"source": {"$eq": "sql"}}]
+    }
+
+def test_truncate_drops_positions_from_n():
+    index = MetadataIndex()
+    for pos, tenant in enumerate(["a", "b", "a", "c"]):
+        index.add(pos, {"tenant": tenant})
+    index.truncate(2)
+    assert index.candidate_ids({"tenant": "a"}, 4).tolist() == [0]
+    assert index.candidate_ids({"tenant": "c"}, 4).size == 0
+
+def test_empty_in_is_rejected_consistently(index):
+    with pytest.raises(ValueError, match="al menos un valor"):
+        index.candidate_ids({"source": {"$in": []}}, 4)
+    with pytest.raises(ValueError, match="al menos un valor"):
+        to_chroma_where({"source": {"$in": []}})
+    # Un "$nin" vacío no excluye nada en ninguno de los dos
+    assert index.candidate_ids({"source": {"$nin": []}}, 4).tolist() == [0, 1, 2, 3]
+    assert to_chroma_where({"source": {"$nin": []}}) is None
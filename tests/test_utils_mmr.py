@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from utils.mmr import mmr_rerank, mmr_select
+
+
+def _near_duplicates():
+    # Dos pasajes casi idénticos muy relevantes y uno distinto algo menos relevante
+    return np.array([
+        [1.0, 0.0, 0.0],
+        [0.99, 0.01, 0.0],
+        [0.6, 0.0, 0.8],
+    ], dtype="float32")
+
+
+def test_lambda_one_keeps_relevance_order():
+    query = np.array([1.0, 0.0, 0.1])
+    assert mmr_select(query, _near_duplicates(), k=3, lambda_mult=1.0) == [0, 1, 2]
+
+
+def test_mmr_skips_near_duplicates():
+    query = np.array([1.0, 0.0, 0.1])
+    assert mmr_select(query, _near_duplicates(), k=2, lambda_mult=0.5) == [0, 2]
+
+
+def test_mmr_rerank_returns_documents_and_handles_edge_cases():
+    docs = [{"id": "a"}, {"id": "b"}, {"id": "c"}]
+    selected = mmr_rerank([1.0, 0.0, 0.1], docs, _near_duplicates(), k=5, lambda_mult=0.3)
+    assert sorted(d["id"] for d in selected) == ["a", "b", "c"]
+    assert mmr_select([1.0, 0.0, 0.0], np.empty((0, 3)), k=2) == []
+    with pytest.raises(ValueError):
+        mmr_select([1.0, 0.0, 0.0], _near_duplicates(), k=2, lambda_mult=1.5)
+    with pytest.raises(ValueError):
+        mmr_select([1.0, 0.0], _near_duplicates(), k=2)
@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+
+from utils.model_registry import ModelRegistry, estimate_model_bytes
+
+
+class FakeModel:
+    def __init__(self, name, nbytes):
+        self.name = name
+        self.nbytes = nbytes
+
+
+def make_registry(sizes, max_bytes=None):
+    calls = []
+
+    def loader(key):
+        calls.append(key)
+        return FakeModel(key, sizes[key])
+
+    return ModelRegistry(loader, max_bytes=max_bytes), calls
+
+
+def test_models_are_loaded_once_per_key():
+    registry, calls = make_registry({"a": 10, "b": 10})
+    assert registry.get("a") is registry.get("a")
+    assert registry.get("b").name == "b"
+    assert calls == ["a", "b"]
+    assert registry.total_bytes == 20
+
+
+def test_least_recently_used_model_is_evicted_over_budget():
+    registry, calls = make_registry({"a": 40, "b": 40, "c": 40}, max_bytes=100)
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # "b" pasa a ser el menos reciente
+    registry.get("c")
+    assert registry.keys() == ["a", "c"]
+    assert "b" not in registry
+    registry.get("b")
+    assert calls == ["a", "b", "c", "b"]
+    assert registry.total_bytes <= 100
+
+
+def test_requested_model_is_kept_even_if_it_exceeds_the_budget():
+    registry, _ = make_registry({"small": 10, "huge": 500}, max_bytes=100)
+    registry.get("small")
+    model = registry.get("huge")
+    assert model.name == "huge"
+    assert registry.keys() == ["huge"]
+
+
+def test_concurrent_requests_load_a_model_once():
+    calls = []
+
+    def slow_loader(key):
+        calls.append(key)
+        time.sleep(0.05)
+        return FakeModel(key, 1)
+
+    registry = ModelRegistry(slow_loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("m"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == ["m"]
+    assert all(r is results[0] for r in results)
+
+
+def test_loader_errors_are_not_cached():
+    attempts = []
+
+    def flaky_loader(key):
+        attempts.append(key)
+        if len(attempts) == 1:
+            raise RuntimeError("fallo de carga")
+        return FakeModel(key, 1)
+
+    registry = ModelRegistry(flaky_loader)
+    with pytest.raises(RuntimeError, match="fallo de carga"):
+        registry.get("m")
+    assert len(registry) == 0
+    assert registry.get("m").name == "m"
+
+
+def test_evict_and_clear():
+    registry, _ = make_registry({"a": 1, "b": 1})
+    registry.get("a")
+    registry.get("b")
+    assert registry.evict("a") is True
+    assert registry.evict("a") is False
+    registry.clear()
+    assert len(registry) == 0 and registry.total_bytes == 0
+
+
+def test_estimate_model_bytes_sums_torch_parameters():
+    torch = pytest.importorskip("torch")
+    module = torch.nn.Linear(4, 2)  # 8 pesos + 2 sesgos en float32
+    assert estimate_model_bytes(module) == 10 * 4
+    assert estimate_model_bytes(object()) == 0
+
+
+def test_negative_budget_is_rejected():
+    with pytest.raises(ValueError):
+        ModelRegistry(lambda key: key, max_bytes=-1)
+
+
+def test_on_evict_releases_every_expelled_model():
+    released = []
+    registry = ModelRegistry(
+        lambda key: FakeModel(key, 60), max_bytes=100, on_evict=lambda key, model: released.append(key)
+    )
+    registry.get("a")
+    registry.get("b")          # expulsa "a" por presupuesto
+    registry.get("c")
+    registry.evict("c")
+    registry.get("d")
+    registry.clear()
+    assert released == ["a", "b", "c", "d"]
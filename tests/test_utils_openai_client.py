@@ -0,0 +1,129 @@
+import asyncio
+
+import openai
+import pytest
+from openai.error import APIError, RateLimitError
+
+from utils import openai_client
+from utils.openai_client import AsyncOpenAIClient
+
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test_api_key")
+    monkeypatch.setattr(openai, "api_key", None)
+
+
+def test_api_key_and_pooled_session_are_passed_per_call():
+    seen = []
+
+    async def create(api_key=None, **payload):
+        seen.append((api_key, openai.aiosession.get(), payload))
+        return {"ok": True}
+
+    async def main():
+        client = AsyncOpenAIClient()
+        try:
+            await client.request("chat", create, model="m")
+            await client.request("chat", create, model="m")
+        finally:
+            await client.aclose()
+
+    asyncio.run(main())
+    assert [key for key, _, _ in seen] == ["test_api_key", "test_api_key"]
+    # La misma sesión (pool keep-alive) en todas las llamadas, sin tocar el estado global
+    assert seen[0][1] is not None and seen[0][1] is seen[1][1]
+    assert seen[0][2] == {"model": "m"}
+    assert openai.api_key is None and openai.aiosession.get() is None
+
+
+def test_endpoint_concurrency_is_limited():
+    in_flight = {"now": 0, "max": 0}
+
+    async def create(api_key=None, **payload):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        return payload["i"]
+
+    async def main():
+        client = AsyncOpenAIClient(endpoint_limits={"chat": 3})
+        try:
+            return await asyncio.gather(*(client.request("chat", create, i=i) for i in range(12)))
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(main()) == list(range(12))
+    assert in_flight["max"] == 3
+
+
+def test_transient_errors_back_off_without_blocking(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(openai_client.asyncio, "sleep", fake_sleep)
+    calls = {"count": 0}
+
+    async def create(api_key=None, **payload):
+        calls["count"] += 1
+        if calls["count"] < 3:
+            raise RateLimitError("límite de peticiones")
+        return "ok"
+
+    async def main():
+        client = AsyncOpenAIClient()
+        try:
+            assert await client.request("chat", create, retries=3, backoff_factor=2.0) == "ok"
+            calls["count"] = -10
+            with pytest.raises(RateLimitError):
+                await client.request("chat", create, retries=1)
+        finally:
+            await client.aclose()
+
+    asyncio.run(main())
+    assert delays[:2] == [1, 2.0]
+
+
+def test_non_transient_errors_and_missing_key(monkeypatch):
+    async def create(api_key=None, **payload):
+        raise APIError("error crítico")
+
+    async def main():
+        client = AsyncOpenAIClient()
+        try:
+            with pytest.raises(APIError):
+                await client.request("chat", create)
+            with pytest.raises(ValueError, match="sin límite"):
+                await client.request("moderations", create)
+            monkeypatch.delenv("OPENAI_API_KEY")
+            with pytest.raises(RuntimeError, match="OPENAI_API_KEY no está configurada"):
+                await client.request("chat", create)
+        finally:
+            await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_each_event_loop_gets_its_own_session():
+    sessions = []
+
+    async def create(api_key=None, **payload):
+        sessions.append(openai.aiosession.get())
+
+    client = AsyncOpenAIClient()
+
+    async def main():
+        await client.request("embeddings", create)
+        await client.aclose()
+
+    asyncio.run(main())
+    asyncio.run(main())
+    assert sessions[0] is not sessions[1]
+
+
+def test_invalid_limits_are_rejected():
+    with pytest.raises(ValueError):
+        AsyncOpenAIClient(endpoint_limits={"chat": 0})
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from utils.docstore import create_docstore
+from utils.metadata_index import MetadataIndex
+from utils.parent_aggregation import (
+    aggregate_by_parent,
+    collapse_to_parents,
+    make_child_documents,
+    make_span_loader,
+)
+
+
+def test_make_child_documents():
+    children = make_child_documents({"id": "p1", "texto": "abc", "metadata": {"origen": "x"}}, ["a", "b"])
+    assert [c["id"] for c in children] == ["p1#0", "p1#1"]
+    assert children[1]["metadata"] == {"origen": "x", "parent_id": "p1", "chunk_index": 1}
+
+
+def test_aggregate_max_and_sum():
+    parents = ["a", "b", "a", "c"]
+    sims = [0.9, 0.5, 0.8, 0.95]
+    groups, scores, best = aggregate_by_parent(parents, sims, "max")
+    assert groups.tolist() == ["c", "a", "b"] and best.tolist() == [3, 0, 1]
+    groups, scores, best = aggregate_by_parent(parents, sims, "sum")
+    assert groups.tolist() == ["a", "c", "b"]
+    assert scores[0] == pytest.approx(1.7)
+    with pytest.raises(ValueError):
+        aggregate_by_parent(parents, sims, "avg")
+
+
+def test_collapse_with_window():
+    docstore = create_docstore("blob")
+    index = MetadataIndex()
+    children = make_child_documents({"id": "p1"}, ["c0", "c1", "c2", "c3"]) + make_child_documents({"id": "p2"}, ["d0"])
+    for doc in children:
+        index.add(docstore.append(doc), doc["metadata"])
+    retrieved = [children[2], children[4], children[3]]
+    distances = np.array([0.1, 0.2, 0.3])
+
+    results = collapse_to_parents(retrieved, distances, k=2, load_span=make_span_loader(docstore, index, 5, 1))
+    assert [r["id"] for r in results] == ["p1", "p2"]
+    assert results[0]["texto"] == "c1\nc2\nc3"
+    assert results[0]["matched_chunks"] == ["p1#2", "p1#3"] and results[0]["best_chunk"] == "p1#2"
+
+    whole = collapse_to_parents(retrieved, distances, k=1, load_span=make_span_loader(docstore, index, 5, None))
+    assert whole[0]["texto"] == "c0\nc1\nc2\nc3"
+    only_chunk = collapse_to_parents(retrieved, distances, k=1, load_span=make_span_loader(docstore, index, 5, 0))
+    assert only_chunk[0]["texto"] == "c2"
+    docstore.close()
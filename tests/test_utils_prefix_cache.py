@@ -0,0 +1,59 @@
+import pytest
+
+from utils.prefix_cache import PrefixCache
+
+
+def test_lookup_returns_longest_cached_prefix():
+    cache = PrefixCache()
+    cache.put([1, 2], "corto")
+    cache.put([1, 2, 3, 4], "largo")
+    assert cache.lookup([1, 2, 3, 4, 5]) == (4, "largo")
+    assert cache.lookup([1, 2, 9]) == (2, "corto")
+    assert cache.lookup([7, 8]) == (0, None)
+    # max_length limita el prefijo (p. ej. para dejar al menos un token sin cachear)
+    assert cache.lookup([1, 2, 3, 4], max_length=3) == (2, "corto")
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_least_recently_used_prefixes_are_evicted():
+    cache = PrefixCache(max_entries=2)
+    cache.put([1], "a")
+    cache.put([2], "b")
+    cache.lookup([1, 5])  # [2] pasa a ser el menos reciente
+    cache.put([3, 3], "c")
+    assert len(cache) == 2
+    assert cache.lookup([2, 5]) == (0, None)
+    assert cache.lookup([1]) == (1, "a") and cache.lookup([3, 3, 3]) == (2, "c")
+
+
+def test_same_value_under_several_prefixes_and_clear():
+    cache = PrefixCache()
+    state = object()
+    cache.put([1, 2], state)
+    cache.put([1, 2, 3], state)
+    cache.put([], state)
+    assert len(cache) == 2
+    assert cache.lookup([1, 2, 4])[1] is state
+    cache.clear()
+    assert len(cache) == 0 and cache.lookup([1, 2, 3]) == (0, None)
+    with pytest.raises(ValueError):
+        PrefixCache(max_entries=0)
+
+
+def test_token_budget_counts_shared_values_once():
+    cache = PrefixCache(max_entries=10, max_tokens=10)
+    shared = object()
+    cache.put([1, 2, 3], shared, tokens=6)
+    cache.put([1, 2, 3, 4, 5, 6], shared, tokens=6)
+    assert cache.tokens == 6 and len(cache) == 2
+    cache.put([7, 8], "b", tokens=4)
+    assert cache.tokens == 10
+    # Superar el presupuesto expulsa los prefijos menos recientes hasta liberar el estado compartido
+    cache.put([9], "c", tokens=3)
+    assert cache.lookup([1, 2, 3, 4, 5, 6]) == (0, None)
+    assert cache.tokens == 7 and len(cache) == 2
+    # Un estado mayor que todo el presupuesto no se cachea
+    cache.put([5, 5], "enorme", tokens=11)
+    assert cache.lookup([5, 5]) == (0, None)
+    with pytest.raises(ValueError):
+        PrefixCache(max_tokens=0)
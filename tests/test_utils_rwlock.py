@@ -0,0 +1,39 @@
+import threading
+import time
+from utils.rwlock import ReadWriteLock
+
+def test_readers_run_concurrently():
+    lock = ReadWriteLock()
+    inside = []
+    barrier = threading.Barrier(3, timeout=2)
+
+    def reader():
+        with lock.read_lock():
+            inside.append(1)
+            # Si los lectores se serializaran, la barrera expiraría
+            barrier.wait()
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(inside) == 3
+
+def test_writer_is_exclusive_and_bumps_generation():
+    lock = ReadWriteLock()
+    events = []
+
+    lock.acquire_read()
+    def writer():
+        with lock.write_lock():
+            events.append("write")
+    th = threading.Thread(target=writer)
+    th.start()
+    time.sleep(0.05)
+    # El escritor espera mientras haya un lector activo
+    assert events == []
+    lock.release_read()
+    th.join(timeout=2)
+    assert events == ["write"]
+    assert lock.generation == 1
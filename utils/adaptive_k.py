@@ -0,0 +1,66 @@
+"""
+adaptive_k.py – Número Adaptativo de Documentos Recuperados (corte por salto de puntuación)
+
+Con un search_k fijo, las consultas con pocas coincidencias fuertes rellenan el prompt con pasajes
+débiles, y las consultas con una coincidencia clara no pueden usar menos documentos. Este módulo
+decide cuántos resultados conservar a partir de sus puntuaciones:
+
+  - Las distancias (menor es mejor) se recorren en orden ascendente.
+  - Se calcula el salto entre puntuaciones consecutivas (np.diff) dentro de [min_k, max_k].
+  - Si el mayor salto supera min_gap veces el rango total de puntuaciones, se corta justo antes
+    de él: los documentos que quedan al otro lado del "acantilado" son mucho menos relevantes.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_ADAPTIVE_MIN_K = 1
+DEFAULT_ADAPTIVE_MIN_GAP = 0.25
+
+
+def adaptive_k(
+    distances,
+    min_k: int = DEFAULT_ADAPTIVE_MIN_K,
+    max_k: Optional[int] = None,
+    min_gap: float = DEFAULT_ADAPTIVE_MIN_GAP,
+    higher_is_better: bool = False
+) -> int:
+    """
+    Calcula cuántos resultados conservar según los saltos entre puntuaciones.
+
+    Args:
+        distances: Puntuaciones ordenadas de mejor a peor.
+        min_k (int): Número mínimo de resultados a conservar.
+        max_k (int, opcional): Número máximo de resultados (por defecto, todos).
+        min_gap (float): Fracción del rango total de puntuaciones que debe superar el mayor salto
+                         para cortar. Valores altos cortan solo ante saltos muy marcados.
+        higher_is_better (bool): True si las puntuaciones son similitudes (p. ej. producto interno).
+
+    Returns:
+        int: Número de resultados a conservar (0 si no hay resultados).
+
+    Raises:
+        ValueError: Si min_k < 1 o min_gap no está en [0, 1].
+    """
+    if min_k < 1:
+        raise ValueError("min_k debe ser mayor o igual que uno.")
+    if not 0.0 <= min_gap <= 1.0:
+        raise ValueError("min_gap debe estar en el rango [0, 1].")
+    scores = np.asarray(distances, dtype="float64").reshape(-1)
+    if higher_is_better:
+        scores = -scores
+    n = len(scores) if max_k is None else min(len(scores), max_k)
+    if n <= min_k:
+        return n
+    scores = scores[:n]
+
+    span = scores[-1] - scores[0]
+    if span <= 0:
+        return n
+    # gaps[i] es el salto entre el resultado i y el i+1; solo se puede cortar tras min_k resultados
+    gaps = np.diff(scores)[min_k - 1:]
+    best = int(np.argmax(gaps))
+    if gaps[best] < min_gap * span:
+        return n
+    return min_k + best
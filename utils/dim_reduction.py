@@ -0,0 +1,182 @@
+"""
+dim_reduction.py – Reducción de Dimensionalidad de los Embeddings Almacenados
+
+La memoria del índice y el coste de cada búsqueda crecen con la dimensión (768 o 1536 en los modelos
+habituales). DimensionReducer reduce los vectores antes de indexarlos y aplica la misma transformación
+a las consultas:
+  - "pca": proyección sobre las `dim` componentes principales, ajustada con una muestra del corpus
+    (SVD de la muestra centrada).
+  - "truncate": truncado estilo Matryoshka (primeras `dim` coordenadas). Solo conserva la calidad con
+    modelos entrenados para ello, pero no necesita ajuste.
+  - En ambos casos, por defecto, los vectores reducidos se renormalizan a norma 1, de modo que L2 y
+    producto interno siguen ordenando como el coseno.
+  - save(path) / DimensionReducer.load(path) persisten la transformación (.npz) junto al índice.
+
+Para decidir cuánto recortar, benchmarks/vector_store_benchmark.py (--reduction-dims) mide el recall@k
+con vectores reducidos frente a la búsqueda exacta a dimensión completa.
+"""
+
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from utils.logger import logger
+
+REDUCTION_METHODS = ("pca", "truncate")
+DEFAULT_FIT_SAMPLE = 10000
+
+
+class DimensionReducer:
+    """
+    Transformación lineal de embeddings a `dim` dimensiones (PCA o truncado Matryoshka).
+    """
+
+    def __init__(self, method: str, dim: int, normalize: bool = True, seed: int = 0):
+        """
+        Args:
+            method (str): "pca" o "truncate".
+            dim (int): Dimensión de salida.
+            normalize (bool): Si True, los vectores reducidos se renormalizan a norma 1.
+            seed (int): Semilla del muestreo del corpus en fit().
+
+        Raises:
+            ValueError: Si method o dim no son válidos.
+        """
+        if method not in REDUCTION_METHODS:
+            raise ValueError(f"Método de reducción '{method}' no soportado; opciones: {REDUCTION_METHODS}")
+        if dim is None or int(dim) < 1:
+            raise ValueError("La dimensión de salida debe ser un entero mayor o igual que uno")
+        self.method = method
+        self.dim = int(dim)
+        self.normalize = normalize
+        self.seed = seed
+        self.input_dim: Optional[int] = None
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+        self.explained_variance: Optional[float] = None
+
+    @property
+    def fitted(self) -> bool:
+        """
+        True si la transformación puede aplicarse (el truncado no necesita ajuste).
+        """
+        return self.method == "truncate" or self.components is not None
+
+    def fit(self, vectors, sample_size: int = DEFAULT_FIT_SAMPLE) -> "DimensionReducer":
+        """
+        Ajusta la transformación con (una muestra de como máximo sample_size filas de) vectors.
+
+        Raises:
+            ValueError: Si los vectores no tienen al menos `dim` dimensiones, o si PCA no dispone de
+                al menos `dim` vectores.
+        """
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2:
+            raise ValueError(f"Se esperaba una matriz de embeddings (n, dim); forma recibida: {matrix.shape}")
+        if self.dim > matrix.shape[1]:
+            raise ValueError(f"No se puede reducir de {matrix.shape[1]} a {self.dim} dimensiones.")
+        self.input_dim = int(matrix.shape[1])
+        if self.method == "pca":
+            if len(matrix) > sample_size:
+                picks = np.random.default_rng(self.seed).choice(len(matrix), size=sample_size, replace=False)
+                matrix = matrix[np.sort(picks)]
+            if len(matrix) < self.dim:
+                raise ValueError(f"PCA a {self.dim} dimensiones necesita al menos {self.dim} vectores (hay {len(matrix)}).")
+            sample = matrix.astype(np.float64)
+            mean = sample.mean(axis=0)
+            _, singular, vt = np.linalg.svd(sample - mean, full_matrices=False)
+            variance = singular ** 2
+            self.mean = mean.astype(np.float32)
+            self.components = np.ascontiguousarray(vt[:self.dim].astype(np.float32))
+            self.explained_variance = float(variance[:self.dim].sum() / max(variance.sum(), 1e-12))
+            logger.info(
+                f"PCA ajustado: {self.input_dim} -> {self.dim} dimensiones con {len(sample)} vectores "
+                f"(varianza explicada {self.explained_variance:.3f})."
+            )
+        return self
+
+    def transform(self, vectors) -> np.ndarray:
+        """
+        Aplica la transformación a una matriz (n, input_dim) o a un único vector.
+
+        Returns:
+            np.ndarray: Vectores reducidos float32 contiguos (matriz o vector, según la entrada).
+
+        Raises:
+            RuntimeError: Si la transformación PCA no está ajustada.
+            ValueError: Si la dimensión de entrada no coincide con la del ajuste.
+        """
+        if not self.fitted:
+            raise RuntimeError("La reducción PCA no está ajustada; llama a fit() con una muestra del corpus.")
+        matrix = np.asarray(vectors, dtype=np.float32)
+        single = matrix.ndim == 1
+        if single:
+            matrix = matrix[None, :]
+        width = matrix.shape[1]
+        if (self.input_dim is not None and width != self.input_dim) or width < self.dim:
+            raise ValueError(f"Dimensión de entrada {width} incompatible con la reducción ({self.input_dim} -> {self.dim}).")
+        if self.method == "pca":
+            reduced = (matrix - self.mean) @ self.components.T
+        else:
+            reduced = np.array(matrix[:, :self.dim], dtype=np.float32)
+        if self.normalize:
+            reduced /= np.maximum(np.linalg.norm(reduced, axis=1, keepdims=True), 1e-12)
+        reduced = np.ascontiguousarray(reduced, dtype=np.float32)
+        return reduced[0] if single else reduced
+
+    def fit_transform(self, vectors, sample_size: int = DEFAULT_FIT_SAMPLE) -> np.ndarray:
+        return self.fit(vectors, sample_size).transform(vectors)
+
+    def describe(self) -> Dict[str, Any]:
+        """
+        Resumen de la transformación (método, dimensiones y varianza explicada).
+        """
+        return {
+            "method": self.method,
+            "input_dim": self.input_dim,
+            "dim": self.dim,
+            "normalize": self.normalize,
+            "explained_variance": self.explained_variance,
+        }
+
+    # ======================
+    # PERSISTENCIA
+    # ======================
+    def save(self, path: str) -> str:
+        """
+        Guarda la transformación en un fichero .npz (escritura atómica).
+        """
+        arrays = {
+            "method": np.array(self.method),
+            "dim": np.array(self.dim),
+            "normalize": np.array(self.normalize),
+            "input_dim": np.array(-1 if self.input_dim is None else self.input_dim),
+        }
+        if self.components is not None:
+            arrays["mean"] = self.mean
+            arrays["components"] = self.components
+            arrays["explained_variance"] = np.array(self.explained_variance)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "DimensionReducer":
+        """
+        Carga una transformación guardada con save().
+        """
+        with np.load(path, allow_pickle=False) as data:
+            reducer = cls(str(data["method"]), int(data["dim"]), normalize=bool(data["normalize"]))
+            input_dim = int(data["input_dim"])
+            reducer.input_dim = None if input_dim < 0 else input_dim
+            if "components" in data.files:
+                reducer.mean = np.asarray(data["mean"], dtype=np.float32)
+                reducer.components = np.ascontiguousarray(data["components"], dtype=np.float32)
+                reducer.explained_variance = float(data["explained_variance"])
+        return reducer
+
@@ -0,0 +1,270 @@
+"""
+disk_embedding_cache.py – Caché Persistente de Embeddings en Disco (Shards Mapeados en Memoria)
+
+Backend de utils/embedding_cache.py que sobrevive a los reinicios y se comparte entre procesos
+(p. ej. workers de uvicorn o réplicas que montan el mismo volumen):
+  - Índice de claves en SQLite (modo WAL): clave -> (shard, fila). SQLite serializa las escrituras
+    entre procesos y permite lectores concurrentes sin bloquearlos.
+  - Vectores en shards append-only de filas de tamaño fijo (float16 por defecto, o float32), leídos
+    mediante np.memmap: solo se cargan en memoria las páginas de los vectores consultados.
+  - Cada instancia escribe únicamente en sus propios shards, de modo que nunca hay dos escritores
+    sobre el mismo fichero. La fila se escribe antes de publicar la clave en el índice: un lector
+    nunca ve una clave cuyo vector no esté completo.
+  - export_to(path) / import_from(path): volcado a un único fichero .npz para trasladar la caché
+    entre nodos.
+
+Uso:
+  - install_disk_embedding_cache(path, dtype="float16") instala el backend global (idempotente).
+"""
+
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.embedding_cache import get_embedding_cache, set_embedding_cache
+from utils.logger import logger
+
+DEFAULT_MAX_SHARD_ROWS = 1_000_000
+SUPPORTED_DTYPES = ("float16", "float32")
+INDEX_FILENAME = "index.sqlite"
+_SQL_BATCH = 500  # claves por consulta IN (...), por debajo del límite de variables de SQLite
+
+
+class DiskEmbeddingCache:
+    """
+    Caché de embeddings persistente: índice SQLite + shards de vectores mapeados en memoria.
+    Implementa la interfaz get_many(keys) / set_many(keys, vectors, ttl=None) de utils/embedding_cache.py.
+    """
+
+    def __init__(self, path: str, dtype: str = "float16", max_shard_rows: int = DEFAULT_MAX_SHARD_ROWS):
+        """
+        Args:
+            path (str): Directorio de la caché (se crea si no existe).
+            dtype (str): Tipo de los vectores en los shards nuevos: "float16" (mitad de espacio) o "float32".
+            max_shard_rows (int): Filas por shard antes de abrir uno nuevo.
+
+        Raises:
+            ValueError: Si dtype o max_shard_rows no son válidos.
+        """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"dtype debe ser uno de {SUPPORTED_DTYPES}")
+        if max_shard_rows < 1:
+            raise ValueError("max_shard_rows debe ser mayor o igual que uno")
+        self.path = os.path.abspath(path)
+        self.dtype = dtype
+        self.max_shard_rows = max_shard_rows
+        os.makedirs(self.path, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            os.path.join(self.path, INDEX_FILENAME), timeout=30.0, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS shards ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT NOT NULL, dim INTEGER NOT NULL, dtype TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, shard INTEGER NOT NULL, row INTEGER NOT NULL)"
+            )
+        self._shards: Dict[int, Tuple[str, int, str]] = {}  # id -> (fichero, dim, dtype)
+        self._maps: Dict[int, np.memmap] = {}
+        self._writers: Dict[int, List[int]] = {}  # dim -> [id del shard, filas escritas]
+
+    # ======================
+    # SHARDS
+    # ======================
+    def _shard_info(self, shard_id: int) -> Tuple[str, int, str]:
+        if shard_id not in self._shards:
+            # Shard creado por otro proceso: refrescar la tabla
+            for sid, filename, dim, dtype in self._conn.execute("SELECT id, filename, dim, dtype FROM shards"):
+                self._shards[sid] = (filename, dim, dtype)
+        return self._shards[shard_id]
+
+    def _shard_map(self, shard_id: int, min_rows: int) -> np.memmap:
+        """
+        Retorna el memmap del shard, re-mapeándolo si el fichero creció por encima de lo mapeado.
+        """
+        mapped = self._maps.get(shard_id)
+        if mapped is not None and mapped.shape[0] >= min_rows:
+            return mapped
+        filename, dim, dtype = self._shard_info(shard_id)
+        filepath = os.path.join(self.path, filename)
+        rows = os.path.getsize(filepath) // (dim * np.dtype(dtype).itemsize)
+        if rows < min_rows:
+            raise RuntimeError(f"El shard {filename} está incompleto ({rows} filas, se esperaban {min_rows}).")
+        mapped = np.memmap(filepath, dtype=dtype, mode="r", shape=(rows, dim))
+        self._maps[shard_id] = mapped
+        return mapped
+
+    def _new_shard(self, dim: int) -> List[int]:
+        filename = f"shard-{os.getpid()}-{uuid.uuid4().hex[:12]}-d{dim}.{self.dtype}"
+        open(os.path.join(self.path, filename), "wb").close()
+        with self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO shards (filename, dim, dtype) VALUES (?, ?, ?)", (filename, dim, self.dtype)
+            )
+        shard_id = cursor.lastrowid
+        self._shards[shard_id] = (filename, dim, self.dtype)
+        writer = [shard_id, 0]
+        self._writers[dim] = writer
+        return writer
+
+    def _lookup(self, keys: Sequence[str]) -> Dict[str, Tuple[int, int]]:
+        found: Dict[str, Tuple[int, int]] = {}
+        for start in range(0, len(keys), _SQL_BATCH):
+            chunk = list(keys[start:start + _SQL_BATCH])
+            placeholders = ",".join("?" * len(chunk))
+            for key, shard, row in self._conn.execute(
+                f"SELECT key, shard, row FROM entries WHERE key IN ({placeholders})", chunk
+            ):
+                found[key] = (shard, row)
+        return found
+
+    # ======================
+    # API PÚBLICA
+    # ======================
+    def get_many(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Retorna el vector float32 de cada clave (None si no está en la caché), en el mismo orden.
+        """
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            found = self._lookup(keys)
+            by_shard: Dict[int, List[Tuple[int, int]]] = {}
+            for i, key in enumerate(keys):
+                if key in found:
+                    shard, row = found[key]
+                    by_shard.setdefault(shard, []).append((i, row))
+            for shard, items in by_shard.items():
+                rows = np.fromiter((row for _, row in items), dtype=np.int64, count=len(items))
+                vectors = np.asarray(self._shard_map(shard, int(rows.max()) + 1)[rows], dtype=np.float32)
+                for (i, _), vector in zip(items, vectors):
+                    results[i] = vector
+        return results
+
+    def set_many(self, keys: Sequence[str], vectors: Sequence[Any], ttl: Optional[int] = None) -> int:
+        """
+        Agrega los vectores cuyas claves no estén ya en la caché. El ttl se ignora: la caché en disco
+        es persistente (las claves dependen del modelo y del texto, por lo que no caducan).
+
+        Returns:
+            int: Número de vectores nuevos escritos.
+        """
+        with self._lock:
+            existing = self._lookup(keys)
+            pending: Dict[str, Any] = {}
+            for key, vector in zip(keys, vectors):
+                if key not in existing and key not in pending:
+                    pending[key] = vector
+            if not pending:
+                return 0
+            by_dim: Dict[int, List[Tuple[str, np.ndarray]]] = {}
+            for key, vector in pending.items():
+                vector = np.asarray(vector, dtype=np.float32).ravel()
+                by_dim.setdefault(vector.shape[0], []).append((key, vector))
+
+            entries = []
+            for dim, items in by_dim.items():
+                start = 0
+                while start < len(items):
+                    writer = self._writers.get(dim)
+                    if writer is None or writer[1] >= self.max_shard_rows:
+                        writer = self._new_shard(dim)
+                    shard_id, first_row = writer
+                    part = items[start:start + self.max_shard_rows - first_row]
+                    block = np.stack([vector for _, vector in part]).astype(self.dtype)
+                    filename = self._shards[shard_id][0]
+                    with open(os.path.join(self.path, filename), "ab") as f:
+                        f.write(block.tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+                    entries.extend((key, shard_id, first_row + j) for j, (key, _) in enumerate(part))
+                    writer[1] += len(part)
+                    start += len(part)
+            # Publicar las claves solo cuando los vectores ya están en disco
+            with self._conn:
+                self._conn.executemany("INSERT OR IGNORE INTO entries (key, shard, row) VALUES (?, ?, ?)", entries)
+        return len(entries)
+
+    def export_to(self, path: str) -> int:
+        """
+        Exporta todas las entradas a un fichero .npz (claves y vectores agrupados por dimensión).
+
+        Returns:
+            int: Número de entradas exportadas.
+        """
+        arrays: Dict[str, np.ndarray] = {}
+        total = 0
+        with self._lock:
+            rows_by_shard: Dict[int, Tuple[List[str], List[int]]] = {}
+            for key, shard, row in self._conn.execute("SELECT key, shard, row FROM entries ORDER BY shard, row"):
+                keys, rows = rows_by_shard.setdefault(shard, ([], []))
+                keys.append(key)
+                rows.append(row)
+            by_dim: Dict[int, Tuple[List[str], List[np.ndarray]]] = {}
+            for shard, (keys, rows) in rows_by_shard.items():
+                dim = self._shard_info(shard)[1]
+                vectors = np.asarray(self._shard_map(shard, max(rows) + 1)[rows], dtype=self.dtype)
+                dim_keys, dim_vectors = by_dim.setdefault(dim, ([], []))
+                dim_keys.extend(keys)
+                dim_vectors.append(vectors)
+            for dim, (keys, vectors) in by_dim.items():
+                arrays[f"keys_{dim}"] = np.array(keys, dtype=str)
+                arrays[f"vectors_{dim}"] = np.concatenate(vectors)
+                total += len(keys)
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+        logger.info(f"Caché de embeddings exportada: {total} entradas en {path}.")
+        return total
+
+    def import_from(self, path: str) -> int:
+        """
+        Importa las entradas de un fichero generado por export_to(); las claves existentes se conservan.
+
+        Returns:
+            int: Número de entradas nuevas.
+        """
+        added = 0
+        with np.load(path, allow_pickle=False) as data:
+            for name in data.files:
+                if not name.startswith("keys_"):
+                    continue
+                dim = name[len("keys_"):]
+                keys = data[name].tolist()
+                added += self.set_many(keys, data[f"vectors_{dim}"])
+        logger.info(f"Caché de embeddings importada: {added} entradas nuevas desde {path}.")
+        return added
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._maps.clear()
+            self._conn.close()
+
+
+_install_lock = threading.Lock()
+
+
+def install_disk_embedding_cache(path: str, dtype: str = "float16") -> DiskEmbeddingCache:
+    """
+    Instala una DiskEmbeddingCache como backend global de utils/embedding_cache.py.
+    Si ya hay una instalada sobre el mismo directorio, se reutiliza.
+    """
+    with _install_lock:
+        current = get_embedding_cache()
+        if isinstance(current, DiskEmbeddingCache) and current.path == os.path.abspath(path):
+            return current
+        cache = DiskEmbeddingCache(path, dtype=dtype)
+        set_embedding_cache(cache)
+        logger.info(f"Caché de embeddings persistente en {cache.path} ({dtype}).")
+        return cache
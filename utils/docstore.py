@@ -0,0 +1,341 @@
+"""
+docstore.py – Almacén Compacto de Documentos (payloads) Fuera del Índice Vectorial
+
+Los vector stores solo necesitan posiciones enteras para buscar; el texto y los metadatos
+de cada documento se guardan aquí, fuera de la memoria de objetos de Python, y se cargan
+de forma perezosa únicamente para el top-k final de cada búsqueda.
+
+Backends disponibles:
+  - BlobDocStore: fichero binario append-only con los payloads serializados (JSON, opcionalmente
+    comprimido con zlib) + un array compacto de offsets (8 bytes por documento).
+  - SQLiteDocStore: tabla SQLite (pos INTEGER PRIMARY KEY, payload BLOB), útil cuando se desea
+    un único fichero transaccional.
+
+Ambos exponen la interfaz de solo lectura de un Mapping {posición: documento}, más:
+  - append(document) -> int: agrega un documento y retorna su posición.
+  - get_many(positions) -> list[dict]: carga en bloque los documentos indicados.
+  - flush() / close(): persistencia y liberación de recursos.
+
+Uso:
+  - create_docstore(backend="blob", path=None, compress=False)
+    Si path es None, se usa un fichero temporal anónimo que se elimina al cerrar.
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+import tempfile
+import threading
+import zlib
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from utils.logger import logger
+
+DEFAULT_COMPRESSION_LEVEL = 6
+
+
+class DocStore(ABC, Mapping):
+    """
+    Base común de los docstores: serialización y API de Mapping {posición: documento}.
+    Las subclases implementan append(), truncate(), __getitem__() y __len__().
+    """
+
+    def __init__(self, compress: bool = False, compression_level: int = DEFAULT_COMPRESSION_LEVEL):
+        self.compress = compress
+        self.compression_level = compression_level
+        self._write_lock = threading.Lock()
+
+    # ======================
+    # SERIALIZACIÓN
+    # ======================
+    def _encode(self, document: Dict[str, Any]) -> bytes:
+        raw = json.dumps(document, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        return zlib.compress(raw, self.compression_level) if self.compress else raw
+
+    def _decode(self, payload: bytes) -> Dict[str, Any]:
+        if self.compress:
+            payload = zlib.decompress(payload)
+        return json.loads(payload.decode("utf-8"))
+
+    # ======================
+    # API PÚBLICA
+    # ======================
+    @abstractmethod
+    def append(self, document: Dict[str, Any]) -> int:
+        """
+        Agrega un documento y retorna su posición.
+        """
+
+    @abstractmethod
+    def truncate(self, n: int) -> None:
+        """
+        Descarta los documentos de las posiciones >= n (p. ej. para deshacer un lote cuyos vectores
+        no llegaron a escribirse en el índice).
+        """
+
+    def get_many(self, positions: Iterable[int]) -> List[Dict[str, Any]]:
+        """
+        Carga los documentos de las posiciones indicadas, en el mismo orden.
+        Las posiciones inexistentes (p. ej. -1 devuelto por FAISS) se omiten.
+        """
+        docs = []
+        for pos in positions:
+            doc = self.get(int(pos))
+            if doc is not None:
+                docs.append(doc)
+        return docs
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self)))
+
+    def __contains__(self, pos: object) -> bool:
+        try:
+            pos = int(pos)
+        except (TypeError, ValueError):
+            return False
+        return 0 <= pos < len(self)
+
+
+class BlobDocStore(DocStore):
+    """
+    Docstore append-only sobre un fichero binario + array de offsets.
+
+    Las lecturas usan os.pread (sin mover el cursor compartido), de modo que varios hilos
+    pueden leer en paralelo mientras otro escribe. Un documento solo es visible cuando su
+    offset final ya fue publicado.
+
+    Con path, cada append escribe el payload y después añade su offset final a '<path>.offsets'
+    (append-only): una caída del proceso no pierde el índice de los documentos ya escritos.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        compress: bool = False,
+        compression_level: int = DEFAULT_COMPRESSION_LEVEL
+    ):
+        """
+        Args:
+            path (str, opcional): Ruta del fichero de payloads. Los offsets se persisten en '<path>.offsets'.
+                                  Si es None, se usa un fichero temporal anónimo.
+            compress (bool): Si True, cada payload se comprime con zlib.
+            compression_level (int): Nivel de compresión zlib (1-9).
+
+        Raises:
+            RuntimeError: Si el fichero de payloads existe con datos pero falta '<path>.offsets'
+                          (reescribirlo desde el offset 0 destruiría los documentos guardados).
+        """
+        super().__init__(compress=compress, compression_level=compression_level)
+        self.path = path
+        # offsets[i] = inicio del documento i; offsets[-1] = fin del último documento
+        self._offsets = array("Q", [0])
+        self._offsets_fd = None
+
+        if path is None:
+            self._file = tempfile.TemporaryFile(prefix="rag_docstore_")
+        else:
+            exists = os.path.exists(path)
+            offsets_path = self._offsets_path()
+            if exists and os.path.getsize(path) > 0 and not os.path.exists(offsets_path):
+                logger.error(f"Docstore '{path}' sin fichero de offsets.")
+                raise RuntimeError(
+                    f"El docstore '{path}' contiene datos pero falta '{offsets_path}': "
+                    "no se puede reabrir sin perder documentos."
+                )
+            self._file = open(path, "r+b" if exists else "w+b")
+            if exists and os.path.exists(offsets_path):
+                self._offsets = self._read_offsets(offsets_path, os.path.getsize(path))
+                logger.info(f"Docstore '{path}' reabierto con {len(self)} documentos.")
+            # Fichero de offsets append-only; se reescribe solo si hay que descartar una cola incompleta
+            with open(offsets_path, "wb") as f:
+                f.write(self._offsets.tobytes())
+            self._offsets_fd = os.open(offsets_path, os.O_WRONLY | os.O_APPEND)
+        self._fd = self._file.fileno()
+
+    @staticmethod
+    def _read_offsets(offsets_path: str, data_size: int) -> array:
+        """
+        Lee los offsets persistidos descartando una escritura a medias (bytes sueltos u offsets
+        posteriores al final del fichero de payloads).
+        """
+        with open(offsets_path, "rb") as f:
+            raw = f.read()
+        loaded = array("Q")
+        loaded.frombytes(raw[:len(raw) - len(raw) % loaded.itemsize])
+        while len(loaded) > 1 and loaded[-1] > data_size:
+            loaded.pop()
+        return loaded if loaded else array("Q", [0])
+
+    def _offsets_path(self) -> str:
+        return f"{self.path}.offsets"
+
+    def append(self, document: Dict[str, Any]) -> int:
+        payload = self._encode(document)
+        with self._write_lock:
+            start = self._offsets[-1]
+            os.pwrite(self._fd, payload, start)
+            pos = len(self._offsets) - 1
+            # Publicar (y persistir) el offset final solo tras escribir el payload completo
+            if self._offsets_fd is not None:
+                os.write(self._offsets_fd, array("Q", [start + len(payload)]).tobytes())
+            self._offsets.append(start + len(payload))
+        return pos
+
+    def truncate(self, n: int) -> None:
+        with self._write_lock:
+            n = max(0, int(n))
+            if n >= len(self._offsets) - 1:
+                return
+            del self._offsets[n + 1:]
+            os.ftruncate(self._fd, self._offsets[-1])
+            if self._offsets_fd is not None:
+                os.ftruncate(self._offsets_fd, len(self._offsets) * self._offsets.itemsize)
+
+    def __getitem__(self, pos: int) -> Dict[str, Any]:
+        offsets = self._offsets
+        pos = int(pos)
+        if pos < 0 or pos >= len(offsets) - 1:
+            raise KeyError(pos)
+        start, end = offsets[pos], offsets[pos + 1]
+        return self._decode(os.pread(self._fd, end - start, start))
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Bytes ocupados por los payloads en disco.
+        """
+        return self._offsets[-1]
+
+    def flush(self) -> None:
+        """
+        Fuerza a disco los payloads y los offsets (ya escritos en cada append).
+        """
+        with self._write_lock:
+            self._file.flush()
+            if self._offsets_fd is not None:
+                os.fsync(self._fd)
+                os.fsync(self._offsets_fd)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.flush()
+        if self._offsets_fd is not None:
+            os.close(self._offsets_fd)
+            self._offsets_fd = None
+        self._file.close()
+
+
+class SQLiteDocStore(DocStore):
+    """
+    Docstore sobre SQLite (una fila por documento, payload como BLOB).
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        compress: bool = False,
+        compression_level: int = DEFAULT_COMPRESSION_LEVEL
+    ):
+        """
+        Args:
+            path (str, opcional): Ruta de la base SQLite. Si es None, se usa una base en memoria.
+            compress (bool): Si True, cada payload se comprime con zlib.
+            compression_level (int): Nivel de compresión zlib (1-9).
+        """
+        super().__init__(compress=compress, compression_level=compression_level)
+        self.path = path
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        if path:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS docs (pos INTEGER PRIMARY KEY, payload BLOB NOT NULL)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def append(self, document: Dict[str, Any]) -> int:
+        payload = self._encode(document)
+        with self._write_lock:
+            pos = self._count
+            self._conn.execute("INSERT INTO docs (pos, payload) VALUES (?, ?)", (pos, payload))
+            self._conn.commit()
+            self._count += 1
+        return pos
+
+    def truncate(self, n: int) -> None:
+        with self._write_lock:
+            n = max(0, int(n))
+            if n >= self._count:
+                return
+            self._conn.execute("DELETE FROM docs WHERE pos >= ?", (n,))
+            self._conn.commit()
+            self._count = n
+
+    def __getitem__(self, pos: int) -> Dict[str, Any]:
+        with self._write_lock:
+            row = self._conn.execute("SELECT payload FROM docs WHERE pos = ?", (int(pos),)).fetchone()
+        if row is None:
+            raise KeyError(pos)
+        return self._decode(row[0])
+
+    def get_many(self, positions: Iterable[int]) -> List[Dict[str, Any]]:
+        wanted = [int(p) for p in positions if 0 <= int(p) < self._count]
+        if not wanted:
+            return []
+        placeholders = ",".join("?" for _ in wanted)
+        with self._write_lock:
+            rows = self._conn.execute(
+                f"SELECT pos, payload FROM docs WHERE pos IN ({placeholders})", wanted
+            ).fetchall()
+        by_pos = {pos: payload for pos, payload in rows}
+        return [self._decode(by_pos[p]) for p in wanted if p in by_pos]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def flush(self) -> None:
+        with self._write_lock:
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._write_lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+DOCSTORE_BACKENDS = {
+    "blob": BlobDocStore,
+    "sqlite": SQLiteDocStore,
+}
+
+
+def create_docstore(backend: str = "blob", path: Optional[str] = None, compress: bool = False, **kwargs) -> DocStore:
+    """
+    Crea un docstore del backend indicado.
+
+    Args:
+        backend (str): "blob" o "sqlite".
+        path (str, opcional): Ruta de persistencia. None -> almacenamiento temporal.
+        compress (bool): Comprimir los payloads con zlib.
+
+    Returns:
+        DocStore: Instancia lista para usarse.
+
+    Raises:
+        ValueError: Si el backend no existe.
+    """
+    cls = DOCSTORE_BACKENDS.get(backend)
+    if cls is None:
+        raise ValueError(f"Backend de docstore desconocido: '{backend}'. Opciones: {list(DOCSTORE_BACKENDS)}")
+    return cls(path=path, compress=compress, **kwargs)
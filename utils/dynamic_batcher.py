@@ -0,0 +1,141 @@
+"""
+dynamic_batcher.py – Agrupación Dinámica de Peticiones Concurrentes en Lotes
+
+Un modelo local procesa un lote de N entradas en bastante menos que N veces lo que tarda una sola
+(sobre todo en CPU, donde una entrada aislada no satura las unidades vectoriales). DynamicBatcher
+recoge las peticiones concurrentes en una cola y las ejecuta juntas:
+  - Un único hilo de trabajo toma la primera petición pendiente y espera como mucho max_delay
+    segundos (o hasta reunir max_batch_size) a que lleguen más; después llama a process_batch con
+    el lote completo.
+  - Cada llamador recibe su propio resultado (un Future por petición). Si process_batch falla, el
+    error se entrega a todas las peticiones del lote.
+  - Como todos los lotes se ejecutan en el mismo hilo, el modelo compartido nunca se usa desde dos
+    lotes a la vez (los usos fuera del planificador deben compartir un lock con process_batch).
+
+Uso:
+    batcher = DynamicBatcher(lambda prompts: modelo(prompts), max_batch_size=8, max_delay=0.01)
+    respuesta = batcher("prompt")            # bloquea hasta tener el resultado
+    future = batcher.submit("otro prompt")   # o de forma asíncrona
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Sequence
+
+from utils.logger import logger
+
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_DELAY = 0.01  # segundos que se espera a completar un lote
+
+_STOP = object()
+
+
+class DynamicBatcher:
+    """
+    Planificador que ejecuta las peticiones concurrentes en lotes con process_batch(items) -> resultados.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        name: str = "dynamic-batcher"
+    ):
+        """
+        Args:
+            process_batch (callable): process_batch(items) -> un resultado por item, en el mismo orden.
+            max_batch_size (int): Máximo de peticiones por lote.
+            max_delay (float): Segundos que se espera, desde la primera petición, a completar el lote.
+            name (str): Nombre del hilo de trabajo.
+
+        Raises:
+            ValueError: Si max_batch_size o max_delay no son válidos.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size debe ser mayor o igual que uno")
+        if max_delay < 0:
+            raise ValueError("max_delay debe ser mayor o igual que cero")
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+
+    def submit(self, item: Any) -> Future:
+        """
+        Encola una petición y retorna el Future con su resultado.
+
+        Raises:
+            RuntimeError: Si el planificador está cerrado.
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("El planificador de lotes está cerrado.")
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+            self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Encola una petición y espera su resultado (relanza el error del lote si lo hubo).
+        """
+        return self.submit(item).result(timeout)
+
+    def _collect(self, first) -> List[Any]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                # Se procesa lo ya reunido y se vuelve a encolar la parada
+                self._queue.put(_STOP)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                return
+            batch = [(item, future) for item, future in self._collect(entry) if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            try:
+                results = list(self.process_batch(items))
+                if len(results) != len(items):
+                    raise RuntimeError(f"El lote retornó {len(results)} resultados para {len(items)} peticiones.")
+            except Exception as e:
+                logger.error(f"Error procesando un lote de {len(items)} peticiones: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Procesa las peticiones ya encoladas y detiene el hilo de trabajo.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            worker = self._worker
+        self._queue.put(_STOP)
+        if worker is not None:
+            worker.join(timeout)
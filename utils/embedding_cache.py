@@ -0,0 +1,273 @@
+"""
+embedding_cache.py – Caché de Embeddings por Texto, Direccionada por Contenido
+
+Sustituye la caché por lista completa (clave hash(tuple(texts))) por una caché por texto:
+  - La clave de cada texto es un digest estable (blake2b) del identificador del modelo y del texto
+    normalizado: es la misma entre procesos y reinicios, a diferencia del hash() aleatorizado de Python.
+  - cached_embed() busca los aciertos, calcula solo los textos que faltan con una única llamada al
+    embedder y recoloca los resultados en el orden original. Re-ingerir datos casi sin cambios
+    apenas cuesta cómputo.
+  - Deduplicación por lote: los textos repetidos (misma clave, es decir, iguales tras normalizar
+    espacios y Unicode) se vectorizan una sola vez y el vector se reparte a todas sus posiciones.
+    Con near_duplicates=True también se agrupan los casi duplicados (sin distinguir mayúsculas ni
+    puntuación) dentro del lote; en la caché solo se guarda el vector del representante de cada
+    grupo, bajo su propia clave. El coste de ingerir corpus con mucho texto repetido baja en proporción.
+  - Los embeddings circulan como matrices float32 contiguas (sin listas de floats de Python): la
+    caché en memoria guarda vistas de las filas calculadas y, si no hay aciertos, se retorna la
+    misma matriz que produjo el embedder, sin copias.
+
+Backends:
+  - MemoryEmbeddingCache (por defecto): sobre utils/cache_manager.py, con TTL opcional.
+  - Cualquier objeto con get_many(keys) y set_many(keys, vectors, ttl=None) puede instalarse con
+    set_embedding_cache() (p. ej. una caché persistente en disco).
+"""
+
+import hashlib
+import re
+import threading
+import unicodedata
+from typing import Any, Awaitable, Callable, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.cache_manager import get_cache, set_cache
+from utils.logger import logger
+
+KEY_PREFIX = "emb:"
+DIGEST_SIZE = 16  # bytes (32 caracteres hexadecimales)
+
+_WHITESPACE = re.compile(r"\s+")
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalización usada para la clave: Unicode NFC, espacios colapsados y sin espacios en los extremos.
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def near_duplicate_key(text: str) -> str:
+    """
+    Forma laxa de un texto para agrupar casi duplicados: normalizado, sin mayúsculas y sin puntuación.
+    """
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", normalize_text(text).casefold())).strip()
+
+
+def deduplicate(keys: Sequence[Hashable]) -> Tuple[List[int], np.ndarray]:
+    """
+    Agrupa claves repetidas.
+
+    Returns:
+        tuple: (posición de la primera aparición de cada clave única, en orden de aparición;
+                array inverso con el índice de la clave única de cada posición).
+    """
+    first: dict = {}
+    unique: List[int] = []
+    inverse = np.empty(len(keys), dtype=np.int64)
+    for i, key in enumerate(keys):
+        j = first.get(key)
+        if j is None:
+            j = first[key] = len(unique)
+            unique.append(i)
+        inverse[i] = j
+    return unique, inverse
+
+
+def embedding_key(model_id: str, text: str) -> str:
+    """
+    Clave estable de un texto para un modelo: blake2b(model_id + texto normalizado).
+
+    Args:
+        model_id (str): Identificador del modelo y de los parámetros que afectan al vector.
+        text (str): Texto a vectorizar.
+
+    Returns:
+        str: Digest hexadecimal.
+    """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    digest.update(model_id.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class MemoryEmbeddingCache:
+    """
+    Backend en memoria sobre utils/cache_manager.py (un vector por clave, como fila np.ndarray).
+    """
+
+    def __init__(self, default_ttl: Optional[int] = None):
+        self.default_ttl = default_ttl
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        return [get_cache(KEY_PREFIX + key) for key in keys]
+
+    def set_many(self, keys: Sequence[str], vectors: Sequence[Any], ttl: Optional[int] = None) -> None:
+        ttl = ttl if ttl is not None else self.default_ttl
+        for key, vector in zip(keys, vectors):
+            set_cache(KEY_PREFIX + key, vector, ttl=ttl)
+
+
+_cache_lock = threading.Lock()
+_embedding_cache = None
+
+
+def get_embedding_cache():
+    """
+    Retorna el backend de caché de embeddings global (MemoryEmbeddingCache si no se configuró otro).
+    """
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = MemoryEmbeddingCache()
+    return _embedding_cache
+
+
+def set_embedding_cache(cache) -> None:
+    """
+    Instala un backend de caché de embeddings global (None restaura el backend en memoria).
+    """
+    global _embedding_cache
+    with _cache_lock:
+        _embedding_cache = cache
+
+
+def as_embedding_matrix(vectors) -> np.ndarray:
+    """
+    Convierte vectores (matriz, lista de arrays o lista de listas) en una matriz (n, dim) float32
+    contigua. No copia si ya lo es.
+
+    Raises:
+        ValueError: Si los vectores no forman una matriz bidimensional.
+    """
+    matrix = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+    if matrix.ndim == 1 and matrix.size == 0:
+        return matrix.reshape(0, 0)
+    if matrix.ndim != 2:
+        raise ValueError(f"Se esperaba una matriz de embeddings (n, dim); forma recibida: {matrix.shape}")
+    return matrix
+
+
+def cached_embed(
+    texts: Sequence[str],
+    model_id: str,
+    embed_fn: Callable[[List[str]], Any],
+    ttl: Optional[int] = None,
+    cache=None,
+    near_duplicates: bool = False
+) -> np.ndarray:
+    """
+    Calcula embeddings reutilizando la caché por texto. Cada texto distinto se vectoriza una sola vez
+    aunque aparezca repetido en el lote.
+
+    Args:
+        texts (list[str]): Textos a vectorizar.
+        model_id (str): Identificador del modelo (y de cualquier parámetro que cambie el vector).
+        embed_fn (callable): embed_fn(textos_faltantes) -> vectores alineados con ellos (matriz o lista).
+        ttl (int, opcional): Tiempo de vida de las entradas nuevas.
+        cache (opcional): Backend a usar; por defecto, get_embedding_cache().
+        near_duplicates (bool): Si True, los textos que solo difieren en mayúsculas o puntuación
+            comparten el vector del primero (ver near_duplicate_key).
+
+    Returns:
+        np.ndarray: Matriz (len(texts), dim) float32 contigua, en el mismo orden que texts. Es de solo
+        lectura porque sus filas pueden compartir memoria con la caché.
+
+    Raises:
+        RuntimeError: Si embed_fn no retorna un vector por cada texto faltante.
+    """
+    steps = _cached_embed_steps(texts, model_id, ttl, cache, near_duplicates)
+    try:
+        pending = next(steps)
+        while True:
+            pending = steps.send(embed_fn(pending))
+    except StopIteration as done:
+        return done.value
+
+
+async def acached_embed(
+    texts: Sequence[str],
+    model_id: str,
+    aembed_fn: Callable[[List[str]], Awaitable[Any]],
+    ttl: Optional[int] = None,
+    cache=None,
+    near_duplicates: bool = False
+) -> np.ndarray:
+    """
+    Versión asíncrona de cached_embed(): igual, pero los textos faltantes se calculan con
+    `await aembed_fn(textos_faltantes)` sin bloquear el event loop.
+    """
+    steps = _cached_embed_steps(texts, model_id, ttl, cache, near_duplicates)
+    try:
+        pending = next(steps)
+        while True:
+            pending = steps.send(await aembed_fn(pending))
+    except StopIteration as done:
+        return done.value
+
+
+def _cached_embed_steps(
+    texts: Sequence[str],
+    model_id: str,
+    ttl: Optional[int],
+    cache,
+    near_duplicates: bool
+):
+    """
+    Núcleo común de cached_embed() y acached_embed(): generador que cede (como mucho una vez) la
+    lista de textos a calcular, recibe sus vectores con send() y retorna la matriz final.
+    """
+    cache = cache if cache is not None else get_embedding_cache()
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    keys = [embedding_key(model_id, text) for text in texts]
+    # Duplicados exactos (misma clave): una consulta a la caché y un vector por texto distinto
+    unique, inverse = deduplicate(keys)
+    unique_keys = [keys[i] for i in unique]
+    hits = list(cache.get_many(unique_keys))
+    missing = [u for u, vector in enumerate(hits) if vector is None]
+    computed = None
+    embedded = 0
+    if missing:
+        missing_texts = [texts[unique[u]] for u in missing]
+        groups, group_of = (
+            deduplicate([near_duplicate_key(t) for t in missing_texts]) if near_duplicates
+            else (list(range(len(missing))), None)
+        )
+        embedded = len(groups)
+        # Punto de suspensión: el driver (síncrono o asíncrono) calcula los textos pedidos
+        computed = as_embedding_matrix((yield [missing_texts[g] for g in groups]))
+        if computed.shape[0] != len(groups):
+            raise RuntimeError(
+                f"El embedder retornó {computed.shape[0]} vectores para {len(groups)} textos."
+            )
+        computed.flags.writeable = False
+        # Solo los textos realmente vectorizados se guardan bajo su clave exacta: un casi duplicado no
+        # debe contaminar la caché compartida con el vector de otro texto. Las filas se guardan como
+        # vistas de la matriz calculada, sin copiarlas.
+        cache.set_many([unique_keys[missing[g]] for g in groups], computed, ttl=ttl)
+        if group_of is not None and len(groups) < len(missing):
+            computed = computed[group_of]
+            computed.flags.writeable = False
+    logger.info(
+        f"Caché de embeddings ({model_id}): {len(unique) - len(missing)} aciertos, {embedded} calculados, "
+        f"{len(texts) - len(unique) + len(missing) - embedded} duplicados."
+    )
+    if computed is not None and len(missing) == len(unique):
+        matrix = computed
+    else:
+        dim = computed.shape[1] if computed is not None else len(hits[0])
+        matrix = np.empty((len(unique), dim), dtype=np.float32)
+        if computed is not None:
+            matrix[missing] = computed
+        for u, vector in enumerate(hits):
+            if vector is not None:
+                matrix[u] = vector
+    if len(unique) < len(texts):
+        # Repartir los vectores de los textos únicos a todas sus posiciones
+        matrix = matrix[inverse]
+    matrix.flags.writeable = False
+    return matrix
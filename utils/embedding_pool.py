@@ -0,0 +1,272 @@
+"""
+embedding_pool.py – Pool de Procesos para Generar Embeddings en CPU
+
+Un solo proceso aprovecha como mucho el paralelismo intra-op de torch, con el overhead de Python
+de por medio. Este pool reparte la codificación entre N procesos:
+  - Cada worker carga el modelo una única vez (model_factory) y limita sus hilos de cómputo
+    (OMP/MKL/torch) a threads_per_worker, para no sobresuscribir la CPU. Cada uno es una copia
+    completa del modelo: el pool expone en nbytes la memoria estimada de todas ellas.
+  - Los textos se reparten en tareas a través de una cola. Se ordenan antes por longitud, de modo
+    que cada tarea agrupa textos de longitud similar.
+  - Los vectores vuelven por memoria compartida: el proceso principal reserva un bloque
+    (n_textos x dim, float32) y cada worker escribe sus filas directamente en él. Por la cola solo
+    viajan mensajes de control, nunca listas de floats serializadas.
+
+Uso:
+    pool = EmbeddingWorkerPool(functools.partial(cargar_modelo, "all-MiniLM-L6-v2"), encode_fn)
+    vectores = pool.encode(textos)          # np.ndarray (n, dim) float32, en el orden de textos
+    pool.close()
+
+model_factory y encode_fn(model, texts, **kwargs) deben poder serializarse con pickle (funciones de
+nivel de módulo o functools.partial sobre ellas), ya que los workers se crean con "spawn".
+"""
+
+import math
+import multiprocessing
+import os
+import queue
+import threading
+from multiprocessing import shared_memory
+from typing import Any, Callable, Optional, Sequence
+
+import numpy as np
+
+from utils.logger import logger
+from utils.model_registry import estimate_model_bytes
+
+DEFAULT_THREADS_PER_WORKER = 2
+DEFAULT_TASK_SIZE = 512          # textos por tarea como máximo
+DEFAULT_START_TIMEOUT = 300      # segundos para cargar el modelo en los workers
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TOKENIZERS_PARALLELISM")
+PROBE_TEXT = "dimension"
+
+
+def default_encode(model, texts, **kwargs):
+    """
+    Codificación por defecto: model.encode(texts, **kwargs).
+    """
+    return model.encode(list(texts), **kwargs)
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _limit_threads(threads: int) -> None:
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = "false" if var == "TOKENIZERS_PARALLELISM" else str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _worker_main(model_factory, encode_fn, threads: int, tasks, results) -> None:
+    """
+    Bucle de cada worker: carga el modelo, anuncia la dimensión y la memoria del modelo y procesa
+    tareas hasta recibir None.
+    """
+    _limit_threads(threads)
+    try:
+        model = model_factory()
+        dim = int(np.asarray(encode_fn(model, [PROBE_TEXT]), dtype=np.float32).shape[1])
+    except Exception as e:
+        results.put(("error", None, f"Error cargando el modelo en el worker: {e}"))
+        return
+    results.put(("ready", None, (dim, estimate_model_bytes(model))))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, shm_name, shape, indices, texts, kwargs = task
+        try:
+            embeddings = np.asarray(encode_fn(model, texts, **kwargs), dtype=np.float32)
+            if embeddings.shape != (len(texts), shape[1]):
+                raise ValueError(f"forma inesperada {embeddings.shape}, se esperaba {(len(texts), shape[1])}")
+            shm = _attach(shm_name)
+            try:
+                output = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+                output[indices] = embeddings
+                del output
+            finally:
+                shm.close()
+            results.put(("done", task_id, None))
+        except Exception as e:
+            results.put(("error", task_id, str(e)))
+
+
+class EmbeddingWorkerPool:
+    """
+    Pool de procesos que cargan el modelo una vez y devuelven los vectores por memoria compartida.
+    """
+
+    def __init__(
+        self,
+        model_factory: Callable[[], Any],
+        encode_fn: Callable[..., Any] = default_encode,
+        num_workers: Optional[int] = None,
+        threads_per_worker: int = DEFAULT_THREADS_PER_WORKER,
+        task_size: int = DEFAULT_TASK_SIZE,
+        start_timeout: float = DEFAULT_START_TIMEOUT
+    ):
+        """
+        Args:
+            model_factory (callable): Crea el modelo dentro de cada worker.
+            encode_fn (callable): encode_fn(model, texts, **kwargs) -> matriz (len(texts), dim).
+            num_workers (int, opcional): Procesos; por defecto, núcleos / threads_per_worker.
+            threads_per_worker (int): Hilos de cómputo por worker.
+            task_size (int): Máximo de textos por tarea.
+            start_timeout (float): Segundos de espera para que los workers carguen el modelo.
+
+        Raises:
+            ValueError: Si los parámetros no son válidos.
+            RuntimeError: Si algún worker no consigue cargar el modelo.
+        """
+        if threads_per_worker < 1:
+            raise ValueError("threads_per_worker debe ser mayor o igual que uno")
+        if task_size < 1:
+            raise ValueError("task_size debe ser mayor o igual que uno")
+        if num_workers is None:
+            num_workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+        if num_workers < 1:
+            raise ValueError("num_workers debe ser mayor o igual que uno")
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker
+        self.task_size = task_size
+        self.dim: Optional[int] = None
+        self.nbytes = 0  # memoria estimada de los modelos cargados en todos los workers
+        # Reentrante: encode() cierra el pool si un worker cae, y close() espera al encode() en curso
+        self._lock = threading.RLock()
+        self._closed = False
+
+        ctx = multiprocessing.get_context("spawn")
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        self._workers = [
+            ctx.Process(
+                target=_worker_main,
+                args=(model_factory, encode_fn, threads_per_worker, self._tasks, self._results),
+                name=f"embedding-worker-{i}",
+                daemon=True
+            )
+            for i in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        try:
+            for _ in range(num_workers):
+                kind, _, payload = self._next_result(timeout=start_timeout)
+                if kind == "error":
+                    raise RuntimeError(payload)
+                self.dim, model_bytes = payload
+                self.nbytes += model_bytes
+        except Exception:
+            self.close()
+            raise
+        logger.info(
+            f"Pool de embeddings iniciado: {num_workers} workers x {threads_per_worker} hilos "
+            f"(dim={self.dim}, {self.nbytes / 2**20:.1f} MB)."
+        )
+
+    def _next_result(self, timeout: Optional[float] = None):
+        """
+        Espera el siguiente mensaje de los workers, detectando si alguno terminó inesperadamente.
+        """
+        waited = 0.0
+        while True:
+            try:
+                return self._results.get(timeout=1.0)
+            except queue.Empty:
+                waited += 1.0
+                dead = [w.name for w in self._workers if not w.is_alive()]
+                if dead:
+                    raise RuntimeError(f"Workers de embeddings terminados inesperadamente: {dead}")
+                if timeout is not None and waited >= timeout:
+                    raise RuntimeError("Tiempo de espera agotado en el pool de embeddings.")
+
+    def encode(self, texts: Sequence[str], **kwargs) -> np.ndarray:
+        """
+        Codifica texts repartiéndolos entre los workers.
+
+        Args:
+            texts (list[str]): Textos a vectorizar.
+            **kwargs: Parámetros adicionales para encode_fn (p. ej. batch_size).
+
+        Returns:
+            np.ndarray: Matriz (len(texts), dim) float32, en el orden de texts.
+
+        Raises:
+            RuntimeError: Si el pool está cerrado o alguna tarea falla.
+        """
+        if self._closed:
+            raise RuntimeError("El pool de embeddings está cerrado.")
+        texts = list(texts)
+        n = len(texts)
+        if n == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        shape = (n, self.dim)
+        # Orden por longitud: cada tarea agrupa textos similares y el padding dentro de ella es mínimo
+        order = np.argsort(-np.fromiter((len(t) for t in texts), dtype=np.int64, count=n), kind="stable")
+        size = max(1, min(self.task_size, math.ceil(n / self.num_workers)))
+        chunks = [order[i:i + size] for i in range(0, n, size)]
+
+        shm = shared_memory.SharedMemory(create=True, size=n * self.dim * np.dtype(np.float32).itemsize)
+        try:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("El pool de embeddings está cerrado.")
+                for task_id, indices in enumerate(chunks):
+                    self._tasks.put((task_id, shm.name, shape, indices, [texts[i] for i in indices], kwargs))
+                errors = []
+                try:
+                    for _ in chunks:
+                        kind, task_id, payload = self._next_result()
+                        if kind == "error":
+                            errors.append(f"tarea {task_id}: {payload}")
+                except RuntimeError:
+                    # Un worker caído deja tareas sin respuesta: el pool ya no es utilizable
+                    self.close()
+                    raise
+            if errors:
+                raise RuntimeError(f"Error en el pool de embeddings: {'; '.join(errors)}")
+            output = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+            result = output.copy()
+            del output
+            return result
+        finally:
+            shm.close()
+            shm.unlink()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self) -> None:
+        """
+        Detiene los workers y libera las colas, después de que termine el encode() en curso.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for worker in self._workers:
+                if worker.is_alive():
+                    self._tasks.put(None)
+            for worker in self._workers:
+                worker.join(timeout=10)
+                if worker.is_alive():
+                    worker.terminate()
+            self._tasks.close()
+            self._results.close()
+        logger.info("Pool de embeddings detenido.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,244 @@
+"""
+metadata_index.py – Índice Invertido de Metadatos para Búsquedas Vectoriales Filtradas
+
+Este módulo mantiene un índice invertido (clave, valor) -> posiciones del vector store, de modo que
+las restricciones por tenant, origen, fecha, etc. se resuelvan ANTES de la búsqueda vectorial en lugar
+de sobre-recuperar documentos y filtrarlos después.
+
+Características:
+  - Listas de posiciones compactas (array('q')) por cada par (clave, valor) escalar.
+  - Resolución de filtros a un bitset (np.ndarray[bool]) sobre el rango [0, ntotal).
+  - Sintaxis de filtro compatible con el `where` de ChromaDB:
+        {"tenant": "acme"}                              -> igualdad
+        {"origen": {"$in": ["api", "sql"]}}             -> pertenencia
+        {"fecha": {"$gte": "2025-01-01"}}               -> rangos ($gt, $gte, $lt, $lte)
+        {"tenant": {"$ne": "demo"}}                     -> negaciones ($ne, $nin)
+        {"$or": [{"tenant": "a"}, {"tenant": "b"}]}     -> combinaciones ($and, $or)
+    Varias claves en el mismo dict se combinan con AND.
+  - Seguro para hilos mediante threading.Lock.
+
+Solo se indexan valores escalares (str, int, float, bool); listas o dicts anidados se ignoran.
+Un "$in" con la lista vacía es un error (ValueError) tanto aquí como en to_chroma_where(): Chroma no
+tiene una cláusula que no coincida con nada y descartarlo devolvería todos los documentos.
+"""
+
+import threading
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+_SCALAR_TYPES = (str, int, float, bool)
+_RANGE_OPERATORS = {
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+SUPPORTED_OPERATORS = {"$eq", "$ne", "$in", "$nin"} | set(_RANGE_OPERATORS)
+
+
+class MetadataIndex:
+    """
+    Índice invertido de metadatos: (clave, valor) -> posiciones en el índice vectorial.
+    """
+
+    def __init__(self):
+        # { clave: { valor: array('q') de posiciones } }
+        self._postings: Dict[str, Dict[Any, array]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, pos: int, metadata: Optional[Dict[str, Any]]) -> None:
+        """
+        Registra los metadatos escalares de la posición `pos`.
+
+        Args:
+            pos (int): Posición (id entero) del vector en el store.
+            metadata (dict, opcional): Metadatos del documento.
+        """
+        if not isinstance(metadata, dict):
+            return
+        with self._lock:
+            for key, value in metadata.items():
+                if not isinstance(value, _SCALAR_TYPES):
+                    continue
+                self._postings.setdefault(key, {}).setdefault(value, array("q")).append(pos)
+
+    def truncate(self, n: int) -> None:
+        """
+        Elimina las posiciones >= n de todas las listas (las posiciones se registran en orden creciente).
+        """
+        with self._lock:
+            for key in list(self._postings):
+                values = self._postings[key]
+                for value in list(values):
+                    postings = values[value]
+                    while postings and postings[-1] >= n:
+                        postings.pop()
+                    if not postings:
+                        del values[value]
+                if not values:
+                    del self._postings[key]
+
+    def clear(self) -> None:
+        """
+        Vacía completamente el índice.
+        """
+        with self._lock:
+            self._postings.clear()
+
+    def keys(self) -> List[str]:
+        """
+        Retorna las claves de metadatos indexadas.
+        """
+        with self._lock:
+            return list(self._postings.keys())
+
+    def mask(self, filter: Dict[str, Any], ntotal: int) -> np.ndarray:
+        """
+        Resuelve un filtro a un bitset booleano de longitud `ntotal`.
+
+        Args:
+            filter (dict): Filtro con la sintaxis descrita en el encabezado del módulo.
+            ntotal (int): Número total de posiciones del store.
+
+        Returns:
+            np.ndarray: Máscara booleana; True en las posiciones que cumplen el filtro.
+
+        Raises:
+            ValueError: Si el filtro no es un dict o usa un operador no soportado.
+        """
+        if not isinstance(filter, dict):
+            raise ValueError("El filtro de metadatos debe ser un dict.")
+        with self._lock:
+            return self._resolve(filter, ntotal)
+
+    def candidate_ids(self, filter: Dict[str, Any], ntotal: int) -> np.ndarray:
+        """
+        Igual que mask(), pero retorna directamente las posiciones (int64, ordenadas) que cumplen el filtro.
+        """
+        return np.flatnonzero(self.mask(filter, ntotal)).astype("int64")
+
+    # ======================
+    # RESOLUCIÓN INTERNA
+    # ======================
+    def _resolve(self, filter: Dict[str, Any], ntotal: int) -> np.ndarray:
+        result = np.ones(ntotal, dtype=bool)
+        for key, condition in filter.items():
+            if key in ("$and", "$or"):
+                if not isinstance(condition, list) or not condition:
+                    raise ValueError(f"'{key}' requiere una lista no vacía de filtros.")
+                masks = [self._resolve(sub, ntotal) for sub in condition]
+                combined = np.logical_and.reduce(masks) if key == "$and" else np.logical_or.reduce(masks)
+                result &= combined
+            else:
+                result &= self._resolve_key(key, condition, ntotal)
+        return result
+
+    def _resolve_key(self, key: str, condition: Any, ntotal: int) -> np.ndarray:
+        values = self._postings.get(key, {})
+        if not isinstance(condition, dict):
+            # Valor escalar directo: equivale a {"$eq": valor}
+            condition = {"$eq": condition}
+
+        result = np.ones(ntotal, dtype=bool)
+        for op, operand in condition.items():
+            if op not in SUPPORTED_OPERATORS:
+                raise ValueError(f"Operador de filtro no soportado: '{op}'.")
+            if op == "$eq":
+                selected = [values[operand]] if operand in values else []
+                result &= self._postings_mask(selected, ntotal)
+            elif op == "$ne":
+                selected = [values[operand]] if operand in values else []
+                result &= ~self._postings_mask(selected, ntotal)
+            elif op in ("$in", "$nin"):
+                _check_membership_operand(op, operand)
+                selected = [values[v] for v in operand if v in values]
+                m = self._postings_mask(selected, ntotal)
+                result &= m if op == "$in" else ~m
+            else:
+                compare = _RANGE_OPERATORS[op]
+                selected = [ids for v, ids in values.items() if _safe_compare(compare, v, operand)]
+                result &= self._postings_mask(selected, ntotal)
+        return result
+
+    @staticmethod
+    def _postings_mask(postings: Iterable[array], ntotal: int) -> np.ndarray:
+        m = np.zeros(ntotal, dtype=bool)
+        for ids in postings:
+            if len(ids):
+                positions = np.frombuffer(ids, dtype="int64")
+                m[positions[positions < ntotal]] = True
+        return m
+
+
+def _check_membership_operand(op: str, operand: Any) -> None:
+    """
+    Valida el operando de "$in"/"$nin" (mismas reglas para MetadataIndex y para Chroma).
+
+    Raises:
+        ValueError: Si no es una lista, o si es un "$in" vacío.
+    """
+    if not isinstance(operand, (list, tuple, set)):
+        raise ValueError(f"'{op}' requiere una lista de valores.")
+    if op == "$in" and not operand:
+        raise ValueError("'$in' requiere al menos un valor.")
+
+
+def _safe_compare(compare, value: Any, operand: Any) -> bool:
+    """
+    Compara ignorando combinaciones de tipos no comparables (p. ej. str vs int).
+    """
+    if isinstance(value, bool) != isinstance(operand, bool):
+        return False
+    try:
+        return bool(compare(value, operand))
+    except TypeError:
+        return False
+
+
+def to_chroma_where(filter: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Traduce un filtro de MetadataIndex al formato `where` de ChromaDB.
+
+    - Varias claves en un mismo dict se envuelven en {"$and": [...]}.
+    - "$in"/"$nin" se expanden a "$or"/"$and" de "$eq"/"$ne" para versiones de Chroma sin soporte nativo.
+      Un "$nin" vacío no restringe nada y se omite; un "$in" vacío lanza ValueError, como en MetadataIndex.
+
+    Args:
+        filter (dict, opcional): Filtro de metadatos.
+
+    Returns:
+        dict | None: Cláusula `where` equivalente, o None si no hay filtro.
+
+    Raises:
+        ValueError: Si un "$in" tiene la lista vacía o su operando no es una lista.
+    """
+    if not filter:
+        return None
+
+    clauses: List[Dict[str, Any]] = []
+    for key, condition in filter.items():
+        if key in ("$and", "$or"):
+            subs = [to_chroma_where(sub) for sub in condition]
+            clauses.append(subs[0] if len(subs) == 1 else {key: subs})
+            continue
+        if not isinstance(condition, dict):
+            clauses.append({key: condition})
+            continue
+        for op, operand in condition.items():
+            if op in ("$in", "$nin"):
+                _check_membership_operand(op, operand)
+                inner_op, joiner = ("$eq", "$or") if op == "$in" else ("$ne", "$and")
+                parts = [{key: {inner_op: v}} for v in operand]
+                if not parts:
+                    # "$nin" vacío: no excluye ningún valor
+                    continue
+                clauses.append(parts[0] if len(parts) == 1 else {joiner: parts})
+            else:
+                clauses.append({key: {op: operand}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
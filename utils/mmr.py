@@ -0,0 +1,89 @@
+"""
+mmr.py – Diversificación MMR (Maximal Marginal Relevance) Vectorizada
+
+Reordena un conjunto de candidatos recuperados para que el top-k final sea relevante para la
+consulta y, a la vez, poco redundante entre sí (p. ej. chunks solapados del TextSplitter que
+repetirían el mismo contenido en el prompt del LLM).
+
+En cada paso se elige el candidato que maximiza:
+    lambda_mult * sim(consulta, d) - (1 - lambda_mult) * max_{s ∈ seleccionados} sim(d, s)
+
+Implementación:
+  - Las similitudes coseno consulta-candidatos y candidato-candidato se calculan de una vez con
+    productos matriciales sobre vectores normalizados.
+  - La máxima similitud con los ya seleccionados se mantiene como un vector que se actualiza con
+    np.maximum en cada paso: k operaciones vectorizadas, sin bucles por pares en Python.
+"""
+
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+DEFAULT_MMR_LAMBDA = 0.5
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def mmr_select(query_vector, candidate_vectors, k: int, lambda_mult: float = DEFAULT_MMR_LAMBDA) -> List[int]:
+    """
+    Selecciona los índices de k candidatos diversos mediante MMR.
+
+    Args:
+        query_vector: Vector de consulta (dim,).
+        candidate_vectors: Matriz (n, dim) con los vectores de los candidatos.
+        k (int): Número de candidatos a seleccionar.
+        lambda_mult (float): 1.0 = solo relevancia (orden original por similitud); 0.0 = máxima diversidad.
+
+    Returns:
+        list[int]: Índices (sobre candidate_vectors) en orden de selección.
+
+    Raises:
+        ValueError: Si lambda_mult está fuera de [0, 1] o las dimensiones no coinciden.
+    """
+    if not 0.0 <= lambda_mult <= 1.0:
+        raise ValueError("lambda_mult debe estar en el rango [0, 1].")
+    candidates = np.asarray(candidate_vectors, dtype="float32")
+    if candidates.ndim != 2 or candidates.shape[0] == 0 or k <= 0:
+        return []
+    query = np.asarray(query_vector, dtype="float32").reshape(-1)
+    if query.shape[0] != candidates.shape[1]:
+        raise ValueError("La dimensión del vector de consulta no coincide con la de los candidatos.")
+
+    candidates = _normalize(candidates)
+    relevance = candidates @ _normalize(query)
+    similarity = candidates @ candidates.T
+
+    k = min(k, candidates.shape[0])
+    selected: List[int] = []
+    available = np.ones(candidates.shape[0], dtype=bool)
+    max_redundancy = np.full(candidates.shape[0], -np.inf, dtype="float32")
+    for _ in range(k):
+        if selected:
+            scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_redundancy
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_redundancy, similarity[best], out=max_redundancy)
+    return selected
+
+
+def mmr_rerank(
+    query_vector,
+    documents: Sequence[Dict[str, Any]],
+    vectors,
+    k: int,
+    lambda_mult: float = DEFAULT_MMR_LAMBDA
+) -> List[Dict[str, Any]]:
+    """
+    Aplica MMR a documentos recuperados junto con sus vectores (mismo orden).
+
+    Returns:
+        list[dict]: Los k documentos seleccionados, en orden de selección.
+    """
+    return [documents[i] for i in mmr_select(query_vector, vectors, k, lambda_mult)]
@@ -0,0 +1,182 @@
+"""
+model_registry.py – Registro de Modelos con Carga bajo Demanda y Expulsión LRU por Presupuesto de Memoria
+
+Sustituye al modelo global único (que reutilizaba en silencio el primer modelo cargado aunque se
+pidiera otro) por un registro indexado por clave de modelo:
+  - get(clave) carga el modelo la primera vez con el loader y lo reutiliza después. La carga se
+    serializa por clave: dos hilos que piden el mismo modelo lo cargan una sola vez, y modelos
+    distintos pueden cargarse en paralelo.
+  - Cada modelo se mide al cargarlo (estimate_model_bytes). Si la suma supera max_bytes, se expulsan
+    los modelos usados hace más tiempo (LRU). El modelo recién pedido nunca se expulsa, aunque él
+    solo supere el presupuesto.
+  - Expulsar suelta la referencia del registro: una petición que ya tenía el modelo termina con
+    normalidad y la memoria se libera cuando deja de usarse. Los recursos que no se liberan solos
+    (p. ej. procesos de un pool) se cierran con el callback on_evict, fuera del lock del registro.
+
+Uso:
+    registry = ModelRegistry(cargar_modelo, max_bytes=2 * 1024**3)
+    model = registry.get("all-MiniLM-L6-v2")
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from utils.logger import logger
+
+
+def estimate_model_bytes(model: Any) -> int:
+    """
+    Estima la memoria de un modelo: el atributo nbytes si lo expone (p. ej. sesiones ONNX) o la suma
+    de parámetros y buffers si es un módulo de torch. 0 si no se puede estimar.
+    """
+    nbytes = getattr(model, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    total = 0
+    for attr in ("parameters", "buffers"):
+        tensors = getattr(model, attr, None)
+        if not callable(tensors):
+            continue
+        try:
+            for tensor in tensors():
+                total += int(tensor.numel()) * int(tensor.element_size())
+        except (TypeError, AttributeError):
+            return 0
+    return total
+
+
+class ModelRegistry:
+    """
+    Registro de modelos cargados bajo demanda, con expulsión LRU bajo un presupuesto de memoria.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[Hashable], Any],
+        max_bytes: Optional[int] = None,
+        size_fn: Callable[[Any], int] = estimate_model_bytes,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None
+    ):
+        """
+        Args:
+            loader (callable): loader(clave) -> modelo cargado.
+            max_bytes (int, opcional): Presupuesto de memoria de los modelos cargados (None = sin límite).
+            size_fn (callable): Estimación en bytes de un modelo cargado.
+            on_evict (callable, opcional): on_evict(clave, modelo) al expulsar un modelo.
+
+        Raises:
+            ValueError: Si max_bytes es negativo.
+        """
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError("max_bytes debe ser mayor o igual que cero")
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.size_fn = size_fn
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        self._models: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._loading: Dict[Hashable, threading.Lock] = {}
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Retorna el modelo de la clave, cargándolo si no está en el registro.
+
+        Raises:
+            Exception: La que lance el loader (el registro no queda modificado).
+        """
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                # Otro hilo pudo cargarlo mientras se esperaba
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key]
+            try:
+                model = self.loader(key)
+                size = int(self.size_fn(model))
+            except Exception:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+            with self._lock:
+                self._models[key] = model
+                self._sizes[key] = size
+                self._loading.pop(key, None)
+                evicted = self._evict_over_budget(keep=key)
+            logger.info(f"Modelo {key} cargado en el registro ({size / 2**20:.1f} MB).")
+            self._release(evicted)
+            return model
+
+    def _evict_over_budget(self, keep: Hashable) -> List[Tuple[Hashable, Any]]:
+        evicted = []
+        if self.max_bytes is None:
+            return evicted
+        for key in list(self._models):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            evicted.append((key, self._models.pop(key)))
+            size = self._sizes.pop(key)
+            logger.info(f"Modelo {key} expulsado del registro por presupuesto de memoria ({size / 2**20:.1f} MB).")
+        return evicted
+
+    def _release(self, evicted: List[Tuple[Hashable, Any]]) -> None:
+        if self.on_evict is None:
+            return
+        for key, model in evicted:
+            try:
+                self.on_evict(key, model)
+            except Exception as e:
+                logger.warning(f"Error liberando el modelo expulsado {key}: {e}")
+
+    @property
+    def total_bytes(self) -> int:
+        """
+        Memoria estimada de los modelos cargados.
+        """
+        return sum(self._sizes.values())
+
+    def evict(self, key: Hashable) -> bool:
+        """
+        Expulsa un modelo del registro. Retorna True si estaba cargado.
+        """
+        with self._lock:
+            self._sizes.pop(key, None)
+            model = self._models.pop(key, None)
+        if model is None:
+            return False
+        self._release([(key, model)])
+        return True
+
+    def clear(self) -> None:
+        """
+        Expulsa todos los modelos.
+        """
+        with self._lock:
+            evicted = list(self._models.items())
+            self._models.clear()
+            self._sizes.clear()
+        self._release(evicted)
+
+    def keys(self) -> List[Hashable]:
+        """
+        Claves cargadas, de la usada hace más tiempo a la más reciente.
+        """
+        with self._lock:
+            return list(self._models)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._models
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._models)
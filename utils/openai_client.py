@@ -0,0 +1,194 @@
+"""
+openai_client.py – Cliente Asíncrono Compartido para la API de OpenAI
+
+Capa común de openai_generator y openai_embedder para el camino asíncrono del pipeline:
+  - Una sesión aiohttp por event loop con pool de conexiones keep-alive: las llamadas reutilizan
+    las conexiones TLS abiertas en lugar de crear una sesión (y un handshake) por petición, que es
+    lo que hace la librería openai si no se le pasa una sesión (openai.aiosession).
+  - Un semáforo por endpoint ("chat", "embeddings") que limita las peticiones en vuelo: un worker
+    de la API atiende muchas llamadas concurrentes sin un hilo por petición y sin desbordar los
+    límites de tasa de OpenAI.
+  - Reintentos con backoff exponencial no bloqueante (asyncio.sleep) ante errores transitorios; el
+    hueco del semáforo se libera mientras se espera.
+  - La API key se pasa en cada llamada (api_key=...), sin modificar el estado global openai.api_key.
+
+Uso:
+    client = get_async_client()
+    response = await client.chat_completion(model="gpt-3.5-turbo", messages=[...])
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+import openai
+from openai.error import APIConnectionError, RateLimitError, ServiceUnavailableError, Timeout
+
+from utils.logger import logger
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+TRANSIENT_ERRORS = (RateLimitError, Timeout, ServiceUnavailableError, APIConnectionError)
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_KEEPALIVE_TIMEOUT = 30.0  # segundos que una conexión ociosa permanece abierta
+DEFAULT_ENDPOINT_LIMITS = {"chat": 16, "embeddings": 8}
+
+
+def resolve_api_key(api_key: Optional[str] = None) -> str:
+    """
+    Retorna la API key indicada o la de OPENAI_API_KEY.
+
+    Raises:
+        RuntimeError: Si no hay API key configurada.
+    """
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        logger.error("OPENAI_API_KEY no está configurada.")
+        raise RuntimeError("OPENAI_API_KEY no está configurada.")
+    return api_key
+
+
+class AsyncOpenAIClient:
+    """
+    Cliente asíncrono con pool de conexiones, límites de concurrencia por endpoint y backoff no bloqueante.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+        endpoint_limits: Optional[Dict[str, int]] = None
+    ):
+        """
+        Args:
+            api_key (str, opcional): API key fija; por defecto se lee OPENAI_API_KEY en cada llamada.
+            max_connections (int): Conexiones simultáneas como máximo en el pool.
+            keepalive_timeout (float): Segundos que se mantiene abierta una conexión ociosa.
+            endpoint_limits (dict, opcional): Peticiones en vuelo por endpoint ("chat", "embeddings").
+
+        Raises:
+            ValueError: Si algún límite no es positivo.
+        """
+        limits = {**DEFAULT_ENDPOINT_LIMITS, **(endpoint_limits or {})}
+        if max_connections < 1 or any(limit < 1 for limit in limits.values()):
+            raise ValueError("Los límites de conexiones y de concurrencia deben ser mayores que cero")
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.endpoint_limits = limits
+        # Sesión y semáforos por event loop: los objetos de asyncio no se pueden compartir entre loops
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+    def _state(self) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None or state["session"].closed:
+            if aiohttp is None:
+                raise RuntimeError("Librería 'aiohttp' requerida para el cliente asíncrono de OpenAI no instalada.")
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=self.keepalive_timeout)
+            state = {
+                "session": aiohttp.ClientSession(connector=connector),
+                "semaphores": {name: asyncio.Semaphore(limit) for name, limit in self.endpoint_limits.items()},
+            }
+            self._states[loop] = state
+        return state
+
+    async def request(
+        self,
+        endpoint: str,
+        create,
+        retries: int = 3,
+        backoff_factor: float = 2.0,
+        **payload
+    ) -> Any:
+        """
+        Ejecuta create(api_key=..., **payload) (p. ej. openai.ChatCompletion.acreate) con la sesión
+        compartida, bajo el semáforo del endpoint y con reintentos ante errores transitorios.
+
+        Raises:
+            RuntimeError: Si no hay API key configurada.
+            ValueError: Si el endpoint no tiene límite configurado.
+            Exception: El último error transitorio al agotar los reintentos, o cualquier otro error de la API.
+        """
+        api_key = resolve_api_key(self.api_key)
+        state = self._state()
+        semaphore = state["semaphores"].get(endpoint)
+        if semaphore is None:
+            raise ValueError(f"Endpoint '{endpoint}' sin límite de concurrencia configurado.")
+        attempt = 0
+        delay = 1  # segundos iniciales
+        while True:
+            try:
+                async with semaphore:
+                    token = openai.aiosession.set(state["session"])
+                    try:
+                        return await create(api_key=api_key, **payload)
+                    finally:
+                        openai.aiosession.reset(token)
+            except TRANSIENT_ERRORS as transient_error:
+                if attempt >= retries:
+                    raise
+                logger.warning(
+                    f"Error transitorio en OpenAI ({endpoint}): {transient_error}. Reintentando en {delay} segundos..."
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+                delay *= backoff_factor
+
+    async def chat_completion(self, retries: int = 3, backoff_factor: float = 2.0, **payload) -> Any:
+        """
+        openai.ChatCompletion.acreate(**payload) a través del pool compartido.
+        """
+        return await self.request("chat", openai.ChatCompletion.acreate, retries, backoff_factor, **payload)
+
+    async def embedding(self, retries: int = 3, backoff_factor: float = 2.0, **payload) -> Any:
+        """
+        openai.Embedding.acreate(**payload) a través del pool compartido.
+        """
+        return await self.request("embeddings", openai.Embedding.acreate, retries, backoff_factor, **payload)
+
+    async def aclose(self) -> None:
+        """
+        Cierra la sesión (y sus conexiones) del event loop actual.
+        """
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state["session"].close()
+
+
+_client: Optional[AsyncOpenAIClient] = None
+_client_lock = threading.Lock()
+
+
+def get_async_client() -> AsyncOpenAIClient:
+    """
+    Retorna el cliente compartido por los adaptadores de OpenAI. Los límites se toman de
+    OPENAI_MAX_CONNECTIONS, OPENAI_CHAT_CONCURRENCY y OPENAI_EMBEDDINGS_CONCURRENCY.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AsyncOpenAIClient(
+                max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+                endpoint_limits={
+                    "chat": int(os.getenv("OPENAI_CHAT_CONCURRENCY", DEFAULT_ENDPOINT_LIMITS["chat"])),
+                    "embeddings": int(os.getenv("OPENAI_EMBEDDINGS_CONCURRENCY", DEFAULT_ENDPOINT_LIMITS["embeddings"])),
+                },
+            )
+        return _client
+
+
+def set_async_client(client: Optional[AsyncOpenAIClient]) -> None:
+    """
+    Sustituye el cliente compartido (None lo recrea en el siguiente get_async_client()).
+    """
+    global _client
+    with _client_lock:
+        _client = client
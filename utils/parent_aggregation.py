@@ -0,0 +1,194 @@
+"""
+parent_aggregation.py – Documentos Multi-Vector y Agregación por Documento Padre (small-to-big)
+
+Al trocear documentos, varios chunks de un mismo padre pueden ocupar todo el top-k. Este módulo
+permite indexar muchos vectores por documento padre y, en la búsqueda, agregar las puntuaciones
+por padre para devolver el padre completo o una ventana de chunks alrededor del que coincidió:
+la precisión es a nivel de chunk, pero el número de entradas de contexto para el LLM es pequeño.
+
+Convenciones:
+  - Cada chunk es un documento normal del vector store cuyo metadata incluye "parent_id"
+    (identificador del padre) y "chunk_index" (posición del chunk dentro del padre).
+    make_child_documents() construye esos documentos a partir de un padre y sus chunks.
+  - La agregación trabaja con similitudes (mayor es mejor): las distancias L2 se convierten con
+    1 / (1 + d), de modo que "sum" premie a los padres con varios chunks relevantes.
+
+Características:
+  - aggregate_by_parent(): group-by vectorizado sobre los arrays de candidatos (np.unique +
+    np.lexsort + np.maximum/np.add.reduceat), sin bucles por candidato en Python.
+  - collapse_to_parents(): construye los k resultados por padre, con el texto del padre completo o
+    de una ventana [chunk - window, chunk + window] resuelta mediante el índice de metadatos.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.metadata_index import MetadataIndex
+
+PARENT_ID_KEY = "parent_id"
+CHUNK_INDEX_KEY = "chunk_index"
+SUPPORTED_AGGREGATIONS = ("max", "sum")
+DEFAULT_PARENT_FETCH_FACTOR = 4
+
+
+def make_child_documents(parent: Dict[str, Any], chunks: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Crea un documento por chunk, enlazado a su padre mediante los metadatos.
+
+    Args:
+        parent (dict): Documento padre con "id" y, opcionalmente, "metadata".
+        chunks (list[str]): Textos de los chunks (p. ej. TextSplitter.split_text(parent["texto"])).
+
+    Returns:
+        list[dict]: Documentos con id "<parent_id>#<i>" y metadata {..., "parent_id", "chunk_index"}.
+    """
+    parent_id = str(parent["id"])
+    base_metadata = dict(parent.get("metadata") or {})
+    return [
+        {
+            "id": f"{parent_id}#{i}",
+            "texto": chunk,
+            "metadata": {**base_metadata, PARENT_ID_KEY: parent_id, CHUNK_INDEX_KEY: i},
+        }
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+def to_similarity(scores, higher_is_better: bool = False) -> np.ndarray:
+    """
+    Convierte puntuaciones a similitudes "mayor es mejor" (las distancias d pasan a 1 / (1 + d)).
+    """
+    scores = np.asarray(scores, dtype="float64")
+    if higher_is_better:
+        return scores
+    return 1.0 / (1.0 + np.maximum(scores, 0.0))
+
+
+def aggregate_by_parent(parent_ids: Sequence[Any], similarities, how: str = "max") -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Agrega similitudes de candidatos por padre.
+
+    Args:
+        parent_ids (list): Identificador del padre de cada candidato.
+        similarities: Similitud de cada candidato (mayor es mejor).
+        how (str): "max" (mejor chunk) o "sum" (suma de los chunks recuperados).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: (identificadores de padre, puntuación agregada,
+            índice del mejor candidato de cada padre), ordenados de mayor a menor puntuación.
+
+    Raises:
+        ValueError: Si la agregación no es soportada o las longitudes no coinciden.
+    """
+    if how not in SUPPORTED_AGGREGATIONS:
+        raise ValueError(f"Agregación no soportada: '{how}'. Opciones: {SUPPORTED_AGGREGATIONS}")
+    sims = np.asarray(similarities, dtype="float64").reshape(-1)
+    if len(parent_ids) != len(sims):
+        raise ValueError("El número de identificadores de padre no coincide con el número de puntuaciones.")
+    if len(sims) == 0:
+        return np.empty(0, dtype=object), np.empty(0, dtype="float64"), np.empty(0, dtype="int64")
+
+    groups, codes = np.unique(np.asarray(parent_ids, dtype=object).astype(str), return_inverse=True)
+    # Agrupar por padre y, dentro de cada grupo, del mejor al peor candidato
+    order = np.lexsort((-sims, codes))
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    sorted_sims = sims[order]
+    if how == "max":
+        scores = np.maximum.reduceat(sorted_sims, starts)
+    else:
+        scores = np.add.reduceat(sorted_sims, starts)
+    best = order[starts]
+    ranking = np.argsort(-scores, kind="stable")
+    return groups[sorted_codes[starts]][ranking], scores[ranking], best[ranking]
+
+
+def sibling_positions(
+    metadata_index: MetadataIndex,
+    ntotal: int,
+    parent_id: Any,
+    center: Optional[int] = None,
+    window: Optional[int] = None
+) -> np.ndarray:
+    """
+    Posiciones de los chunks de un padre (todos, o los de la ventana [center - window, center + window]).
+    """
+    condition: Dict[str, Any] = {PARENT_ID_KEY: str(parent_id)}
+    if window is not None and center is not None:
+        condition[CHUNK_INDEX_KEY] = {"$gte": center - window, "$lte": center + window}
+    return metadata_index.candidate_ids(condition, ntotal)
+
+
+def make_span_loader(docstore, metadata_index: MetadataIndex, ntotal: int, window: Optional[int]):
+    """
+    Crea la función load_span de collapse_to_parents() para un vector store.
+
+    Args:
+        docstore: Mapping {posición: documento} con get_many().
+        metadata_index (MetadataIndex): Índice de metadatos del store.
+        ntotal (int): Número de posiciones válidas.
+        window (int, opcional): None -> padre completo; 0 -> solo el mejor chunk; w -> ventana ±w.
+
+    Returns:
+        callable | None
+    """
+    if window == 0:
+        return None
+
+    def load_span(parent_id: Any, center: Optional[int]) -> List[Dict[str, Any]]:
+        return docstore.get_many(sibling_positions(metadata_index, ntotal, parent_id, center, window))
+
+    return load_span
+
+
+def collapse_to_parents(
+    documents: Sequence[Dict[str, Any]],
+    scores,
+    k: int,
+    how: str = "max",
+    higher_is_better: bool = False,
+    load_span: Optional[Callable[[Any, Optional[int]], List[Dict[str, Any]]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Agrupa los chunks recuperados por padre y construye los k mejores resultados.
+
+    Args:
+        documents (list[dict]): Chunks recuperados (alineados con scores).
+        scores: Distancias o similitudes de los chunks.
+        k (int): Número de padres a retornar.
+        how (str): "max" o "sum".
+        higher_is_better (bool): True si scores son similitudes.
+        load_span (callable, opcional): load_span(parent_id, chunk_index) -> chunks del padre o de la
+                                        ventana alrededor de chunk_index. Si es None, se retorna solo
+                                        el mejor chunk de cada padre.
+
+    Returns:
+        list[dict]: Resultados con "id" (del padre), "texto", "metadata" (del mejor chunk), "score",
+                    "matched_chunks" (ids de los chunks recuperados) y "best_chunk".
+    """
+    if not documents:
+        return []
+    parent_ids = [
+        (doc.get("metadata") or {}).get(PARENT_ID_KEY, doc.get("id")) for doc in documents
+    ]
+    groups, agg_scores, best = aggregate_by_parent(parent_ids, to_similarity(scores, higher_is_better), how)
+
+    keys = np.asarray(parent_ids, dtype=object).astype(str)
+    results = []
+    for parent_id, score, best_idx in zip(groups[:k], agg_scores[:k], best[:k]):
+        best_doc = documents[int(best_idx)]
+        metadata = best_doc.get("metadata") or {}
+        span = [best_doc]
+        if load_span is not None and PARENT_ID_KEY in metadata:
+            span = load_span(parent_id, metadata.get(CHUNK_INDEX_KEY)) or [best_doc]
+            span = sorted(span, key=lambda d: (d.get("metadata") or {}).get(CHUNK_INDEX_KEY, 0))
+        results.append({
+            "id": parent_id,
+            "texto": "\n".join(doc.get("texto", "") for doc in span),
+            "metadata": metadata,
+            "score": float(score),
+            "matched_chunks": [documents[i].get("id") for i in np.flatnonzero(keys == parent_id)],
+            "best_chunk": best_doc.get("id"),
+        })
+    return results
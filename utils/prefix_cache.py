@@ -0,0 +1,137 @@
+"""
+prefix_cache.py – Caché LRU de Estados por Prefijo de Tokens
+
+Los prompts que construye el pipeline comparten texto al principio: el andamiaje fijo y, cuando dos
+consultas recuperan los mismos primeros documentos, esa parte del contexto. Un modelo causal puede continuar desde el estado
+(past key/values) ya calculado para un prefijo de tokens en lugar de recalcular la atención sobre
+todo el prompt, y el prefill es la mayor parte de la latencia de un modelo local en CPU.
+PrefixCache guarda esos estados:
+  - La clave es la secuencia de ids de tokens del prefijo (tupla); el valor es opaco (p. ej. un
+    DynamicCache de transformers). Un mismo valor puede registrarse bajo varios prefijos suyos.
+  - lookup(ids) retorna el prefijo cacheado más largo de ids y su valor.
+  - Acotada por número de entradas y por un presupuesto de tokens (la memoria de un estado crece con
+    los tokens que cubre), con expulsión LRU. Un valor registrado bajo varios prefijos cuenta una vez.
+
+Uso:
+    cache = PrefixCache(max_entries=32, max_tokens=8192)
+    cache.put(ids[:n], estado, tokens=n)
+    length, estado = cache.lookup(ids_nuevo_prompt)   # (0, None) si no hay prefijo cacheado
+"""
+
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_MAX_TOKENS = 8192  # tokens cubiertos por todos los estados cacheados
+
+
+class PrefixCache:
+    """
+    Caché LRU acotada de estados indexados por prefijo de tokens, con búsqueda del prefijo más largo.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_tokens: Optional[int] = DEFAULT_MAX_TOKENS):
+        """
+        Args:
+            max_entries (int): Máximo de prefijos cacheados.
+            max_tokens (int, opcional): Máximo de tokens cubiertos por los valores distintos cacheados
+                                        (None: sin límite de tokens).
+
+        Raises:
+            ValueError: Si max_entries o max_tokens no son positivos.
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries debe ser mayor o igual que uno")
+        if max_tokens is not None and max_tokens < 1:
+            raise ValueError("max_tokens debe ser mayor o igual que uno")
+        self.max_entries = max_entries
+        self.max_tokens = max_tokens
+        self.tokens = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[int, ...], Any]" = OrderedDict()
+        self._lengths: Counter = Counter()
+        # id(valor) -> [número de prefijos que lo referencian, tokens que cubre]
+        self._values: Dict[int, List[int]] = {}
+
+    def lookup(self, token_ids: Sequence[int], max_length: Optional[int] = None) -> Tuple[int, Optional[Any]]:
+        """
+        Busca el prefijo cacheado más largo de token_ids (de como máximo max_length tokens).
+
+        Returns:
+            tuple: (longitud del prefijo, valor), o (0, None) si no hay ninguno.
+        """
+        token_ids = tuple(token_ids)
+        limit = len(token_ids) if max_length is None else min(max_length, len(token_ids))
+        with self._lock:
+            for length in sorted(self._lengths, reverse=True):
+                if length > limit:
+                    continue
+                key = token_ids[:length]
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return length, self._entries[key]
+            self.misses += 1
+            return 0, None
+
+    def put(self, prefix_ids: Sequence[int], value: Any, tokens: Optional[int] = None) -> None:
+        """
+        Guarda value para el prefijo prefix_ids, expulsando los prefijos usados hace más tiempo hasta
+        respetar max_entries y max_tokens. Un valor mayor que todo el presupuesto no se guarda.
+
+        Args:
+            prefix_ids (Sequence[int]): Ids de tokens del prefijo.
+            value: Estado a cachear.
+            tokens (int, opcional): Tokens que cubre value (por defecto, len(prefix_ids)).
+        """
+        key = tuple(prefix_ids)
+        if not key:
+            return
+        tokens = len(key) if tokens is None else tokens
+        if self.max_tokens is not None and tokens > self.max_tokens:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._release(self._entries[key])
+            else:
+                self._lengths[len(key)] += 1
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._retain(value, tokens)
+            while len(self._entries) > self.max_entries or (
+                self.max_tokens is not None and self.tokens > self.max_tokens
+            ):
+                evicted, evicted_value = self._entries.popitem(last=False)
+                self._lengths[len(evicted)] -= 1
+                if not self._lengths[len(evicted)]:
+                    del self._lengths[len(evicted)]
+                self._release(evicted_value)
+
+    def _retain(self, value: Any, tokens: int) -> None:
+        record = self._values.get(id(value))
+        if record is None:
+            self._values[id(value)] = [1, tokens]
+            self.tokens += tokens
+        else:
+            record[0] += 1
+
+    def _release(self, value: Any) -> None:
+        record = self._values[id(value)]
+        record[0] -= 1
+        if not record[0]:
+            del self._values[id(value)]
+            self.tokens -= record[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._lengths.clear()
+            self._values.clear()
+            self.tokens = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
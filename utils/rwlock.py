@@ -0,0 +1,79 @@
+"""
+rwlock.py – Lock de Lectores/Escritores para Estructuras Compartidas del Sistema RAG
+
+Permite que múltiples lectores (p. ej. búsquedas en un índice FAISS, que liberan el GIL)
+se ejecuten en paralelo, mientras que los escritores obtienen acceso exclusivo.
+
+Características:
+  - Preferencia por escritores: cuando un escritor espera, no se admiten nuevos lectores,
+    evitando que la ingesta quede bloqueada indefinidamente por un flujo continuo de búsquedas.
+  - Context managers read_lock() / write_lock().
+  - Contador de generación que los escritores incrementan al publicar cambios.
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Lock de lectores/escritores con preferencia por escritores.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer_active = False
+        self._writers_waiting = 0
+        self.generation = 0
+
+    def acquire_read(self) -> None:
+        with self._cond:
+            while self._writer_active or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self) -> None:
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self) -> None:
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer_active or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer_active = True
+
+    def release_write(self) -> None:
+        with self._cond:
+            self._writer_active = False
+            self.generation += 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def read_lock(self):
+        """
+        Acceso compartido: varios lectores pueden mantenerlo simultáneamente.
+        """
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_lock(self):
+        """
+        Acceso exclusivo: espera a que terminen los lectores en curso. Al liberarlo,
+        se incrementa `generation`.
+        """
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()